@@ -1,21 +1,53 @@
 from __future__ import annotations
 
 import json
-from datetime import datetime, timedelta, timezone
+from datetime import date, datetime, timedelta, timezone
 from typing import Any
 
 from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, Response, StreamingResponse
 from pydantic import BaseModel
 from sqlalchemy.orm import Session
 
 from app.api import deps
 from app.core.config import settings
-from app.crud.scan import delete_scan, list_all_scans
-from app.crud.user import delete_user, list_users, set_user_active
+from app.core.profiling import (
+    Capture,
+    ProfilerBusy,
+    get_capture,
+    get_profiler_status,
+    list_captures,
+    profile_for,
+    set_slow_request_threshold,
+)
+from app.core.tracing import get_tracing_metrics
+from app.crud.admin_job import create_admin_job, get_admin_job, list_admin_jobs
+from app.crud.rollup import (
+    USERS_ACTIVE,
+    USERS_TOTAL,
+    get_counters,
+    list_scan_daily_stats,
+    rebuild_rollups,
+    scan_counter_name,
+)
+from app.crud.scan import delete_scan, delete_scans_for_user, get_scan_by_id, list_all_scans
+from app.crud.user import delete_user, get_user_by_id, list_users, set_user_active
 from app.db.session import get_db
-from app.models.user import User
+from app.schemas.admin_job import AdminJobOut, BulkScanSelection, BulkUserActiveRequest, BulkUserSelection
 from app.schemas.scan import AdminScanOut
 from app.schemas.user import UserOut
+from app.services.admin_jobs import submit_admin_job
+from app.services.admission import get_admission_metrics
+from app.services.analytics import bucket_count, default_range, get_scan_time_series
+from app.services.auth_cache import Principal, get_auth_cache_metrics
+from app.services.scan_export import EXPORT_FORMATS, ExportUnavailableError, check_export_format, export_scans
+from app.services.passwords import get_password_hash_metrics
+from app.services.rate_limit import get_rate_limit_metrics
+from app.services.scan_events import publish_scan_event
+from app.services.scan_pipeline import admin_scan_out_json, json_array
+from app.services.upload_gc import get_gc_metrics, run_gc_pass
+from app.services.uploads import release_upload
 
 router = APIRouter(prefix="/admin", tags=["admin"])
 
@@ -23,14 +55,9 @@ router = APIRouter(prefix="/admin", tags=["admin"])
 @router.get("/overview")
 def admin_overview(
     db: Session = Depends(get_db),
-    current_admin: User = Depends(deps.get_current_admin_user),
+    current_admin: Principal = Depends(deps.get_current_admin_user),
 ) -> dict[str, Any]:
-    users = list_users(db, limit=1000)
-    scans = list_all_scans(db, limit=1000)
-
-    total_users = len(users)
-    total_active_users = sum(1 for u in users if u.is_active)
-    total_scans = len(scans)
+    counters = get_counters(db)
 
     today = datetime.now(timezone.utc).date()
     start_date = today - timedelta(days=6)
@@ -38,37 +65,24 @@ def admin_overview(
     for i in range(7):
         d = start_date + timedelta(days=i)
         buckets[d.isoformat()] = 0
+    for row in list_scan_daily_stats(db, start=start_date, end=today):
+        key = row.day.isoformat()
+        buckets[key] = buckets.get(key, 0) + row.count
 
-    scans_by_type = {"dashboard": 0, "estimate_field": 0, "other": 0}
-
-    for s in scans:
-        created_date = (s.created_at.date() if isinstance(s.created_at, datetime) else s.created_at)
-        if start_date <= created_date <= today:
-            buckets[created_date.isoformat()] = buckets.get(created_date.isoformat(), 0) + 1
-
-        scan_type = None
-        try:
-            data = json.loads(s.result_json)
-            if isinstance(data, dict):
-                scan_type = data.get("scan_type")
-        except Exception:
-            scan_type = None
-
-        if scan_type == "dashboard":
-            scans_by_type["dashboard"] += 1
-        elif scan_type == "estimate_field":
-            scans_by_type["estimate_field"] += 1
-        else:
-            scans_by_type["other"] += 1
+    scans_by_type = {
+        "dashboard": counters.get(scan_counter_name("dashboard"), 0),
+        "estimate_field": counters.get(scan_counter_name("estimate_field"), 0),
+        "other": counters.get(scan_counter_name("other"), 0),
+    }
 
     scans_last_7_days = [
         {"date": d, "count": buckets.get(d, 0)} for d in sorted(buckets.keys())
     ]
 
     return {
-        "total_users": total_users,
-        "total_active_users": total_active_users,
-        "total_scans": total_scans,
+        "total_users": counters.get(USERS_TOTAL, 0),
+        "total_active_users": counters.get(USERS_ACTIVE, 0),
+        "total_scans": sum(scans_by_type.values()),
         "scans_last_7_days": scans_last_7_days,
         "scans_by_type": scans_by_type,
         "admin_email": current_admin.email,
@@ -76,10 +90,43 @@ def admin_overview(
     }
 
 
+@router.get("/analytics/scans")
+def admin_scan_analytics(
+    db: Session = Depends(get_db),
+    current_admin: Principal = Depends(deps.get_current_admin_user),
+    start: date | None = Query(None, description="First day (UTC), defaults to 29 days before end"),
+    end: date | None = Query(None, description="Last day (UTC), defaults to today"),
+    bucket: str = Query("day", pattern="^(hour|day|week)$"),
+    group_by: str = Query("none", pattern="^(none|scan_type|user|location|disease_category)$"),
+    scan_type: str | None = Query(None, max_length=32),
+) -> dict[str, Any]:
+    default_start, default_end = default_range()
+    end = end or default_end
+    start = start or (end - (default_end - default_start))
+    if start > end:
+        raise HTTPException(status_code=400, detail="start must not be after end")
+    if bucket_count(start, end, bucket) > settings.ANALYTICS_MAX_BUCKETS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Range too large for {bucket} buckets; use a shorter range or a larger bucket.",
+        )
+    return get_scan_time_series(
+        db, start=start, end=end, bucket=bucket, group_by=group_by, scan_type=scan_type
+    )
+
+
+@router.post("/rollups/rebuild")
+def admin_rebuild_rollups(
+    db: Session = Depends(get_db),
+    current_admin: Principal = Depends(deps.get_current_admin_user),
+) -> dict[str, int]:
+    return rebuild_rollups(db)
+
+
 @router.get("/users", response_model=list[UserOut])
 def admin_list_users(
     db: Session = Depends(get_db),
-    current_admin: User = Depends(deps.get_current_admin_user),
+    current_admin: Principal = Depends(deps.get_current_admin_user),
     limit: int = Query(100, ge=1, le=500),
     offset: int = Query(0, ge=0),
 ) -> list[UserOut]:
@@ -94,7 +141,7 @@ def admin_set_user_active(
     user_id: int,
     body: ToggleActiveBody,
     db: Session = Depends(get_db),
-    current_admin: User = Depends(deps.get_current_admin_user),
+    current_admin: Principal = Depends(deps.get_current_admin_user),
 ) -> UserOut:
     if user_id == current_admin.id:
         raise HTTPException(status_code=400, detail="You cannot change your own active status")
@@ -110,55 +157,292 @@ def admin_set_user_active(
 def admin_delete_user(
     user_id: int,
     db: Session = Depends(get_db),
-    current_admin: User = Depends(deps.get_current_admin_user),
+    current_admin: Principal = Depends(deps.get_current_admin_user),
 ) -> dict[str, bool]:
     if user_id == current_admin.id:
         raise HTTPException(status_code=400, detail="You cannot delete your own account")
 
+    if get_user_by_id(db, user_id=user_id) is None:
+        raise HTTPException(status_code=404, detail="User not found")
+
+    image_filenames = delete_scans_for_user(db, user_id=user_id)
     ok = delete_user(db, user_id=user_id)
     if not ok:
         raise HTTPException(status_code=404, detail="User not found")
+    for filename in image_filenames:
+        release_upload(db, filename)
     return {"ok": True}
 
 
 @router.get("/scans", response_model=list[AdminScanOut])
 def admin_list_scans(
     db: Session = Depends(get_db),
-    current_admin: User = Depends(deps.get_current_admin_user),
+    current_admin: Principal = Depends(deps.get_current_admin_user),
     limit: int = Query(200, ge=1, le=500),
     offset: int = Query(0, ge=0),
-) -> list[AdminScanOut]:
+) -> Response:
     scans = list_all_scans(db, limit=limit, offset=offset)
-    out: list[AdminScanOut] = []
-
-    for s in scans:
-        try:
-            result = json.loads(s.result_json)
-        except Exception:
-            result = {"raw": s.result_json}
-
-        image_url = f"{settings.API_V1_STR}/scans/{s.id}/image"
-        out.append(
-            AdminScanOut(
-                id=s.id,
-                user_id=s.user_id,
-                image_filename=s.image_filename,
-                image_url=image_url,
-                result=result,
-                created_at=s.created_at,
-            )
-        )
+    return Response(content=json_array(admin_scan_out_json(s) for s in scans), media_type="application/json")
 
-    return out
+
+@router.get("/scans/export")
+def admin_export_scans(
+    current_admin: Principal = Depends(deps.get_current_admin_user),
+    format: str = Query("ndjson", pattern="^(ndjson|csv|parquet)$"),
+    user_id: int | None = Query(None),
+    start: date | None = Query(None, description="First day (UTC), inclusive"),
+    end: date | None = Query(None, description="Last day (UTC), inclusive"),
+    scan_type: str | None = Query(None, max_length=32),
+) -> StreamingResponse:
+    """Stream every matching scan, oldest first, without loading them all into memory."""
+
+    if start is not None and end is not None and start > end:
+        raise HTTPException(status_code=400, detail="start must not be after end")
+    try:
+        check_export_format(format)
+    except ExportUnavailableError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+
+    media_type, ext = EXPORT_FORMATS[format]
+    filename = f"scans-{datetime.now(timezone.utc).strftime('%Y%m%dT%H%M%SZ')}.{ext}"
+    return StreamingResponse(
+        export_scans(format, user_id=user_id, start=start, end=end, scan_type=scan_type),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{filename}"', "Cache-Control": "no-store"},
+    )
 
 
 @router.delete("/scans/{scan_id}")
 def admin_delete_scan(
     scan_id: int,
     db: Session = Depends(get_db),
-    current_admin: User = Depends(deps.get_current_admin_user),
+    current_admin: Principal = Depends(deps.get_current_admin_user),
 ) -> dict[str, bool]:
+    scan = get_scan_by_id(db, scan_id=scan_id)
+    if scan is None:
+        raise HTTPException(status_code=404, detail="Scan not found")
+
+    image_filename = scan.image_filename
+    owner_id = scan.user_id
     ok = delete_scan(db, scan_id=scan_id)
     if not ok:
         raise HTTPException(status_code=404, detail="Scan not found")
+    release_upload(db, image_filename)
+    publish_scan_event(owner_id, "scan.deleted", {"scan_id": scan_id})
     return {"ok": True}
+
+
+def _admin_job_to_out(job) -> AdminJobOut:
+    if job.status == "succeeded":
+        progress = 100
+    elif job.total:
+        progress = min(99, int(100 * job.processed / job.total))
+    else:
+        progress = 0
+    return AdminJobOut(
+        id=job.id,
+        kind=job.kind,
+        status=job.status,
+        total=job.total,
+        processed=job.processed,
+        progress=progress,
+        files_released=job.files_released,
+        error=job.error,
+        status_url=f"{settings.API_V1_STR}/admin/jobs/{job.id}",
+        created_at=job.created_at,
+        updated_at=job.updated_at,
+        finished_at=job.finished_at,
+    )
+
+
+def _start_admin_job(db: Session, *, kind: str, params: dict[str, Any], current_admin: Principal) -> JSONResponse:
+    job = create_admin_job(db, kind=kind, params_json=json.dumps(params), created_by=current_admin.id)
+    submit_admin_job(job.id)
+    out = _admin_job_to_out(job)
+    return JSONResponse(status_code=202, content=jsonable_encoder(out), headers={"Location": out.status_url})
+
+
+@router.post("/bulk/scans/delete", status_code=202, response_model=AdminJobOut)
+def admin_bulk_delete_scans(
+    body: BulkScanSelection,
+    db: Session = Depends(get_db),
+    current_admin: Principal = Depends(deps.get_current_admin_user),
+):
+    return _start_admin_job(db, kind="delete_scans", params=body.model_dump(mode="json"), current_admin=current_admin)
+
+
+@router.post("/bulk/users/delete", status_code=202, response_model=AdminJobOut)
+def admin_bulk_delete_users(
+    body: BulkUserSelection,
+    db: Session = Depends(get_db),
+    current_admin: Principal = Depends(deps.get_current_admin_user),
+):
+    return _start_admin_job(db, kind="delete_users", params=body.model_dump(mode="json"), current_admin=current_admin)
+
+
+@router.post("/bulk/users/active", status_code=202, response_model=AdminJobOut)
+def admin_bulk_set_users_active(
+    body: BulkUserActiveRequest,
+    db: Session = Depends(get_db),
+    current_admin: Principal = Depends(deps.get_current_admin_user),
+):
+    return _start_admin_job(
+        db, kind="set_users_active", params=body.model_dump(mode="json"), current_admin=current_admin
+    )
+
+
+@router.get("/jobs", response_model=list[AdminJobOut])
+def admin_list_jobs(
+    db: Session = Depends(get_db),
+    current_admin: Principal = Depends(deps.get_current_admin_user),
+    limit: int = Query(50, ge=1, le=200),
+) -> list[AdminJobOut]:
+    return [_admin_job_to_out(job) for job in list_admin_jobs(db, limit=limit)]
+
+
+@router.get("/jobs/{job_id}", response_model=AdminJobOut)
+def admin_get_job(
+    job_id: str,
+    db: Session = Depends(get_db),
+    current_admin: Principal = Depends(deps.get_current_admin_user),
+) -> AdminJobOut:
+    job = get_admin_job(db, job_id=job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return _admin_job_to_out(job)
+
+
+@router.get("/storage/gc")
+def admin_storage_gc_status(
+    current_admin: Principal = Depends(deps.get_current_admin_user),
+) -> dict[str, Any]:
+    return get_gc_metrics()
+
+
+@router.get("/auth-cache")
+def admin_auth_cache_status(
+    current_admin: Principal = Depends(deps.get_current_admin_user),
+) -> dict[str, Any]:
+    return get_auth_cache_metrics()
+
+
+@router.get("/password-hashing")
+def admin_password_hashing_status(
+    current_admin: Principal = Depends(deps.get_current_admin_user),
+) -> dict[str, Any]:
+    return get_password_hash_metrics()
+
+
+@router.get("/rate-limits")
+def admin_rate_limit_status(
+    current_admin: Principal = Depends(deps.get_current_admin_user),
+) -> dict[str, Any]:
+    return get_rate_limit_metrics()
+
+
+@router.get("/admission")
+def admin_admission_status(
+    current_admin: Principal = Depends(deps.get_current_admin_user),
+) -> dict[str, Any]:
+    return get_admission_metrics()
+
+
+def _require_profiling() -> None:
+    if not settings.PROFILING_ENABLED:
+        raise HTTPException(status_code=404, detail="Profiling is disabled")
+
+
+@router.get("/profiler")
+def admin_profiler_status(
+    current_admin: Principal = Depends(deps.get_current_admin_user),
+) -> dict[str, Any]:
+    _require_profiling()
+    return get_profiler_status()
+
+
+@router.post("/profiler/run")
+async def admin_run_profiler(
+    current_admin: Principal = Depends(deps.get_current_admin_user),
+    seconds: float = Query(10.0, gt=0, le=600),
+    include_idle: bool = Query(False),
+) -> Response:
+    """Sample this worker for ``seconds`` and return folded stacks for a flamegraph."""
+
+    _require_profiling()
+    if seconds > settings.PROFILING_MAX_SECONDS:
+        raise HTTPException(status_code=400, detail=f"seconds must be at most {settings.PROFILING_MAX_SECONDS:g}")
+    try:
+        capture = await profile_for(seconds)
+    except ProfilerBusy as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    return _folded_response(capture, include_idle)
+
+
+@router.put("/profiler/slow-requests")
+def admin_set_slow_request_capture(
+    current_admin: Principal = Depends(deps.get_current_admin_user),
+    threshold_ms: float = Query(..., ge=0, description="Capture requests slower than this; 0 turns capture off"),
+) -> dict[str, Any]:
+    _require_profiling()
+    set_slow_request_threshold(threshold_ms)
+    return get_profiler_status()
+
+
+@router.get("/profiler/captures")
+def admin_list_profiler_captures(
+    current_admin: Principal = Depends(deps.get_current_admin_user),
+) -> list[dict[str, Any]]:
+    _require_profiling()
+    return list_captures()
+
+
+@router.get("/profiler/captures/{capture_id}")
+def admin_get_profiler_capture(
+    capture_id: int,
+    current_admin: Principal = Depends(deps.get_current_admin_user),
+) -> dict[str, Any]:
+    _require_profiling()
+    capture = get_capture(capture_id)
+    if capture is None:
+        raise HTTPException(status_code=404, detail="Capture not found")
+    return capture.summary()
+
+
+@router.get("/profiler/captures/{capture_id}/folded")
+def admin_download_profiler_capture(
+    capture_id: int,
+    current_admin: Principal = Depends(deps.get_current_admin_user),
+    include_idle: bool = Query(False),
+) -> Response:
+    _require_profiling()
+    capture = get_capture(capture_id)
+    if capture is None:
+        raise HTTPException(status_code=404, detail="Capture not found")
+    return _folded_response(capture, include_idle)
+
+
+def _folded_response(capture: Capture, include_idle: bool) -> Response:
+    return Response(
+        content=capture.folded(include_idle=include_idle),
+        media_type="text/plain",
+        headers={
+            "Content-Disposition": f'attachment; filename="profile-{capture.id}.folded"',
+            "Cache-Control": "no-store",
+            "X-Profile-Capture-Id": str(capture.id),
+        },
+    )
+
+
+@router.get("/tracing")
+def admin_tracing_status(
+    current_admin: Principal = Depends(deps.get_current_admin_user),
+) -> dict[str, Any]:
+    return get_tracing_metrics()
+
+
+@router.post("/storage/gc")
+def admin_run_storage_gc(
+    current_admin: Principal = Depends(deps.get_current_admin_user),
+    grace_seconds: int | None = Query(None, ge=0),
+) -> dict[str, Any]:
+    return run_gc_pass(grace_seconds=grace_seconds)
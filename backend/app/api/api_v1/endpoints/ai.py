@@ -1,13 +1,11 @@
 from __future__ import annotations
 
-import os
-import shutil
-import uuid
+from fastapi import APIRouter, Depends, File, HTTPException, UploadFile, status
+from fastapi.concurrency import run_in_threadpool
 
-from fastapi import APIRouter, File, HTTPException, UploadFile, status
-
-from app.core.config import settings
+from app.api import deps
 from app.services.ai_service import ModelNotAvailableError, model_status, predict_image
+from app.services.uploads import UploadRejectedError, discard_staged, stage_upload
 
 router = APIRouter(prefix="/ai", tags=["ai"])
 
@@ -17,23 +15,18 @@ def get_status() -> dict:
     return model_status()
 
 
-@router.post("/predict")
+@router.post("/predict", dependencies=[Depends(deps.limit_client_inference("ai_predict"))])
 async def predict(file: UploadFile = File(...)) -> dict:
-    ext = os.path.splitext(file.filename or "")[1] or ".jpg"
-    filename = f"tmp_{uuid.uuid4().hex}{ext}"
-    path = os.path.join(settings.UPLOAD_DIR, filename)
-
     try:
-        with open(path, "wb") as buffer:
-            shutil.copyfileobj(file.file, buffer)
+        staged = await stage_upload(file)
+    except UploadRejectedError as e:
+        raise HTTPException(status_code=e.status_code, detail=e.detail)
 
-        try:
-            return predict_image(path)
-        except ModelNotAvailableError as e:
-            raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail=str(e))
+    try:
+        async with deps.inference_slot():
+            # Nothing is persisted for ad-hoc predictions, so skip the overlay render.
+            return await run_in_threadpool(predict_image, staged.path, render=False)
+    except ModelNotAvailableError as e:
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail=str(e))
     finally:
-        try:
-            if os.path.exists(path):
-                os.remove(path)
-        except Exception:
-            pass
+        discard_staged(staged)
@@ -2,63 +2,88 @@ from __future__ import annotations
 
 from fastapi import APIRouter, Depends, HTTPException, status, Form
 from fastapi.security import OAuth2PasswordRequestForm
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.core.security import create_access_token
-from app.crud.user import authenticate_user, create_user, get_user_by_email, get_user_by_username
-from app.db.session import get_db
+from app.crud.user import (
+    authenticate_user_async,
+    create_user_async,
+    get_user_by_email_async,
+    get_user_by_username_async,
+)
+from app.db.session import get_async_db
 from app.schemas.token import Token
 from app.schemas.user import UserCreate, UserOut
+from app.services.passwords import PasswordHasherBusy
 
 router = APIRouter(prefix="/auth", tags=["auth"])
 
+# These routes are async so that waiting on the password pool holds no
+# request thread.
 
-@router.post("/register", response_model=UserOut)
-def register(user_in: UserCreate, db: Session = Depends(get_db)) -> UserOut:
-    if get_user_by_email(db, user_in.email) is not None:
+
+def _hasher_busy() -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        detail="Too many sign-in attempts in progress; try again shortly",
+        headers={"Retry-After": "1"},
+    )
+
+
+async def _register(
+    db: AsyncSession, *, email: str, username: str, password: str, full_name: str | None
+) -> UserOut:
+    if await get_user_by_email_async(db, email) is not None:
         raise HTTPException(status_code=400, detail="Email is already registered")
-    if get_user_by_username(db, user_in.username) is not None:
+    if await get_user_by_username_async(db, username) is not None:
         raise HTTPException(status_code=400, detail="Username is already taken")
+    # Give the connection back to the pool while the password is hashed.
+    await db.rollback()
+
+    try:
+        user = await create_user_async(
+            db,
+            email=email,
+            username=username,
+            password=password,
+            full_name=full_name,
+        )
+    except PasswordHasherBusy:
+        raise _hasher_busy()
+    return user
 
-    user = create_user(
+
+@router.post("/register", response_model=UserOut)
+async def register(user_in: UserCreate, db: AsyncSession = Depends(get_async_db)) -> UserOut:
+    return await _register(
         db,
         email=user_in.email,
         username=user_in.username,
         password=user_in.password,
         full_name=user_in.full_name,
     )
-    return user
 
 
 @router.post("/register-simple", response_model=UserOut)
-def register_simple(
+async def register_simple(
     email: str = Form(...),
     username: str = Form(...),
     password: str = Form(...),
     full_name: str | None = Form(None),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
 ) -> UserOut:
-    if get_user_by_email(db, email) is not None:
-        raise HTTPException(status_code=400, detail="Email is already registered")
-    if get_user_by_username(db, username) is not None:
-        raise HTTPException(status_code=400, detail="Username is already taken")
-
-    user = create_user(
-        db,
-        email=email,
-        username=username,
-        password=password,
-        full_name=full_name,
-    )
-    return user
+    return await _register(db, email=email, username=username, password=password, full_name=full_name)
 
 
 @router.post("/login", response_model=Token)
-def login(
+async def login(
     form_data: OAuth2PasswordRequestForm = Depends(),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
 ) -> Token:
-    user = authenticate_user(db, identifier=form_data.username, password=form_data.password)
+    try:
+        user = await authenticate_user_async(db, identifier=form_data.username, password=form_data.password)
+    except PasswordHasherBusy:
+        raise _hasher_busy()
     if user is None:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
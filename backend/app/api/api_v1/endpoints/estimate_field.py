@@ -1,22 +1,23 @@
 from __future__ import annotations
 
-import json
 import math
 import os
-import shutil
-import uuid
 from typing import Any
 
-import httpx
 from fastapi import APIRouter, Depends, File, Form, HTTPException, UploadFile, status
+from fastapi.concurrency import run_in_threadpool
 from fastapi.responses import FileResponse
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.api import deps
 from app.core.config import settings
-from app.crud.scan import create_scan
-from app.db.session import get_db
-from app.models.user import User
+from app.core.metrics import INFERENCE_DURATION, RENDER_DURATION, timed
+from app.core.tracing import inject, traced
+from app.crud.scan import create_scan_async
+from app.db.session import get_async_db
+from app.services.auth_cache import Principal
+from app.services.storage import StorageError, get_storage
+from app.services.uploads import UploadRejectedError, release_upload_async, stage_upload, store_upload_async
 
 router = APIRouter(prefix="/estimate-field", tags=["estimate-field"])
 
@@ -165,6 +166,7 @@ def _render_bboxes_with_labels(*, image_path: str, predictions: list[dict[str, A
     base.save(output_path)
 
 
+@traced("scan.yield_estimate")
 def _compute_yield_estimate(
     predictions: list[dict[str, Any]], image_path: str | None = None
 ) -> dict[str, Any]:
@@ -413,43 +415,26 @@ def _compute_field_area_from_image(*, image_path: str, altitude_m: float | None)
         return None
 
 
-@router.post("/")
-async def estimate_field(
-    file: UploadFile = File(...),
-    altitude_m: float | None = Form(None),
-    current_user: User = Depends(deps.get_current_active_user),
-    db: Session = Depends(get_db),
-) -> dict[str, Any]:
-    if not settings.ROBOFLOW_API_KEY:
-        raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail="ROBOFLOW_API_KEY is not set. Set it in your environment to enable Estimate Field.",
-        )
-
-    ext = os.path.splitext(file.filename or "")[1] or ".jpg"
-    stem = uuid.uuid4().hex
-    original_filename = f"{stem}{ext}"
-    original_path = os.path.join(settings.UPLOAD_DIR, original_filename)
-
-    with open(original_path, "wb") as buffer:
-        shutil.copyfileobj(file.file, buffer)
+def _infer_roboflow(*, image_path: str, filename: str) -> Any:
+    import httpx
 
     try:
         # Call Roboflow directly over HTTP instead of relying on the inference-sdk client.
         url = f"{settings.ROBOFLOW_API_URL.rstrip('/')}/{settings.ROBOFLOW_MODEL_ID}"
         params = {"api_key": settings.ROBOFLOW_API_KEY}
 
-        with open(original_path, "rb") as f:
-            files = {"file": (original_filename, f, "application/octet-stream")}
-            resp = httpx.post(url, params=params, files=files, timeout=60.0)
+        with timed(INFERENCE_DURATION, backend="roboflow"):
+            with open(image_path, "rb") as f:
+                files = {"file": (filename, f, "application/octet-stream")}
+                resp = httpx.post(url, params=params, files=files, headers=inject(), timeout=60.0)
 
-        try:
-            resp.raise_for_status()
-        except httpx.HTTPStatusError as e:
-            raise HTTPException(
-                status_code=e.response.status_code,
-                detail=f"Roboflow HTTP error: {e.response.text}",
-            ) from e
+            try:
+                resp.raise_for_status()
+            except httpx.HTTPStatusError as e:
+                raise HTTPException(
+                    status_code=e.response.status_code,
+                    detail=f"Roboflow HTTP error: {e.response.text}",
+                ) from e
 
         raw = resp.json()
     except HTTPException:
@@ -457,31 +442,81 @@ async def estimate_field(
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Roboflow inference failed: {e}")
 
-    predictions = raw.get("predictions") if isinstance(raw, dict) else None
-    if not isinstance(predictions, list):
-        predictions = []
+    return raw
 
-    yield_estimate = _compute_yield_estimate(predictions, image_path=original_path)
 
-    # Optional approximate field area estimate using altitude and camera FOV
-    field_area = _compute_field_area_from_image(
-        image_path=original_path,
-        altitude_m=altitude_m,
-    )
+@router.post("/", dependencies=[Depends(deps.limit_user_inference("estimate_field"))])
+async def estimate_field(
+    file: UploadFile = File(...),
+    altitude_m: float | None = Form(None),
+    current_user: Principal = Depends(deps.get_current_active_user_async),
+    db: AsyncSession = Depends(get_async_db),
+) -> dict[str, Any]:
+    if not settings.ROBOFLOW_API_KEY:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="ROBOFLOW_API_KEY is not set. Set it in your environment to enable Estimate Field.",
+        )
 
-    annotated_filename = f"{stem}_rf.jpg"
-    annotated_path = os.path.join(settings.UPLOAD_DIR, annotated_filename)
+    storage = get_storage()
+    try:
+        staged = await stage_upload(file)
+    except UploadRejectedError as e:
+        raise HTTPException(status_code=e.status_code, detail=e.detail)
 
     try:
-        _render_bboxes_with_labels(
-            image_path=original_path,
-            predictions=[p for p in predictions if isinstance(p, dict)],
-            output_path=annotated_path,
+        original_filename = await store_upload_async(staged)
+        original_path = await run_in_threadpool(storage.fetch, original_filename)
+    except StorageError as e:
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail=str(e))
+    if original_path is None:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Uploaded image is not available in storage",
         )
+    stem = os.path.splitext(original_filename)[0]
+
+    def render(predictions: list[dict[str, Any]], annotated_filename: str) -> None:
+        with timed(RENDER_DURATION, kind="boxes"):
+            _render_bboxes_with_labels(
+                image_path=original_path,
+                predictions=predictions,
+                output_path=storage.path(annotated_filename),
+            )
+        storage.publish(annotated_filename)
+
+    annotated_filename: str | None = f"{stem}_rf.jpg"
+    try:
+        async with deps.inference_slot(current_user) as slot:
+            raw = await run_in_threadpool(_infer_roboflow, image_path=original_path, filename=original_filename)
+
+            predictions = raw.get("predictions") if isinstance(raw, dict) else None
+            if not isinstance(predictions, list):
+                predictions = []
+
+            # Under load the colour analysis and the annotated image are skipped.
+            yield_estimate = await run_in_threadpool(
+                _compute_yield_estimate, predictions, image_path=None if slot.degraded else original_path
+            )
+
+            # Optional approximate field area estimate using altitude and camera FOV
+            field_area = _compute_field_area_from_image(
+                image_path=original_path,
+                altitude_m=altitude_m,
+            )
+
+            if slot.degraded:
+                annotated_filename = None
+            else:
+                try:
+                    await run_in_threadpool(render, [p for p in predictions if isinstance(p, dict)], annotated_filename)
+                except HTTPException:
+                    raise
+                except Exception as e:
+                    raise HTTPException(status_code=500, detail=f"Failed to render Roboflow annotations: {e}")
     except HTTPException:
+        await release_upload_async(original_filename)
         raise
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Failed to render Roboflow annotations: {e}")
 
     out: dict[str, Any] = {
         "source": "roboflow",
@@ -492,17 +527,20 @@ async def estimate_field(
         "yield_estimate": yield_estimate,
         "field_area": field_area,
         "annotated_image_filename": annotated_filename,
-        "annotated_image_url": f"{settings.API_V1_STR}/estimate-field/image/{annotated_filename}",
+        "annotated_image_url": (
+            f"{settings.API_V1_STR}/estimate-field/image/{annotated_filename}" if annotated_filename else None
+        ),
+        "degraded": slot.degraded,
         "original_image_filename": original_filename,
         "original_image_url": f"{settings.API_V1_STR}/estimate-field/image/{original_filename}",
     }
 
     try:
-        create_scan(
+        await create_scan_async(
             db,
             user_id=current_user.id,
             image_filename=original_filename,
-            result_json=json.dumps(out),
+            result=out,
         )
     except Exception:
         # Persisting history should not break the main inference response.
@@ -514,10 +552,12 @@ async def estimate_field(
 @router.get("/image/{image_name}")
 def get_estimate_image(
     image_name: str,
-    current_user: User = Depends(deps.get_current_active_user),
+    current_user: Principal = Depends(deps.get_current_active_user),
 ):
-    safe_name = os.path.basename(image_name)
-    path = os.path.join(settings.UPLOAD_DIR, safe_name)
-    if not os.path.exists(path):
+    try:
+        path = get_storage().fetch(os.path.basename(image_name))
+    except StorageError:
+        path = None
+    if not path:
         raise HTTPException(status_code=404, detail="Image not found")
     return FileResponse(path)
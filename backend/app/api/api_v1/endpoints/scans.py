@@ -3,114 +3,79 @@ from __future__ import annotations
 import base64
 import json
 import os
-import shutil
-import uuid
+import time
 
-from fastapi import APIRouter, Depends, File, Form, HTTPException, UploadFile
-from fastapi.responses import FileResponse, Response
+from fastapi import APIRouter, Depends, File, Form, Header, HTTPException, Query, UploadFile
+from fastapi.encoders import jsonable_encoder
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import FileResponse, JSONResponse, Response, StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 
 from app.api import deps
 from app.core.config import settings
-from app.crud.scan import create_scan, get_scan_by_id, list_scans_for_user
-from app.db.session import get_db
-from app.models.user import User
-from app.schemas.scan import ScanOut
-from app.services.ai_service import ModelNotAvailableError, predict_image, render_polygons_only
+from app.core.security import create_stream_ticket, verify_image_token
+from app.crud.scan import create_queued_scan_async, create_scan_async, get_scan_by_id, list_scans_for_user
+from app.crud.scan_job import get_scan_job
+from app.db.session import get_async_db, get_db
+from app.schemas.scan import ScanJobOut, ScanOut
+from app.schemas.token import StreamTicket
+from app.services.auth_cache import Principal
+from app.services.render_queue import enqueue_render, wait_for_render
+from app.services.result_codec import load_scan_result
+from app.services.scan_events import publish_scan_event, stream_scan_events
+from app.services.scan_jobs import notify_scan_job_queued
+from app.services.scan_pipeline import analyze_scan, json_array, scan_out_json, scan_to_out
+from app.services.storage import StorageError, get_storage
+from app.services.uploads import UploadRejectedError, release_upload_async, stage_upload, store_upload_async
 
 router = APIRouter(prefix="/scans", tags=["scans"])
 
 
-def _scan_to_out(scan, *, result: dict) -> ScanOut:
-    return ScanOut(
-        id=scan.id,
-        image_filename=scan.image_filename,
-        image_url=f"{settings.API_V1_STR}/scans/{scan.id}/image",
-        result=result,
-        created_at=scan.created_at,
-    )
-
-
-def _compute_field_health(result: dict) -> dict:
-    detections_raw = result.get("detections")
-    detections = [d for d in detections_raw if isinstance(d, dict)] if isinstance(detections_raw, list) else []
-
-    total = len(detections)
-    disease_keywords = (
-        "disease",
-        "blight",
-        "rust",
-        "mold",
-        "rot",
-        "wilt",
-        "pest",
-        "infect",
-    )
-
-    disease_count = 0
-    for d in detections:
-        label = str(d.get("class_name") or d.get("class_id") or "").lower()
-        if any(k in label for k in disease_keywords):
-            disease_count += 1
-
-    if total <= 0:
-        health_percent = 100
-    else:
-        health_percent = max(0, min(100, round(100 * (1 - disease_count / total))))
-
-    if disease_count == 0:
-        recommendation = (
-            "No disease indicators were found in this scan. Maintain regular scouting and record "
-            "keeping, keep irrigation and fertilization on schedule, and avoid unnecessary "
-            "chemical applications."
-        )
-    elif health_percent >= 70:
-        recommendation = (
-            "Early or mild disease pressure detected. Mark the affected spots from the scan, scout "
-            "those rows on the ground, and consider targeted treatment only in hotspots. Monitor "
-            "these areas over the next 3–7 days."
-        )
-    elif health_percent >= 40:
-        recommendation = (
-            "Moderate disease presence detected. Prioritise treatment of the affected blocks, "
-            "following local agronomy or extension guidelines for product choice and rates. Improve "
-            "airflow in the canopy where possible and avoid prolonged leaf wetness from irrigation."
-        )
-    else:
-        recommendation = (
-            "Severe disease indicators detected in this frame. Consult an agronomist or local "
-            "extension officer as soon as possible, plan immediate treatment for the worst areas, "
-            "and review crop rotation, residue management, and variety selection for future seasons."
-        )
-
-    return {
-        "field_health_percent": health_percent,
-        "disease_count": disease_count,
-        "total_detections": total,
-        "recommendation": recommendation,
-    }
-
-
 @router.get("/", response_model=list[ScanOut])
 def list_my_scans(
     db: Session = Depends(get_db),
-    current_user: User = Depends(deps.get_current_active_user),
-) -> list[ScanOut]:
+    current_user: Principal = Depends(deps.get_current_active_user),
+) -> Response:
     scans = list_scans_for_user(db, user_id=current_user.id)
-    out: list[ScanOut] = []
-    for s in scans:
-        try:
-            result = json.loads(s.result_json)
-        except Exception:
-            result = {"raw": s.result_json}
-        out.append(_scan_to_out(s, result=result))
-    return out
+    # Serialized directly: the stored results are spliced in without a parse / validate / dump round trip.
+    return Response(content=json_array(scan_out_json(s) for s in scans), media_type="application/json")
+
+
+def _wants_async(async_query: bool, prefer: str | None) -> bool:
+    if async_query:
+        return True
+    return any(p.strip().lower() == "respond-async" for p in (prefer or "").split(","))
+
+
+def _job_to_out(job, *, scan=None) -> ScanJobOut:
+    scan_out = None
+    if scan is not None and job.status == "succeeded":
+        scan_out = scan_to_out(scan, result=load_scan_result(scan))
+    return ScanJobOut(
+        id=job.id,
+        scan_id=job.scan_id,
+        status=job.status,
+        stage=job.stage,
+        progress=job.progress,
+        attempts=job.attempts,
+        error=job.error,
+        status_url=f"{settings.API_V1_STR}/scans/jobs/{job.id}",
+        created_at=job.created_at,
+        updated_at=job.updated_at,
+        scan=scan_out,
+    )
 
 
-@router.post("/", response_model=ScanOut)
+@router.post(
+    "/",
+    response_model=ScanOut,
+    responses={202: {"model": ScanJobOut, "description": "Accepted for asynchronous processing"}},
+    dependencies=[Depends(deps.limit_user_inference("scan_create"))],
+)
 async def create_my_scan(
-    db: Session = Depends(get_db),
-    current_user: User = Depends(deps.get_current_active_user),
+    db: AsyncSession = Depends(get_async_db),
+    current_user: Principal = Depends(deps.get_current_active_user_async),
     file: UploadFile = File(...),
     drone_name: str = Form(...),
     flight_duration: str = Form(...),
@@ -118,20 +83,31 @@ async def create_my_scan(
     location: str = Form(...),
     field_size: str = Form(""),
     captured_at: str = Form(...),
-) -> ScanOut:
-    ext = os.path.splitext(file.filename or "")[1] or ".jpg"
-    filename = f"{uuid.uuid4().hex}{ext}"
-    path = os.path.join(settings.UPLOAD_DIR, filename)
-
-    with open(path, "wb") as buffer:
-        shutil.copyfileobj(file.file, buffer)
+    async_mode: bool = Query(False, alias="async"),
+    prefer: str | None = Header(None),
+):
+    storage = get_storage()
+    try:
+        staged = await stage_upload(file)
+    except UploadRejectedError as e:
+        raise HTTPException(status_code=e.status_code, detail=e.detail)
 
     try:
-        result = predict_image(path)
-    except ModelNotAvailableError as e:
-        result = {"status": "model_not_available", "reason": str(e)}
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"AI inference failed: {e}")
+        filename = await store_upload_async(staged)
+        path = await run_in_threadpool(storage.fetch, filename)
+    except StorageError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    if path is None:
+        raise HTTPException(status_code=503, detail="Uploaded image is not available in storage")
+
+    user_id = current_user.id
+
+    def on_stage(stage: str, progress: int) -> None:
+        publish_scan_event(
+            user_id,
+            "scan.progress",
+            {"scan_id": None, "job_id": None, "image_filename": filename, "stage": stage, "progress": progress},
+        )
 
     drone_info = {
         "name": drone_name,
@@ -142,40 +118,164 @@ async def create_my_scan(
         "captured_at": captured_at,
     }
 
-    field_health = _compute_field_health(result) if isinstance(result, dict) else None
+    if _wants_async(async_mode, prefer) and settings.SCAN_JOB_WORKERS > 0:
+        try:
+            # Queued jobs are admitted by the worker, so the quota is charged on acceptance.
+            await deps.charge_inference_quota(current_user)
+        except HTTPException:
+            await release_upload_async(filename)
+            raise
+        try:
+            scan, job = await create_queued_scan_async(
+                db,
+                user_id=user_id,
+                image_filename=filename,
+                result={"scan_type": "dashboard", "drone": drone_info},
+                payload_json=json.dumps({"drone": drone_info}),
+            )
+        except Exception:
+            await db.rollback()
+            await release_upload_async(filename)
+            raise
+        notify_scan_job_queued()
+
+        job_out = _job_to_out(job)
+        publish_scan_event(
+            user_id,
+            "scan.queued",
+            {
+                "scan_id": scan.id,
+                "job_id": job.id,
+                "image_filename": filename,
+                "stage": job.stage,
+                "progress": job.progress,
+            },
+        )
+        return JSONResponse(
+            status_code=202,
+            content=jsonable_encoder(job_out),
+            headers={"Location": job_out.status_url},
+        )
 
-    if isinstance(result, dict):
-        result["drone"] = drone_info
-        if field_health is not None:
-            result["field_health"] = field_health
-        if "scan_type" not in result:
-            result["scan_type"] = "dashboard"
+    on_stage("upload", 10)
+    try:
+        async with deps.inference_slot(current_user) as slot:
+            # Off the event loop, so progress events reach open streams while inference runs.
+            result = await run_in_threadpool(
+                analyze_scan,
+                filename=filename,
+                path=path,
+                drone_info=drone_info,
+                on_stage=on_stage,
+                prerender=not slot.degraded,
+            )
+    except HTTPException:
+        await release_upload_async(filename)
+        raise
+    except Exception as e:
+        await release_upload_async(filename)
+        raise HTTPException(status_code=500, detail=f"AI inference failed: {e}")
 
-    scan = create_scan(
-        db,
-        user_id=current_user.id,
-        image_filename=filename,
-        result_json=json.dumps(result),
+    on_stage("save", 90)
+    try:
+        scan = await create_scan_async(
+            db,
+            user_id=user_id,
+            image_filename=filename,
+            result=result,
+        )
+    except Exception:
+        await db.rollback()
+        await release_upload_async(filename)
+        raise
+
+    scan_out = scan_to_out(scan, result=result)
+    publish_scan_event(
+        user_id,
+        "scan.completed",
+        {"scan_id": scan.id, "job_id": None, "scan": scan_out.model_dump(mode="json")},
     )
+    return scan_out
 
-    return _scan_to_out(scan, result=result)
 
+@router.post("/events/ticket", response_model=StreamTicket)
+def create_scan_events_ticket(current_user: Principal = Depends(deps.get_current_active_user)) -> StreamTicket:
+    """A short-lived ticket for opening ``GET /scans/events`` from an EventSource."""
 
-@router.get("/{scan_id}/image")
-def get_scan_image(
-    scan_id: int,
+    ticket = create_stream_ticket(user_id=current_user.id)
+    return StreamTicket(
+        ticket=ticket,
+        expires_in=max(1, settings.STREAM_TICKET_TTL_SECONDS),
+        url=f"{settings.API_V1_STR}/scans/events?ticket={ticket}",
+    )
+
+
+@router.get("/events")
+async def stream_my_scan_events(
+    current_user: Principal = Depends(deps.get_current_active_stream_user),
+) -> StreamingResponse:
+    """Server-Sent Events feed of the caller's scans as they move through the pipeline.
+
+    Events: ``scan.queued``, ``scan.progress`` (stage ``upload``, ``inference``,
+    ``render``, ``save``), ``scan.completed`` (with the full scan), ``scan.failed``
+    and ``scan.deleted``. A ``resync`` event means events were dropped and the
+    client should reload ``GET /scans/``.
+
+    Authenticate with the usual bearer header or, from a browser EventSource,
+    with ``?ticket=`` from ``POST /scans/events/ticket``.
+    """
+
+    return StreamingResponse(
+        stream_scan_events(current_user.id),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-store", "X-Accel-Buffering": "no"},
+    )
+
+
+@router.get("/jobs/{job_id}", response_model=ScanJobOut)
+def get_my_scan_job(
+    job_id: str,
     db: Session = Depends(get_db),
-    current_user: User = Depends(deps.get_current_active_user),
-):
-    scan = get_scan_by_id(db, scan_id=scan_id)
-    if scan is None or scan.user_id != current_user.id:
-        raise HTTPException(status_code=404, detail="Scan not found")
+    current_user: Principal = Depends(deps.get_current_active_user),
+) -> ScanJobOut:
+    job = get_scan_job(db, job_id=job_id)
+    if job is None or job.user_id != current_user.id:
+        raise HTTPException(status_code=404, detail="Scan job not found")
+    scan = get_scan_by_id(db, scan_id=job.scan_id) if job.status == "succeeded" else None
+    return _job_to_out(job, scan=scan)
 
+
+def _decode_data_url(image_b64: str) -> Response | None:
+    try:
+        media_type = "image/jpeg"
+        data_str = image_b64
+        if data_str.startswith("data:"):
+            header, _, b64_data = data_str.partition(",")
+            if ";base64" in header:
+                mt = header.split(":", 1)[1].split(";", 1)[0]
+                if mt:
+                    media_type = mt
+            data_str = b64_data or ""
+        raw = base64.b64decode(data_str)
+        return Response(content=raw, media_type=media_type)
+    except Exception:
+        return None
+
+
+async def _fetch_image(storage, name: str) -> str | None:
+    # Remote backends download on fetch, so this stays off the event loop.
+    try:
+        return await run_in_threadpool(storage.fetch, name)
+    except StorageError as e:
+        raise HTTPException(status_code=502, detail=f"Image storage is unavailable: {e}")
+
+
+async def _annotated_image_response(scan):
     annotated_name = None
     detections: list[dict] = []
     image_b64: str | None = None
     try:
-        parsed = json.loads(scan.result_json)
+        parsed = load_scan_result(scan)
         if isinstance(parsed, dict):
             annotated_name = parsed.get("annotated_image_filename")
             det = parsed.get("detections")
@@ -187,78 +287,66 @@ def get_scan_image(
     except Exception:
         annotated_name = None
 
+    storage = get_storage()
     original_name = os.path.basename(scan.image_filename)
     stem = os.path.splitext(original_name)[0]
+    poly_name = f"{stem}_poly.jpg"
 
-    poly_path = os.path.join(settings.UPLOAD_DIR, f"{stem}_poly.jpg")
-    if os.path.exists(poly_path):
+    poly_path = await _fetch_image(storage, poly_name)
+    if poly_path:
         return FileResponse(poly_path)
 
-    original_path = os.path.join(settings.UPLOAD_DIR, original_name)
-    if os.path.exists(original_path) and detections:
-        try:
-            render_polygons_only(
-                image_path=original_path,
-                detections=detections,
-                output_path=poly_path,
-            )
-        except Exception:
-            pass
-        if os.path.exists(poly_path):
-            return FileResponse(poly_path)
+    original_path = await _fetch_image(storage, original_name)
+    render_pending = False
+    if original_path and detections:
+        # Rendering happens off the request path; give it a moment (it may
+        # already be running for this image) and otherwise serve the plain original.
+        job = enqueue_render(image_filename=original_name, detections=detections)
+        if await run_in_threadpool(wait_for_render, job, settings.RENDER_WAIT_SECONDS):
+            poly_path = await _fetch_image(storage, poly_name)
+            if poly_path:
+                return FileResponse(poly_path)
+        render_pending = not job.done()
 
     candidates: list[str] = []
 
     if isinstance(annotated_name, str) and annotated_name.strip():
         base = os.path.basename(annotated_name.strip())
         if base.endswith("_poly.jpg") or base.endswith("_poly.png"):
-            candidates.append(os.path.join(settings.UPLOAD_DIR, base))
+            candidates.append(base)
 
-    candidates.append(original_path)
+    candidates.append(original_name)
 
-    path = next((p for p in candidates if os.path.exists(p)), None)
+    path = None
+    for candidate in candidates:
+        path = await _fetch_image(storage, candidate)
+        if path:
+            break
     if not path:
         # As a fallback (e.g. after a redeploy where uploads/ was cleared), try to
         # decode a base64-encoded image stored in the result JSON.
         if image_b64:
-            try:
-                media_type = "image/jpeg"
-                data_str = image_b64
-                if data_str.startswith("data:"):
-                    header, _, b64_data = data_str.partition(",")
-                    if ";base64" in header:
-                        mt = header.split(":", 1)[1].split(";", 1)[0]
-                        if mt:
-                            media_type = mt
-                    data_str = b64_data or ""
-                raw = base64.b64decode(data_str)
-                return Response(content=raw, media_type=media_type)
-            except Exception:
-                pass
+            response = _decode_data_url(image_b64)
+            if response is not None:
+                return response
 
         raise HTTPException(status_code=404, detail="Image file missing")
 
-    return FileResponse(path)
-
+    response = FileResponse(path)
+    if render_pending:
+        # A stand-in for an overlay that is still rendering must not be cached.
+        response.headers["Cache-Control"] = "no-store"
+    return response
 
-@router.get("/{scan_id}/original-image")
-def get_scan_original_image(
-    scan_id: int,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(deps.get_current_active_user),
-):
-    scan = get_scan_by_id(db, scan_id=scan_id)
-    if scan is None or scan.user_id != current_user.id:
-        raise HTTPException(status_code=404, detail="Scan not found")
 
-    original_name = os.path.basename(scan.image_filename)
-    original_path = os.path.join(settings.UPLOAD_DIR, original_name)
-    if os.path.exists(original_path):
+async def _original_image_response(scan):
+    original_path = await _fetch_image(get_storage(), os.path.basename(scan.image_filename))
+    if original_path:
         return FileResponse(original_path)
 
     image_b64: str | None = None
     try:
-        parsed = json.loads(scan.result_json)
+        parsed = load_scan_result(scan)
         if isinstance(parsed, dict):
             img_val = parsed.get("image")
             if isinstance(img_val, str) and img_val.strip():
@@ -267,19 +355,70 @@ def get_scan_original_image(
         image_b64 = None
 
     if image_b64:
-        try:
-            media_type = "image/jpeg"
-            data_str = image_b64
-            if data_str.startswith("data:"):
-                header, _, b64_data = data_str.partition(",")
-                if ";base64" in header:
-                    mt = header.split(":", 1)[1].split(";", 1)[0]
-                    if mt:
-                        media_type = mt
-                data_str = b64_data or ""
-            raw = base64.b64decode(data_str)
-            return Response(content=raw, media_type=media_type)
-        except Exception:
-            pass
+        response = _decode_data_url(image_b64)
+        if response is not None:
+            return response
 
     raise HTTPException(status_code=404, detail="Original image missing")
+
+
+@router.get("/media/{token}")
+async def get_signed_scan_image(token: str, db: Session = Depends(get_db)):
+    claims = verify_image_token(token)
+    if claims is None:
+        raise HTTPException(status_code=404, detail="Image not found")
+
+    # Fast path: the signature already proves the caller may see this scan, so
+    # files that exist on disk are served without touching the database.
+    original_name = os.path.basename(claims["filename"])
+    if claims["variant"] == "original":
+        name = original_name
+    else:
+        name = f"{os.path.splitext(original_name)[0]}_poly.jpg"
+
+    try:
+        path = await run_in_threadpool(get_storage().fetch, name)
+    except StorageError:
+        path = None
+
+    if path:
+        response = FileResponse(path)
+    else:
+        scan = await run_in_threadpool(get_scan_by_id, db, scan_id=claims["scan_id"])
+        if scan is None or scan.user_id != claims["user_id"]:
+            raise HTTPException(status_code=404, detail="Image not found")
+        if claims["variant"] == "original":
+            response = await _original_image_response(scan)
+        else:
+            response = await _annotated_image_response(scan)
+
+    # The URL is a capability that stops working at expires_at, so shared caches
+    # may keep the bytes for exactly as long as the link itself is valid.
+    if "cache-control" not in response.headers:
+        max_age = max(0, claims["expires_at"] - int(time.time()))
+        response.headers["Cache-Control"] = f"public, max-age={max_age}, immutable"
+    return response
+
+
+@router.get("/{scan_id}/image")
+async def get_scan_image(
+    scan_id: int,
+    db: Session = Depends(get_db),
+    current_user: Principal = Depends(deps.get_current_active_user),
+):
+    scan = await run_in_threadpool(get_scan_by_id, db, scan_id=scan_id)
+    if scan is None or scan.user_id != current_user.id:
+        raise HTTPException(status_code=404, detail="Scan not found")
+    return await _annotated_image_response(scan)
+
+
+@router.get("/{scan_id}/original-image")
+async def get_scan_original_image(
+    scan_id: int,
+    db: Session = Depends(get_db),
+    current_user: Principal = Depends(deps.get_current_active_user),
+):
+    scan = await run_in_threadpool(get_scan_by_id, db, scan_id=scan_id)
+    if scan is None or scan.user_id != current_user.id:
+        raise HTTPException(status_code=404, detail="Scan not found")
+    return await _original_image_response(scan)
@@ -1,14 +1,23 @@
 from __future__ import annotations
 
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, HTTPException, status
+from sqlalchemy.orm import Session
 
 from app.api import deps
-from app.models.user import User
+from app.crud.user import get_user_by_id
+from app.db.session import get_db
 from app.schemas.user import UserOut
+from app.services.auth_cache import Principal
 
 router = APIRouter(prefix="/users", tags=["users"])
 
 
 @router.get("/me", response_model=UserOut)
-def read_me(current_user: User = Depends(deps.get_current_active_user)) -> UserOut:
-    return current_user
+def read_me(
+    db: Session = Depends(get_db),
+    current_user: Principal = Depends(deps.get_current_active_user),
+) -> UserOut:
+    user = get_user_by_id(db, user_id=current_user.id)
+    if user is None:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Could not validate credentials")
+    return user
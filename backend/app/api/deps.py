@@ -1,52 +1,176 @@
 from __future__ import annotations
 
-from jose import JWTError, jwt
-from fastapi import Depends, HTTPException, status
+from contextlib import asynccontextmanager
+from typing import AsyncIterator
+
+from fastapi import Depends, HTTPException, Query, Request, status
 from fastapi.security import OAuth2PasswordBearer
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 
 from app.core.config import settings
-from app.db.session import get_db
-from app.crud.user import get_user_by_id
-from app.models.user import User
+from app.core.security import decode_access_token, verify_stream_ticket
+from app.db.session import get_async_db, get_db
+from app.crud.user import get_user_by_id, get_user_by_id_async
+from app.services import admission, rate_limit
+from app.services.auth_cache import Principal, get_principal, get_principal_async, principal_of
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl=f"{settings.API_V1_STR}/auth/login")
+optional_oauth2_scheme = OAuth2PasswordBearer(tokenUrl=f"{settings.API_V1_STR}/auth/login", auto_error=False)
 
 
-def get_current_user(db: Session = Depends(get_db), token: str = Depends(oauth2_scheme)) -> User:
-    credentials_exception = HTTPException(
+def _credentials_exception() -> HTTPException:
+    return HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
 
+
+def _user_id_from_token(token: str) -> int:
     try:
-        payload = jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
+        payload = decode_access_token(token)
         subject = payload.get("sub")
         if subject is None:
-            raise credentials_exception
-        user_id = int(subject)
-    except (JWTError, ValueError):
-        raise credentials_exception
+            raise _credentials_exception()
+        return int(subject)
+    except ValueError:
+        raise _credentials_exception()
+
+
+# These resolve to a cached Principal rather than the User row; endpoints that
+# need the full row (e.g. GET /users/me) load it themselves.
+
+
+def get_current_user(db: Session = Depends(get_db), token: str = Depends(oauth2_scheme)) -> Principal:
+    user = get_principal(
+        _user_id_from_token(token), lambda user_id: principal_of(get_user_by_id(db, user_id=user_id))
+    )
+    if user is None:
+        raise _credentials_exception()
+    return user
+
 
-    user = get_user_by_id(db, user_id=user_id)
+async def get_current_user_async(
+    db: AsyncSession = Depends(get_async_db), token: str = Depends(oauth2_scheme)
+) -> Principal:
+    async def load(user_id: int) -> Principal | None:
+        return principal_of(await get_user_by_id_async(db, user_id=user_id))
+
+    user = await get_principal_async(_user_id_from_token(token), load)
     if user is None:
-        raise credentials_exception
+        raise _credentials_exception()
     return user
 
 
-def get_current_active_user(current_user: User = Depends(get_current_user)) -> User:
+def get_current_active_user(current_user: Principal = Depends(get_current_user)) -> Principal:
+    if not current_user.is_active:
+        raise HTTPException(status_code=400, detail="Inactive user")
+    return current_user
+
+
+async def get_current_active_user_async(current_user: Principal = Depends(get_current_user_async)) -> Principal:
     if not current_user.is_active:
         raise HTTPException(status_code=400, detail="Inactive user")
     return current_user
 
 
-def get_current_admin_user(current_user: User = Depends(get_current_user)) -> User:
+def get_current_active_stream_user(
+    db: Session = Depends(get_db),
+    token: str | None = Depends(optional_oauth2_scheme),
+    ticket: str | None = Query(None),
+) -> Principal:
+    # Browsers' EventSource cannot send an Authorization header, so streams also
+    # accept ?ticket= from POST /scans/events/ticket. Bearer tokens are never
+    # taken from the query string, where access and proxy logs would keep them.
+    if token:
+        return get_current_active_user(current_user=get_current_user(db=db, token=token))
+    user_id = verify_stream_ticket(ticket) if ticket else None
+    if user_id is None:
+        raise _credentials_exception()
+    user = get_principal(user_id, lambda uid: principal_of(get_user_by_id(db, user_id=uid)))
+    if user is None:
+        raise _credentials_exception()
+    return get_current_active_user(current_user=user)
+
+
+def get_current_admin_user(current_user: Principal = Depends(get_current_user)) -> Principal:
     if not current_user.is_active:
         raise HTTPException(status_code=400, detail="Inactive user")
 
-    email = (current_user.email or "").lower()
-    if email not in settings.ADMIN_EMAILS:
+    if not current_user.is_admin:
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Admin access required")
 
     return current_user
+
+
+def _rate_limited(decision: rate_limit.Decision) -> HTTPException:
+    if decision.reason == "quota":
+        detail = "Daily inference quota reached; try again tomorrow (UTC)"
+    else:
+        detail = "Too many requests; slow down"
+    return HTTPException(
+        status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+        detail=detail,
+        headers={"Retry-After": rate_limit.retry_after_header(decision)},
+    )
+
+
+def limit_user_inference(policy: str):
+    """Dependency charging the current user one call of ``policy``; the quota is charged on admission."""
+
+    async def dependency(current_user: Principal = Depends(get_current_active_user_async)) -> None:
+        if current_user.is_admin and settings.RATE_LIMIT_EXEMPT_ADMINS:
+            return
+        decision = await rate_limit.check(policy, f"user:{current_user.id}")
+        if not decision.allowed:
+            raise _rate_limited(decision)
+
+    return dependency
+
+
+def limit_client_inference(policy: str):
+    """Like limit_user_inference, keyed by client address for unauthenticated routes.
+
+    Addresses are rate limited only: a daily quota per address would let one
+    client behind a shared NAT or proxy lock out everyone else there.
+    """
+
+    async def dependency(request: Request) -> None:
+        host = request.client.host if request.client else "unknown"
+        decision = await rate_limit.check(policy, f"ip:{host}")
+        if not decision.allowed:
+            raise _rate_limited(decision)
+
+    return dependency
+
+
+async def charge_inference_quota(user: Principal) -> None:
+    """Count one call against ``user``'s daily inference quota; 429 once it is used up."""
+
+    if user.is_admin and settings.RATE_LIMIT_EXEMPT_ADMINS:
+        return
+    decision = await rate_limit.charge_quota(f"user:{user.id}")
+    if not decision.allowed:
+        raise _rate_limited(decision)
+
+
+@asynccontextmanager
+async def inference_slot(user: Principal | None = None) -> AsyncIterator[admission.Ticket]:
+    """Admission control around a route's inference work; 503 with Retry-After when overloaded.
+
+    With ``user``, one unit of their daily quota is charged once the call is
+    admitted, so calls that are shed or rejected earlier cost nothing.
+    """
+
+    try:
+        async with admission.admit() as ticket:
+            if user is not None:
+                await charge_inference_quota(user)
+            yield ticket
+    except admission.Overloaded as e:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Inference is at capacity; try again shortly",
+            headers={"Retry-After": admission.retry_after_header(e)},
+        )
@@ -21,15 +21,56 @@ def _float_env(key: str, default: float) -> float:
         return default
 
 
+def _int_env(key: str, default: int) -> int:
+    try:
+        return int(os.getenv(key, str(default)))
+    except Exception:
+        return default
+
+
+def _bool_env(key: str, default: bool) -> bool:
+    value = os.getenv(key)
+    if value is None:
+        return default
+    return value.strip().lower() in ("1", "true", "yes", "on")
+
+
 class Settings:
     PROJECT_NAME = "AgridroneScan API"
     API_V1_STR = "/api"
 
     DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./agridronescan.db")
+    # Used by the async session (get_async_db). Empty means DATABASE_URL with its
+    # async driver: sqlite+aiosqlite, postgresql+asyncpg or mysql+aiomysql.
+    ASYNC_DATABASE_URL = os.getenv("ASYNC_DATABASE_URL", "")
+
+    # Engine profile, picked from the DATABASE_URL scheme (see app/db/session.py).
+    # SQLite: pragmas applied to every new connection.
+    DB_SQLITE_JOURNAL_MODE = os.getenv("DB_SQLITE_JOURNAL_MODE", "wal")
+    DB_SQLITE_SYNCHRONOUS = os.getenv("DB_SQLITE_SYNCHRONOUS", "normal")
+    DB_SQLITE_BUSY_TIMEOUT_MS = _int_env("DB_SQLITE_BUSY_TIMEOUT_MS", 10_000)
+    DB_SQLITE_CACHE_SIZE_KB = _int_env("DB_SQLITE_CACHE_SIZE_KB", 64 * 1024)
+    DB_SQLITE_MMAP_SIZE = _int_env("DB_SQLITE_MMAP_SIZE", 256 * 1024 * 1024)
+    # Server databases (PostgreSQL, MySQL): connection pool and per-statement limits.
+    DB_POOL_SIZE = _int_env("DB_POOL_SIZE", 10)
+    DB_MAX_OVERFLOW = _int_env("DB_MAX_OVERFLOW", 20)
+    DB_POOL_TIMEOUT_SECONDS = _float_env("DB_POOL_TIMEOUT_SECONDS", 30.0)
+    DB_POOL_RECYCLE_SECONDS = _int_env("DB_POOL_RECYCLE_SECONDS", 1800)
+    DB_POOL_PRE_PING = _bool_env("DB_POOL_PRE_PING", True)
+    DB_STATEMENT_TIMEOUT_MS = _int_env("DB_STATEMENT_TIMEOUT_MS", 30_000)
+    DB_IDLE_IN_TRANSACTION_TIMEOUT_MS = _int_env("DB_IDLE_IN_TRANSACTION_TIMEOUT_MS", 60_000)
 
     SECRET_KEY = os.getenv("SECRET_KEY", "change-me-in-prod")
     ALGORITHM = "HS256"
     ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", "60"))
+    # bcrypt cost for new hashes; stored hashes with any other cost are rehashed on login.
+    PASSWORD_BCRYPT_ROUNDS = min(31, max(4, _int_env("PASSWORD_BCRYPT_ROUNDS", 12)))
+    # Hashing and checking run on a dedicated pool (app/services/passwords.py) so a burst of
+    # logins cannot occupy the request threadpool. Beyond PASSWORD_HASH_MAX_PENDING calls
+    # queued or running, login and registration answer 503.
+    PASSWORD_HASH_WORKERS = _int_env("PASSWORD_HASH_WORKERS", min(4, os.cpu_count() or 1))
+    PASSWORD_HASH_MAX_PENDING = _int_env("PASSWORD_HASH_MAX_PENDING", 64)
+    IMAGE_URL_TTL_SECONDS = int(os.getenv("IMAGE_URL_TTL_SECONDS", "3600"))
 
     ADMIN_EMAILS = [
         e.strip().lower()
@@ -37,6 +78,15 @@ class Settings:
         if e.strip()
     ]
 
+    # Cache of the authenticated user's id/email/is_active/admin flag (app/services/auth_cache.py).
+    # The TTL is the longest a worker can act on a changed account without an invalidation
+    # reaching it; 0 disables the cache. AUTH_CACHE_REDIS_URL broadcasts invalidations
+    # to the other workers over Redis pub/sub.
+    AUTH_CACHE_TTL_SECONDS = _float_env("AUTH_CACHE_TTL_SECONDS", 30.0)
+    AUTH_CACHE_MAX_ENTRIES = _int_env("AUTH_CACHE_MAX_ENTRIES", 10_000)
+    AUTH_CACHE_REDIS_URL = os.getenv("AUTH_CACHE_REDIS_URL", "")
+    AUTH_CACHE_CHANNEL = os.getenv("AUTH_CACHE_CHANNEL", "agridronescan:auth-cache")
+
     _cors_origins = os.getenv("CORS_ORIGINS", "*")
 
     # If wildcard is present, treat as allow-all for local development
@@ -45,6 +95,85 @@ class Settings:
     else:
         CORS_ORIGINS = [o.strip() for o in _cors_origins.split(",") if o.strip()]
 
+    # JSON responses of at least COMPRESSION_MIN_BYTES sent in one piece are brotli
+    # (when installed, see requirements-compression.txt) or gzip compressed for clients
+    # that accept it; bodies from COMPRESSION_THREAD_BYTES up are compressed off the loop.
+    COMPRESSION_ENABLED = _bool_env("COMPRESSION_ENABLED", True)
+    COMPRESSION_MIN_BYTES = _int_env("COMPRESSION_MIN_BYTES", 1024)
+    COMPRESSION_THREAD_BYTES = _int_env("COMPRESSION_THREAD_BYTES", 128 * 1024)
+    COMPRESSION_GZIP_LEVEL = _int_env("COMPRESSION_GZIP_LEVEL", 4)
+    COMPRESSION_BROTLI_QUALITY = _int_env("COMPRESSION_BROTLI_QUALITY", 4)
+
+    # GET /metrics (Prometheus text format). With METRICS_TOKEN set, scrapers must send
+    # "Authorization: Bearer <token>". Disk usage of UPLOAD_DIR is re-measured at most
+    # once per METRICS_DISK_USAGE_TTL_SECONDS.
+    METRICS_ENABLED = _bool_env("METRICS_ENABLED", True)
+    METRICS_TOKEN = os.getenv("METRICS_TOKEN", "")
+    METRICS_DISK_USAGE_TTL_SECONDS = _float_env("METRICS_DISK_USAGE_TTL_SECONDS", 60.0)
+
+    # Admin sampling profiler (app/core/profiling.py, /api/admin/profiler). The sampler
+    # thread only runs while a profile is being taken or slow-request capture is on.
+    # PROFILING_SLOW_REQUEST_MS > 0 turns capture on at startup; admins can change it at
+    # runtime. Samples are kept for PROFILING_MAX_SECONDS, which also caps a manual run.
+    PROFILING_ENABLED = _bool_env("PROFILING_ENABLED", True)
+    PROFILING_INTERVAL_MS = _float_env("PROFILING_INTERVAL_MS", 10.0)
+    PROFILING_MAX_SECONDS = _float_env("PROFILING_MAX_SECONDS", 60.0)
+    PROFILING_SLOW_REQUEST_MS = _float_env("PROFILING_SLOW_REQUEST_MS", 0.0)
+    PROFILING_MAX_CAPTURES = _int_env("PROFILING_MAX_CAPTURES", 20)
+
+    # Tracing (app/core/tracing.py). TRACING_EXPORTER is none (off), file (JSON lines at
+    # TRACING_FILE_PATH), otlp (OTLP/HTTP JSON to TRACING_OTLP_ENDPOINT) or a
+    # "package.module:factory" returning an exporter. New traces are sampled at
+    # TRACING_SAMPLE_RATE; traces started by a sampled caller are always kept.
+    TRACING_EXPORTER = os.getenv("TRACING_EXPORTER", "none")
+    TRACING_SAMPLE_RATE = min(1.0, max(0.0, _float_env("TRACING_SAMPLE_RATE", 1.0)))
+    TRACING_SERVICE_NAME = os.getenv("TRACING_SERVICE_NAME", "agridronescan-api")
+    TRACING_FILE_PATH = os.getenv("TRACING_FILE_PATH", "./traces.jsonl")
+    TRACING_OTLP_ENDPOINT = os.getenv("TRACING_OTLP_ENDPOINT", "http://localhost:4318/v1/traces")
+    TRACING_EXPORT_INTERVAL_SECONDS = _float_env("TRACING_EXPORT_INTERVAL_SECONDS", 2.0)
+    TRACING_MAX_QUEUE = _int_env("TRACING_MAX_QUEUE", 2048)
+
+    # Pre-fork serving (python -m app.serve). The model is loaded once in the parent
+    # and shared copy-on-write; SERVE_THREADS_PER_WORKER (0 = cpu count / workers) caps
+    # the torch/BLAS/OpenCV threads of each worker. A worker is replaced after
+    # SERVE_MAX_REQUESTS (plus up to SERVE_MAX_REQUESTS_JITTER) requests or
+    # SERVE_MAX_WORKER_AGE_SECONDS, one at a time, with in-flight requests allowed
+    # SERVE_GRACEFUL_TIMEOUT_SECONDS to finish. 0 turns a limit off.
+    # Several workers need RATE_LIMIT_REDIS_URL (or rate limiting off), since in-memory
+    # limits and quotas would be per worker. Scan events (SSE) are not shared between
+    # workers at all: a stream only sees events published by the worker serving it.
+    SERVE_HOST = os.getenv("SERVE_HOST", "0.0.0.0")
+    SERVE_PORT = _int_env("PORT", 8000)
+    SERVE_WORKERS = _int_env("SERVE_WORKERS", 1)
+    SERVE_THREADS_PER_WORKER = _int_env("SERVE_THREADS_PER_WORKER", 0)
+    SERVE_PRELOAD_MODEL = _bool_env("SERVE_PRELOAD_MODEL", True)
+    SERVE_MAX_REQUESTS = _int_env("SERVE_MAX_REQUESTS", 0)
+    SERVE_MAX_REQUESTS_JITTER = _int_env("SERVE_MAX_REQUESTS_JITTER", 0)
+    SERVE_MAX_WORKER_AGE_SECONDS = _float_env("SERVE_MAX_WORKER_AGE_SECONDS", 0.0)
+    SERVE_GRACEFUL_TIMEOUT_SECONDS = _float_env("SERVE_GRACEFUL_TIMEOUT_SECONDS", 30.0)
+
+    # Startup warm-up (app/services/warmup.py): imports the auth and HTTP client
+    # libraries and loads the local model on a background thread, optionally running
+    # one inference on a blank image. GET /ready answers 503 until it has finished.
+    WARMUP_ENABLED = _bool_env("WARMUP_ENABLED", True)
+    WARMUP_RUN_INFERENCE = _bool_env("WARMUP_RUN_INFERENCE", True)
+
+    # Admission control for the inference routes (app/services/admission.py), per
+    # process. At most the current limit run at once, between ADMISSION_MIN_CONCURRENCY
+    # and ADMISSION_MAX_CONCURRENCY: it shrinks while calls take longer than
+    # ADMISSION_TARGET_LATENCY_SECONDS and grows back while they are faster (0 keeps it
+    # at the maximum). Up to ADMISSION_MAX_QUEUE more wait, each for at most
+    # ADMISSION_QUEUE_TIMEOUT_SECONDS; the rest get 503 with Retry-After. While calls are
+    # queued, and for ADMISSION_DEGRADED_HOLD_SECONDS after one was turned away,
+    # optional work (overlay pre-rendering, colour analysis) is skipped.
+    ADMISSION_ENABLED = _bool_env("ADMISSION_ENABLED", True)
+    ADMISSION_MAX_CONCURRENCY = _int_env("ADMISSION_MAX_CONCURRENCY", 8)
+    ADMISSION_MIN_CONCURRENCY = _int_env("ADMISSION_MIN_CONCURRENCY", 1)
+    ADMISSION_MAX_QUEUE = _int_env("ADMISSION_MAX_QUEUE", 16)
+    ADMISSION_QUEUE_TIMEOUT_SECONDS = _float_env("ADMISSION_QUEUE_TIMEOUT_SECONDS", 10.0)
+    ADMISSION_TARGET_LATENCY_SECONDS = _float_env("ADMISSION_TARGET_LATENCY_SECONDS", 5.0)
+    ADMISSION_DEGRADED_HOLD_SECONDS = _float_env("ADMISSION_DEGRADED_HOLD_SECONDS", 10.0)
+
     AI_MODEL_PATH = os.getenv("AI_MODEL_PATH", "./best.pt")
     AI_REMOTE_BASE_URL = os.getenv(
         "AI_REMOTE_BASE_URL",
@@ -55,6 +184,86 @@ class Settings:
     AI_REMOTE_IOU = _float_env("AI_REMOTE_IOU", 0.7)
     UPLOAD_DIR = os.getenv("UPLOAD_DIR", "./uploads")
 
+    # Overlay rendering runs in a process pool (0 renders on a thread instead);
+    # image GETs wait at most RENDER_WAIT_SECONDS before serving the original.
+    RENDER_WORKERS = _int_env("RENDER_WORKERS", 1)
+    RENDER_WAIT_SECONDS = _float_env("RENDER_WAIT_SECONDS", 1.5)
+    MAX_UPLOAD_BYTES = _int_env("MAX_UPLOAD_BYTES", 25 * 1024 * 1024)
+    UPLOAD_CHUNK_SIZE = _int_env("UPLOAD_CHUNK_SIZE", 1024 * 1024)
+
+    # Opt-in asynchronous scans (POST /scans/?async=true or "Prefer: respond-async").
+    # SCAN_JOB_WORKERS=0 disables the worker and async requests run inline.
+    SCAN_JOB_WORKERS = _int_env("SCAN_JOB_WORKERS", 2)
+    SCAN_JOB_POLL_SECONDS = _float_env("SCAN_JOB_POLL_SECONDS", 2.0)
+    SCAN_JOB_LEASE_SECONDS = _int_env("SCAN_JOB_LEASE_SECONDS", 300)
+    SCAN_JOB_MAX_ATTEMPTS = _int_env("SCAN_JOB_MAX_ATTEMPTS", 3)
+
+    # GET /scans/events (Server-Sent Events). Browsers open it with a ticket from
+    # POST /scans/events/ticket, valid for STREAM_TICKET_TTL_SECONDS; it only has to
+    # be valid when the stream (or a reconnect) starts.
+    STREAM_TICKET_TTL_SECONDS = _int_env("STREAM_TICKET_TTL_SECONDS", 60)
+    SCAN_EVENTS_KEEPALIVE_SECONDS = _float_env("SCAN_EVENTS_KEEPALIVE_SECONDS", 15.0)
+    SCAN_EVENTS_QUEUE_SIZE = _int_env("SCAN_EVENTS_QUEUE_SIZE", 100)
+    SCAN_EVENTS_RETRY_MS = _int_env("SCAN_EVENTS_RETRY_MS", 3000)
+
+    # GET /admin/analytics/scans
+    ANALYTICS_CACHE_TTL_SECONDS = _float_env("ANALYTICS_CACHE_TTL_SECONDS", 30.0)
+    ANALYTICS_CACHE_MAX_ENTRIES = _int_env("ANALYTICS_CACHE_MAX_ENTRIES", 256)
+    ANALYTICS_MAX_BUCKETS = _int_env("ANALYTICS_MAX_BUCKETS", 5000)
+
+    # Bulk admin operations run as background jobs in batches of this many rows.
+    ADMIN_BULK_CHUNK_SIZE = _int_env("ADMIN_BULK_CHUNK_SIZE", 500)
+    ADMIN_JOB_LEASE_SECONDS = _int_env("ADMIN_JOB_LEASE_SECONDS", 300)
+    # How often each process looks for jobs whose runner's lease expired; 0 only checks at startup.
+    ADMIN_JOB_SWEEP_SECONDS = _int_env("ADMIN_JOB_SWEEP_SECONDS", 60)
+
+    # How scan results are stored (app/services/result_codec.py): "auto" picks JSONB on
+    # PostgreSQL, otherwise zlib-compressed JSON. Also "json" (plain text, as before),
+    # "zlib", "zstd", "msgpack-zstd" and "jsonb"; "jsonb" outside PostgreSQL means "auto".
+    # zstd and msgpack need backend/requirements-codec.txt on every host that reads them.
+    SCAN_RESULT_CODEC = os.getenv("SCAN_RESULT_CODEC", "auto")
+    SCAN_RESULT_ZSTD_LEVEL = _int_env("SCAN_RESULT_ZSTD_LEVEL", 3)
+    SCAN_RESULT_ZLIB_LEVEL = _int_env("SCAN_RESULT_ZLIB_LEVEL", 6)
+
+    # Rows fetched per round trip (and per Parquet row group) by GET /admin/scans/export.
+    EXPORT_BATCH_SIZE = _int_env("EXPORT_BATCH_SIZE", 1000)
+
+    # Token-bucket limits on the inference routes (app/services/rate_limit.py), as
+    # "<count>/<period>" ("30/minute", "5/10s"; "0" disables one). POST /scans/ and
+    # /estimate-field/ are limited per user, the unauthenticated /ai/predict per client
+    # address. Each call by a signed-in user that is admitted to run (or queued as a
+    # scan job) also counts against INFERENCE_DAILY_QUOTA for that user (UTC days; 0
+    # means no quota). Buckets are per process unless RATE_LIMIT_REDIS_URL shares them
+    # through Redis; the memory backend keeps at most RATE_LIMIT_MAX_KEYS buckets.
+    RATE_LIMIT_ENABLED = _bool_env("RATE_LIMIT_ENABLED", True)
+    RATE_LIMIT_SCAN_CREATE = os.getenv("RATE_LIMIT_SCAN_CREATE", "30/minute")
+    RATE_LIMIT_ESTIMATE_FIELD = os.getenv("RATE_LIMIT_ESTIMATE_FIELD", "20/minute")
+    RATE_LIMIT_AI_PREDICT = os.getenv("RATE_LIMIT_AI_PREDICT", "10/minute")
+    INFERENCE_DAILY_QUOTA = _int_env("INFERENCE_DAILY_QUOTA", 1000)
+    RATE_LIMIT_EXEMPT_ADMINS = _bool_env("RATE_LIMIT_EXEMPT_ADMINS", True)
+    RATE_LIMIT_MAX_KEYS = _int_env("RATE_LIMIT_MAX_KEYS", 100_000)
+    RATE_LIMIT_REDIS_URL = os.getenv("RATE_LIMIT_REDIS_URL", "")
+    RATE_LIMIT_REDIS_PREFIX = os.getenv("RATE_LIMIT_REDIS_PREFIX", "agridronescan")
+
+    # Background sweep of unreferenced uploads and stale scratch files; 0 disables it.
+    # Images whose last scan was deleted are removed by this sweep once they have been
+    # unused for UPLOAD_GC_GRACE_SECONDS, not when the scan is deleted.
+    UPLOAD_GC_INTERVAL_SECONDS = _int_env("UPLOAD_GC_INTERVAL_SECONDS", 3600)
+    UPLOAD_GC_GRACE_SECONDS = _int_env("UPLOAD_GC_GRACE_SECONDS", 6 * 3600)
+    UPLOAD_GC_BATCH_SIZE = _int_env("UPLOAD_GC_BATCH_SIZE", 500)
+
+    # "local" keeps uploads in UPLOAD_DIR; "s3" stores them in an S3-compatible
+    # bucket and uses UPLOAD_DIR as a node-local working directory and cache.
+    STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "local")
+    STORAGE_CACHE_MAX_BYTES = _int_env("STORAGE_CACHE_MAX_BYTES", 2 * 1024 * 1024 * 1024)
+    S3_BUCKET = os.getenv("S3_BUCKET", "")
+    S3_PREFIX = os.getenv("S3_PREFIX", "uploads")
+    S3_ENDPOINT_URL = os.getenv("S3_ENDPOINT_URL", "")
+    S3_REGION = os.getenv("S3_REGION", "")
+    S3_ACCESS_KEY_ID = os.getenv("S3_ACCESS_KEY_ID", "")
+    S3_SECRET_ACCESS_KEY = os.getenv("S3_SECRET_ACCESS_KEY", "")
+    S3_MULTIPART_CHUNK_SIZE = _int_env("S3_MULTIPART_CHUNK_SIZE", 8 * 1024 * 1024)
+
     ROBOFLOW_API_URL = os.getenv("ROBOFLOW_API_URL", "https://serverless.roboflow.com")
     ROBOFLOW_API_KEY = os.getenv("ROBOFLOW_API_KEY", "")
     ROBOFLOW_MODEL_ID = os.getenv("ROBOFLOW_MODEL_ID", "corn-2xipv-uadpf/3")
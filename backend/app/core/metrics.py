@@ -0,0 +1,210 @@
+from __future__ import annotations
+
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Iterator
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    generate_latest,
+)
+from prometheus_client.core import GaugeMetricFamily
+from prometheus_client.registry import Collector
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from app.core.config import settings
+from app.core.profiling import record_stage
+from app.core.tracing import span
+
+# Prometheus metrics served at GET /metrics. With several worker processes,
+# set PROMETHEUS_MULTIPROC_DIR (an empty directory, before the app is
+# imported): each worker then writes its samples there and whichever worker
+# answers the scrape aggregates all of them.
+
+MULTIPROC_DIR = os.environ.get("PROMETHEUS_MULTIPROC_DIR") or os.environ.get("prometheus_multiproc_dir")
+
+_SLOW_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 20.0, 30.0, 60.0, 120.0)
+_DB_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 10.0)
+
+HTTP_REQUESTS = Counter(
+    "http_requests_total", "HTTP requests by route template, method and status.", ["route", "method", "status"]
+)
+HTTP_DURATION = Histogram(
+    "http_request_duration_seconds",
+    "Time from request start to the end of the response body.",
+    ["route", "method", "status"],
+)
+HTTP_IN_FLIGHT = Gauge(
+    "http_requests_in_flight", "HTTP requests currently being served.", multiprocess_mode="livesum"
+)
+INFERENCE_DURATION = Histogram(
+    "inference_duration_seconds",
+    "Model inference calls by backend (remote, local, roboflow) and outcome.",
+    ["backend", "outcome"],
+    buckets=_SLOW_BUCKETS,
+)
+RENDER_DURATION = Histogram(
+    "render_duration_seconds",
+    "Annotated image renders by kind (polygons, boxes) and outcome.",
+    ["kind", "outcome"],
+    buckets=_SLOW_BUCKETS,
+)
+DB_QUERY_DURATION = Histogram(
+    "db_query_duration_seconds",
+    "SQL statements executed, by kind of statement; the count is the number of queries.",
+    ["operation"],
+    buckets=_DB_BUCKETS,
+)
+UPLOAD_BYTES = Counter("upload_bytes_total", "Bytes of accepted image uploads.")
+UPLOADS = Counter("uploads_total", "Image uploads by outcome (accepted, or the rejection status).", ["outcome"])
+ADMISSION_DECISIONS = Counter(
+    "admission_decisions_total",
+    "Inference calls by admission outcome (admitted, degraded, queue_full, queue_timeout).",
+    ["outcome"],
+)
+ADMISSION_QUEUE_DEPTH = Gauge(
+    "admission_queue_depth", "Inference calls waiting for a slot.", multiprocess_mode="livesum"
+)
+ADMISSION_LIMIT = Gauge(
+    "admission_concurrency_limit", "Current adaptive limit on concurrent inference calls.", multiprocess_mode="livesum"
+)
+
+# Stage names in the per-request breakdown of slow-request captures, and span names.
+_STAGES = {INFERENCE_DURATION: "inference", RENDER_DURATION: "render"}
+
+
+@contextmanager
+def timed(histogram: Histogram, **labels: str) -> Iterator[None]:
+    """Observe the duration of the block under ``labels`` plus outcome=ok|error.
+
+    The block also runs in a tracing span, so outgoing calls made inside it
+    carry that span's traceparent.
+    """
+
+    stage = _STAGES.get(histogram, "timed")
+    started = time.perf_counter()
+    outcome = "error"
+    try:
+        with span(".".join([stage, *labels.values()]), attributes=labels):
+            yield
+        outcome = "ok"
+    finally:
+        elapsed = time.perf_counter() - started
+        histogram.labels(**labels, outcome=outcome).observe(elapsed)
+        if histogram in _STAGES:
+            record_stage(":".join([stage, *labels.values()]), elapsed)
+
+
+_OPERATIONS = {"SELECT": "select", "INSERT": "insert", "UPDATE": "update", "DELETE": "delete", "WITH": "select"}
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany) -> None:
+    if context is not None:
+        context._metrics_started = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany) -> None:
+    started = getattr(context, "_metrics_started", None)
+    if started is None:
+        return
+    elapsed = time.perf_counter() - started
+    verb = statement.lstrip()[:6].upper().rstrip()
+    DB_QUERY_DURATION.labels(operation=_OPERATIONS.get(verb, "other")).observe(elapsed)
+    record_stage("db", elapsed)
+
+
+_db_lock = threading.Lock()
+_db_installed = False
+
+
+def install_db_metrics() -> None:
+    """Time every statement on every engine (sync, and the async engine's sync core)."""
+
+    global _db_installed
+    with _db_lock:
+        if _db_installed:
+            return
+        event.listen(Engine, "before_cursor_execute", _before_cursor_execute)
+        event.listen(Engine, "after_cursor_execute", _after_cursor_execute)
+        _db_installed = True
+
+
+class UploadDirCollector(Collector):
+    """Disk usage of UPLOAD_DIR, walked at most once per METRICS_DISK_USAGE_TTL_SECONDS."""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._expires = 0.0
+        self._value = (0, 0)
+
+    def _walk(self, root: str) -> tuple[int, int]:
+        total = files = 0
+        stack = [root]
+        while stack:
+            try:
+                entries = os.scandir(stack.pop())
+            except OSError:
+                continue
+            with entries:
+                for entry in entries:
+                    try:
+                        if entry.is_dir(follow_symlinks=False):
+                            stack.append(entry.path)
+                        elif entry.is_file(follow_symlinks=False):
+                            total += entry.stat(follow_symlinks=False).st_size
+                            files += 1
+                    except OSError:
+                        continue
+        return total, files
+
+    def describe(self):
+        # Keeps registration from calling collect() (and walking the directory) at import.
+        yield GaugeMetricFamily("upload_dir_bytes", "Bytes of files under UPLOAD_DIR.")
+        yield GaugeMetricFamily("upload_dir_files", "Files under UPLOAD_DIR.")
+
+    def collect(self):
+        with self._lock:
+            now = time.monotonic()
+            if now >= self._expires:
+                self._value = self._walk(settings.UPLOAD_DIR)
+                self._expires = now + settings.METRICS_DISK_USAGE_TTL_SECONDS
+            total, files = self._value
+        yield GaugeMetricFamily("upload_dir_bytes", "Bytes of files under UPLOAD_DIR.", value=total)
+        yield GaugeMetricFamily("upload_dir_files", "Files under UPLOAD_DIR.", value=files)
+
+
+_upload_dir = UploadDirCollector()
+if MULTIPROC_DIR is None:
+    REGISTRY.register(_upload_dir)
+
+
+def render_metrics() -> tuple[bytes, str]:
+    """The exposition body and its content type, across all workers in multiprocess mode."""
+
+    if MULTIPROC_DIR is None:
+        return generate_latest(REGISTRY), CONTENT_TYPE_LATEST
+    from prometheus_client import multiprocess
+
+    registry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(registry)
+    registry.register(_upload_dir)
+    return generate_latest(registry), CONTENT_TYPE_LATEST
+
+
+def mark_worker_exit(pid: int | None = None) -> None:
+    """Drop a finished worker's live gauges from the shared multiprocess files."""
+
+    if MULTIPROC_DIR is None:
+        return
+    from prometheus_client import multiprocess
+
+    multiprocess.mark_process_dead(os.getpid() if pid is None else pid)
+
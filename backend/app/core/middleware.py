@@ -0,0 +1,302 @@
+from __future__ import annotations
+
+import functools
+import gzip
+import time
+from typing import Any, Awaitable, Callable
+
+import anyio
+
+from app.core import metrics, profiling, tracing
+from app.core.config import settings
+
+# Plain ASGI middleware: no per-request task, no body buffering beyond the
+# single-chunk JSON responses that are compressed.
+
+Scope = dict[str, Any]
+Message = dict[str, Any]
+Receive = Callable[[], Awaitable[Message]]
+Send = Callable[[Message], Awaitable[None]]
+ASGIApp = Callable[[Scope, Receive, Send], Awaitable[None]]
+
+_ALLOW_METHODS = b"GET, POST, PUT, PATCH, DELETE, OPTIONS"
+
+
+def _header(scope: Scope, name: bytes) -> bytes | None:
+    for key, value in scope["headers"]:
+        if key == name:
+            return value
+    return None
+
+
+class CORSMiddleware:
+    """CORS for ``settings.CORS_ORIGINS``, answering every OPTIONS request itself.
+
+    With ``*`` every response carries a literal ``*``, so it is the same for
+    all origins and safe in shared caches. Otherwise only listed origins get
+    their origin echoed back, with ``Vary: Origin``. Credentials are never
+    allowed.
+    """
+
+    def __init__(self, app: ASGIApp, origins: list[str] | None = None) -> None:
+        self.app = app
+        origins = settings.CORS_ORIGINS if origins is None else origins
+        self.allow_all = "*" in origins
+        self.allowed = frozenset(o.rstrip("/").encode("latin-1") for o in origins if o != "*")
+        self.static_headers = [
+            (b"access-control-allow-methods", _ALLOW_METHODS),
+            (b"access-control-allow-credentials", b"false"),
+        ]
+
+    def _cors_headers(self, scope: Scope) -> list[tuple[bytes, bytes]]:
+        if self.allow_all:
+            origin = b"*"
+        else:
+            origin = _header(scope, b"origin")
+            if origin is None or origin not in self.allowed:
+                return []
+        requested = _header(scope, b"access-control-request-headers")
+        return [
+            (b"access-control-allow-origin", origin),
+            *self.static_headers,
+            (b"access-control-allow-headers", requested or b"*"),
+        ]
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        cors = self._cors_headers(scope)
+        if scope["method"] == "OPTIONS":
+            headers = [*cors, (b"content-length", b"0")]
+            if not self.allow_all:
+                headers.append((b"vary", b"Origin"))
+            await send({"type": "http.response.start", "status": 200, "headers": headers})
+            await send({"type": "http.response.body", "body": b""})
+            return
+
+        async def send_with_cors(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                headers = [
+                    (k, v) for k, v in message.get("headers", []) if not k.startswith(b"access-control-")
+                ]
+                headers.extend(cors)
+                if not self.allow_all:
+                    headers.append((b"vary", b"Origin"))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        await self.app(scope, receive, send_with_cors)
+
+
+@functools.lru_cache(maxsize=1)
+def _brotli():
+    try:
+        import brotli  # type: ignore
+    except Exception:
+        return None
+    return brotli
+
+
+@functools.lru_cache(maxsize=256)
+def _pick_encoding(accept_encoding: bytes) -> str | None:
+    accepted = {}
+    for part in accept_encoding.decode("latin-1").lower().split(","):
+        name, _, params = part.strip().partition(";")
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        accepted[name.strip()] = q
+    if accepted.get("br", 0) > 0 and _brotli() is not None:
+        return "br"
+    if accepted.get("gzip", 0) > 0:
+        return "gzip"
+    return None
+
+
+def _is_json(content_type: bytes) -> bool:
+    media = content_type.split(b";", 1)[0].strip().lower()
+    return media == b"application/json" or media.endswith(b"+json")
+
+
+def compress(body: bytes, encoding: str) -> bytes:
+    if encoding == "br":
+        return _brotli().compress(body, quality=settings.COMPRESSION_BROTLI_QUALITY)
+    return gzip.compress(body, compresslevel=settings.COMPRESSION_GZIP_LEVEL, mtime=0)
+
+
+class CompressionMiddleware:
+    """Brotli/gzip for JSON responses sent as a single body chunk.
+
+    Streaming responses (exports, SSE), images and anything already encoded
+    pass through untouched. Bodies above COMPRESSION_THREAD_BYTES are
+    compressed off the event loop.
+    """
+
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or not settings.COMPRESSION_ENABLED:
+            await self.app(scope, receive, send)
+            return
+        encoding = _pick_encoding(_header(scope, b"accept-encoding") or b"")
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        start: Message | None = None
+
+        async def send_compressed(message: Message) -> None:
+            nonlocal start
+            if message["type"] == "http.response.start":
+                headers = message.get("headers", [])
+                content_type = b""
+                for key, value in headers:
+                    key = key.lower()
+                    if key == b"content-encoding":
+                        break
+                    if key == b"content-type":
+                        content_type = value
+                else:
+                    if _is_json(content_type) and message["status"] not in (204, 304):
+                        # Held back until the body shows whether it is worth compressing.
+                        start = message
+                        return
+                await send(message)
+                return
+
+            if start is None or message["type"] != "http.response.body":
+                await send(message)
+                return
+
+            held, start = start, None
+            body = message.get("body", b"")
+            headers = [(k, v) for k, v in held.get("headers", []) if k.lower() != b"vary"]
+            vary = [v for k, v in held.get("headers", []) if k.lower() == b"vary"]
+            headers.append((b"vary", b", ".join([*vary, b"Accept-Encoding"])))
+            if message.get("more_body", False) or len(body) < settings.COMPRESSION_MIN_BYTES:
+                await send({**held, "headers": headers})
+                await send(message)
+                return
+
+            if len(body) >= settings.COMPRESSION_THREAD_BYTES:
+                compressed = await anyio.to_thread.run_sync(compress, body, encoding)
+            else:
+                compressed = compress(body, encoding)
+            headers = [(k, v) for k, v in headers if k.lower() != b"content-length"]
+            headers.append((b"content-encoding", encoding.encode("ascii")))
+            headers.append((b"content-length", str(len(compressed)).encode("ascii")))
+            await send({**held, "headers": headers})
+            await send({"type": "http.response.body", "body": compressed})
+
+        await self.app(scope, receive, send_compressed)
+
+
+class MetricsMiddleware:
+    """Request counts, latency and in-flight requests, labelled by route template."""
+
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status = 500
+        started = time.perf_counter()
+
+        async def send_with_status(message: Message) -> None:
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        metrics.HTTP_IN_FLIGHT.inc()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            metrics.HTTP_IN_FLIGHT.dec()
+            route = scope.get("route")
+            # Unmatched paths share one label so scanners cannot blow up the series count.
+            labels = (getattr(route, "path", None) or "unmatched", scope["method"], str(status))
+            metrics.HTTP_REQUESTS.labels(*labels).inc()
+            metrics.HTTP_DURATION.labels(*labels).observe(time.perf_counter() - started)
+
+
+class SlowRequestMiddleware:
+    """Traces per-stage time of each request while slow-request capture is on."""
+
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or profiling.slow_request_threshold_ms() <= 0:
+            await self.app(scope, receive, send)
+            return
+
+        status = 500
+
+        async def send_with_status(message: Message) -> None:
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        trace, token = profiling.begin_request()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            route = getattr(scope.get("route"), "path", None) or "unmatched"
+            profiling.end_request(
+                trace, token, method=scope["method"], path=scope["path"], route=route, status=status
+            )
+
+
+class TracingMiddleware:
+    """A server span per request, continuing the caller's traceparent if it sent one."""
+
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        traceparent = _header(scope, b"traceparent")
+        with tracing.span(
+            f"{scope['method']} request",
+            kind="server",
+            parent=traceparent.decode("latin-1") if traceparent else None,
+        ) as span:
+            status = 500
+
+            async def send_with_status(message: Message) -> None:
+                nonlocal status
+                if message["type"] == "http.response.start":
+                    status = message["status"]
+                await send(message)
+
+            try:
+                await self.app(scope, receive, send_with_status)
+            finally:
+                route = getattr(scope.get("route"), "path", None)
+                if route:
+                    span.name = f"{scope['method']} {route}"
+                span.attributes.update(
+                    {
+                        "http.request.method": scope["method"],
+                        "http.route": route or "unmatched",
+                        "url.path": scope["path"],
+                        "http.response.status_code": status,
+                    }
+                )
+                if status >= 500 and span.error is None:
+                    span.error = f"HTTP {status}"
@@ -0,0 +1,337 @@
+from __future__ import annotations
+
+import asyncio
+import itertools
+import os
+import sys
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar, Token
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from types import CodeType
+from typing import Any, Iterator, Optional
+
+from app.core.config import settings
+from app.core.tracing import current_span
+
+# In-process sampling profiler for admins. A daemon thread snapshots the stack
+# of every thread with sys._current_frames() each PROFILING_INTERVAL_MS and
+# keeps the last PROFILING_MAX_SECONDS of samples. A manual run, or a request
+# slower than the slow-request threshold, turns the samples from its time
+# window into a capture. Captures are kept in a ring buffer and exported as
+# folded stacks ("frame;frame;frame count"), which flamegraph.pl, inferno and
+# speedscope read directly. Everything is per worker process.
+
+
+class ProfilerBusy(RuntimeError):
+    pass
+
+
+# Leaf frames of a thread that is waiting rather than working.
+_IDLE_LEAVES = {
+    ("threading.py", "wait"),
+    ("threading.py", "_wait_for_tstate_lock"),
+    ("selectors.py", "select"),
+    ("queue.py", "get"),
+    ("thread.py", "_worker"),
+    ("core.py", "_connection_worker_thread"),  # aiosqlite
+}
+
+Sample = tuple[float, str, tuple[str, ...]]
+
+
+@dataclass
+class Capture:
+    id: int
+    kind: str
+    created_at: datetime
+    seconds: float
+    samples: list[Sample]
+    request: Optional[dict[str, Any]] = None
+    stages: Optional[dict[str, Any]] = None
+
+    def summary(self) -> dict[str, Any]:
+        return {
+            "id": self.id,
+            "kind": self.kind,
+            "created_at": self.created_at,
+            "seconds": round(self.seconds, 6),
+            "samples": len(self.samples),
+            "request": self.request,
+            "stages": self.stages,
+        }
+
+    def folded(self, *, include_idle: bool = False) -> str:
+        counts: dict[tuple[str, ...], int] = {}
+        for _, thread, stack in self.samples:
+            if not include_idle and stack and stack[-1] in _idle_labels:
+                continue
+            key = (thread, *stack)
+            counts[key] = counts.get(key, 0) + 1
+        lines = [f"{';'.join(key)} {count}" for key, count in sorted(counts.items())]
+        return "\n".join(lines) + "\n" if lines else ""
+
+
+_lock = threading.Lock()
+_thread: threading.Thread | None = None
+_stop: threading.Event | None = None
+_users = 0
+_samples: deque[Sample] = deque()
+_labels: dict[CodeType, str] = {}
+_idle_labels: set[str] = set()
+_stacks: dict[tuple[str, ...], tuple[str, ...]] = {}
+
+_captures: deque[Capture] = deque(maxlen=max(1, settings.PROFILING_MAX_CAPTURES))
+_capture_ids = itertools.count(1)
+_manual_running = False
+_slow_threshold_ms = 0.0
+_metrics = {"samples_total": 0, "sampling_seconds_total": 0.0, "captures_total": 0}
+
+
+def _prefixes() -> list[str]:
+    paths = {os.path.abspath(p or os.getcwd()) for p in sys.path if isinstance(p, str)}
+    return sorted((p.rstrip(os.sep) + os.sep for p in paths), key=len, reverse=True)
+
+
+_PREFIXES = _prefixes()
+
+
+def _label(code: CodeType) -> str:
+    label = _labels.get(code)
+    if label is None:
+        filename = code.co_filename
+        for prefix in _PREFIXES:
+            if filename.startswith(prefix):
+                filename = filename[len(prefix):]
+                break
+        label = f"{code.co_name} ({filename}:{code.co_firstlineno})"
+        _labels[code] = label
+        if (os.path.basename(code.co_filename), code.co_name) in _IDLE_LEAVES:
+            _idle_labels.add(label)
+    return label
+
+
+def _stack(frame) -> tuple[str, ...]:
+    out = []
+    while frame is not None:
+        out.append(_label(frame.f_code))
+        frame = frame.f_back
+    out.reverse()
+    stack = tuple(out)
+    # Interned, so the many identical stacks of waiting threads cost one tuple.
+    return _stacks.setdefault(stack, stack)
+
+
+def _run(stop: threading.Event) -> None:
+    me = threading.get_ident()
+    interval = max(0.001, settings.PROFILING_INTERVAL_MS / 1000)
+    while not stop.wait(interval):
+        started = time.perf_counter()
+        names = {t.ident: t.name for t in threading.enumerate()}
+        batch = [
+            (started, names.get(ident, str(ident)), _stack(frame))
+            for ident, frame in sys._current_frames().items()
+            if ident != me
+        ]
+        with _lock:
+            _samples.extend(batch)
+            horizon = started - settings.PROFILING_MAX_SECONDS
+            while _samples and _samples[0][0] < horizon:
+                _samples.popleft()
+            if len(_stacks) > 100_000:
+                _stacks.clear()
+            _metrics["samples_total"] += len(batch)
+            _metrics["sampling_seconds_total"] += time.perf_counter() - started
+
+
+def _acquire() -> None:
+    global _thread, _stop, _users
+    with _lock:
+        _users += 1
+        if _thread is None:
+            # A fresh event per thread, so a sampler still stopping is never revived.
+            _stop = threading.Event()
+            _thread = threading.Thread(target=_run, args=(_stop,), name="profiler-sampler", daemon=True)
+            _thread.start()
+
+
+def _release() -> None:
+    global _thread, _stop, _users
+    with _lock:
+        _users = max(0, _users - 1)
+        if _users or _thread is None:
+            return
+        thread, _thread = _thread, None
+        _stop.set()
+        _stop = None
+        _samples.clear()
+        _stacks.clear()
+    thread.join(timeout=1)
+
+
+def _window(start: float, end: float) -> list[Sample]:
+    out = []
+    with _lock:
+        for sample in reversed(_samples):
+            if sample[0] < start:
+                break
+            if sample[0] <= end:
+                out.append(sample)
+    out.reverse()
+    return out
+
+
+def _store(kind: str, seconds: float, samples: list[Sample], **extra: Any) -> Capture:
+    capture = Capture(
+        id=next(_capture_ids),
+        kind=kind,
+        created_at=datetime.now(timezone.utc),
+        seconds=seconds,
+        samples=samples,
+        **extra,
+    )
+    with _lock:
+        _captures.append(capture)
+        _metrics["captures_total"] += 1
+    return capture
+
+
+async def profile_for(seconds: float) -> Capture:
+    """Sample every thread of this worker for ``seconds`` and store the capture."""
+
+    global _manual_running
+    with _lock:
+        if _manual_running:
+            raise ProfilerBusy("A profile is already being taken in this worker")
+        _manual_running = True
+    _acquire()
+    try:
+        start = time.perf_counter()
+        await asyncio.sleep(min(seconds, settings.PROFILING_MAX_SECONDS))
+        end = time.perf_counter()
+        samples = _window(start, end)
+    finally:
+        _release()
+        with _lock:
+            _manual_running = False
+    return _store("manual", end - start, samples)
+
+
+def slow_request_threshold_ms() -> float:
+    return _slow_threshold_ms
+
+
+def set_slow_request_threshold(threshold_ms: float) -> None:
+    """Capture every request slower than ``threshold_ms``; 0 turns capture off."""
+
+    global _slow_threshold_ms
+    threshold_ms = max(0.0, threshold_ms)
+    with _lock:
+        was_on, _slow_threshold_ms = _slow_threshold_ms > 0, threshold_ms
+    if threshold_ms > 0 and not was_on:
+        _acquire()
+    elif threshold_ms <= 0 and was_on:
+        _release()
+
+
+@dataclass
+class RequestTrace:
+    started: float
+    stages: dict[str, list[float]] = field(default_factory=dict)
+
+
+_current: ContextVar[Optional[RequestTrace]] = ContextVar("profiling_request", default=None)
+
+
+def record_stage(name: str, seconds: float) -> None:
+    """Add ``seconds`` to stage ``name`` of the request being traced, if any."""
+
+    trace = _current.get()
+    if trace is None:
+        return
+    entry = trace.stages.get(name)
+    if entry is None:
+        trace.stages[name] = [1, seconds]
+    else:
+        entry[0] += 1
+        entry[1] += seconds
+
+
+@contextmanager
+def stage(name: str) -> Iterator[None]:
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_stage(name, time.perf_counter() - started)
+
+
+def begin_request() -> tuple[RequestTrace, Token]:
+    trace = RequestTrace(started=time.perf_counter())
+    return trace, _current.set(trace)
+
+
+def end_request(trace: RequestTrace, token: Token, *, method: str, path: str, route: str, status: int) -> None:
+    _current.reset(token)
+    end = time.perf_counter()
+    elapsed = end - trace.started
+    threshold = _slow_threshold_ms
+    if threshold <= 0 or elapsed * 1000 < threshold:
+        return
+    stages = {name: {"count": int(c), "seconds": round(s, 6)} for name, (c, s) in sorted(trace.stages.items())}
+    accounted = sum(s for _, s in trace.stages.values())
+    span = current_span()
+    _store(
+        "slow_request",
+        elapsed,
+        _window(trace.started, end),
+        request={
+            "method": method,
+            "path": path,
+            "route": route,
+            "status": status,
+            "trace_id": span.trace_id if span is not None else None,
+        },
+        stages={"stages": stages, "unaccounted_seconds": round(max(0.0, elapsed - accounted), 6)},
+    )
+
+
+def list_captures() -> list[dict[str, Any]]:
+    with _lock:
+        captures = list(_captures)
+    return [c.summary() for c in reversed(captures)]
+
+
+def get_capture(capture_id: int) -> Optional[Capture]:
+    with _lock:
+        for capture in _captures:
+            if capture.id == capture_id:
+                return capture
+    return None
+
+
+def get_profiler_status() -> dict[str, Any]:
+    with _lock:
+        out: dict[str, Any] = dict(_metrics)
+        out["sampling"] = _thread is not None
+        out["buffered_samples"] = len(_samples)
+        out["captures"] = len(_captures)
+        out["manual_running"] = _manual_running
+    out["sampling_seconds_total"] = round(out["sampling_seconds_total"], 6)
+    out["interval_ms"] = settings.PROFILING_INTERVAL_MS
+    out["max_seconds"] = settings.PROFILING_MAX_SECONDS
+    out["max_captures"] = _captures.maxlen
+    out["slow_request_threshold_ms"] = _slow_threshold_ms
+    return out
+
+
+def start_profiling() -> None:
+    if settings.PROFILING_ENABLED and settings.PROFILING_SLOW_REQUEST_MS > 0:
+        set_slow_request_threshold(settings.PROFILING_SLOW_REQUEST_MS)
+
+
+def stop_profiling() -> None:
+    set_slow_request_threshold(0)
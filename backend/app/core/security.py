@@ -1,22 +1,56 @@
 from __future__ import annotations
 
+import base64
+import hashlib
+import hmac
+import json
+import os
+import time
 from datetime import datetime, timedelta, timezone
+from functools import lru_cache
 from typing import Any, Optional
 
-from jose import jwt
-from passlib.context import CryptContext
-
 from app.core.config import settings
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+IMAGE_VARIANTS = ("image", "original")
+
+# jose (with its cryptography backend) and passlib are imported on first use rather
+# than with the app; the startup warm-up (app/services/warmup.py) touches both.
+
+
+@lru_cache(maxsize=1)
+def pwd_context():
+    from passlib.context import CryptContext
+
+    # min/max pin the cost, so verify_and_update() flags hashes made under an older policy.
+    return CryptContext(
+        schemes=["bcrypt"],
+        deprecated="auto",
+        bcrypt__default_rounds=settings.PASSWORD_BCRYPT_ROUNDS,
+        bcrypt__min_rounds=settings.PASSWORD_BCRYPT_ROUNDS,
+        bcrypt__max_rounds=settings.PASSWORD_BCRYPT_ROUNDS,
+    )
+
+
+@lru_cache(maxsize=1)
+def _jose():
+    from jose import JWTError, jwt
+
+    return jwt, JWTError
 
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
-    return pwd_context.verify(plain_password, hashed_password)
+    return pwd_context().verify(plain_password, hashed_password)
 
 
 def get_password_hash(password: str) -> str:
-    return pwd_context.hash(password)
+    return pwd_context().hash(password)
+
+
+def verify_and_update_password(plain_password: str, hashed_password: str) -> tuple[bool, Optional[str]]:
+    """Check a password; on success also return a new hash when the stored one is outdated."""
+
+    return pwd_context().verify_and_update(plain_password, hashed_password)
 
 
 def create_access_token(subject: str, expires_delta: Optional[timedelta] = None) -> str:
@@ -25,5 +59,131 @@ def create_access_token(subject: str, expires_delta: Optional[timedelta] = None)
 
     expire = datetime.now(timezone.utc) + expires_delta
     to_encode: dict[str, Any] = {"exp": expire, "sub": subject}
+    jwt, _ = _jose()
     encoded_jwt = jwt.encode(to_encode, settings.SECRET_KEY, algorithm=settings.ALGORITHM)
     return encoded_jwt
+
+
+def decode_access_token(token: str) -> dict[str, Any]:
+    """The token's claims; ValueError if it is malformed, forged or expired."""
+
+    jwt, JWTError = _jose()
+    try:
+        return jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
+    except JWTError as e:
+        raise ValueError(str(e)) from e
+
+
+def _b64url_encode(raw: bytes) -> str:
+    return base64.urlsafe_b64encode(raw).rstrip(b"=").decode("ascii")
+
+
+def _b64url_decode(value: str) -> bytes:
+    return base64.urlsafe_b64decode(value + "=" * (-len(value) % 4))
+
+
+@lru_cache(maxsize=4)
+def _signing_key(purpose: bytes) -> bytes:
+    # Derived from SECRET_KEY per purpose, so an image link, a stream ticket and
+    # a JWT can never be replayed as one another.
+    return hmac.new(settings.SECRET_KEY.encode("utf-8"), purpose, hashlib.sha256).digest()
+
+
+def _signature(purpose: bytes, body: str) -> str:
+    return _b64url_encode(hmac.new(_signing_key(purpose), body.encode("ascii"), hashlib.sha256).digest())
+
+
+def _image_signature(body: str) -> str:
+    return _signature(b"scan-image-url", body)
+
+
+def create_image_token(
+    *,
+    scan_id: int,
+    user_id: int,
+    filename: str,
+    variant: str = "image",
+    now: Optional[float] = None,
+) -> str:
+    if variant not in IMAGE_VARIANTS:
+        raise ValueError(f"Unknown image variant: {variant}")
+
+    ttl = max(60, int(settings.IMAGE_URL_TTL_SECONDS))
+    issued = int(time.time() if now is None else now)
+    # Round the expiry up to a TTL window so every listing inside the same window
+    # produces byte-identical URLs that browsers, proxies and CDNs can reuse.
+    expires_at = (issued // ttl + 2) * ttl
+
+    payload = {"s": scan_id, "u": user_id, "v": variant, "f": filename, "e": expires_at}
+    body = _b64url_encode(json.dumps(payload, separators=(",", ":")).encode("utf-8"))
+    return f"{body}.{_image_signature(body)}"
+
+
+def scan_image_url(scan: Any, *, variant: str = "image") -> str:
+    token = create_image_token(
+        scan_id=scan.id,
+        user_id=scan.user_id,
+        filename=os.path.basename(scan.image_filename),
+        variant=variant,
+    )
+    return f"{settings.API_V1_STR}/scans/media/{token}"
+
+
+def verify_image_token(token: str, *, now: Optional[float] = None) -> Optional[dict[str, Any]]:
+    body, sep, signature = token.partition(".")
+    if not sep or not body or not signature:
+        return None
+    try:
+        if not hmac.compare_digest(signature.encode("utf-8"), _image_signature(body).encode("ascii")):
+            return None
+    except UnicodeError:
+        return None
+
+    try:
+        payload = json.loads(_b64url_decode(body))
+        claims = {
+            "scan_id": int(payload["s"]),
+            "user_id": int(payload["u"]),
+            "variant": str(payload["v"]),
+            "filename": str(payload["f"]),
+            "expires_at": int(payload["e"]),
+        }
+    except Exception:
+        return None
+
+    if claims["variant"] not in IMAGE_VARIANTS:
+        return None
+    if claims["expires_at"] <= int(time.time() if now is None else now):
+        return None
+    return claims
+
+
+def create_stream_ticket(*, user_id: int, now: Optional[float] = None) -> str:
+    """A short-lived credential that only opens ``user_id``'s scan event stream.
+
+    EventSource cannot send an Authorization header, so the stream URL carries
+    this instead of the bearer token: it ends up in access and proxy logs, where
+    a ticket is worth nothing once it expires and never grants API access.
+    """
+
+    expires_at = int(time.time() if now is None else now) + max(1, settings.STREAM_TICKET_TTL_SECONDS)
+    body = _b64url_encode(json.dumps({"u": user_id, "e": expires_at}, separators=(",", ":")).encode("utf-8"))
+    return f"{body}.{_signature(b'scan-event-stream', body)}"
+
+
+def verify_stream_ticket(ticket: str, *, now: Optional[float] = None) -> Optional[int]:
+    """The user id a stream ticket was issued to, or None if it is forged or expired."""
+
+    body, sep, signature = ticket.partition(".")
+    if not sep or not body or not signature:
+        return None
+    try:
+        if not hmac.compare_digest(signature.encode("utf-8"), _signature(b"scan-event-stream", body).encode("ascii")):
+            return None
+        payload = json.loads(_b64url_decode(body))
+        user_id, expires_at = int(payload["u"]), int(payload["e"])
+    except Exception:
+        return None
+    if expires_at <= int(time.time() if now is None else now):
+        return None
+    return user_id
@@ -0,0 +1,395 @@
+from __future__ import annotations
+
+import functools
+import importlib
+import inspect
+import json
+import logging
+import os
+import queue
+import re
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Any, Callable, Iterator, Optional, Protocol
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Request tracing with W3C Trace Context (https://www.w3.org/TR/trace-context/).
+# An incoming traceparent header continues the caller's trace; outgoing calls
+# to the inference services carry ours. Finished spans are batched on a
+# background thread and handed to the exporter named by TRACING_EXPORTER:
+# "none" (tracing off), "file" (JSON lines, handy in tests), "otlp" (OTLP/HTTP
+# JSON to a collector) or "package.module:factory" for anything else.
+# Sampling is parent based: a sampled caller is always followed, and new traces
+# are kept with probability TRACING_SAMPLE_RATE, decided from the trace id so
+# every service that sees the id agrees.
+
+_TRACEPARENT_RE = re.compile(r"^([0-9a-f]{2})-([0-9a-f]{32})-([0-9a-f]{16})-([0-9a-f]{2})(?:-.*)?$")
+_INVALID_TRACE_ID = "0" * 32
+_INVALID_SPAN_ID = "0" * 16
+
+
+class TracingError(RuntimeError):
+    pass
+
+
+@dataclass
+class Span:
+    name: str
+    trace_id: str
+    span_id: str
+    parent_id: Optional[str]
+    sampled: bool
+    kind: str = "internal"
+    start_ns: int = 0
+    end_ns: int = 0
+    attributes: dict[str, Any] = field(default_factory=dict)
+    error: Optional[str] = None
+
+    def set_attribute(self, key: str, value: Any) -> None:
+        self.attributes[key] = value
+
+    @property
+    def traceparent(self) -> str:
+        return f"00-{self.trace_id}-{self.span_id}-{'01' if self.sampled else '00'}"
+
+    def to_dict(self) -> dict[str, Any]:
+        return {
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_span_id": self.parent_id,
+            "name": self.name,
+            "kind": self.kind,
+            "start_time_unix_nano": self.start_ns,
+            "end_time_unix_nano": self.end_ns,
+            "duration_ms": round((self.end_ns - self.start_ns) / 1e6, 3),
+            "attributes": self.attributes,
+            "status": "error" if self.error is not None else "ok",
+            "error": self.error,
+            "service": settings.TRACING_SERVICE_NAME,
+        }
+
+
+class SpanExporter(Protocol):
+    def export(self, spans: list[Span]) -> None: ...
+
+    def shutdown(self) -> None: ...
+
+
+class FileSpanExporter:
+    """Appends one JSON object per span to ``path``."""
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+
+    def export(self, spans: list[Span]) -> None:
+        lines = "".join(json.dumps(s.to_dict(), default=str) + "\n" for s in spans)
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.write(lines)
+
+    def shutdown(self) -> None:
+        pass
+
+
+_OTLP_KINDS = {"internal": 1, "server": 2, "client": 3}
+
+
+def _otlp_value(value: Any) -> dict[str, Any]:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+class OTLPHttpSpanExporter:
+    """POSTs spans to an OpenTelemetry collector as OTLP/HTTP JSON."""
+
+    def __init__(self, endpoint: str, *, timeout: float = 5.0) -> None:
+        import httpx
+
+        self.endpoint = endpoint
+        self._client = httpx.Client(timeout=timeout)
+
+    def _span(self, span: Span) -> dict[str, Any]:
+        out: dict[str, Any] = {
+            "traceId": span.trace_id,
+            "spanId": span.span_id,
+            "name": span.name,
+            "kind": _OTLP_KINDS.get(span.kind, 1),
+            "startTimeUnixNano": str(span.start_ns),
+            "endTimeUnixNano": str(span.end_ns),
+            "attributes": [{"key": k, "value": _otlp_value(v)} for k, v in span.attributes.items()],
+            "status": {"code": 2, "message": span.error} if span.error is not None else {"code": 1},
+        }
+        if span.parent_id:
+            out["parentSpanId"] = span.parent_id
+        return out
+
+    def export(self, spans: list[Span]) -> None:
+        body = {
+            "resourceSpans": [
+                {
+                    "resource": {
+                        "attributes": [
+                            {"key": "service.name", "value": {"stringValue": settings.TRACING_SERVICE_NAME}}
+                        ]
+                    },
+                    "scopeSpans": [{"scope": {"name": "app"}, "spans": [self._span(s) for s in spans]}],
+                }
+            ]
+        }
+        self._client.post(self.endpoint, json=body).raise_for_status()
+
+    def shutdown(self) -> None:
+        self._client.close()
+
+
+def _load_exporter(name: str) -> Optional[SpanExporter]:
+    name = (name or "none").strip()
+    if name.lower() in ("", "none", "off"):
+        return None
+    if name.lower() == "file":
+        return FileSpanExporter(settings.TRACING_FILE_PATH)
+    if name.lower() == "otlp":
+        return OTLPHttpSpanExporter(settings.TRACING_OTLP_ENDPOINT)
+    module_name, _, attr = name.partition(":")
+    if not attr:
+        raise TracingError(f"Unknown TRACING_EXPORTER: {name!r}; expected none, file, otlp or module:factory")
+    try:
+        factory = getattr(importlib.import_module(module_name), attr)
+    except Exception as e:
+        raise TracingError(f"Could not load TRACING_EXPORTER {name!r}: {e}") from e
+    return factory()
+
+
+class _BatchProcessor:
+    """Queues finished spans and exports them in batches off the request path."""
+
+    def __init__(self, exporter: SpanExporter) -> None:
+        self.exporter = exporter
+        self._queue: queue.Queue[Span | threading.Event | None] = queue.Queue(
+            maxsize=max(1, settings.TRACING_MAX_QUEUE)
+        )
+        self.dropped = 0
+        self.exported = 0
+        self.failed = 0
+        self._thread = threading.Thread(target=self._run, name="trace-exporter", daemon=True)
+        self._thread.start()
+
+    def submit(self, span: Span) -> None:
+        try:
+            self._queue.put_nowait(span)
+        except queue.Full:
+            self.dropped += 1
+
+    def _export(self, batch: list[Span]) -> None:
+        if not batch:
+            return
+        try:
+            self.exporter.export(batch)
+            self.exported += len(batch)
+        except Exception:
+            self.failed += len(batch)
+            logger.warning("exporting %d spans failed", len(batch), exc_info=True)
+        batch.clear()
+
+    def _run(self) -> None:
+        interval = max(0.05, settings.TRACING_EXPORT_INTERVAL_SECONDS)
+        batch: list[Span] = []
+        deadline = time.monotonic() + interval
+        while True:
+            try:
+                item = self._queue.get(timeout=max(0.0, deadline - time.monotonic()))
+            except queue.Empty:
+                item = False
+            if isinstance(item, Span):
+                batch.append(item)
+                if len(batch) < 512:
+                    continue
+            self._export(batch)
+            deadline = time.monotonic() + interval
+            if isinstance(item, threading.Event):
+                item.set()
+            elif item is None:
+                return
+
+    def flush(self, timeout: float = 5.0) -> None:
+        done = threading.Event()
+        self._queue.put(done)
+        done.wait(timeout)
+
+    def shutdown(self) -> None:
+        self._queue.put(None)
+        self._thread.join(timeout=5)
+        self.exporter.shutdown()
+
+
+_lock = threading.Lock()
+_processor: _BatchProcessor | None = None
+_enabled = (settings.TRACING_EXPORTER or "none").strip().lower() not in ("", "none", "off")
+_current: ContextVar[Optional[Span]] = ContextVar("current_span", default=None)
+
+
+def tracing_enabled() -> bool:
+    return _enabled
+
+
+def start_tracing() -> None:
+    """Create the exporter; raises TracingError at startup for a bad TRACING_EXPORTER."""
+
+    global _processor
+    with _lock:
+        if _processor is not None or not _enabled:
+            return
+        exporter = _load_exporter(settings.TRACING_EXPORTER)
+        if exporter is not None:
+            _processor = _BatchProcessor(exporter)
+
+
+def stop_tracing() -> None:
+    global _processor
+    with _lock:
+        processor, _processor = _processor, None
+    if processor is not None:
+        processor.shutdown()
+
+
+def flush_spans(timeout: float = 5.0) -> None:
+    processor = _processor
+    if processor is not None:
+        processor.flush(timeout)
+
+
+def parse_traceparent(header: str | None) -> Optional[tuple[str, str, bool]]:
+    """``(trace_id, parent_span_id, sampled)`` from a traceparent header, or None if invalid."""
+
+    if not header:
+        return None
+    # Ids are lowercase hex only; anything else starts a new trace.
+    match = _TRACEPARENT_RE.match(header.strip())
+    if match is None:
+        return None
+    version, trace_id, span_id, flags = match.groups()
+    if version == "ff" or (version == "00" and len(header.strip()) != 55):
+        return None
+    if trace_id == _INVALID_TRACE_ID or span_id == _INVALID_SPAN_ID:
+        return None
+    return trace_id, span_id, bool(int(flags, 16) & 1)
+
+
+def _sample(trace_id: str) -> bool:
+    rate = settings.TRACING_SAMPLE_RATE
+    if rate >= 1.0:
+        return True
+    if rate <= 0.0:
+        return False
+    # The low 64 bits of the trace id are random in W3C ids.
+    return int(trace_id[16:], 16) < int(rate * (1 << 64))
+
+
+def _new_span(name: str, kind: str, parent: Optional[tuple[str, str, bool]]) -> Span:
+    if parent is None:
+        trace_id = os.urandom(16).hex()
+        return Span(name, trace_id, os.urandom(8).hex(), None, _sample(trace_id), kind)
+    trace_id, parent_id, sampled = parent
+    return Span(name, trace_id, os.urandom(8).hex(), parent_id, sampled, kind)
+
+
+def current_span() -> Optional[Span]:
+    return _current.get()
+
+
+@contextmanager
+def span(
+    name: str,
+    *,
+    kind: str = "internal",
+    parent: Optional[str] = None,
+    attributes: Optional[dict[str, Any]] = None,
+) -> Iterator[Optional[Span]]:
+    """A child of the current span, or a new trace (continuing ``parent``, a traceparent, if valid)."""
+
+    if not _enabled:
+        yield None
+        return
+    current = _current.get()
+    if current is not None:
+        context = (current.trace_id, current.span_id, current.sampled)
+    else:
+        context = parse_traceparent(parent)
+    s = _new_span(name, kind, context)
+    if attributes:
+        s.attributes.update(attributes)
+    token = _current.set(s)
+    s.start_ns = time.time_ns()
+    try:
+        yield s
+    except BaseException as e:
+        s.error = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        s.end_ns = time.time_ns()
+        _current.reset(token)
+        processor = _processor
+        if s.sampled and processor is not None:
+            processor.submit(s)
+
+
+def traced(name: str) -> Callable:
+    """Decorator running a sync or async function inside ``span(name)``."""
+
+    def decorate(fn: Callable) -> Callable:
+        if inspect.iscoroutinefunction(fn):
+
+            @functools.wraps(fn)
+            async def async_wrapper(*args: Any, **kwargs: Any) -> Any:
+                if not _enabled:
+                    return await fn(*args, **kwargs)
+                with span(name):
+                    return await fn(*args, **kwargs)
+
+            return async_wrapper
+
+        @functools.wraps(fn)
+        def wrapper(*args: Any, **kwargs: Any) -> Any:
+            if not _enabled:
+                return fn(*args, **kwargs)
+            with span(name):
+                return fn(*args, **kwargs)
+
+        return wrapper
+
+    return decorate
+
+
+def inject(headers: dict[str, str] | None = None) -> dict[str, str]:
+    """``headers`` plus a traceparent for the current span, for outgoing HTTP calls."""
+
+    headers = dict(headers or {})
+    current = _current.get()
+    if current is not None:
+        headers["traceparent"] = current.traceparent
+    return headers
+
+
+def get_tracing_metrics() -> dict[str, Any]:
+    processor = _processor
+    return {
+        "enabled": _enabled,
+        "exporter": settings.TRACING_EXPORTER,
+        "sample_rate": settings.TRACING_SAMPLE_RATE,
+        "exported_total": processor.exported if processor else 0,
+        "failed_total": processor.failed if processor else 0,
+        "dropped_total": processor.dropped if processor else 0,
+        "queued": processor._queue.qsize() if processor else 0,
+    }
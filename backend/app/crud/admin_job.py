@@ -0,0 +1,85 @@
+from __future__ import annotations
+
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+
+from sqlalchemy import or_, select, update
+from sqlalchemy.orm import Session
+
+from app.models.admin_job import AdminJob
+
+
+def _now() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+def create_admin_job(db: Session, *, kind: str, params_json: str, created_by: int) -> AdminJob:
+    job = AdminJob(
+        id=uuid.uuid4().hex,
+        kind=kind,
+        status="queued",
+        params_json=params_json,
+        created_by=created_by,
+    )
+    db.add(job)
+    db.commit()
+    db.refresh(job)
+    return job
+
+
+def get_admin_job(db: Session, *, job_id: str) -> Optional[AdminJob]:
+    return db.execute(select(AdminJob).where(AdminJob.id == job_id)).scalar_one_or_none()
+
+
+def list_admin_jobs(db: Session, *, limit: int = 50) -> list[AdminJob]:
+    stmt = select(AdminJob).order_by(AdminJob.created_at.desc()).limit(limit)
+    return list(db.execute(stmt).scalars().all())
+
+
+def list_runnable_admin_job_ids(db: Session, *, lease_seconds: int) -> list[str]:
+    stale = _now() - timedelta(seconds=lease_seconds)
+    stmt = (
+        select(AdminJob.id)
+        .where(
+            or_(
+                AdminJob.status == "queued",
+                (AdminJob.status == "running") & (AdminJob.heartbeat_at < stale),
+            )
+        )
+        .order_by(AdminJob.created_at)
+    )
+    return list(db.execute(stmt).scalars().all())
+
+
+def claim_admin_job(db: Session, *, job_id: str, worker_id: str, lease_seconds: int) -> bool:
+    """Take the job for ``worker_id`` if it is queued or its previous runner's lease expired."""
+
+    now = _now()
+    stale = now - timedelta(seconds=lease_seconds)
+    res = db.execute(
+        update(AdminJob)
+        .where(
+            AdminJob.id == job_id,
+            or_(
+                AdminJob.status == "queued",
+                (AdminJob.status == "running") & (AdminJob.heartbeat_at < stale),
+            ),
+        )
+        .values(status="running", claimed_by=worker_id, heartbeat_at=now, updated_at=now)
+    )
+    db.commit()
+    return bool(res.rowcount)
+
+
+def update_admin_job(db: Session, *, job_id: str, worker_id: str, **values) -> bool:
+    """Update a running job's fields and heartbeat; returns False if the lease was lost."""
+
+    now = _now()
+    res = db.execute(
+        update(AdminJob)
+        .where(AdminJob.id == job_id, AdminJob.claimed_by == worker_id, AdminJob.status == "running")
+        .values(heartbeat_at=now, updated_at=now, **values)
+    )
+    db.commit()
+    return bool(res.rowcount)
@@ -0,0 +1,95 @@
+from __future__ import annotations
+
+from datetime import datetime, timezone
+from typing import Optional
+
+from sqlalchemy import select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from app.models.blob import Blob
+
+
+def get_blob_by_digest(db: Session, *, digest: str) -> Optional[Blob]:
+    return db.execute(select(Blob).where(Blob.digest == digest)).scalar_one_or_none()
+
+
+def get_blob_by_filename(db: Session, *, filename: str) -> Optional[Blob]:
+    return db.execute(select(Blob).where(Blob.filename == filename)).scalar_one_or_none()
+
+
+def acquire_blob(
+    db: Session,
+    *,
+    digest: str,
+    filename: str,
+    size: int,
+    content_type: str,
+) -> tuple[Blob, bool]:
+    """Take a reference on the blob with ``digest``, creating it if needed.
+
+    A row left at ``ref_count`` 0 by release_blob() is simply revived. Returns
+    the blob and whether this call created it.
+    """
+
+    for _ in range(2):
+        now = datetime.now(timezone.utc)
+        res = db.execute(
+            update(Blob)
+            .where(Blob.digest == digest)
+            .values(ref_count=Blob.ref_count + 1, last_used_at=now)
+        )
+        if res.rowcount:
+            db.commit()
+            blob = get_blob_by_digest(db, digest=digest)
+            if blob is not None:
+                return blob, False
+
+        blob = Blob(
+            digest=digest,
+            filename=filename,
+            size=size,
+            content_type=content_type,
+            ref_count=1,
+            last_used_at=now,
+        )
+        db.add(blob)
+        try:
+            db.commit()
+        except IntegrityError:
+            # Another request inserted the same digest first; take a reference on theirs.
+            db.rollback()
+            continue
+        db.refresh(blob)
+        return blob, True
+
+    raise RuntimeError(f"Could not acquire blob {digest}")
+
+
+def release_blob(db: Session, *, filename: str) -> Optional[int]:
+    """Drop one reference on the blob stored as ``filename``.
+
+    Returns the remaining reference count, or None if the file is not a
+    tracked blob with live references. A blob that reaches 0 keeps its row and
+    its files: deleting them here would race an upload of the same content
+    that revives the row. The upload GC removes both once the blob has gone
+    unused for its grace period, counted from this release.
+    """
+
+    res = db.execute(
+        update(Blob)
+        .where(Blob.filename == filename, Blob.ref_count > 0)
+        .values(ref_count=Blob.ref_count - 1, last_used_at=datetime.now(timezone.utc))
+    )
+    if not res.rowcount:
+        db.rollback()
+        return None
+    remaining = db.execute(select(Blob.ref_count).where(Blob.filename == filename)).scalar_one_or_none()
+    db.commit()
+    return remaining
+
+
+def list_blobs_by_filenames(db: Session, *, filenames: list[str]) -> list[Blob]:
+    if not filenames:
+        return []
+    return list(db.execute(select(Blob).where(Blob.filename.in_(filenames))).scalars().all())
@@ -0,0 +1,149 @@
+from __future__ import annotations
+
+import json
+from collections import Counter
+from datetime import date, datetime, timezone
+from typing import Any, Iterable
+
+from sqlalchemy import delete, func, select, update
+from sqlalchemy.orm import Session
+
+from app.models.rollup import ScanDailyStat, StatCounter
+from app.models.scan import Scan
+from app.models.user import User
+
+SCAN_TYPES = ("dashboard", "estimate_field")
+
+USERS_TOTAL = "users_total"
+USERS_ACTIVE = "users_active"
+
+
+def scan_type_of(result: Any) -> str:
+    """Bucket a scan for the overview: ``dashboard``, ``estimate_field`` or ``other``.
+
+    ``result`` is the decoded result, or its JSON text.
+    """
+
+    data = result
+    if isinstance(result, str) or result is None:
+        try:
+            data = json.loads(result or "")
+        except Exception:
+            return "other"
+    scan_type = data.get("scan_type") if isinstance(data, dict) else None
+    return scan_type if scan_type in SCAN_TYPES else "other"
+
+
+def scan_counter_name(scan_type: str) -> str:
+    return f"scans:{scan_type}"
+
+
+def utc_day(value: datetime) -> date:
+    # SQLite hands back naive datetimes; they were written as UTC.
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc)
+    return value.date()
+
+
+def _upsert(db: Session, model: Any, keys: dict[str, Any], column: str, delta: int) -> None:
+    """Add ``delta`` to ``model.<column>`` for the row with ``keys``, creating it at ``delta``.
+
+    Runs inside the caller's transaction, which commits it together with the
+    change being counted.
+    """
+
+    dialect = db.get_bind().dialect.name
+    if dialect in ("sqlite", "postgresql"):
+        if dialect == "sqlite":
+            from sqlalchemy.dialects.sqlite import insert
+        else:
+            from sqlalchemy.dialects.postgresql import insert
+        target = getattr(model, column)
+        stmt = insert(model).values(**keys, **{column: delta})
+        stmt = stmt.on_conflict_do_update(
+            index_elements=list(keys),
+            set_={column: target + stmt.excluded[column]},
+        )
+        db.execute(stmt)
+        return
+
+    target = getattr(model, column)
+    res = db.execute(
+        update(model)
+        .where(*(getattr(model, k) == v for k, v in keys.items()))
+        .values({column: target + delta})
+    )
+    if not res.rowcount:
+        db.add(model(**keys, **{column: delta}))
+        db.flush()
+
+
+def bump_counter(db: Session, *, name: str, delta: int) -> None:
+    if delta:
+        _upsert(db, StatCounter, {"name": name}, "value", delta)
+
+
+def bump_scan_stats(db: Session, *, day: date, scan_type: str, delta: int) -> None:
+    if not delta:
+        return
+    _upsert(db, ScanDailyStat, {"day": day, "scan_type": scan_type}, "count", delta)
+    bump_counter(db, name=scan_counter_name(scan_type), delta=delta)
+
+
+def bump_scan_stats_bulk(db: Session, rows: Iterable[tuple[datetime, str]], *, sign: int) -> None:
+    """Count many ``(created_at, scan_type)`` rows at once, e.g. before a bulk delete."""
+
+    buckets = Counter((utc_day(created_at), scan_type) for created_at, scan_type in rows)
+    for (day, scan_type), n in buckets.items():
+        bump_scan_stats(db, day=day, scan_type=scan_type, delta=sign * n)
+
+
+def get_counters(db: Session) -> dict[str, int]:
+    return {name: int(value) for name, value in db.execute(select(StatCounter.name, StatCounter.value)).all()}
+
+
+def list_scan_daily_stats(db: Session, *, start: date, end: date) -> list[ScanDailyStat]:
+    stmt = (
+        select(ScanDailyStat)
+        .where(ScanDailyStat.day >= start, ScanDailyStat.day <= end)
+        .order_by(ScanDailyStat.day)
+    )
+    return list(db.execute(stmt).scalars().all())
+
+
+def rebuild_rollups(db: Session, *, batch_size: int = 1000, from_results: bool = False) -> dict[str, int]:
+    """Recompute every rollup row from the users and scans tables.
+
+    Scans are streamed ``batch_size`` rows at a time, so this works on tables
+    of any size. ``from_results`` classifies scans from their result text
+    instead of the scan_type column, for migrations applied before that
+    column existed. Returns the rebuilt counters.
+    """
+
+    db.execute(delete(ScanDailyStat))
+    db.execute(delete(StatCounter))
+
+    buckets: Counter[tuple[date, str]] = Counter()
+    if from_results:
+        stmt = select(Scan.created_at, Scan.result_json).execution_options(yield_per=batch_size)
+        for created_at, result_json in db.execute(stmt):
+            buckets[(utc_day(created_at), scan_type_of(result_json))] += 1
+    else:
+        stmt = select(Scan.created_at, Scan.scan_type).execution_options(yield_per=batch_size)
+        for created_at, scan_type in db.execute(stmt):
+            buckets[(utc_day(created_at), scan_type if scan_type in SCAN_TYPES else "other")] += 1
+
+    totals: Counter[str] = Counter()
+    for (day, scan_type), n in buckets.items():
+        db.add(ScanDailyStat(day=day, scan_type=scan_type, count=n))
+        totals[scan_counter_name(scan_type)] += n
+
+    totals[USERS_TOTAL] = int(db.execute(select(func.count()).select_from(User)).scalar() or 0)
+    totals[USERS_ACTIVE] = int(
+        db.execute(select(func.count()).select_from(User).where(User.is_active.is_(True))).scalar() or 0
+    )
+    for name, value in totals.items():
+        db.add(StatCounter(name=name, value=value))
+
+    db.commit()
+    return dict(totals)
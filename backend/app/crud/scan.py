@@ -1,21 +1,90 @@
 from __future__ import annotations
 
-from typing import Optional
+from datetime import datetime, timezone
+from typing import Any, Optional
 
-from sqlalchemy import select
+from sqlalchemy import and_, delete, func, or_, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 
+from app.core.tracing import traced
+from app.crud.rollup import bump_scan_stats, bump_scan_stats_bulk, utc_day
+from app.crud.scan_job import add_scan_job
 from app.models.scan import Scan
+from app.models.scan_job import ScanJob
+from app.models.user import User
+from app.services.result_codec import decode_result, resolve_codec, result_columns
+from app.services.scan_fields import scan_columns
 
 
+def _add_scan(db: Session, *, user_id: int, image_filename: str, result: Any, status: str) -> Scan:
+    now = datetime.now(timezone.utc)
+    scan = Scan(
+        user_id=user_id,
+        image_filename=image_filename,
+        status=status,
+        created_at=now,
+        created_date=utc_day(now),
+        **result_columns(result, dialect=db.get_bind().dialect.name),
+        **scan_columns(result),
+    )
+    db.add(scan)
+    bump_scan_stats(db, day=scan.created_date, scan_type=scan.scan_type, delta=1)
+    return scan
+
+
+@traced("db.create_scan")
 def create_scan(
     db: Session,
     *,
     user_id: int,
     image_filename: str,
-    result_json: str,
+    result: Any,
+    status: str = "complete",
 ) -> Scan:
-    scan = Scan(user_id=user_id, image_filename=image_filename, result_json=result_json)
+    scan = _add_scan(db, user_id=user_id, image_filename=image_filename, result=result, status=status)
+    db.commit()
+    db.refresh(scan)
+    return scan
+
+
+@traced("db.create_queued_scan")
+def create_queued_scan(
+    db: Session,
+    *,
+    user_id: int,
+    image_filename: str,
+    result: Any,
+    payload_json: str,
+) -> tuple[Scan, ScanJob]:
+    """A pending scan and the job that will complete it, committed together.
+
+    Either both exist or neither does, so a failure never leaves a pending
+    scan (counted in the rollups) that no job will ever finish.
+    """
+
+    scan = _add_scan(db, user_id=user_id, image_filename=image_filename, result=result, status="pending")
+    db.flush()
+    job = add_scan_job(db, scan_id=scan.id, user_id=user_id, payload_json=payload_json)
+    db.commit()
+    db.refresh(scan)
+    db.refresh(job)
+    return scan, job
+
+
+def update_scan_result(db: Session, *, scan_id: int, result: Any, status: str) -> Optional[Scan]:
+    scan = get_scan_by_id(db, scan_id=scan_id)
+    if scan is None:
+        return None
+    columns = scan_columns(result)
+    if columns["scan_type"] != scan.scan_type:
+        day = utc_day(scan.created_at)
+        bump_scan_stats(db, day=day, scan_type=scan.scan_type, delta=-1)
+        bump_scan_stats(db, day=day, scan_type=columns["scan_type"], delta=1)
+    columns.update(result_columns(result, dialect=db.get_bind().dialect.name))
+    for name, value in columns.items():
+        setattr(scan, name, value)
+    scan.status = status
     db.add(scan)
     db.commit()
     db.refresh(scan)
@@ -50,6 +119,158 @@ def delete_scan(db: Session, *, scan_id: int) -> bool:
     scan = get_scan_by_id(db, scan_id=scan_id)
     if scan is None:
         return False
+    bump_scan_stats(db, day=utc_day(scan.created_at), scan_type=scan.scan_type, delta=-1)
+    db.execute(delete(ScanJob).where(ScanJob.scan_id == scan_id))
     db.delete(scan)
     db.commit()
     return True
+
+
+def delete_scans_for_user(db: Session, *, user_id: int) -> list[str]:
+    """Delete every scan owned by ``user_id`` and return their image filenames."""
+
+    rows = db.execute(
+        select(Scan.image_filename, Scan.created_at, Scan.scan_type).where(Scan.user_id == user_id)
+    ).all()
+    if rows:
+        bump_scan_stats_bulk(db, ((created_at, scan_type) for _, created_at, scan_type in rows), sign=-1)
+        db.execute(delete(ScanJob).where(ScanJob.user_id == user_id))
+        db.execute(delete(Scan).where(Scan.user_id == user_id))
+        db.commit()
+    return [filename for filename, _, _ in rows]
+
+
+def delete_scans_by_ids(db: Session, *, scan_ids: list[int]) -> list[tuple[int, int, str]]:
+    """Delete the given scans in one statement and return ``(id, user_id, image_filename)`` for each.
+
+    Meant for batches of a few hundred ids; ids that no longer exist are skipped.
+    """
+
+    if not scan_ids:
+        return []
+    rows = db.execute(
+        select(Scan.id, Scan.user_id, Scan.image_filename, Scan.created_at, Scan.scan_type).where(
+            Scan.id.in_(scan_ids)
+        )
+    ).all()
+    if not rows:
+        return []
+    found = [row.id for row in rows]
+    bump_scan_stats_bulk(db, ((row.created_at, row.scan_type) for row in rows), sign=-1)
+    db.execute(delete(ScanJob).where(ScanJob.scan_id.in_(found)))
+    db.execute(delete(Scan).where(Scan.id.in_(found)))
+    db.commit()
+    return [(row.id, row.user_id, row.image_filename) for row in rows]
+
+
+def count_scans_by_stem(db: Session, *, stems: list[str]) -> dict[str, int]:
+    """Count live scans whose image filename is ``f"{stem}.<ext>"`` for each stem.
+
+    Uses a range predicate per stem so the lookup stays on the image_filename
+    index. Scans whose owner no longer exists do not count.
+    """
+
+    if not stems:
+        return {}
+    ranges = [and_(Scan.image_filename >= f"{stem}.", Scan.image_filename < f"{stem}/") for stem in stems]
+    stmt = (
+        select(Scan.image_filename, func.count())
+        .join(User, User.id == Scan.user_id)
+        .where(or_(*ranges))
+        .group_by(Scan.image_filename)
+    )
+    counts: dict[str, int] = {}
+    for filename, n in db.execute(stmt).all():
+        stem = filename.rsplit(".", 1)[0]
+        counts[stem] = counts.get(stem, 0) + int(n)
+    return counts
+
+
+def reencode_scan_results(db: Session, *, batch_size: int = 500) -> int:
+    """Rewrite plain-text results with the configured codec, ``batch_size`` rows per commit.
+
+    Rows whose text is not valid JSON are left as they are. Returns how many
+    rows were rewritten.
+    """
+
+    dialect = db.get_bind().dialect.name
+    if resolve_codec(dialect) == "json":
+        return 0
+    rewritten = 0
+    last_id = 0
+    while True:
+        rows = db.execute(
+            select(Scan.id, Scan.result_json)
+            .where(Scan.id > last_id, Scan.result_data.is_(None), Scan.result_doc.is_(None), Scan.result_json != "")
+            .order_by(Scan.id)
+            .limit(batch_size)
+        ).all()
+        if not rows:
+            return rewritten
+        for scan_id, result_json in rows:
+            try:
+                result = decode_result(result_json, None, None)
+            except ValueError:
+                continue
+            db.execute(update(Scan).where(Scan.id == scan_id).values(**result_columns(result, dialect=dialect)))
+            rewritten += 1
+        db.commit()
+        last_id = rows[-1].id
+
+
+# Async variants for the asyncio routes. Writes go through the sync functions
+# via run_sync, so the rollup counters stay in the same transaction.
+
+
+async def create_scan_async(
+    db: AsyncSession,
+    *,
+    user_id: int,
+    image_filename: str,
+    result: Any,
+    status: str = "complete",
+) -> Scan:
+    return await db.run_sync(
+        lambda session: create_scan(
+            session, user_id=user_id, image_filename=image_filename, result=result, status=status
+        )
+    )
+
+
+async def create_queued_scan_async(
+    db: AsyncSession,
+    *,
+    user_id: int,
+    image_filename: str,
+    result: Any,
+    payload_json: str,
+) -> tuple[Scan, ScanJob]:
+    return await db.run_sync(
+        lambda session: create_queued_scan(
+            session, user_id=user_id, image_filename=image_filename, result=result, payload_json=payload_json
+        )
+    )
+
+
+async def update_scan_result_async(db: AsyncSession, *, scan_id: int, result: Any, status: str) -> Optional[Scan]:
+    return await db.run_sync(
+        lambda session: update_scan_result(session, scan_id=scan_id, result=result, status=status)
+    )
+
+
+async def delete_scan_async(db: AsyncSession, *, scan_id: int) -> bool:
+    return await db.run_sync(lambda session: delete_scan(session, scan_id=scan_id))
+
+
+async def get_scan_by_id_async(db: AsyncSession, *, scan_id: int) -> Optional[Scan]:
+    return (await db.execute(select(Scan).where(Scan.id == scan_id))).scalar_one_or_none()
+
+
+async def list_scans_for_user_async(db: AsyncSession, *, user_id: int, limit: int = 50) -> list[Scan]:
+    stmt = (
+        select(Scan)
+        .where(Scan.user_id == user_id)
+        .order_by(Scan.created_at.desc())
+        .limit(limit)
+    )
+    return list((await db.execute(stmt)).scalars().all())
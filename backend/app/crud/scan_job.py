@@ -0,0 +1,146 @@
+from __future__ import annotations
+
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+
+from sqlalchemy import or_, select, update
+from sqlalchemy.orm import Session
+
+from app.models.scan_job import ScanJob
+
+
+def _now() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+def add_scan_job(db: Session, *, scan_id: int, user_id: int, payload_json: str) -> ScanJob:
+    """Add a queued job to the session without committing it."""
+
+    job = ScanJob(
+        id=uuid.uuid4().hex,
+        scan_id=scan_id,
+        user_id=user_id,
+        status="queued",
+        stage="uploaded",
+        progress=10,
+        payload_json=payload_json,
+    )
+    db.add(job)
+    return job
+
+
+def create_scan_job(db: Session, *, scan_id: int, user_id: int, payload_json: str) -> ScanJob:
+    job = add_scan_job(db, scan_id=scan_id, user_id=user_id, payload_json=payload_json)
+    db.commit()
+    db.refresh(job)
+    return job
+
+
+def get_scan_job(db: Session, *, job_id: str) -> Optional[ScanJob]:
+    return db.execute(select(ScanJob).where(ScanJob.id == job_id)).scalar_one_or_none()
+
+
+def claim_scan_jobs(
+    db: Session, *, worker_id: str, limit: int, lease_seconds: int, max_attempts: int = 0
+) -> tuple[list[str], list[str]]:
+    """Claim up to ``limit`` runnable jobs for ``worker_id``; returns ``(claimed, exhausted)`` ids.
+
+    Runnable means queued, or running under a lease that expired because the
+    worker holding it died. Each claim is a conditional UPDATE, so concurrent
+    workers (threads, processes or replicas) never both win the same job.
+
+    A runnable job already tried ``max_attempts`` times (e.g. one that keeps
+    killing its worker, which never reaches the error handler) is marked
+    failed instead and returned in ``exhausted``; 0 means no limit.
+    """
+
+    if limit <= 0:
+        return [], []
+
+    now = _now()
+    stale = now - timedelta(seconds=lease_seconds)
+    runnable = or_(
+        ScanJob.status == "queued",
+        (ScanJob.status == "running") & (ScanJob.heartbeat_at < stale),
+    )
+    candidates = db.execute(
+        select(ScanJob.id, ScanJob.status, ScanJob.attempts)
+        .where(runnable)
+        .order_by(ScanJob.created_at)
+        .limit(limit * 2)
+    ).all()
+
+    claimed: list[str] = []
+    exhausted: list[str] = []
+    for job_id, status, attempts in candidates:
+        if len(claimed) >= limit:
+            break
+        guard = ScanJob.status == "queued" if status == "queued" else (
+            (ScanJob.status == "running") & (ScanJob.heartbeat_at < stale)
+        )
+        if max_attempts > 0 and (attempts or 0) >= max_attempts:
+            res = db.execute(
+                update(ScanJob)
+                .where(ScanJob.id == job_id, guard)
+                .values(
+                    status="failed",
+                    stage="failed",
+                    claimed_by=None,
+                    updated_at=now,
+                    error=f"Gave up after {attempts} attempts; the worker running it stopped",
+                )
+            )
+            db.commit()
+            if res.rowcount:
+                exhausted.append(job_id)
+            continue
+        res = db.execute(
+            update(ScanJob)
+            .where(ScanJob.id == job_id, guard)
+            .values(
+                status="running",
+                claimed_by=worker_id,
+                heartbeat_at=now,
+                updated_at=now,
+                attempts=ScanJob.attempts + 1,
+            )
+        )
+        db.commit()
+        if res.rowcount:
+            claimed.append(job_id)
+    return claimed, exhausted
+
+
+def update_scan_job(
+    db: Session,
+    *,
+    job_id: str,
+    worker_id: str | None = None,
+    **values,
+) -> bool:
+    """Update a job's fields and heartbeat; returns False if the lease was lost."""
+
+    now = _now()
+    stmt = update(ScanJob).where(ScanJob.id == job_id)
+    if worker_id is not None:
+        stmt = stmt.where(ScanJob.claimed_by == worker_id, ScanJob.status == "running")
+    res = db.execute(stmt.values(heartbeat_at=now, updated_at=now, **values))
+    db.commit()
+    return bool(res.rowcount)
+
+
+def requeue_stale_scan_jobs(db: Session, *, lease_seconds: int, worker_id: str | None = None) -> int:
+    """Put running jobs back in the queue if their lease expired or ``worker_id`` holds them."""
+
+    stale = _now() - timedelta(seconds=lease_seconds)
+    abandoned = ScanJob.heartbeat_at < stale
+    if worker_id is not None:
+        abandoned = or_(abandoned, ScanJob.claimed_by == worker_id)
+    res = db.execute(
+        update(ScanJob)
+        .where(ScanJob.status == "running", abandoned)
+        .values(status="queued", claimed_by=None, updated_at=_now())
+    )
+    db.commit()
+    return int(res.rowcount or 0)
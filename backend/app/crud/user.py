@@ -2,11 +2,14 @@ from __future__ import annotations
 
 from typing import Optional
 
-from sqlalchemy import select
+from sqlalchemy import case, delete, func, or_, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 
-from app.core.security import get_password_hash, verify_password
+from app.crud.rollup import USERS_ACTIVE, USERS_TOTAL, bump_counter
 from app.models.user import User
+from app.services.auth_cache import invalidate_users
+from app.services.passwords import check_password, check_password_async, hash_password, hash_password_async
 
 
 def get_user_by_id(db: Session, user_id: int) -> Optional[User]:
@@ -21,35 +24,77 @@ def get_user_by_username(db: Session, username: str) -> Optional[User]:
     return db.execute(select(User).where(User.username == username)).scalar_one_or_none()
 
 
-def create_user(
+def _insert_user(
     db: Session,
     *,
     email: str,
     username: str,
-    password: str,
-    full_name: Optional[str] = None,
+    hashed_password: str,
+    full_name: Optional[str],
 ) -> User:
     user = User(
         email=email,
         username=username,
         full_name=full_name,
-        hashed_password=get_password_hash(password),
+        hashed_password=hashed_password,
         is_active=True,
     )
     db.add(user)
+    bump_counter(db, name=USERS_TOTAL, delta=1)
+    bump_counter(db, name=USERS_ACTIVE, delta=1)
     db.commit()
     db.refresh(user)
+    # SQLite can hand out a deleted user's id again, and that id may be cached as missing.
+    invalidate_users([user.id])
     return user
 
 
+def create_user(
+    db: Session,
+    *,
+    email: str,
+    username: str,
+    password: str,
+    full_name: Optional[str] = None,
+) -> User:
+    return _insert_user(
+        db, email=email, username=username, hashed_password=hash_password(password), full_name=full_name
+    )
+
+
+def _login_stmt(identifier: str):
+    # One lookup by email or username; an email match wins if both exist.
+    return (
+        select(User)
+        .where(or_(User.email == identifier, User.username == identifier))
+        .order_by(case((User.email == identifier, 0), else_=1))
+        .limit(1)
+    )
+
+
+def _save_rehash(user: User, new_hash: str):
+    user.hashed_password = new_hash
+    return update(User).where(User.id == user.id).values(hashed_password=new_hash)
+
+
 def authenticate_user(db: Session, *, identifier: str, password: str) -> Optional[User]:
-    user = get_user_by_email(db, identifier)
-    if user is None:
-        user = get_user_by_username(db, identifier)
+    """The user if ``password`` matches, upgrading the stored hash when its cost is outdated.
+
+    The returned user is detached: the session's transaction is ended before
+    the password check so no pooled connection is held while bcrypt runs.
+    """
+
+    user = db.execute(_login_stmt(identifier)).scalar_one_or_none()
     if user is None:
         return None
-    if not verify_password(password, user.hashed_password):
+    db.expunge(user)
+    db.rollback()
+    ok, new_hash = check_password(password, user.hashed_password)
+    if not ok:
         return None
+    if new_hash is not None:
+        db.execute(_save_rehash(user, new_hash))
+        db.commit()
     return user
 
 
@@ -67,10 +112,13 @@ def set_user_active(db: Session, *, user_id: int, is_active: bool) -> Optional[U
     user = get_user_by_id(db, user_id=user_id)
     if user is None:
         return None
+    if bool(user.is_active) != is_active:
+        bump_counter(db, name=USERS_ACTIVE, delta=1 if is_active else -1)
     user.is_active = is_active
     db.add(user)
     db.commit()
     db.refresh(user)
+    invalidate_users([user_id])
     return user
 
 
@@ -78,6 +126,97 @@ def delete_user(db: Session, *, user_id: int) -> bool:
     user = get_user_by_id(db, user_id=user_id)
     if user is None:
         return False
+    bump_counter(db, name=USERS_TOTAL, delta=-1)
+    if user.is_active:
+        bump_counter(db, name=USERS_ACTIVE, delta=-1)
     db.delete(user)
     db.commit()
+    invalidate_users([user_id])
     return True
+
+
+def set_users_active(db: Session, *, user_ids: list[int], is_active: bool) -> int:
+    """Set ``is_active`` on a batch of users in one UPDATE; returns how many changed."""
+
+    if not user_ids:
+        return 0
+    res = db.execute(
+        update(User)
+        .where(User.id.in_(user_ids), User.is_active.is_not(is_active))
+        .values(is_active=is_active)
+    )
+    changed = int(res.rowcount or 0)
+    bump_counter(db, name=USERS_ACTIVE, delta=changed if is_active else -changed)
+    db.commit()
+    if changed:
+        invalidate_users(user_ids)
+    return changed
+
+
+def delete_users_by_ids(db: Session, *, user_ids: list[int]) -> int:
+    """Delete a batch of users whose scans are already gone; returns how many were deleted."""
+
+    if not user_ids:
+        return 0
+    active = int(
+        db.execute(
+            select(func.count()).select_from(User).where(User.id.in_(user_ids), User.is_active.is_(True))
+        ).scalar()
+        or 0
+    )
+    res = db.execute(delete(User).where(User.id.in_(user_ids)))
+    deleted = int(res.rowcount or 0)
+    bump_counter(db, name=USERS_TOTAL, delta=-deleted)
+    bump_counter(db, name=USERS_ACTIVE, delta=-active)
+    db.commit()
+    if deleted:
+        invalidate_users(user_ids)
+    return deleted
+
+
+# Async variants for the asyncio routes. Password hashing and checking are
+# awaited on the password pool rather than run on the event loop.
+
+
+async def get_user_by_id_async(db: AsyncSession, user_id: int) -> Optional[User]:
+    return (await db.execute(select(User).where(User.id == user_id))).scalar_one_or_none()
+
+
+async def get_user_by_email_async(db: AsyncSession, email: str) -> Optional[User]:
+    return (await db.execute(select(User).where(User.email == email))).scalar_one_or_none()
+
+
+async def get_user_by_username_async(db: AsyncSession, username: str) -> Optional[User]:
+    return (await db.execute(select(User).where(User.username == username))).scalar_one_or_none()
+
+
+async def create_user_async(
+    db: AsyncSession,
+    *,
+    email: str,
+    username: str,
+    password: str,
+    full_name: Optional[str] = None,
+) -> User:
+    # Hashed before touching the session, so no connection is held meanwhile.
+    hashed_password = await hash_password_async(password)
+    return await db.run_sync(
+        lambda session: _insert_user(
+            session, email=email, username=username, hashed_password=hashed_password, full_name=full_name
+        )
+    )
+
+
+async def authenticate_user_async(db: AsyncSession, *, identifier: str, password: str) -> Optional[User]:
+    user = (await db.execute(_login_stmt(identifier))).scalar_one_or_none()
+    if user is None:
+        return None
+    db.expunge(user)
+    await db.rollback()
+    ok, new_hash = await check_password_async(password, user.hashed_password)
+    if not ok:
+        return None
+    if new_hash is not None:
+        await db.execute(_save_rehash(user, new_hash))
+        await db.commit()
+    return user
@@ -0,0 +1,150 @@
+from __future__ import annotations
+
+from typing import Callable
+
+from sqlalchemy import (
+    JSON,
+    Column,
+    Connection,
+    Date,
+    DateTime,
+    Engine,
+    Integer,
+    LargeBinary,
+    String,
+    inspect,
+    select,
+    text,
+    update,
+)
+from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy.orm import Session
+
+import app.models  # noqa: F401  (registers every table on Base.metadata)
+from app.crud.rollup import rebuild_rollups, utc_day
+from app.db.base import Base
+from app.models.scan import Scan
+from app.services.scan_fields import scan_columns
+
+# Base.metadata.create_all() only creates missing tables, so changes to existing
+# tables are applied here. Every step must be idempotent: on a fresh database
+# create_all() has already built the current schema and the steps are no-ops.
+
+
+def _add_column(conn: Connection, table: str, column: Column) -> None:
+    existing = {c["name"] for c in inspect(conn).get_columns(table)}
+    if column.name in existing:
+        return
+    ddl = f"ALTER TABLE {table} ADD COLUMN {column.name} {column.type.compile(dialect=conn.dialect)}"
+    if column.server_default is not None:
+        ddl += f" DEFAULT '{column.server_default.arg}'"
+    if not column.nullable:
+        ddl += " NOT NULL"
+    conn.execute(text(ddl))
+
+
+def _create_index(conn: Connection, name: str, table: str, columns: str) -> None:
+    conn.execute(text(f"CREATE INDEX IF NOT EXISTS {name} ON {table} ({columns})"))
+
+
+def _v1_upload_gc(conn: Connection) -> None:
+    _create_index(conn, "ix_scans_image_filename", "scans", "image_filename")
+    _add_column(conn, "blobs", Column("last_used_at", DateTime(timezone=True)))
+
+
+def _v2_scan_status(conn: Connection) -> None:
+    _add_column(
+        conn,
+        "scans",
+        Column("status", String(20), nullable=False, server_default="complete"),
+    )
+
+
+def _v3_rollups(conn: Connection) -> None:
+    # Existing databases start with empty rollup tables; count what is already there.
+    with Session(bind=conn) as db:
+        rebuild_rollups(db, from_results=True)
+
+
+def _v4_scan_analytics_columns(conn: Connection) -> None:
+    _add_column(conn, "scans", Column("scan_type", String(32), nullable=False, server_default="other"))
+    _add_column(conn, "scans", Column("health_percent", Integer))
+    _add_column(conn, "scans", Column("overall_yield_index", Integer))
+    _add_column(conn, "scans", Column("location", String(120)))
+    _add_column(conn, "scans", Column("disease_category", String(32)))
+    _add_column(conn, "scans", Column("created_date", Date))
+    _create_index(conn, "ix_scans_scan_type", "scans", "scan_type")
+    _create_index(conn, "ix_scans_location", "scans", "location")
+    _create_index(conn, "ix_scans_created_date", "scans", "created_date")
+    _create_index(conn, "ix_scans_created_date_scan_type", "scans", "created_date, scan_type")
+
+    # Backfill from result_json in id order, a batch at a time.
+    last_id = 0
+    while True:
+        rows = conn.execute(
+            select(Scan.id, Scan.created_at, Scan.result_json)
+            .where(Scan.id > last_id, Scan.created_date.is_(None))
+            .order_by(Scan.id)
+            .limit(500)
+        ).all()
+        if not rows:
+            break
+        for scan_id, created_at, result_json in rows:
+            conn.execute(
+                update(Scan)
+                .where(Scan.id == scan_id)
+                .values(created_date=utc_day(created_at), **scan_columns(result_json))
+            )
+        last_id = rows[-1][0]
+
+
+def _v5_scan_result_codec(conn: Connection) -> None:
+    # Existing rows stay as text and keep decoding; python -m app.services.reencode_results
+    # rewrites them with the current codec.
+    _add_column(conn, "scans", Column("result_data", LargeBinary))
+    _add_column(conn, "scans", Column("result_doc", JSON().with_variant(JSONB(), "postgresql")))
+
+
+MIGRATIONS: list[tuple[int, Callable[[Connection], None]]] = [
+    (1, _v1_upload_gc),
+    (2, _v2_scan_status),
+    (3, _v3_rollups),
+    (4, _v4_scan_analytics_columns),
+    (5, _v5_scan_result_codec),
+]
+
+SCHEMA_VERSION = MIGRATIONS[-1][0]
+
+
+def get_schema_version(conn: Connection) -> int:
+    if not inspect(conn).has_table("schema_version"):
+        return 0
+    value = conn.execute(text("SELECT MAX(version) FROM schema_version")).scalar()
+    return int(value or 0)
+
+
+def schema_is_current(conn: Connection) -> bool:
+    """Every table exists and the recorded version is current: one table listing and one query."""
+
+    tables = set(inspect(conn).get_table_names())
+    if not tables.issuperset(Base.metadata.tables):
+        return False
+    value = conn.execute(text("SELECT MAX(version) FROM schema_version")).scalar()
+    return int(value or 0) >= SCHEMA_VERSION
+
+
+def upgrade_schema(engine: Engine) -> None:
+    # The common case on startup; create_all() alone checks each table separately.
+    with engine.connect() as conn:
+        if schema_is_current(conn):
+            return
+    Base.metadata.create_all(bind=engine)
+    with engine.begin() as conn:
+        current = get_schema_version(conn)
+        if current >= SCHEMA_VERSION:
+            return
+        for version, step in MIGRATIONS:
+            if version > current:
+                step(conn)
+        conn.execute(text("DELETE FROM schema_version"))
+        conn.execute(text("INSERT INTO schema_version (version) VALUES (:v)"), {"v": SCHEMA_VERSION})
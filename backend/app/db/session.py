@@ -1,12 +1,137 @@
 from __future__ import annotations
 
-from sqlalchemy import create_engine
+import threading
+from typing import Any, AsyncIterator
+
+from sqlalchemy import Engine, create_engine, event
+from sqlalchemy.engine import URL, make_url
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.orm import sessionmaker
 
 from app.core.config import settings
 
-connect_args = {"check_same_thread": False} if settings.DATABASE_URL.startswith("sqlite") else {}
-engine = create_engine(settings.DATABASE_URL, connect_args=connect_args, future=True)
+
+def _is_memory_sqlite(url) -> bool:
+    return url.database in (None, "", ":memory:") or "mode=memory" in str(url)
+
+
+def _sqlite_pragmas() -> list[str]:
+    pragmas = [f"PRAGMA busy_timeout={max(0, settings.DB_SQLITE_BUSY_TIMEOUT_MS)}"]
+    if settings.DB_SQLITE_JOURNAL_MODE:
+        pragmas.append(f"PRAGMA journal_mode={settings.DB_SQLITE_JOURNAL_MODE}")
+    if settings.DB_SQLITE_SYNCHRONOUS:
+        pragmas.append(f"PRAGMA synchronous={settings.DB_SQLITE_SYNCHRONOUS}")
+    if settings.DB_SQLITE_CACHE_SIZE_KB > 0:
+        # Negative cache_size is in KiB rather than pages.
+        pragmas.append(f"PRAGMA cache_size=-{settings.DB_SQLITE_CACHE_SIZE_KB}")
+    if settings.DB_SQLITE_MMAP_SIZE > 0:
+        pragmas.append(f"PRAGMA mmap_size={settings.DB_SQLITE_MMAP_SIZE}")
+    pragmas.append("PRAGMA temp_store=MEMORY")
+    return pragmas
+
+
+def _pg_session_settings() -> dict[str, str]:
+    values = {}
+    if settings.DB_STATEMENT_TIMEOUT_MS > 0:
+        values["statement_timeout"] = str(settings.DB_STATEMENT_TIMEOUT_MS)
+    if settings.DB_IDLE_IN_TRANSACTION_TIMEOUT_MS > 0:
+        values["idle_in_transaction_session_timeout"] = str(settings.DB_IDLE_IN_TRANSACTION_TIMEOUT_MS)
+    return values
+
+
+def _engine_options(url: URL, *, tuned: bool) -> dict[str, Any]:
+    backend = url.get_backend_name()
+    kwargs: dict[str, Any] = {}
+    connect_args: dict[str, Any] = {}
+
+    if backend == "sqlite":
+        connect_args["check_same_thread"] = False
+        if tuned:
+            connect_args["timeout"] = max(0, settings.DB_SQLITE_BUSY_TIMEOUT_MS) / 1000.0
+    elif tuned:
+        kwargs.update(
+            pool_size=max(1, settings.DB_POOL_SIZE),
+            max_overflow=max(0, settings.DB_MAX_OVERFLOW),
+            pool_timeout=settings.DB_POOL_TIMEOUT_SECONDS,
+            pool_recycle=settings.DB_POOL_RECYCLE_SECONDS,
+            pool_pre_ping=settings.DB_POOL_PRE_PING,
+            pool_use_lifo=True,
+        )
+        if backend == "postgresql":
+            session_settings = _pg_session_settings()
+            if session_settings and url.get_driver_name() == "asyncpg":
+                connect_args["server_settings"] = session_settings
+            elif session_settings:
+                connect_args["options"] = " ".join(f"-c {k}={v}" for k, v in session_settings.items())
+        elif backend == "mysql" and settings.DB_STATEMENT_TIMEOUT_MS > 0:
+            connect_args["init_command"] = f"SET SESSION max_execution_time={settings.DB_STATEMENT_TIMEOUT_MS}"
+
+    kwargs["connect_args"] = connect_args
+    return kwargs
+
+
+def _install_sqlite_pragmas(engine: Engine) -> None:
+    pragmas = _sqlite_pragmas()
+
+    @event.listens_for(engine, "connect")
+    def _apply_sqlite_pragmas(dbapi_connection, connection_record) -> None:
+        cursor = dbapi_connection.cursor()
+        try:
+            for pragma in pragmas:
+                cursor.execute(pragma)
+        finally:
+            cursor.close()
+
+
+def create_db_engine(database_url: str, *, tuned: bool = True, **overrides: Any) -> Engine:
+    """Build an engine with the profile that fits ``database_url``.
+
+    SQLite gets WAL journaling, ``synchronous=NORMAL``, a busy timeout and a
+    larger page cache and mmap window on every connection, so readers no
+    longer block on the writer and writers wait instead of failing with
+    "database is locked". Server databases get a sized, pre-pinged, recycled
+    pool and per-session statement timeouts. ``tuned=False`` returns the
+    plain default engine (used by the benchmark for comparison).
+    """
+
+    url = make_url(database_url)
+    kwargs = _engine_options(url, tuned=tuned)
+    kwargs["connect_args"].update(overrides.pop("connect_args", {}))
+    kwargs.update(overrides)
+    engine = create_engine(url, future=True, **kwargs)
+    if url.get_backend_name() == "sqlite" and tuned and not _is_memory_sqlite(url):
+        _install_sqlite_pragmas(engine)
+    return engine
+
+
+# Driver used by the async engine when DATABASE_URL names a sync one.
+_ASYNC_DRIVERS = {"sqlite": "aiosqlite", "postgresql": "asyncpg", "mysql": "aiomysql"}
+_ASYNC_DRIVER_NAMES = {"aiosqlite", "asyncpg", "psycopg", "aiomysql", "asyncmy"}
+
+
+def async_database_url(database_url: str) -> URL:
+    """``database_url`` with an asyncio driver, e.g. sqlite:// -> sqlite+aiosqlite://."""
+
+    url = make_url(database_url)
+    if url.get_driver_name() in _ASYNC_DRIVER_NAMES:
+        return url
+    backend = url.get_backend_name()
+    if backend not in _ASYNC_DRIVERS:
+        raise ValueError(f"No async driver known for {backend!r}; set ASYNC_DATABASE_URL")
+    return url.set(drivername=f"{backend}+{_ASYNC_DRIVERS[backend]}")
+
+
+def create_async_db_engine(database_url: str, *, tuned: bool = True) -> AsyncEngine:
+    """The asyncio counterpart of :func:`create_db_engine`, with the same profile."""
+
+    url = async_database_url(database_url)
+    engine = create_async_engine(url, **_engine_options(url, tuned=tuned))
+    if url.get_backend_name() == "sqlite" and tuned and not _is_memory_sqlite(url):
+        _install_sqlite_pragmas(engine.sync_engine)
+    return engine
+
+
+engine = create_db_engine(settings.DATABASE_URL)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine, future=True)
 
 
@@ -16,3 +141,34 @@ def get_db():
         yield db
     finally:
         db.close()
+
+
+_async_lock = threading.Lock()
+_async_engine: AsyncEngine | None = None
+_async_sessionmaker: async_sessionmaker[AsyncSession] | None = None
+
+
+def get_async_sessionmaker() -> async_sessionmaker[AsyncSession]:
+    # Built on first use so importing the app does not require the async driver.
+    global _async_engine, _async_sessionmaker
+    with _async_lock:
+        if _async_sessionmaker is None:
+            _async_engine = create_async_db_engine(settings.ASYNC_DATABASE_URL or settings.DATABASE_URL)
+            # Objects stay readable after commit: lazy refreshes are not possible outside an await.
+            _async_sessionmaker = async_sessionmaker(_async_engine, autoflush=False, expire_on_commit=False)
+        return _async_sessionmaker
+
+
+async def get_async_db() -> AsyncIterator[AsyncSession]:
+    async with get_async_sessionmaker()() as db:
+        yield db
+
+
+async def dispose_async_engine() -> None:
+    global _async_engine, _async_sessionmaker
+    with _async_lock:
+        async_engine = _async_engine
+        _async_engine = None
+        _async_sessionmaker = None
+    if async_engine is not None:
+        await async_engine.dispose()
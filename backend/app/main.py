@@ -1,14 +1,35 @@
 from __future__ import annotations
 
+import asyncio
+import hmac
 import os
 
-from fastapi import FastAPI, Request
-from fastapi.responses import Response
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import JSONResponse, Response
 
 from app.api.api_v1 import api_router
 from app.core.config import settings
-from app.db.base import Base
-from app.db.session import engine
+from app.core.metrics import install_db_metrics, mark_worker_exit, render_metrics
+from app.core.middleware import (
+    CompressionMiddleware,
+    CORSMiddleware,
+    MetricsMiddleware,
+    SlowRequestMiddleware,
+    TracingMiddleware,
+)
+from app.core.profiling import start_profiling, stop_profiling
+from app.core.tracing import start_tracing, stop_tracing, tracing_enabled
+from app.db.migrations import upgrade_schema
+from app.db.session import dispose_async_engine, engine
+from app.services.admin_jobs import admin_job_sweep_loop, resume_admin_jobs, shutdown_admin_jobs
+from app.services.auth_cache import start_auth_cache_listener, stop_auth_cache_listener
+from app.services.passwords import shutdown_password_hasher
+from app.services.rate_limit import check_rate_limit_settings
+from app.services.render_queue import shutdown_render_queue
+from app.services.result_codec import check_result_codec_settings
+from app.services.scan_jobs import start_scan_job_worker, stop_scan_job_worker
+from app.services.upload_gc import upload_gc_loop
+from app.services.warmup import get_warmup_status, is_ready, start_warmup
 
 import app.models
 
@@ -16,37 +37,77 @@ import app.models
 def create_app() -> FastAPI:
     app = FastAPI(title=settings.PROJECT_NAME)
 
-    @app.middleware("http")
-    async def cors_middleware(request: Request, call_next):
-        if request.method == "OPTIONS":
-            response = Response(status_code=200)
-        else:
-            response = await call_next(request)
-
-        origin = request.headers.get("origin")
-        if origin:
-            response.headers["Access-Control-Allow-Origin"] = origin
-        else:
-            response.headers["Access-Control-Allow-Origin"] = "*"
-
-        response.headers["Access-Control-Allow-Methods"] = "GET, POST, PUT, PATCH, DELETE, OPTIONS"
-        request_headers = request.headers.get("Access-Control-Request-Headers")
-        if request_headers:
-            response.headers["Access-Control-Allow-Headers"] = request_headers
-        else:
-            response.headers["Access-Control-Allow-Headers"] = "*"
-
-        response.headers["Access-Control-Allow-Credentials"] = "false"
-        return response
+    # Last added runs first, so requests pass Metrics -> Tracing -> SlowRequest
+    # -> CORS -> Compression, and preflights answered by CORS are still measured
+    # and traced.
+    app.add_middleware(CompressionMiddleware)
+    app.add_middleware(CORSMiddleware)
+    if settings.METRICS_ENABLED or settings.PROFILING_ENABLED:
+        install_db_metrics()
+    if settings.PROFILING_ENABLED:
+        app.add_middleware(SlowRequestMiddleware)
+    if tracing_enabled():
+        app.add_middleware(TracingMiddleware)
+    if settings.METRICS_ENABLED:
+        app.add_middleware(MetricsMiddleware)
 
     @app.get("/health")
     def health() -> dict:
         return {"status": "ok"}
 
+    # /health is liveness; /ready tells a load balancer when to send traffic.
+    @app.get("/ready")
+    def ready() -> Response:
+        status = get_warmup_status()
+        if not is_ready():
+            return JSONResponse(status_code=503, content=status, headers={"Retry-After": "1"})
+        return JSONResponse(content=status)
+
+    @app.get("/metrics", include_in_schema=False)
+    def metrics(request: Request) -> Response:
+        if not settings.METRICS_ENABLED:
+            raise HTTPException(status_code=404, detail="Not Found")
+        if settings.METRICS_TOKEN:
+            expected = f"Bearer {settings.METRICS_TOKEN}"
+            if not hmac.compare_digest(request.headers.get("authorization", ""), expected):
+                raise HTTPException(status_code=401, detail="Not authenticated")
+        body, content_type = render_metrics()
+        return Response(content=body, media_type=content_type)
+
     @app.on_event("startup")
     def on_startup() -> None:
         os.makedirs(settings.UPLOAD_DIR, exist_ok=True)
-        Base.metadata.create_all(bind=engine)
+        upgrade_schema(engine)
+        check_rate_limit_settings()
+        check_result_codec_settings(engine.dialect.name)
+        start_tracing()
+
+    @app.on_event("startup")
+    async def start_background_tasks() -> None:
+        app.state.background_tasks = []
+        if settings.UPLOAD_GC_INTERVAL_SECONDS > 0:
+            app.state.background_tasks.append(asyncio.create_task(upload_gc_loop()))
+        if settings.ADMIN_JOB_SWEEP_SECONDS > 0:
+            app.state.background_tasks.append(asyncio.create_task(admin_job_sweep_loop()))
+        start_scan_job_worker()
+        resume_admin_jobs()
+        start_auth_cache_listener()
+        start_profiling()
+        start_warmup()
+
+    @app.on_event("shutdown")
+    async def stop_background_tasks() -> None:
+        for task in getattr(app.state, "background_tasks", []):
+            task.cancel()
+        stop_scan_job_worker()
+        shutdown_admin_jobs()
+        shutdown_render_queue()
+        shutdown_password_hasher()
+        stop_auth_cache_listener()
+        stop_profiling()
+        stop_tracing()
+        mark_worker_exit()
+        await dispose_async_engine()
 
     app.include_router(api_router, prefix=settings.API_V1_STR)
 
@@ -1,7 +1,12 @@
 from __future__ import annotations
 
+from app.models.admin_job import AdminJob
+from app.models.blob import Blob
 from app.models.contact_message import ContactMessage
+from app.models.rollup import ScanDailyStat, StatCounter
 from app.models.scan import Scan
+from app.models.scan_job import ScanJob
+from app.models.schema_version import SchemaVersion
 from app.models.user import User
 
-__all__ = ["User", "ContactMessage", "Scan"]
+__all__ = ["User", "ContactMessage", "Scan", "Blob", "SchemaVersion", "ScanJob", "StatCounter", "ScanDailyStat", "AdminJob"]
@@ -0,0 +1,40 @@
+from __future__ import annotations
+
+from datetime import datetime, timezone
+from typing import Optional
+
+from sqlalchemy import DateTime, Integer, String, Text
+from sqlalchemy.orm import Mapped, mapped_column
+
+from app.db.base import Base
+
+
+class AdminJob(Base):
+    """A bulk admin operation (delete scans, delete users, (de)activate users) run in the background."""
+
+    __tablename__ = "admin_jobs"
+
+    id: Mapped[str] = mapped_column(String(32), primary_key=True)
+    kind: Mapped[str] = mapped_column(String(40), nullable=False)
+    # queued -> running -> succeeded | failed; running jobs with an expired lease are requeued.
+    status: Mapped[str] = mapped_column(String(20), default="queued", nullable=False, index=True)
+    params_json: Mapped[str] = mapped_column(Text, nullable=False)
+    # Not a foreign key: the job record outlives the admin account that started it.
+    created_by: Mapped[int] = mapped_column(Integer, nullable=False)
+    total: Mapped[Optional[int]] = mapped_column(Integer, nullable=True)
+    processed: Mapped[int] = mapped_column(Integer, default=0, nullable=False)
+    files_released: Mapped[int] = mapped_column(Integer, default=0, nullable=False)
+    error: Mapped[Optional[str]] = mapped_column(Text, nullable=True)
+    claimed_by: Mapped[Optional[str]] = mapped_column(String(120), nullable=True)
+    heartbeat_at: Mapped[Optional[datetime]] = mapped_column(DateTime(timezone=True), nullable=True)
+    created_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True),
+        default=lambda: datetime.now(timezone.utc),
+        nullable=False,
+    )
+    updated_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True),
+        default=lambda: datetime.now(timezone.utc),
+        nullable=False,
+    )
+    finished_at: Mapped[Optional[datetime]] = mapped_column(DateTime(timezone=True), nullable=True)
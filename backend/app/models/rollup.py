@@ -0,0 +1,27 @@
+from __future__ import annotations
+
+from datetime import date
+
+from sqlalchemy import BigInteger, Date, Integer, String
+from sqlalchemy.orm import Mapped, mapped_column
+
+from app.db.base import Base
+
+
+class StatCounter(Base):
+    """Running totals for the admin overview, keyed by name (``users_total``, ``scans:dashboard``, ...)."""
+
+    __tablename__ = "stat_counters"
+
+    name: Mapped[str] = mapped_column(String(64), primary_key=True)
+    value: Mapped[int] = mapped_column(BigInteger, default=0, nullable=False)
+
+
+class ScanDailyStat(Base):
+    """Number of scans created per UTC day and scan type."""
+
+    __tablename__ = "scan_daily_stats"
+
+    day: Mapped[date] = mapped_column(Date, primary_key=True)
+    scan_type: Mapped[str] = mapped_column(String(32), primary_key=True)
+    count: Mapped[int] = mapped_column(Integer, default=0, nullable=False)
@@ -1,8 +1,10 @@
 from __future__ import annotations
 
-from datetime import datetime, timezone
+from datetime import date, datetime, timezone
+from typing import Any, Optional
 
-from sqlalchemy import DateTime, ForeignKey, Integer, String, Text
+from sqlalchemy import JSON, Date, DateTime, ForeignKey, Index, Integer, LargeBinary, String, Text
+from sqlalchemy.dialects.postgresql import JSONB
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
 from app.db.base import Base
@@ -10,15 +12,35 @@ from app.db.base import Base
 
 class Scan(Base):
     __tablename__ = "scans"
+    __table_args__ = (Index("ix_scans_created_date_scan_type", "created_date", "scan_type"),)
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True)
     user_id: Mapped[int] = mapped_column(ForeignKey("users.id"), nullable=False, index=True)
-    image_filename: Mapped[str] = mapped_column(String(255), nullable=False)
+    image_filename: Mapped[str] = mapped_column(String(255), nullable=False, index=True)
+    # The result is stored in one of result_json / result_data / result_doc, depending
+    # on the codec it was written with; read it through app.services.result_codec.
     result_json: Mapped[str] = mapped_column(Text, nullable=False)
+    result_data: Mapped[Optional[bytes]] = mapped_column(LargeBinary, nullable=True)
+    result_doc: Mapped[Optional[Any]] = mapped_column(JSON(none_as_null=True).with_variant(JSONB(none_as_null=True), "postgresql"), nullable=True)
+    # "complete" for finished scans; "pending" / "failed" for scans created through a ScanJob.
+    status: Mapped[str] = mapped_column(
+        String(20), default="complete", server_default="complete", nullable=False
+    )
     created_at: Mapped[datetime] = mapped_column(
         DateTime(timezone=True),
         default=lambda: datetime.now(timezone.utc),
         nullable=False,
     )
 
+    # Denormalized from result_json when the result is written, so analytics can
+    # filter and aggregate in SQL without parsing JSON.
+    scan_type: Mapped[str] = mapped_column(
+        String(32), default="other", server_default="other", nullable=False, index=True
+    )
+    health_percent: Mapped[Optional[int]] = mapped_column(Integer, nullable=True)
+    overall_yield_index: Mapped[Optional[int]] = mapped_column(Integer, nullable=True)
+    location: Mapped[Optional[str]] = mapped_column(String(120), nullable=True, index=True)
+    disease_category: Mapped[Optional[str]] = mapped_column(String(32), nullable=True)
+    created_date: Mapped[Optional[date]] = mapped_column(Date, nullable=True, index=True)
+
     user = relationship("User")
@@ -1,15 +1,17 @@
 from __future__ import annotations
 
 from app.schemas.contact import ContactCreate, ContactOut
-from app.schemas.scan import ScanOut
-from app.schemas.token import Token
+from app.schemas.scan import ScanJobOut, ScanOut
+from app.schemas.token import StreamTicket, Token
 from app.schemas.user import UserCreate, UserOut
 
 __all__ = [
     "Token",
+    "StreamTicket",
     "UserCreate",
     "UserOut",
     "ContactCreate",
     "ContactOut",
     "ScanOut",
+    "ScanJobOut",
 ]
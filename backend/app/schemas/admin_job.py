@@ -0,0 +1,64 @@
+from __future__ import annotations
+
+from datetime import date, datetime
+
+from pydantic import BaseModel, Field, model_validator
+
+
+class ScanFilter(BaseModel):
+    user_id: int | None = None
+    scan_type: str | None = Field(None, max_length=32)
+    status: str | None = Field(None, max_length=20)
+    start: date | None = None
+    end: date | None = None
+
+
+class UserFilter(BaseModel):
+    is_active: bool | None = None
+    created_before: datetime | None = None
+    email_domain: str | None = Field(None, max_length=255)
+
+
+class BulkScanSelection(BaseModel):
+    """Scans to act on: explicit ``ids``, a ``filter``, or both (the intersection)."""
+
+    ids: list[int] | None = Field(None, max_length=100_000)
+    filter: ScanFilter | None = None
+
+    @model_validator(mode="after")
+    def _require_criteria(self):
+        if not self.ids and not (self.filter and self.filter.model_dump(exclude_none=True)):
+            raise ValueError("Provide ids or at least one filter field")
+        return self
+
+
+class BulkUserSelection(BaseModel):
+    """Users to act on: explicit ``ids``, a ``filter``, or both (the intersection)."""
+
+    ids: list[int] | None = Field(None, max_length=100_000)
+    filter: UserFilter | None = None
+
+    @model_validator(mode="after")
+    def _require_criteria(self):
+        if not self.ids and not (self.filter and self.filter.model_dump(exclude_none=True)):
+            raise ValueError("Provide ids or at least one filter field")
+        return self
+
+
+class BulkUserActiveRequest(BulkUserSelection):
+    is_active: bool
+
+
+class AdminJobOut(BaseModel):
+    id: str
+    kind: str
+    status: str
+    total: int | None = None
+    processed: int
+    progress: int
+    files_released: int
+    error: str | None = None
+    status_url: str
+    created_at: datetime
+    updated_at: datetime
+    finished_at: datetime | None = None
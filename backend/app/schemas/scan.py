@@ -9,7 +9,9 @@ class ScanOut(BaseModel):
     id: int
     image_filename: str
     image_url: str
+    original_image_url: str | None = None
     result: dict
+    status: str = "complete"
     created_at: datetime
 
 
@@ -18,5 +20,20 @@ class AdminScanOut(BaseModel):
     user_id: int
     image_filename: str
     image_url: str
+    original_image_url: str | None = None
     result: dict
     created_at: datetime
+
+
+class ScanJobOut(BaseModel):
+    id: str
+    scan_id: int
+    status: str
+    stage: str
+    progress: int
+    attempts: int
+    error: str | None = None
+    status_url: str
+    created_at: datetime
+    updated_at: datetime
+    scan: ScanOut | None = None
@@ -6,3 +6,9 @@ from pydantic import BaseModel
 class Token(BaseModel):
     access_token: str
     token_type: str = "bearer"
+
+
+class StreamTicket(BaseModel):
+    ticket: str
+    expires_in: int
+    url: str
@@ -0,0 +1,340 @@
+"""Pre-fork production server.
+
+    cd backend
+    SERVE_WORKERS=4 RATE_LIMIT_REDIS_URL=redis://... python -m app.serve
+
+The parent process imports the app, brings the schema up to date and runs
+the warm-up (app/services/warmup.py, which loads the local model) once,
+then forks SERVE_WORKERS uvicorn workers that share one listening socket.
+Model weights and everything else imported before the fork are shared
+copy-on-write (``gc.freeze`` keeps the collector from touching, and so
+copying, those pages). Each worker's torch/BLAS/OpenCV thread pools are
+capped so N workers do not each start one thread per core.
+
+The parent replaces workers that exit, recycles them by request count or age
+one at a time (the replacement is started before the old worker is told to
+drain), and on SIGHUP recycles every worker the same way. SIGTERM/SIGINT
+drain all workers and exit. POSIX only; use uvicorn directly elsewhere.
+
+Several workers do not share in-process state. Rate limits and quotas must
+then live in Redis, so startup refuses SERVE_WORKERS > 1 with in-memory rate
+limiting. Scan events (GET /scans/events) reach only the streams of the
+worker that published them, including progress from its scan-job
+dispatcher. The profiler and admission limits are per worker, and without
+AUTH_CACHE_REDIS_URL so are auth-cache invalidations (bounded by the TTL).
+"""
+
+from __future__ import annotations
+
+import gc
+import glob
+import logging
+import os
+import random
+import shutil
+import signal
+import socket
+import sys
+import tempfile
+import threading
+import time
+from dataclasses import dataclass
+
+from app.core.config import settings
+
+logger = logging.getLogger("app.serve")
+
+# Read by OpenMP, MKL, OpenBLAS, numexpr and Accelerate when they first start.
+_THREAD_ENV = (
+    "OMP_NUM_THREADS",
+    "MKL_NUM_THREADS",
+    "OPENBLAS_NUM_THREADS",
+    "NUMEXPR_NUM_THREADS",
+    "VECLIB_MAXIMUM_THREADS",
+)
+
+
+@dataclass
+class Worker:
+    pid: int
+    started: float
+    max_age: float
+    retiring_since: float | None = None
+
+
+def _threads_per_worker(workers: int) -> int:
+    if settings.SERVE_THREADS_PER_WORKER > 0:
+        return settings.SERVE_THREADS_PER_WORKER
+    return max(1, (os.cpu_count() or 1) // max(1, workers))
+
+
+def _pin_threads(threads: int) -> None:
+    # The environment covers pools started from now on; these already exist.
+    torch = sys.modules.get("torch")
+    if torch is not None:
+        torch.set_num_threads(threads)
+    cv2 = sys.modules.get("cv2")
+    if cv2 is not None:
+        cv2.setNumThreads(threads)
+
+
+def _prepare_multiproc_dir(workers: int) -> str | None:
+    """Point prometheus-client at a directory shared by the workers; returns one we created."""
+
+    current = os.environ.get("PROMETHEUS_MULTIPROC_DIR")
+    if current:
+        os.makedirs(current, exist_ok=True)
+        # Files left by a previous run would be added to this run's counters.
+        for path in glob.glob(os.path.join(current, "*.db")):
+            os.remove(path)
+        return None
+    if workers <= 1:
+        return None
+    created = tempfile.mkdtemp(prefix="agridronescan-metrics-")
+    os.environ["PROMETHEUS_MULTIPROC_DIR"] = created
+    return created
+
+
+def _drain_threads(timeout: float) -> None:
+    deadline = time.monotonic() + timeout
+    me = threading.current_thread()
+    for thread in threading.enumerate():
+        if thread is me or thread.daemon:
+            continue
+        thread.join(max(0.0, deadline - time.monotonic()))
+    left = [t.name for t in threading.enumerate() if t is not me and not t.daemon and t.is_alive()]
+    if left:
+        logger.warning("worker %d exiting with threads still running: %s", os.getpid(), ", ".join(left))
+
+
+def _kill_after() -> float:
+    # Uvicorn's graceful shutdown, then the thread drain, then a margin.
+    return 2 * settings.SERVE_GRACEFUL_TIMEOUT_SECONDS + 5
+
+
+def _check_workers(workers: int) -> None:
+    if workers <= 1:
+        return
+    if settings.RATE_LIMIT_ENABLED and not settings.RATE_LIMIT_REDIS_URL:
+        raise SystemExit(
+            "SERVE_WORKERS > 1 needs RATE_LIMIT_REDIS_URL (or RATE_LIMIT_ENABLED=false): "
+            "in-memory rate limits and quotas would be multiplied by the number of workers"
+        )
+    logger.warning(
+        "%d workers: scan events only reach streams held by the publishing worker; "
+        "the profiler and admission limits are per worker",
+        workers,
+    )
+    if not settings.AUTH_CACHE_REDIS_URL and settings.AUTH_CACHE_TTL_SECONDS > 0:
+        logger.warning("without AUTH_CACHE_REDIS_URL, other workers see user changes within AUTH_CACHE_TTL_SECONDS")
+
+
+def _bind(host: str, port: int) -> socket.socket:
+    family = socket.AF_INET6 if ":" in host else socket.AF_INET
+    sock = socket.socket(family, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(2048)
+    sock.set_inheritable(True)
+    return sock
+
+
+class Arbiter:
+    def __init__(self, app, sock: socket.socket, workers: int, threads: int) -> None:
+        self.app = app
+        self.sock = sock
+        self.size = max(1, workers)
+        self.threads = threads
+        self.workers: dict[int, Worker] = {}
+        self.stopping = False
+        self.recycle_all = False
+        self._due: set[int] = set()
+        self._recent_crashes: list[float] = []
+
+    # Worker side.
+
+    def _run_worker(self) -> None:
+        import uvicorn
+
+        for sig in (signal.SIGHUP, signal.SIGTERM, signal.SIGINT, signal.SIGCHLD):
+            signal.signal(sig, signal.SIG_DFL)
+        random.seed()
+        _pin_threads(self.threads)
+        limit = None
+        if settings.SERVE_MAX_REQUESTS > 0:
+            # Jitter, so workers started together are not all recycled together.
+            limit = settings.SERVE_MAX_REQUESTS + random.randint(0, max(0, settings.SERVE_MAX_REQUESTS_JITTER))
+        config = uvicorn.Config(
+            self.app,
+            lifespan="on",
+            limit_max_requests=limit,
+            timeout_graceful_shutdown=int(settings.SERVE_GRACEFUL_TIMEOUT_SECONDS) or None,
+        )
+        uvicorn.Server(config).run(sockets=[self.sock])
+        # The shutdown handlers stop the executors without waiting; let jobs
+        # and renders already running finish before os._exit() cuts them off.
+        _drain_threads(settings.SERVE_GRACEFUL_TIMEOUT_SECONDS)
+
+    def spawn(self) -> None:
+        max_age = settings.SERVE_MAX_WORKER_AGE_SECONDS
+        if max_age > 0:
+            max_age += random.uniform(0, max_age * 0.1)
+        pid = os.fork()
+        if pid == 0:
+            code = 0
+            try:
+                self._run_worker()
+            except BaseException:
+                logger.exception("worker %d crashed", os.getpid())
+                code = 1
+            finally:
+                os._exit(code)
+        self.workers[pid] = Worker(pid=pid, started=time.monotonic(), max_age=max_age)
+        logger.info("started worker %d", pid)
+
+    # Parent side.
+
+    def _reap(self) -> None:
+        from app.core.metrics import mark_worker_exit
+
+        while True:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                return
+            if pid == 0:
+                return
+            worker = self.workers.pop(pid, None)
+            self._due.discard(pid)
+            mark_worker_exit(pid)
+            if worker is None:
+                continue
+            code = os.waitstatus_to_exitcode(status)
+            if worker.retiring_since is None and not self.stopping:
+                logger.info("worker %d exited with %d", pid, code)
+                if code != 0 and time.monotonic() - worker.started < 5:
+                    self._recent_crashes.append(time.monotonic())
+
+    def _retire(self, worker: Worker) -> None:
+        worker.retiring_since = time.monotonic()
+        try:
+            os.kill(worker.pid, signal.SIGTERM)
+        except ProcessLookupError:
+            pass
+
+    def _active(self) -> list[Worker]:
+        return [w for w in self.workers.values() if w.retiring_since is None]
+
+    def _maintain(self) -> None:
+        now = time.monotonic()
+        self._recent_crashes = [t for t in self._recent_crashes if now - t < 30]
+        if len(self._recent_crashes) >= self.size * 2:
+            # Workers die right after starting: do not fork as fast as they crash.
+            time.sleep(1.0)
+
+        if self.recycle_all:
+            self.recycle_all = False
+            self._due.update(w.pid for w in self._active())
+
+        while len(self._active()) < self.size:
+            self.spawn()
+
+        # Recycle one worker at a time, and only with every slot filled, so capacity
+        # never drops by more than the worker being drained.
+        if not any(w.retiring_since is not None for w in self.workers.values()):
+            for worker in sorted(self._active(), key=lambda w: w.started):
+                if worker.pid in self._due or (worker.max_age > 0 and now - worker.started > worker.max_age):
+                    self._due.discard(worker.pid)
+                    logger.info("recycling worker %d", worker.pid)
+                    self.spawn()
+                    self._retire(worker)
+                    break
+
+        for worker in self.workers.values():
+            if worker.retiring_since is not None and now - worker.retiring_since > _kill_after():
+                try:
+                    os.kill(worker.pid, signal.SIGKILL)
+                except ProcessLookupError:
+                    pass
+
+    def _on_stop(self, signum, frame) -> None:
+        self.stopping = True
+
+    def _on_hup(self, signum, frame) -> None:
+        self.recycle_all = True
+
+    def run(self) -> None:
+        signal.signal(signal.SIGTERM, self._on_stop)
+        signal.signal(signal.SIGINT, self._on_stop)
+        signal.signal(signal.SIGHUP, self._on_hup)
+        while not self.stopping:
+            self._reap()
+            if self.stopping:
+                break
+            self._maintain()
+            time.sleep(0.2)
+        self.shutdown()
+
+    def shutdown(self) -> None:
+        logger.info("stopping %d workers", len(self.workers))
+        for worker in self.workers.values():
+            self._retire(worker)
+        deadline = time.monotonic() + _kill_after()
+        while self.workers and time.monotonic() < deadline:
+            self._reap()
+            time.sleep(0.1)
+        for pid in list(self.workers):
+            try:
+                os.kill(pid, signal.SIGKILL)
+            except ProcessLookupError:
+                pass
+        while self.workers:
+            self.workers.pop(os.waitpid(-1, 0)[0], None)
+
+
+def main() -> None:
+    if not hasattr(os, "fork"):
+        raise SystemExit("app.serve needs os.fork; run uvicorn app.main:app on this platform")
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s [serve] %(message)s")
+
+    workers = max(1, settings.SERVE_WORKERS)
+    _check_workers(workers)
+    threads = _threads_per_worker(workers)
+    # Before anything imports torch or numpy, so their pools start at this size.
+    for name in _THREAD_ENV:
+        os.environ[name] = str(threads)
+    created_dir = _prepare_multiproc_dir(workers)
+
+    from app.db.session import engine
+    from app.db.migrations import upgrade_schema
+    from app.main import app
+    from app.services.warmup import run_warmup
+
+    # Once here rather than racing in every worker's startup.
+    upgrade_schema(engine)
+    engine.dispose()
+    # Before forking, so imports and weights are shared; workers only repeat the
+    # inference warm-up, which must not start torch's thread pools in this process.
+    warmup = run_warmup(load_model=settings.SERVE_PRELOAD_MODEL, run_inference=False)
+    logger.info("warm-up finished in %.0f ms: %s", warmup["duration_ms"], warmup["steps"])
+
+    sock = _bind(settings.SERVE_HOST, settings.SERVE_PORT)
+    logger.info(
+        "listening on %s:%d with %d workers, %d threads each",
+        settings.SERVE_HOST,
+        settings.SERVE_PORT,
+        workers,
+        threads,
+    )
+    gc.collect()
+    gc.freeze()
+    try:
+        Arbiter(app, sock, workers, threads).run()
+    finally:
+        sock.close()
+        if created_dir is not None:
+            shutil.rmtree(created_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,255 @@
+from __future__ import annotations
+
+import asyncio
+import json
+import logging
+import random
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from typing import Any, Iterator
+
+from sqlalchemy import and_, func, select
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.crud.admin_job import (
+    claim_admin_job,
+    get_admin_job,
+    list_runnable_admin_job_ids,
+    update_admin_job,
+)
+from app.crud.scan import delete_scans_by_ids
+from app.crud.user import delete_users_by_ids, set_users_active
+from app.db.session import SessionLocal
+from app.models.admin_job import AdminJob
+from app.models.scan import Scan
+from app.models.user import User
+from app.services.scan_events import publish_scan_event
+from app.services.scan_jobs import worker_id
+from app.services.uploads import release_upload
+
+logger = logging.getLogger(__name__)
+
+_lock = threading.Lock()
+_executor: ThreadPoolExecutor | None = None
+# Submitted to this process's executor and not finished yet.
+_pending: set[str] = set()
+
+
+class _LeaseLost(RuntimeError):
+    pass
+
+
+def _scan_conditions(params: dict[str, Any]) -> list:
+    f = params.get("filter") or {}
+    conditions = []
+    if f.get("user_id") is not None:
+        conditions.append(Scan.user_id == f["user_id"])
+    if f.get("scan_type"):
+        conditions.append(Scan.scan_type == f["scan_type"])
+    if f.get("status"):
+        conditions.append(Scan.status == f["status"])
+    if f.get("start"):
+        conditions.append(Scan.created_date >= datetime.fromisoformat(f["start"]).date())
+    if f.get("end"):
+        conditions.append(Scan.created_date <= datetime.fromisoformat(f["end"]).date())
+    return conditions
+
+
+def _user_conditions(params: dict[str, Any]) -> list:
+    f = params.get("filter") or {}
+    # Never let an admin lock themselves out through a bulk operation.
+    conditions = [User.id != params["created_by"]]
+    if f.get("is_active") is not None:
+        conditions.append(User.is_active.is_(bool(f["is_active"])))
+    if f.get("created_before"):
+        conditions.append(User.created_at < datetime.fromisoformat(f["created_before"]))
+    if f.get("email_domain"):
+        domain = str(f["email_domain"]).lower().lstrip("@")
+        conditions.append(func.lower(User.email).like(f"%@{domain}"))
+    return conditions
+
+
+def _count(db: Session, id_col, conditions: list, ids: list[int] | None) -> int:
+    stmt = select(func.count()).select_from(id_col.class_).where(*conditions)
+    if not ids:
+        return int(db.execute(stmt).scalar() or 0)
+    total = 0
+    size = max(1, settings.ADMIN_BULK_CHUNK_SIZE)
+    for i in range(0, len(ids), size):
+        total += int(db.execute(stmt.where(id_col.in_(ids[i : i + size]))).scalar() or 0)
+    return total
+
+
+def _id_batches(db: Session, id_col, conditions: list, ids: list[int] | None) -> Iterator[list[int]]:
+    """Yield matching ids ``ADMIN_BULK_CHUNK_SIZE`` at a time, in id order.
+
+    Keyset pagination (``id > last``) keeps every batch an index range scan,
+    and already-processed rows never need to be skipped over again.
+    """
+
+    size = max(1, settings.ADMIN_BULK_CHUNK_SIZE)
+    if ids:
+        for i in range(0, len(ids), size):
+            chunk = ids[i : i + size]
+            found = db.execute(select(id_col).where(id_col.in_(chunk), *conditions).order_by(id_col)).scalars()
+            batch = list(found)
+            if batch:
+                yield batch
+        return
+
+    last = 0
+    while True:
+        batch = list(
+            db.execute(
+                select(id_col).where(and_(id_col > last, *conditions)).order_by(id_col).limit(size)
+            ).scalars()
+        )
+        if not batch:
+            return
+        yield batch
+        last = batch[-1]
+
+
+def _delete_scan_batch(db: Session, scan_ids: list[int]) -> tuple[int, int]:
+    """Delete the scans; returns how many were deleted and how many uploads that freed."""
+
+    deleted = delete_scans_by_ids(db, scan_ids=scan_ids)
+    released = 0
+    for scan_id, owner_id, filename in deleted:
+        # Deduplicated uploads shared with scans that remain stay on disk.
+        released += release_upload(db, filename)
+        publish_scan_event(owner_id, "scan.deleted", {"scan_id": scan_id})
+    return len(deleted), released
+
+
+def _run(db: Session, job: AdminJob, me: str) -> None:
+    job_id, kind = job.id, job.kind
+    params = json.loads(job.params_json)
+    params["created_by"] = job.created_by
+    ids = sorted(set(params.get("ids") or [])) or None
+    if kind == "delete_scans":
+        id_col, conditions = Scan.id, _scan_conditions(params)
+    else:
+        id_col, conditions = User.id, _user_conditions(params)
+
+    # A resumed job carries on from its earlier progress; only what is left gets counted.
+    processed = job.processed
+    released = job.files_released
+    total = processed + _count(db, id_col, conditions, ids)
+
+    def heartbeat() -> None:
+        if not update_admin_job(
+            db, job_id=job_id, worker_id=me, total=total, processed=processed, files_released=released
+        ):
+            raise _LeaseLost(job_id)
+
+    heartbeat()
+    for batch in _id_batches(db, id_col, conditions, ids):
+        if kind == "delete_scans":
+            n, freed = _delete_scan_batch(db, batch)
+            released += freed
+            processed += n
+        elif kind == "delete_users":
+            for scan_batch in _id_batches(db, Scan.id, [Scan.user_id.in_(batch)], None):
+                released += _delete_scan_batch(db, scan_batch)[1]
+            processed += delete_users_by_ids(db, user_ids=batch)
+        else:
+            set_users_active(db, user_ids=batch, is_active=bool(params["is_active"]))
+            processed += len(batch)
+        heartbeat()
+
+
+def process_admin_job(job_id: str) -> None:
+    me = worker_id()
+    db = SessionLocal()
+    try:
+        if not claim_admin_job(db, job_id=job_id, worker_id=me, lease_seconds=settings.ADMIN_JOB_LEASE_SECONDS):
+            return
+        job = get_admin_job(db, job_id=job_id)
+        if job is None:
+            return
+        try:
+            _run(db, job, me)
+        except _LeaseLost:
+            logger.warning("admin job %s lost its lease", job_id)
+            return
+        except Exception as e:
+            db.rollback()
+            logger.exception("admin job %s failed", job_id)
+            update_admin_job(
+                db, job_id=job_id, worker_id=me, status="failed", error=str(e), finished_at=datetime.now(timezone.utc)
+            )
+            return
+        update_admin_job(db, job_id=job_id, worker_id=me, status="succeeded", finished_at=datetime.now(timezone.utc))
+    finally:
+        db.close()
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    with _lock:
+        if _executor is None:
+            # One at a time: bulk jobs are write-heavy and should not compete with each other.
+            _executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="admin-job")
+        return _executor
+
+
+def _run_pending(job_id: str) -> None:
+    try:
+        process_admin_job(job_id)
+    finally:
+        with _lock:
+            _pending.discard(job_id)
+
+
+def submit_admin_job(job_id: str) -> None:
+    with _lock:
+        if job_id in _pending:
+            return
+        _pending.add(job_id)
+    try:
+        _get_executor().submit(_run_pending, job_id)
+    except RuntimeError:
+        # Shutting down; the job is picked up by the next sweep anywhere.
+        with _lock:
+            _pending.discard(job_id)
+
+
+def resume_admin_jobs() -> None:
+    """Pick up jobs that are queued, or whose runner died and let its lease expire."""
+
+    db = SessionLocal()
+    try:
+        job_ids = list_runnable_admin_job_ids(db, lease_seconds=settings.ADMIN_JOB_LEASE_SECONDS)
+    finally:
+        db.close()
+    for job_id in job_ids:
+        submit_admin_job(job_id)
+
+
+def shutdown_admin_jobs() -> None:
+    global _executor
+    with _lock:
+        executor = _executor
+        _executor = None
+    if executor is not None:
+        # A job cut short keeps its lease; admin_job_sweep_loop() in some process
+        # resumes it once the lease expires.
+        executor.shutdown(wait=False, cancel_futures=True)
+
+
+async def admin_job_sweep_loop() -> None:
+    """Periodically resume admin jobs abandoned by workers that exited or were recycled."""
+
+    interval = settings.ADMIN_JOB_SWEEP_SECONDS
+    await asyncio.sleep(random.uniform(0.1, 1.0) * interval)
+    while True:
+        try:
+            await asyncio.to_thread(resume_admin_jobs)
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            logger.exception("admin job sweep failed")
+        await asyncio.sleep(interval)
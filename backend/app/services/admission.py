@@ -0,0 +1,219 @@
+from __future__ import annotations
+
+import asyncio
+import math
+import threading
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from typing import Any, AsyncIterator
+
+from app.core.config import settings
+from app.core.metrics import ADMISSION_DECISIONS, ADMISSION_LIMIT, ADMISSION_QUEUE_DEPTH
+
+# Admission control for the inference routes. Without it every call is
+# accepted and they all slow down together until the upstream timeout; with
+# it at most `limit` run at once, a bounded number wait their turn, and the
+# rest are turned away at once with a Retry-After hint.
+#
+# The limit adapts to observed latency (additive increase, multiplicative
+# decrease): a call slower than ADMISSION_TARGET_LATENCY_SECONDS cuts it by a
+# tenth, at most once per target period, and fast calls made while every slot
+# was busy raise it by about one per `limit` calls.
+#
+# State is per process and is only changed from the event loop; the lock
+# keeps get_admission_metrics() consistent when read from a worker thread.
+
+_DECREASE_FACTOR = 0.9
+_MAX_RETRY_AFTER = 60
+
+
+class Overloaded(RuntimeError):
+    def __init__(self, reason: str, retry_after: float) -> None:
+        super().__init__(reason)
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+@dataclass
+class Ticket:
+    started: float
+    waited: float
+    # Skip optional work for this call.
+    degraded: bool
+
+
+class _Limiter:
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._waiters: deque[asyncio.Future] = deque()
+        self.in_flight = 0
+        self.limit = float(max(1, settings.ADMISSION_MAX_CONCURRENCY))
+        self.latency_ewma = 0.0
+        self._last_decrease = 0.0
+        self._last_shed = -math.inf
+        self.counts = {"admitted": 0, "degraded": 0, "queued": 0, "queue_full": 0, "queue_timeout": 0}
+        ADMISSION_LIMIT.set(self.limit)
+
+    @property
+    def capacity(self) -> int:
+        return max(1, int(self.limit))
+
+    def degraded(self, now: float) -> bool:
+        return bool(self._waiters) or now - self._last_shed < settings.ADMISSION_DEGRADED_HOLD_SECONDS
+
+    def retry_after(self) -> float:
+        # Roughly how long the calls ahead of a new one would take to drain.
+        per_call = self.latency_ewma or settings.ADMISSION_TARGET_LATENCY_SECONDS or 1.0
+        ahead = len(self._waiters) + 1
+        return min(_MAX_RETRY_AFTER, max(1.0, per_call * ahead / self.capacity))
+
+    def _shed(self, reason: str, now: float) -> Overloaded:
+        self._last_shed = now
+        self.counts[reason] += 1
+        ADMISSION_DECISIONS.labels(outcome=reason).inc()
+        return Overloaded(reason, self.retry_after())
+
+    def _grant(self, now: float, waited: float) -> Ticket:
+        self.in_flight += 1
+        degraded = self.degraded(now)
+        outcome = "degraded" if degraded else "admitted"
+        self.counts[outcome] += 1
+        ADMISSION_DECISIONS.labels(outcome=outcome).inc()
+        return Ticket(started=now, waited=waited, degraded=degraded)
+
+    async def acquire(self) -> Ticket:
+        now = time.monotonic()
+        with self._lock:
+            if self.in_flight < self.capacity and not self._waiters:
+                return self._grant(now, 0.0)
+            if len(self._waiters) >= settings.ADMISSION_MAX_QUEUE:
+                raise self._shed("queue_full", now)
+            future = asyncio.get_running_loop().create_future()
+            self._waiters.append(future)
+            self.counts["queued"] += 1
+            ADMISSION_QUEUE_DEPTH.set(len(self._waiters))
+
+        try:
+            await asyncio.wait_for(future, settings.ADMISSION_QUEUE_TIMEOUT_SECONDS)
+        except BaseException as e:
+            with self._lock:
+                if future.done() and not future.cancelled():
+                    # Granted just as we gave up: hand the slot on.
+                    self._release_slot()
+                else:
+                    self._discard(future)
+                if isinstance(e, asyncio.TimeoutError):
+                    raise self._shed("queue_timeout", time.monotonic()) from None
+            raise
+        # _release_slot() already counted this call in in_flight.
+        granted = time.monotonic()
+        with self._lock:
+            self.in_flight -= 1
+            return self._grant(granted, granted - now)
+
+    def _discard(self, future: asyncio.Future) -> None:
+        try:
+            self._waiters.remove(future)
+        except ValueError:
+            pass
+        ADMISSION_QUEUE_DEPTH.set(len(self._waiters))
+
+    def _release_slot(self) -> None:
+        self.in_flight -= 1
+        while self._waiters and self.in_flight < self.capacity:
+            future = self._waiters.popleft()
+            if future.done():
+                continue
+            self.in_flight += 1
+            future.set_result(None)
+        ADMISSION_QUEUE_DEPTH.set(len(self._waiters))
+
+    def _adapt(self, latency: float, saturated: bool, now: float) -> None:
+        self.latency_ewma = latency if self.latency_ewma == 0 else 0.8 * self.latency_ewma + 0.2 * latency
+        target = settings.ADMISSION_TARGET_LATENCY_SECONDS
+        if target <= 0:
+            return
+        lowest = float(max(1, settings.ADMISSION_MIN_CONCURRENCY))
+        highest = float(max(lowest, settings.ADMISSION_MAX_CONCURRENCY))
+        if latency > target:
+            if now - self._last_decrease >= target:
+                self.limit = max(lowest, self.limit * _DECREASE_FACTOR)
+                self._last_decrease = now
+        elif saturated:
+            self.limit = min(highest, self.limit + 1.0 / self.limit)
+        ADMISSION_LIMIT.set(self.limit)
+
+    def release(self, ticket: Ticket) -> None:
+        now = time.monotonic()
+        with self._lock:
+            saturated = self.in_flight >= self.capacity or bool(self._waiters)
+            self._adapt(now - ticket.started, saturated, now)
+            self._release_slot()
+
+    def snapshot(self) -> dict[str, Any]:
+        with self._lock:
+            return {
+                "limit": round(self.limit, 2),
+                "capacity": self.capacity,
+                "in_flight": self.in_flight,
+                "queued": len(self._waiters),
+                "latency_ewma_seconds": round(self.latency_ewma, 3),
+                "degraded": self.degraded(time.monotonic()),
+                "counts": dict(self.counts),
+            }
+
+
+_limiter: _Limiter | None = None
+_limiter_lock = threading.Lock()
+
+
+def _get_limiter() -> _Limiter:
+    # Built on first use, in the worker that serves requests, so importing this
+    # module (e.g. in the app.serve parent) leaves the limit gauge untouched.
+    global _limiter
+    with _limiter_lock:
+        if _limiter is None:
+            _limiter = _Limiter()
+        return _limiter
+
+
+@asynccontextmanager
+async def admit() -> AsyncIterator[Ticket]:
+    """Hold an inference slot for the body of the block; raises Overloaded if none is free in time."""
+
+    if not settings.ADMISSION_ENABLED:
+        yield Ticket(started=time.monotonic(), waited=0.0, degraded=False)
+        return
+    limiter = _get_limiter()
+    ticket = await limiter.acquire()
+    try:
+        yield ticket
+    finally:
+        limiter.release(ticket)
+
+
+def is_degraded() -> bool:
+    """True while inference is backed up, for work outside the admitted routes (e.g. scan jobs)."""
+
+    if not settings.ADMISSION_ENABLED:
+        return False
+    limiter = _get_limiter()
+    with limiter._lock:
+        return limiter.degraded(time.monotonic())
+
+
+def retry_after_header(error: Overloaded) -> str:
+    return str(max(1, math.ceil(error.retry_after)))
+
+
+def get_admission_metrics() -> dict[str, Any]:
+    return {
+        "enabled": settings.ADMISSION_ENABLED,
+        "max_concurrency": settings.ADMISSION_MAX_CONCURRENCY,
+        "min_concurrency": settings.ADMISSION_MIN_CONCURRENCY,
+        "max_queue": settings.ADMISSION_MAX_QUEUE,
+        "target_latency_seconds": settings.ADMISSION_TARGET_LATENCY_SECONDS,
+        **_get_limiter().snapshot(),
+    }
@@ -4,10 +4,13 @@ import base64
 import json
 import mimetypes
 import os
+import threading
 from functools import lru_cache
 from typing import Any
 
 from app.core.config import settings
+from app.core.metrics import INFERENCE_DURATION, RENDER_DURATION, timed
+from app.core.tracing import inject
 
 
 class ModelNotAvailableError(RuntimeError):
@@ -236,8 +239,18 @@ def _require_httpx():
     return httpx
 
 
-@lru_cache(maxsize=1)
+# Serialises the first load: the startup warm-up and an early request would
+# otherwise both load the weights.
+_model_lock = threading.Lock()
+
+
 def _get_yolo_model():
+    with _model_lock:
+        return _load_yolo_model()
+
+
+@lru_cache(maxsize=1)
+def _load_yolo_model():
     try:
         from ultralytics import YOLO  # type: ignore
     except Exception as e:  # pragma: no cover
@@ -252,6 +265,28 @@ def _get_yolo_model():
     return YOLO(model_path)
 
 
+def preload_model(*, run_inference: bool = False) -> bool:
+    """Load the local model now, e.g. in the serving parent before workers fork.
+
+    False when inference is remote or the model cannot be loaded; workers then
+    behave as before and report the problem on first use. ``run_inference`` also
+    predicts on a blank image, so the first real request does not pay for the
+    framework's lazy setup.
+    """
+
+    if _remote_base_url():
+        return False
+    try:
+        model = _get_yolo_model()
+    except ModelNotAvailableError:
+        return False
+    if run_inference:
+        from PIL import Image
+
+        model.predict(source=Image.new("RGB", (64, 64)), verbose=False)
+    return True
+
+
 def model_status() -> dict[str, Any]:
     base_url = _remote_base_url()
     if base_url:
@@ -338,7 +373,7 @@ def _encode_image_b64(image_path: str) -> str | None:
         return None
 
 
-def predict_image(image_path: str) -> dict[str, Any]:
+def predict_image(image_path: str, *, render: bool = True) -> dict[str, Any]:
     base_url = _remote_base_url()
     if base_url:
         httpx = _require_httpx()
@@ -346,24 +381,26 @@ def predict_image(image_path: str) -> dict[str, Any]:
         content_type = mimetypes.guess_type(filename)[0] or "image/jpeg"
 
         try:
-            with open(image_path, "rb") as f:
-                res = httpx.post(
-                    f"{base_url}/predict",
-                    params={
-                        "conf": settings.AI_REMOTE_CONF,
-                        "iou": settings.AI_REMOTE_IOU,
-                        "return_image": "true",
-                    },
-                    files={"file": (filename, f, content_type)},
-                    timeout=settings.AI_REMOTE_TIMEOUT_SECONDS,
-                )
-
-            if res.status_code >= 400:
-                try:
-                    detail = res.json()
-                except Exception:
-                    detail = res.text
-                raise ModelNotAvailableError(f"Remote AI error ({res.status_code}): {detail}")
+            with timed(INFERENCE_DURATION, backend="remote"):
+                with open(image_path, "rb") as f:
+                    res = httpx.post(
+                        f"{base_url}/predict",
+                        params={
+                            "conf": settings.AI_REMOTE_CONF,
+                            "iou": settings.AI_REMOTE_IOU,
+                            "return_image": "true",
+                        },
+                        files={"file": (filename, f, content_type)},
+                        headers=inject(),
+                        timeout=settings.AI_REMOTE_TIMEOUT_SECONDS,
+                    )
+
+                if res.status_code >= 400:
+                    try:
+                        detail = res.json()
+                    except Exception:
+                        detail = res.text
+                    raise ModelNotAvailableError(f"Remote AI error ({res.status_code}): {detail}")
 
             data = res.json()
             predictions = data.get("predictions") if isinstance(data, dict) else None
@@ -392,14 +429,16 @@ def predict_image(image_path: str) -> dict[str, Any]:
 
             annotated_filename: str | None = None
             annotated_error: str | None = None
-            stem = os.path.splitext(filename)[0]
-            annotated_filename = f"{stem}_poly.jpg"
-            annotated_path = os.path.join(os.path.dirname(image_path), annotated_filename)
-            try:
-                render_polygons_only(image_path=image_path, detections=detections, output_path=annotated_path)
-            except Exception as e:
-                annotated_error = str(e)
-                annotated_filename = None
+            if render:
+                stem = os.path.splitext(filename)[0]
+                annotated_filename = f"{stem}_poly.jpg"
+                annotated_path = os.path.join(os.path.dirname(image_path), annotated_filename)
+                try:
+                    with timed(RENDER_DURATION, kind="polygons"):
+                        render_polygons_only(image_path=image_path, detections=detections, output_path=annotated_path)
+                except Exception as e:
+                    annotated_error = str(e)
+                    annotated_filename = None
 
             image_b64: str | None = None
             if isinstance(data, dict) and "image" in data:
@@ -425,7 +464,8 @@ def predict_image(image_path: str) -> dict[str, Any]:
             raise ModelNotAvailableError(f"Remote AI request failed: {e}") from e
 
     model = _get_yolo_model()
-    results = model.predict(source=image_path, verbose=False)
+    with timed(INFERENCE_DURATION, backend="local"):
+        results = model.predict(source=image_path, verbose=False)
     if not results:
         image_b64 = _encode_image_b64(image_path)
         out_empty: dict[str, Any] = {"detections": [], "names": {}}
@@ -0,0 +1,157 @@
+from __future__ import annotations
+
+import threading
+import time
+from datetime import date, datetime, timedelta, timezone
+from typing import Any
+
+from sqlalchemy import Date, cast, func, select
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.models.scan import Scan
+
+_GROUP_COLUMNS = {
+    "scan_type": Scan.scan_type,
+    "user": Scan.user_id,
+    "location": Scan.location,
+    "disease_category": Scan.disease_category,
+}
+
+_cache_lock = threading.Lock()
+_cache: dict[tuple, tuple[float, dict[str, Any]]] = {}
+
+
+def _bucket_expr(dialect: str, bucket: str):
+    if bucket == "day":
+        return Scan.created_date
+    if dialect == "sqlite":
+        if bucket == "hour":
+            return func.strftime("%Y-%m-%dT%H:00:00", Scan.created_at)
+        # Monday of the ISO week: forward to Sunday, then back six days.
+        return func.date(Scan.created_date, "weekday 0", "-6 days")
+    if bucket == "hour":
+        return func.date_trunc("hour", Scan.created_at)
+    return cast(func.date_trunc("week", Scan.created_date), Date)
+
+
+def _bucket_key(value: Any, bucket: str) -> str:
+    if isinstance(value, datetime):
+        return value.strftime("%Y-%m-%dT%H:00:00") if bucket == "hour" else value.date().isoformat()
+    if isinstance(value, date):
+        return value.isoformat()
+    return str(value)
+
+
+def _round(value: Any) -> float | None:
+    return None if value is None else round(float(value), 2)
+
+
+def query_scan_time_series(
+    db: Session,
+    *,
+    start: date,
+    end: date,
+    bucket: str,
+    group_by: str,
+    scan_type: str | None = None,
+) -> dict[str, Any]:
+    """Aggregate scans into ``bucket`` periods between ``start`` and ``end`` (inclusive).
+
+    Runs entirely in SQL over the denormalized, indexed scan columns; only
+    buckets that contain scans are returned.
+    """
+
+    dialect = db.get_bind().dialect.name
+    bucket_col = _bucket_expr(dialect, bucket).label("bucket")
+    group_col = _GROUP_COLUMNS.get(group_by)
+
+    columns = [
+        bucket_col,
+        func.count().label("count"),
+        func.avg(Scan.health_percent).label("avg_health_percent"),
+        func.avg(Scan.overall_yield_index).label("avg_overall_yield_index"),
+    ]
+    group_cols = [bucket_col]
+    if group_col is not None:
+        columns.insert(1, group_col.label("group"))
+        group_cols.append(group_col)
+
+    stmt = (
+        select(*columns)
+        .where(Scan.created_date >= start, Scan.created_date <= end)
+        .group_by(*group_cols)
+        .order_by(bucket_col)
+    )
+    if scan_type:
+        stmt = stmt.where(Scan.scan_type == scan_type)
+
+    rows = []
+    for row in db.execute(stmt).mappings():
+        rows.append(
+            {
+                "bucket": _bucket_key(row["bucket"], bucket),
+                "group": row["group"] if group_col is not None else None,
+                "count": int(row["count"]),
+                "avg_health_percent": _round(row["avg_health_percent"]),
+                "avg_overall_yield_index": _round(row["avg_overall_yield_index"]),
+            }
+        )
+
+    return {
+        "start": start.isoformat(),
+        "end": end.isoformat(),
+        "bucket": bucket,
+        "group_by": group_by,
+        "scan_type": scan_type,
+        "rows": rows,
+        "total": sum(r["count"] for r in rows),
+    }
+
+
+def bucket_count(start: date, end: date, bucket: str) -> int:
+    days = (end - start).days + 1
+    if bucket == "hour":
+        return days * 24
+    if bucket == "week":
+        return days // 7 + 2
+    return days
+
+
+def get_scan_time_series(
+    db: Session,
+    *,
+    start: date,
+    end: date,
+    bucket: str,
+    group_by: str,
+    scan_type: str | None = None,
+) -> dict[str, Any]:
+    """``query_scan_time_series`` behind a short-lived in-process cache."""
+
+    ttl = settings.ANALYTICS_CACHE_TTL_SECONDS
+    key = (start, end, bucket, group_by, scan_type)
+    now = time.monotonic()
+    if ttl > 0:
+        with _cache_lock:
+            hit = _cache.get(key)
+            if hit is not None and hit[0] > now:
+                return hit[1]
+
+    result = query_scan_time_series(
+        db, start=start, end=end, bucket=bucket, group_by=group_by, scan_type=scan_type
+    )
+    result["generated_at"] = datetime.now(timezone.utc).isoformat()
+
+    if ttl > 0:
+        with _cache_lock:
+            if len(_cache) >= max(1, settings.ANALYTICS_CACHE_MAX_ENTRIES):
+                for stale in [k for k, (expires, _) in _cache.items() if expires <= now] or [next(iter(_cache))]:
+                    _cache.pop(stale, None)
+            _cache[key] = (now + ttl, result)
+    return result
+
+
+def default_range(days: int = 30) -> tuple[date, date]:
+    end = datetime.now(timezone.utc).date()
+    return end - timedelta(days=days - 1), end
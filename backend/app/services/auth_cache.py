@@ -0,0 +1,225 @@
+from __future__ import annotations
+
+import logging
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Optional
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Process-local cache of the fields request authorization needs, keyed by user
+# id, so an authenticated request does not have to load its user row. Entries
+# (including "no such user") live for at most AUTH_CACHE_TTL_SECONDS. The crud
+# functions that change those fields call invalidate_users() after committing;
+# with AUTH_CACHE_REDIS_URL set, invalidations are also broadcast to every
+# other worker, otherwise the TTL bounds how stale another worker can be.
+
+
+@dataclass(frozen=True)
+class Principal:
+    id: int
+    email: str
+    is_active: bool
+    is_admin: bool
+
+
+class AuthCacheError(RuntimeError):
+    pass
+
+
+_MISSING = object()
+
+_lock = threading.Lock()
+_entries: "OrderedDict[int, tuple[float, Optional[Principal]]]" = OrderedDict()
+# Bumped by every invalidation; a load that started before one is not cached.
+_generation = 0
+_metrics: dict[str, int] = {
+    "hits": 0,
+    "misses": 0,
+    "expired": 0,
+    "evictions": 0,
+    "invalidations": 0,
+    "remote_invalidations": 0,
+}
+
+_listener: threading.Thread | None = None
+_listener_stop = threading.Event()
+_redis_client: Any = None
+
+
+def principal_of(user: Any) -> Optional[Principal]:
+    if user is None:
+        return None
+    return Principal(id=int(user.id), email=user.email, is_active=bool(user.is_active), is_admin=bool(user.is_admin))
+
+
+def _enabled() -> bool:
+    return settings.AUTH_CACHE_TTL_SECONDS > 0 and settings.AUTH_CACHE_MAX_ENTRIES > 0
+
+
+def _lookup(user_id: int) -> tuple[Any, int]:
+    """The cached principal (or _MISSING) and the generation to store a fresh load under."""
+
+    with _lock:
+        entry = _entries.get(user_id)
+        if entry is not None:
+            if entry[0] > time.monotonic():
+                _entries.move_to_end(user_id)
+                _metrics["hits"] += 1
+                return entry[1], _generation
+            del _entries[user_id]
+            _metrics["expired"] += 1
+        _metrics["misses"] += 1
+        return _MISSING, _generation
+
+
+def _store(user_id: int, principal: Optional[Principal], generation: int) -> None:
+    with _lock:
+        if generation != _generation:
+            return
+        _entries[user_id] = (time.monotonic() + settings.AUTH_CACHE_TTL_SECONDS, principal)
+        _entries.move_to_end(user_id)
+        while len(_entries) > settings.AUTH_CACHE_MAX_ENTRIES:
+            _entries.popitem(last=False)
+            _metrics["evictions"] += 1
+
+
+def get_principal(user_id: int, load: Callable[[int], Optional[Principal]]) -> Optional[Principal]:
+    """The principal for ``user_id``, from the cache or from ``load(user_id)``."""
+
+    if not _enabled():
+        return load(user_id)
+    cached, generation = _lookup(user_id)
+    if cached is not _MISSING:
+        return cached
+    principal = load(user_id)
+    _store(user_id, principal, generation)
+    return principal
+
+
+async def get_principal_async(
+    user_id: int, load: Callable[[int], Awaitable[Optional[Principal]]]
+) -> Optional[Principal]:
+    if not _enabled():
+        return await load(user_id)
+    cached, generation = _lookup(user_id)
+    if cached is not _MISSING:
+        return cached
+    principal = await load(user_id)
+    _store(user_id, principal, generation)
+    return principal
+
+
+def _evict(user_ids: list[int] | None) -> None:
+    global _generation
+    with _lock:
+        _generation += 1
+        if user_ids is None:
+            _entries.clear()
+        else:
+            for user_id in user_ids:
+                _entries.pop(user_id, None)
+
+
+def invalidate_users(user_ids: list[int] | None = None) -> None:
+    """Drop cached principals for ``user_ids`` (every user when None), here and on other workers."""
+
+    _evict(None if user_ids is None else [int(u) for u in user_ids])
+    with _lock:
+        _metrics["invalidations"] += 1
+    if settings.AUTH_CACHE_REDIS_URL:
+        message = "*" if user_ids is None else ",".join(str(int(u)) for u in user_ids)
+        try:
+            _redis().publish(settings.AUTH_CACHE_CHANNEL, message)
+        except Exception:
+            # Other workers fall back to the TTL.
+            logger.warning("auth cache invalidation broadcast failed", exc_info=True)
+
+
+def get_auth_cache_metrics() -> dict[str, Any]:
+    with _lock:
+        out: dict[str, Any] = dict(_metrics)
+        out["entries"] = len(_entries)
+    lookups = out["hits"] + out["misses"]
+    out["hit_rate"] = round(out["hits"] / lookups, 4) if lookups else None
+    out["ttl_seconds"] = settings.AUTH_CACHE_TTL_SECONDS
+    out["max_entries"] = settings.AUTH_CACHE_MAX_ENTRIES
+    out["broadcast"] = bool(settings.AUTH_CACHE_REDIS_URL)
+    out["listening"] = _listener is not None and _listener.is_alive()
+    return out
+
+
+def _require_redis():
+    try:
+        import redis  # type: ignore
+    except Exception as e:  # pragma: no cover
+        raise AuthCacheError(
+            "redis is not installed. Install backend/requirements-redis.txt to use AUTH_CACHE_REDIS_URL."
+        ) from e
+    return redis
+
+
+def _redis():
+    global _redis_client
+    if _redis_client is None:
+        _redis_client = _require_redis().Redis.from_url(settings.AUTH_CACHE_REDIS_URL, socket_timeout=2)
+    return _redis_client
+
+
+def _apply_remote(message: Any) -> None:
+    data = message.get("data")
+    if isinstance(data, bytes):
+        data = data.decode("utf-8", "replace")
+    if not isinstance(data, str):
+        return
+    if data == "*":
+        _evict(None)
+    else:
+        _evict([int(part) for part in data.split(",") if part.strip().isdigit()])
+    with _lock:
+        _metrics["remote_invalidations"] += 1
+
+
+def _listen() -> None:
+    while not _listener_stop.is_set():
+        pubsub = None
+        try:
+            pubsub = _redis().pubsub(ignore_subscribe_messages=True)
+            pubsub.subscribe(settings.AUTH_CACHE_CHANNEL)
+            # Anything published while we were not subscribed is lost.
+            _evict(None)
+            while not _listener_stop.is_set():
+                message = pubsub.get_message(timeout=1.0)
+                if message is not None and message.get("type") == "message":
+                    _apply_remote(message)
+        except Exception:
+            logger.warning("auth cache invalidation listener disconnected", exc_info=True)
+            _listener_stop.wait(5.0)
+        finally:
+            if pubsub is not None:
+                try:
+                    pubsub.close()
+                except Exception:
+                    pass
+
+
+def start_auth_cache_listener() -> None:
+    global _listener
+    if not settings.AUTH_CACHE_REDIS_URL or not _enabled() or _listener is not None:
+        return
+    _require_redis()
+    _listener_stop.clear()
+    _listener = threading.Thread(target=_listen, name="auth-cache-invalidation", daemon=True)
+    _listener.start()
+
+
+def stop_auth_cache_listener() -> None:
+    global _listener
+    _listener_stop.set()
+    if _listener is not None:
+        _listener.join(timeout=5)
+    _listener = None
@@ -0,0 +1,123 @@
+from __future__ import annotations
+
+import asyncio
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Optional
+
+from app.core.config import settings
+from app.core.profiling import stage
+from app.core.security import get_password_hash, verify_and_update_password
+
+# bcrypt is deliberately slow CPU work. It runs here, on a small pool of its
+# own, rather than on the request threadpool or the event loop, and callers
+# beyond PASSWORD_HASH_MAX_PENDING are turned away instead of queueing without
+# bound.
+
+
+class PasswordHasherBusy(RuntimeError):
+    pass
+
+
+_lock = threading.Lock()
+_executor: ThreadPoolExecutor | None = None
+_pending = 0
+_metrics: dict[str, Any] = {
+    "calls_total": 0,
+    "rejected_total": 0,
+    "queue_seconds_total": 0.0,
+    "queue_seconds_max": 0.0,
+    "run_seconds_total": 0.0,
+}
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    with _lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=max(1, settings.PASSWORD_HASH_WORKERS), thread_name_prefix="password-hash"
+            )
+        return _executor
+
+
+def _release(_: Future | None = None) -> None:
+    global _pending
+    with _lock:
+        _pending -= 1
+
+
+def _submit(fn: Callable[..., Any], *args: Any) -> Future:
+    global _pending
+    with _lock:
+        if settings.PASSWORD_HASH_MAX_PENDING > 0 and _pending >= settings.PASSWORD_HASH_MAX_PENDING:
+            _metrics["rejected_total"] += 1
+            raise PasswordHasherBusy("Too many password checks in progress; try again shortly")
+        _pending += 1
+    queued_at = time.perf_counter()
+
+    def run() -> Any:
+        started = time.perf_counter()
+        try:
+            return fn(*args)
+        finally:
+            waited = started - queued_at
+            with _lock:
+                _metrics["calls_total"] += 1
+                _metrics["queue_seconds_total"] += waited
+                _metrics["queue_seconds_max"] = max(_metrics["queue_seconds_max"], waited)
+                _metrics["run_seconds_total"] += time.perf_counter() - started
+
+    try:
+        future = _get_executor().submit(run)
+    except BaseException:
+        _release()
+        raise
+    # Also runs when a waiting caller is cancelled before the work starts.
+    future.add_done_callback(_release)
+    return future
+
+
+def hash_password(password: str) -> str:
+    with stage("password_hash"):
+        return _submit(get_password_hash, password).result()
+
+
+def check_password(password: str, hashed_password: str) -> tuple[bool, Optional[str]]:
+    """``(matches, new_hash)``; ``new_hash`` is set when the stored hash should be replaced."""
+
+    with stage("password_hash"):
+        return _submit(verify_and_update_password, password, hashed_password).result()
+
+
+async def hash_password_async(password: str) -> str:
+    with stage("password_hash"):
+        return await asyncio.wrap_future(_submit(get_password_hash, password))
+
+
+async def check_password_async(password: str, hashed_password: str) -> tuple[bool, Optional[str]]:
+    with stage("password_hash"):
+        return await asyncio.wrap_future(_submit(verify_and_update_password, password, hashed_password))
+
+
+def get_password_hash_metrics() -> dict[str, Any]:
+    with _lock:
+        out = dict(_metrics)
+        out["pending"] = _pending
+    calls = out["calls_total"]
+    out["queue_seconds_avg"] = round(out["queue_seconds_total"] / calls, 6) if calls else None
+    out["run_seconds_avg"] = round(out["run_seconds_total"] / calls, 6) if calls else None
+    out["workers"] = max(1, settings.PASSWORD_HASH_WORKERS)
+    out["max_pending"] = settings.PASSWORD_HASH_MAX_PENDING
+    out["bcrypt_rounds"] = settings.PASSWORD_BCRYPT_ROUNDS
+    return out
+
+
+def shutdown_password_hasher() -> None:
+    global _executor
+    with _lock:
+        executor = _executor
+        _executor = None
+    if executor is not None:
+        executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,313 @@
+from __future__ import annotations
+
+import functools
+import logging
+import math
+import re
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Optional
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Token-bucket rate limits for the routes that spend inference capacity, plus a
+# daily per-user inference quota charged once a call is admitted to run. Buckets live in this process by default;
+# with RATE_LIMIT_REDIS_URL set they live in Redis and are shared by every
+# worker and node. A Redis failure lets requests through rather than failing
+# them.
+
+POLICIES = ("scan_create", "estimate_field", "ai_predict")
+
+_PERIODS = {
+    "s": 1, "sec": 1, "second": 1,
+    "m": 60, "min": 60, "minute": 60,
+    "h": 3600, "hour": 3600,
+    "d": 86400, "day": 86400,
+}
+_RATE_RE = re.compile(r"^\s*(\d+)\s*/\s*(\d*)\s*([a-z]+?)s?\s*$")
+
+
+class RateLimitError(RuntimeError):
+    pass
+
+
+@dataclass(frozen=True)
+class Policy:
+    name: str
+    limit: int
+    period: float
+
+    @property
+    def rate(self) -> float:
+        """Tokens refilled per second; the bucket holds ``limit`` tokens."""
+
+        return self.limit / self.period
+
+
+@dataclass(frozen=True)
+class Decision:
+    allowed: bool
+    retry_after: float = 0.0
+    reason: str = ""
+
+
+def parse_rate(name: str, spec: str) -> Optional[Policy]:
+    """``"30/minute"``, ``"5/10s"``, ``"1000/day"``; empty or ``"0"`` means unlimited."""
+
+    spec = (spec or "").strip().lower()
+    if spec in ("", "0", "off", "none"):
+        return None
+    match = _RATE_RE.match(spec)
+    if match is None or match.group(3) not in _PERIODS:
+        raise RateLimitError(f"Invalid rate limit for {name}: {spec!r}; expected e.g. '30/minute'")
+    limit = int(match.group(1))
+    if limit <= 0:
+        return None
+    period = int(match.group(2) or 1) * _PERIODS[match.group(3)]
+    return Policy(name=name, limit=limit, period=float(period))
+
+
+@functools.lru_cache(maxsize=4)
+def _parse_policies(specs: tuple[str, ...]) -> dict[str, Optional[Policy]]:
+    return {name: parse_rate(name, spec) for name, spec in zip(POLICIES, specs)}
+
+
+def _policies() -> dict[str, Optional[Policy]]:
+    return _parse_policies(
+        (settings.RATE_LIMIT_SCAN_CREATE, settings.RATE_LIMIT_ESTIMATE_FIELD, settings.RATE_LIMIT_AI_PREDICT)
+    )
+
+
+def check_rate_limit_settings() -> None:
+    """Raise RateLimitError at startup rather than on the first limited request."""
+
+    _policies()
+    if settings.RATE_LIMIT_REDIS_URL:
+        _require_redis()
+
+
+def _day(now: float) -> int:
+    # Days since the epoch; UTC days, since Unix time has no leap seconds.
+    return int(now // 86400)
+
+
+def _seconds_to_midnight(now: float) -> float:
+    return max(1.0, (_day(now) + 1) * 86400 - now)
+
+
+class MemoryBackend:
+    """Buckets and quota counters in dicts; one per process, at most ``max_keys`` buckets.
+
+    Quota counters are kept per signed-in user and cleared daily, so they are
+    bounded by the number of active users rather than by ``max_keys``.
+    """
+
+    def __init__(self, max_keys: int = 100_000) -> None:
+        self._lock = threading.Lock()
+        # Least recently used first, so the oldest buckets are evicted when full.
+        self._buckets: OrderedDict[str, list[float]] = OrderedDict()
+        self._counts: dict[str, int] = {}
+        self._count_day = -1
+        self._max_keys = max(1000, max_keys)
+
+    async def take(self, key: str, policy: Policy, now: float) -> float:
+        """Take a token; 0.0 if one was available, else seconds until one is."""
+
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                if len(self._buckets) >= self._max_keys:
+                    self._prune(now)
+                self._buckets[key] = [policy.limit - 1.0, now, policy.rate, float(policy.limit)]
+                return 0.0
+            self._buckets.move_to_end(key)
+            tokens = min(float(policy.limit), bucket[0] + max(0.0, now - bucket[1]) * policy.rate)
+            bucket[1] = now
+            if tokens >= 1.0:
+                bucket[0] = tokens - 1.0
+                return 0.0
+            bucket[0] = tokens
+            return (1.0 - tokens) / policy.rate
+
+    def _prune(self, now: float) -> None:
+        # A bucket that has refilled completely is the same as no bucket; if
+        # none has, the least recently used go, which at worst hands a key
+        # that has been idle longest a fresh bucket.
+        full = [k for k, (tokens, stamp, rate, limit) in self._buckets.items() if tokens + (now - stamp) * rate >= limit]
+        for key in full:
+            del self._buckets[key]
+        while len(self._buckets) >= self._max_keys:
+            self._buckets.popitem(last=False)
+
+    async def count(self, key: str, now: float) -> int:
+        """Add one to today's (UTC) counter for ``key`` and return the new value."""
+
+        day = _day(now)
+        with self._lock:
+            if day != self._count_day:
+                self._counts.clear()
+                self._count_day = day
+            value = self._counts.get(key, 0) + 1
+            self._counts[key] = value
+            return value
+
+    def reset(self) -> None:
+        with self._lock:
+            self._buckets.clear()
+            self._counts.clear()
+
+
+# Same algorithm as MemoryBackend.take, atomically and on the Redis clock.
+_TAKE_SCRIPT = """
+local limit = tonumber(ARGV[1])
+local rate = tonumber(ARGV[2])
+local t = redis.call('TIME')
+local now = tonumber(t[1]) + tonumber(t[2]) / 1000000
+local state = redis.call('HMGET', KEYS[1], 't', 's')
+local tokens = tonumber(state[1])
+local stamp = tonumber(state[2])
+local wait = 0
+if tokens == nil then
+  tokens = limit - 1
+else
+  tokens = math.min(limit, tokens + math.max(0, now - stamp) * rate)
+  if tokens >= 1 then
+    tokens = tokens - 1
+  else
+    wait = (1 - tokens) / rate
+  end
+end
+redis.call('HSET', KEYS[1], 't', tostring(tokens), 's', tostring(now))
+redis.call('PEXPIRE', KEYS[1], math.ceil(limit / rate * 1000) + 1000)
+return tostring(wait)
+"""
+
+_COUNT_SCRIPT = """
+local value = redis.call('INCR', KEYS[1])
+if value == 1 then
+  redis.call('EXPIRE', KEYS[1], 172800)
+end
+return value
+"""
+
+
+def _require_redis():
+    try:
+        import redis.asyncio  # type: ignore
+    except Exception as e:  # pragma: no cover
+        raise RateLimitError(
+            "redis is not installed. Install backend/requirements-redis.txt to use RATE_LIMIT_REDIS_URL."
+        ) from e
+    return redis.asyncio
+
+
+class RedisBackend:
+    """Buckets and counters shared through Redis."""
+
+    def __init__(self, url: str, prefix: str) -> None:
+        self._client = _require_redis().Redis.from_url(url, socket_timeout=1)
+        self._prefix = prefix
+        self._take = self._client.register_script(_TAKE_SCRIPT)
+        self._count = self._client.register_script(_COUNT_SCRIPT)
+
+    async def take(self, key: str, policy: Policy, now: float) -> float:
+        return float(await self._take(keys=[f"{self._prefix}:rl:{key}"], args=[policy.limit, policy.rate]))
+
+    async def count(self, key: str, now: float) -> int:
+        return int(await self._count(keys=[f"{self._prefix}:quota:{_day(now)}:{key}"]))
+
+
+_lock = threading.Lock()
+_backend: MemoryBackend | RedisBackend | None = None
+_metrics: dict[str, dict[str, int]] = {}
+
+
+def get_backend() -> MemoryBackend | RedisBackend:
+    global _backend
+    with _lock:
+        if _backend is None:
+            if settings.RATE_LIMIT_REDIS_URL:
+                _backend = RedisBackend(settings.RATE_LIMIT_REDIS_URL, settings.RATE_LIMIT_REDIS_PREFIX)
+            else:
+                _backend = MemoryBackend(settings.RATE_LIMIT_MAX_KEYS)
+        return _backend
+
+
+def _record(name: str, outcome: str) -> None:
+    with _lock:
+        counts = _metrics.setdefault(name, {"allowed": 0, "limited": 0, "quota_exceeded": 0, "errors": 0})
+        counts[outcome] += 1
+
+
+async def check(name: str, key: str) -> Decision:
+    """Take one token from ``key``'s bucket (e.g. ``"user:42"``) under policy ``name``.
+
+    This is only the rate limit; the daily quota is charged separately with
+    charge_quota() once the call has been admitted to run.
+    """
+
+    policy = _policies().get(name) if settings.RATE_LIMIT_ENABLED else None
+    if policy is None:
+        return Decision(True)
+
+    now = time.time()
+    try:
+        wait = await get_backend().take(f"{name}:{key}", policy, now)
+    except RateLimitError:
+        raise
+    except Exception:
+        logger.warning("rate limit backend failed; letting the request through", exc_info=True)
+        _record(name, "errors")
+        return Decision(True)
+    if wait > 0:
+        _record(name, "limited")
+        return Decision(False, wait, "rate")
+    _record(name, "allowed")
+    return Decision(True)
+
+
+async def charge_quota(key: str) -> Decision:
+    """Count one inference call by ``key`` against today's (UTC) INFERENCE_DAILY_QUOTA."""
+
+    daily = settings.INFERENCE_DAILY_QUOTA if settings.RATE_LIMIT_ENABLED else 0
+    if daily <= 0:
+        return Decision(True)
+
+    now = time.time()
+    try:
+        used = await get_backend().count(key, now)
+    except RateLimitError:
+        raise
+    except Exception:
+        logger.warning("rate limit backend failed; not charging the quota", exc_info=True)
+        _record("quota", "errors")
+        return Decision(True)
+    if used > daily:
+        _record("quota", "quota_exceeded")
+        return Decision(False, _seconds_to_midnight(now), "quota")
+    _record("quota", "allowed")
+    return Decision(True)
+
+
+def retry_after_header(decision: Decision) -> str:
+    return str(max(1, math.ceil(decision.retry_after)))
+
+
+def get_rate_limit_metrics() -> dict[str, Any]:
+    policies = _policies()
+    with _lock:
+        counts = {name: dict(values) for name, values in _metrics.items()}
+    return {
+        "enabled": settings.RATE_LIMIT_ENABLED,
+        "backend": "redis" if settings.RATE_LIMIT_REDIS_URL else "memory",
+        "inference_daily_quota": settings.INFERENCE_DAILY_QUOTA,
+        "policies": {
+            name: None if policy is None else {"limit": policy.limit, "period_seconds": policy.period}
+            for name, policy in policies.items()
+        },
+        "counts": counts,
+    }
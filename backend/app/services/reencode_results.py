@@ -0,0 +1,57 @@
+"""Rewrite plain-text scan results with the configured result codec.
+
+Usage (from ``backend/``)::
+
+    python -m app.services.reencode_results [--vacuum]
+
+New results are always written with SCAN_RESULT_CODEC and older rows keep
+decoding as they are, so this is only needed to reclaim space. ``--vacuum``
+compacts a SQLite database file afterwards.
+"""
+
+from __future__ import annotations
+
+import argparse
+import logging
+import sys
+import time
+
+from app.core.config import settings
+from app.crud.scan import reencode_scan_results
+from app.db.migrations import upgrade_schema
+from app.db.session import SessionLocal, engine
+from app.services.result_codec import resolve_codec
+
+logger = logging.getLogger(__name__)
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Rewrite plain-text scan results with the configured codec.")
+    parser.add_argument("--vacuum", action="store_true", help="VACUUM a SQLite database afterwards")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    upgrade_schema(engine)
+
+    started = time.perf_counter()
+    db = SessionLocal()
+    try:
+        rewritten = reencode_scan_results(db)
+    finally:
+        db.close()
+    logger.info(
+        "%s results rewritten as %s in %.3fs",
+        rewritten,
+        resolve_codec(engine.dialect.name),
+        time.perf_counter() - started,
+    )
+
+    if args.vacuum and engine.dialect.name == "sqlite":
+        with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+            conn.exec_driver_sql("VACUUM")
+        logger.info("database vacuumed (%s)", settings.DATABASE_URL)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
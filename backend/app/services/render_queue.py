@@ -0,0 +1,135 @@
+from __future__ import annotations
+
+import contextvars
+import multiprocessing
+import os
+import threading
+import uuid
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from typing import Any
+
+from app.core.config import settings
+from app.core.metrics import RENDER_DURATION, timed
+from app.services.ai_service import render_polygons_only
+from app.services.storage import get_storage
+
+_lock = threading.Lock()
+_inflight: dict[str, Future] = {}
+_process_pool: ProcessPoolExecutor | None = None
+_coordinator: ThreadPoolExecutor | None = None
+
+
+def overlay_name(image_filename: str) -> str:
+    stem = os.path.splitext(os.path.basename(image_filename))[0]
+    return f"{stem}_poly.jpg"
+
+
+def _render_in_worker(image_path: str, detections: list[dict[str, Any]], output_path: str) -> None:
+    # Runs in a pool process: decode, draw and JPEG encode never hold the API's GIL.
+    render_polygons_only(image_path=image_path, detections=detections, output_path=output_path)
+
+
+def _get_coordinator() -> ThreadPoolExecutor:
+    global _coordinator
+    with _lock:
+        if _coordinator is None:
+            _coordinator = ThreadPoolExecutor(
+                max_workers=max(1, settings.RENDER_WORKERS) * 2,
+                thread_name_prefix="render",
+            )
+        return _coordinator
+
+
+def _get_process_pool() -> ProcessPoolExecutor | None:
+    global _process_pool
+    if settings.RENDER_WORKERS <= 0:
+        return None
+    with _lock:
+        if _process_pool is None:
+            # spawn, not fork: forking a server process that already runs threads is unsafe.
+            _process_pool = ProcessPoolExecutor(
+                max_workers=settings.RENDER_WORKERS,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        return _process_pool
+
+
+def _run_job(image_filename: str, poly_name: str, detections: list[dict[str, Any]]) -> str:
+    storage = get_storage()
+    if storage.fetch(poly_name):
+        return poly_name
+
+    source = storage.fetch(image_filename)
+    if not source:
+        raise FileNotFoundError(image_filename)
+
+    output_path = storage.path(poly_name)
+    tmp_path = f"{output_path}.part-{uuid.uuid4().hex}.jpg"
+    try:
+        pool = _get_process_pool()
+        with timed(RENDER_DURATION, kind="polygons"):
+            if pool is None:
+                _render_in_worker(source, detections, tmp_path)
+            else:
+                pool.submit(_render_in_worker, source, detections, tmp_path).result()
+        os.replace(tmp_path, output_path)
+    finally:
+        if os.path.exists(tmp_path):
+            try:
+                os.remove(tmp_path)
+            except Exception:
+                pass
+
+    storage.publish(poly_name)
+    return poly_name
+
+
+def enqueue_render(*, image_filename: str, detections: list[dict[str, Any]]) -> Future:
+    """Queue an overlay render for ``image_filename`` and return its future.
+
+    Renders are single-flight per overlay: while one is queued or running,
+    every caller asking for the same image gets the same future back.
+    """
+
+    poly_name = overlay_name(image_filename)
+    coordinator = _get_coordinator()
+    with _lock:
+        future = _inflight.get(poly_name)
+        if future is not None:
+            return future
+        # In the caller's context, so the render span joins the scan's trace.
+        future = coordinator.submit(
+            contextvars.copy_context().run, _run_job, os.path.basename(image_filename), poly_name, detections
+        )
+        _inflight[poly_name] = future
+
+    def _forget(done: Future) -> None:
+        with _lock:
+            if _inflight.get(poly_name) is done:
+                del _inflight[poly_name]
+
+    future.add_done_callback(_forget)
+    return future
+
+
+def wait_for_render(future: Future, timeout: float) -> bool:
+    try:
+        future.result(timeout=max(0.0, timeout))
+        return True
+    except FutureTimeoutError:
+        return False
+    except Exception:
+        return False
+
+
+def shutdown_render_queue() -> None:
+    global _process_pool, _coordinator
+    with _lock:
+        pool, coordinator = _process_pool, _coordinator
+        _process_pool = None
+        _coordinator = None
+    if coordinator is not None:
+        coordinator.shutdown(wait=False, cancel_futures=True)
+    if pool is not None:
+        pool.shutdown(wait=False, cancel_futures=True)
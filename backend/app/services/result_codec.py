@@ -0,0 +1,251 @@
+from __future__ import annotations
+
+import functools
+import json
+import logging
+import struct
+import zlib
+from typing import Any
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+# A scan result lives in exactly one of three columns of its row:
+#
+#   result_json  plain JSON text; rows written before the codec existed, and
+#                every row when SCAN_RESULT_CODEC=json
+#   result_data  binary envelope: format version byte, codec id byte, payload
+#   result_doc   native JSONB document (PostgreSQL)
+#
+# Readers go through decode_result(), so tables holding any mix of these decode
+# transparently and the codec can be changed at any time.
+
+CODECS = ("auto", "json", "zlib", "zstd", "msgpack-zstd", "jsonb")
+
+_FORMAT_VERSION = 1
+_HEADER = struct.Struct("!BB")
+_CODEC_IDS = {"zlib": 1, "zstd": 2, "msgpack-zstd": 3}
+_CODEC_NAMES = {v: k for k, v in _CODEC_IDS.items()}
+
+
+class ResultCodecError(RuntimeError):
+    pass
+
+
+def _require_zstd():
+    try:
+        import zstandard  # type: ignore
+    except Exception as e:  # pragma: no cover
+        raise ResultCodecError(
+            "zstandard is not installed. Install backend/requirements-codec.txt to read or write zstd scan results."
+        ) from e
+    return zstandard
+
+
+def _require_msgpack():
+    try:
+        import msgpack  # type: ignore
+    except Exception as e:  # pragma: no cover
+        raise ResultCodecError(
+            "msgpack is not installed. Install backend/requirements-codec.txt to read or write msgpack scan results."
+        ) from e
+    return msgpack
+
+
+@functools.lru_cache(maxsize=1)
+def _orjson():
+    try:
+        import orjson  # type: ignore
+    except Exception:
+        return None
+    return orjson
+
+
+def dumps_json(data: Any) -> bytes:
+    """Compact UTF-8 JSON, through orjson when it is installed."""
+
+    orjson = _orjson()
+    if orjson is not None:
+        try:
+            return orjson.dumps(data)
+        except TypeError:
+            # Values orjson refuses (e.g. ints wider than 64 bits) still go through json.
+            pass
+    return json.dumps(data, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+
+
+def loads_json(raw: bytes | str) -> Any:
+    orjson = _orjson()
+    if orjson is not None:
+        return orjson.loads(raw)
+    return json.loads(raw)
+
+
+@functools.lru_cache(maxsize=16)
+def _resolve(setting: str, dialect: str) -> str:
+    codec = (setting or "auto").strip().lower()
+    if codec not in CODECS:
+        raise ResultCodecError(f"Unknown SCAN_RESULT_CODEC {setting!r}; expected one of {', '.join(CODECS)}")
+    if codec == "jsonb" and dialect != "postgresql":
+        codec = "auto"
+    if codec != "auto":
+        return codec
+    if dialect == "postgresql":
+        return "jsonb"
+    # zstd (and msgpack) only when asked for: rows written with an optional
+    # package installed would be unreadable on a host without it.
+    return "zlib"
+
+
+def resolve_codec(dialect: str) -> str:
+    """The codec new results are written with on a ``dialect`` database."""
+
+    return _resolve(settings.SCAN_RESULT_CODEC, dialect)
+
+
+def check_result_codec_settings(dialect: str) -> None:
+    """Raise ResultCodecError at startup for an unknown codec or one whose package is missing."""
+
+    codec = resolve_codec(dialect)
+    if codec in ("zstd", "msgpack-zstd"):
+        _require_zstd()
+    if codec == "msgpack-zstd":
+        _require_msgpack()
+
+
+def _unreadable(error: ResultCodecError) -> dict[str, Any]:
+    logger.warning("unreadable scan result: %s", error)
+    return {"raw": None, "error": str(error)}
+
+
+def encode_envelope(data: Any, codec: str) -> bytes:
+    if codec == "zlib":
+        payload = zlib.compress(dumps_json(data), settings.SCAN_RESULT_ZLIB_LEVEL)
+    elif codec == "zstd":
+        zstd = _require_zstd()
+        payload = zstd.ZstdCompressor(level=settings.SCAN_RESULT_ZSTD_LEVEL).compress(dumps_json(data))
+    elif codec == "msgpack-zstd":
+        zstd = _require_zstd()
+        try:
+            packed = _require_msgpack().packb(data, use_bin_type=True)
+        except (OverflowError, TypeError, ValueError):
+            # Values msgpack cannot represent (e.g. ints wider than 64 bits) go in a zstd JSON envelope.
+            return encode_envelope(data, "zstd")
+        payload = zstd.ZstdCompressor(level=settings.SCAN_RESULT_ZSTD_LEVEL).compress(packed)
+    else:
+        raise ResultCodecError(f"{codec!r} is not a binary result codec")
+    return _HEADER.pack(_FORMAT_VERSION, _CODEC_IDS[codec]) + payload
+
+
+def _open_envelope(blob: bytes) -> tuple[str, bytes]:
+    """Check an envelope's header and return its codec and decompressed payload."""
+
+    if len(blob) < _HEADER.size:
+        raise ResultCodecError("Scan result envelope is truncated")
+    version, codec_id = _HEADER.unpack_from(blob)
+    if version != _FORMAT_VERSION or codec_id not in _CODEC_NAMES:
+        raise ResultCodecError(f"Unsupported scan result format {version}/{codec_id}")
+    codec = _CODEC_NAMES[codec_id]
+    payload = memoryview(blob)[_HEADER.size :]
+    try:
+        if codec == "zlib":
+            return codec, zlib.decompress(payload)
+        return codec, _require_zstd().ZstdDecompressor().decompress(payload)
+    except ResultCodecError:
+        raise
+    except Exception as e:
+        raise ResultCodecError(f"Corrupt {codec} scan result: {e}") from e
+
+
+def _decode_payload(codec: str, raw: bytes) -> Any:
+    try:
+        if codec == "msgpack-zstd":
+            return _require_msgpack().unpackb(raw, raw=False, strict_map_key=False)
+        return loads_json(raw)
+    except ResultCodecError:
+        raise
+    except Exception as e:
+        raise ResultCodecError(f"Corrupt {codec} scan result: {e}") from e
+
+
+def decode_envelope(blob: bytes) -> Any:
+    return _decode_payload(*_open_envelope(blob))
+
+
+def result_columns(result: Any, *, dialect: str) -> dict[str, Any]:
+    """Column values that store ``result`` with the codec configured for ``dialect``.
+
+    ``result_json`` predates the codec and is NOT NULL on existing databases,
+    so it holds an empty string when the result lives in another column.
+    """
+
+    codec = resolve_codec(dialect)
+    if codec == "json":
+        return {"result_json": dumps_json(result).decode("utf-8"), "result_data": None, "result_doc": None}
+    if codec == "jsonb":
+        return {"result_json": "", "result_data": None, "result_doc": result}
+    return {"result_json": "", "result_data": encode_envelope(result, codec), "result_doc": None}
+
+
+def decode_result(result_json: str | None, result_data: bytes | None, result_doc: Any) -> Any:
+    """Decode a stored result from whichever column holds it.
+
+    Raises ResultCodecError for an unreadable envelope and ValueError for
+    legacy text that is not valid JSON.
+    """
+
+    if result_data is not None:
+        return decode_envelope(result_data)
+    if result_doc is not None:
+        return result_doc
+    return loads_json(result_json or "")
+
+
+def result_json_bytes(result_json: str | None, result_data: bytes | None, result_doc: Any) -> bytes:
+    """A stored result as JSON object bytes, parsing it only when it is not stored as JSON.
+
+    JSON envelopes are passed through as stored (after decompression), and
+    text rows once they have been checked to parse. Anything that is not a
+    JSON object comes back wrapped as ``{"raw": ...}``, as
+    :func:`load_scan_result` does.
+    """
+
+    if result_data is not None:
+        try:
+            codec, raw = _open_envelope(result_data)
+            if codec != "msgpack-zstd" and raw.lstrip()[:1] == b"{":
+                return raw
+            data = _decode_payload(codec, raw)
+        except ResultCodecError as e:
+            # One unreadable row should not fail the list or export it is part of.
+            data = _unreadable(e)
+    elif result_doc is not None:
+        data = result_doc
+    else:
+        # Legacy text is not trusted to be JSON: one bad row spliced in raw would
+        # corrupt the whole list or export it is part of.
+        try:
+            parsed = loads_json(result_json or "")
+        except ValueError:
+            parsed = None
+        if isinstance(parsed, dict):
+            return result_json.encode("utf-8")
+        data = result_json
+    return dumps_json(data if isinstance(data, dict) else {"raw": data})
+
+
+def load_scan_result(scan: Any) -> Any:
+    """A scan's decoded result; legacy text that is not JSON comes back as ``{"raw": text}``.
+
+    An envelope that cannot be read (corrupt, or written with a codec whose
+    package is not installed here) comes back as ``{"raw": None, "error": ...}``.
+    """
+
+    try:
+        return decode_result(scan.result_json, scan.result_data, scan.result_doc)
+    except ResultCodecError as e:
+        return _unreadable(e)
+    except Exception:
+        return {"raw": scan.result_json}
+
@@ -0,0 +1,42 @@
+"""Rebuild the admin overview rollup tables from scratch.
+
+Usage (from ``backend/``)::
+
+    python -m app.services.rollups
+
+The counters are kept up to date as users and scans change, so this is only
+needed after editing the database by hand or restoring a backup.
+"""
+
+from __future__ import annotations
+
+import logging
+import sys
+import time
+
+from app.crud.rollup import rebuild_rollups
+from app.db.migrations import upgrade_schema
+from app.db.session import SessionLocal, engine
+
+logger = logging.getLogger(__name__)
+
+
+def main() -> int:
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    upgrade_schema(engine)
+
+    started = time.perf_counter()
+    db = SessionLocal()
+    try:
+        totals = rebuild_rollups(db)
+    finally:
+        db.close()
+
+    for name in sorted(totals):
+        logger.info("%s = %s", name, totals[name])
+    logger.info("rollups rebuilt in %.3fs", time.perf_counter() - started)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
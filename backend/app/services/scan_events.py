@@ -0,0 +1,105 @@
+from __future__ import annotations
+
+import asyncio
+import itertools
+import json
+import threading
+from typing import Any, AsyncIterator
+
+from app.core.config import settings
+
+_lock = threading.Lock()
+_subscribers: dict[int, set["_Subscriber"]] = {}
+_event_ids = itertools.count(1)
+
+# Sentinel pushed to a subscriber whose queue overflowed; the stream tells the
+# client to resync and closes instead of silently dropping events.
+_OVERFLOW = object()
+
+
+class _Subscriber:
+    __slots__ = ("loop", "queue", "overflowed")
+
+    def __init__(self, loop: asyncio.AbstractEventLoop, maxsize: int) -> None:
+        self.loop = loop
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=maxsize)
+        self.overflowed = False
+
+    def offer(self, item: Any) -> None:
+        # Always runs on the subscriber's own event loop.
+        if self.overflowed:
+            return
+        try:
+            self.queue.put_nowait(item)
+        except asyncio.QueueFull:
+            self.overflowed = True
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait(_OVERFLOW)
+
+
+def subscriber_count() -> int:
+    with _lock:
+        return sum(len(subs) for subs in _subscribers.values())
+
+
+def publish_scan_event(user_id: int, event: str, data: dict[str, Any]) -> None:
+    """Push ``event`` to every open stream of ``user_id``.
+
+    Safe to call from any thread: delivery is handed to each subscriber's event
+    loop, so job workers and request handlers publish the same way. With no
+    subscribers this is a dict lookup and nothing else.
+    """
+
+    with _lock:
+        subs = list(_subscribers.get(user_id, ()))
+    if not subs:
+        return
+
+    item = (next(_event_ids), event, json.dumps(data, default=str, separators=(",", ":")))
+    for sub in subs:
+        try:
+            sub.loop.call_soon_threadsafe(sub.offer, item)
+        except RuntimeError:
+            # The subscriber's loop is closed; its stream is already gone.
+            pass
+
+
+def _format(event_id: int | None, event: str, data: str) -> bytes:
+    head = f"id: {event_id}\n" if event_id is not None else ""
+    return f"{head}event: {event}\ndata: {data}\n\n".encode("utf-8")
+
+
+async def stream_scan_events(user_id: int) -> AsyncIterator[bytes]:
+    """Yield Server-Sent Events frames for ``user_id`` until the client goes away.
+
+    Idle connections cost one queue and one pending ``wait_for``; a comment
+    line is sent every SCAN_EVENTS_KEEPALIVE_SECONDS so proxies keep them open.
+    """
+
+    sub = _Subscriber(asyncio.get_running_loop(), max(1, settings.SCAN_EVENTS_QUEUE_SIZE))
+    with _lock:
+        _subscribers.setdefault(user_id, set()).add(sub)
+
+    keepalive = max(1.0, settings.SCAN_EVENTS_KEEPALIVE_SECONDS)
+    try:
+        yield f"retry: {int(settings.SCAN_EVENTS_RETRY_MS)}\n\n".encode("utf-8")
+        yield _format(None, "ready", "{}")
+        while True:
+            try:
+                item = await asyncio.wait_for(sub.queue.get(), timeout=keepalive)
+            except asyncio.TimeoutError:
+                yield b": keepalive\n\n"
+                continue
+            if item is _OVERFLOW:
+                yield _format(None, "resync", '{"reason":"overflow"}')
+                return
+            event_id, event, data = item
+            yield _format(event_id, event, data)
+    finally:
+        with _lock:
+            subs = _subscribers.get(user_id)
+            if subs is not None:
+                subs.discard(sub)
+                if not subs:
+                    del _subscribers[user_id]
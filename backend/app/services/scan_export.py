@@ -0,0 +1,305 @@
+from __future__ import annotations
+
+import csv
+import io
+import json
+from datetime import date, datetime
+from typing import Any, Iterator
+
+from sqlalchemy import select
+
+from app.core.config import settings
+from app.db.session import SessionLocal
+from app.models.scan import Scan
+from app.services.result_codec import load_scan_result, result_json_bytes
+
+EXPORT_FORMATS = {
+    "ndjson": ("application/x-ndjson", "ndjson"),
+    "csv": ("text/csv; charset=utf-8", "csv"),
+    "parquet": ("application/vnd.apache.parquet", "parquet"),
+}
+
+_META_COLUMNS = (
+    Scan.id,
+    Scan.user_id,
+    Scan.image_filename,
+    Scan.status,
+    Scan.scan_type,
+    Scan.created_at,
+    Scan.location,
+    Scan.health_percent,
+    Scan.overall_yield_index,
+    Scan.disease_category,
+)
+
+# Flat columns for CSV and Parquet. The first block comes straight from the
+# scans table, the rest is pulled out of the stored result.
+FLAT_COLUMNS = (
+    "id",
+    "user_id",
+    "created_at",
+    "scan_type",
+    "status",
+    "image_filename",
+    "location",
+    "disease_category",
+    "health_percent",
+    "overall_yield_index",
+    "disease_count",
+    "total_detections",
+    "kernel_development_score",
+    "discoloration_index",
+    "leaf_dryness_index",
+    "area_hectares",
+    "drone_name",
+    "drone_altitude",
+    "flight_duration",
+    "field_size",
+    "captured_at",
+)
+
+_INT_COLUMNS = {
+    "id",
+    "user_id",
+    "health_percent",
+    "overall_yield_index",
+    "disease_count",
+    "total_detections",
+    "kernel_development_score",
+    "discoloration_index",
+    "leaf_dryness_index",
+}
+
+
+class ExportUnavailableError(RuntimeError):
+    pass
+
+
+def _require_pyarrow():
+    try:
+        import pyarrow as pa  # type: ignore
+        import pyarrow.parquet as pq  # type: ignore
+    except Exception as e:  # pragma: no cover
+        raise ExportUnavailableError(
+            "pyarrow is not installed. Install backend/requirements-parquet.txt to enable Parquet export."
+        ) from e
+    return pa, pq
+
+
+def check_export_format(fmt: str) -> None:
+    """Raise ExportUnavailableError up front, before any response bytes are sent."""
+
+    if fmt == "parquet":
+        _require_pyarrow()
+
+
+def _iter_rows(
+    *,
+    user_id: int | None,
+    start: date | None,
+    end: date | None,
+    scan_type: str | None,
+) -> Iterator[Any]:
+    stmt = select(*_META_COLUMNS, Scan.result_json, Scan.result_data, Scan.result_doc).order_by(Scan.id)
+    if user_id is not None:
+        stmt = stmt.where(Scan.user_id == user_id)
+    if start is not None:
+        stmt = stmt.where(Scan.created_date >= start)
+    if end is not None:
+        stmt = stmt.where(Scan.created_date <= end)
+    if scan_type:
+        stmt = stmt.where(Scan.scan_type == scan_type)
+
+    # yield_per streams from a server-side cursor where the driver has one, so
+    # only one batch of rows is ever held in memory.
+    db = SessionLocal()
+    try:
+        result = db.execute(stmt.execution_options(yield_per=max(1, settings.EXPORT_BATCH_SIZE)))
+        yield from result
+    finally:
+        db.close()
+
+
+def _iso(value: Any) -> str | None:
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return value
+
+
+def _meta(row: Any) -> dict[str, Any]:
+    return {
+        "id": row.id,
+        "user_id": row.user_id,
+        "created_at": _iso(row.created_at),
+        "scan_type": row.scan_type,
+        "status": row.status,
+        "image_filename": row.image_filename,
+        "location": row.location,
+        "disease_category": row.disease_category,
+        "health_percent": row.health_percent,
+        "overall_yield_index": row.overall_yield_index,
+    }
+
+
+def _sub(data: dict[str, Any], key: str) -> dict[str, Any]:
+    value = data.get(key)
+    return value if isinstance(value, dict) else {}
+
+
+def flatten_row(row: Any) -> dict[str, Any]:
+    out = _meta(row)
+    data = load_scan_result(row)
+    if not isinstance(data, dict):
+        data = {}
+
+    health = _sub(data, "field_health")
+    yield_estimate = _sub(data, "yield_estimate")
+    drone = _sub(data, "drone")
+    area = _sub(data, "field_area")
+
+    total = health.get("total_detections")
+    if total is None:
+        detections = data.get("detections", data.get("predictions"))
+        total = len(detections) if isinstance(detections, list) else None
+
+    out.update(
+        {
+            "disease_count": health.get("disease_count"),
+            "total_detections": total,
+            "kernel_development_score": yield_estimate.get("kernel_development_score"),
+            "discoloration_index": yield_estimate.get("discoloration_index"),
+            "leaf_dryness_index": yield_estimate.get("leaf_dryness_index"),
+            "area_hectares": area.get("area_hectares"),
+            "drone_name": drone.get("name"),
+            "drone_altitude": drone.get("altitude"),
+            "flight_duration": drone.get("flight_duration"),
+            "field_size": drone.get("field_size"),
+            "captured_at": drone.get("captured_at"),
+        }
+    )
+    for name in _INT_COLUMNS:
+        value = out.get(name)
+        if value is not None and not isinstance(value, int):
+            try:
+                out[name] = int(round(float(value)))
+            except (TypeError, ValueError):
+                out[name] = None
+    if out["area_hectares"] is not None:
+        try:
+            out["area_hectares"] = float(out["area_hectares"])
+        except (TypeError, ValueError):
+            out["area_hectares"] = None
+    for name in ("drone_name", "drone_altitude", "flight_duration", "field_size", "captured_at"):
+        if out[name] is not None:
+            out[name] = str(out[name])
+    return out
+
+
+def _ndjson(rows: Iterator[Any]) -> Iterator[bytes]:
+    buf: list[str] = []
+    size = 0
+    for row in rows:
+        # Stored JSON is spliced in as is instead of being parsed and re-encoded.
+        head = json.dumps(_meta(row), separators=(",", ":"))
+        result = result_json_bytes(row.result_json, row.result_data, row.result_doc).decode("utf-8")
+        line = f'{head[:-1]},"result":{result}}}\n'
+        buf.append(line)
+        size += len(line)
+        if size >= 64 * 1024:
+            yield "".join(buf).encode("utf-8")
+            buf, size = [], 0
+    if buf:
+        yield "".join(buf).encode("utf-8")
+
+
+def _csv(rows: Iterator[Any]) -> Iterator[bytes]:
+    out = io.StringIO()
+    writer = csv.DictWriter(out, fieldnames=FLAT_COLUMNS, extrasaction="ignore")
+    writer.writeheader()
+    for row in rows:
+        writer.writerow(flatten_row(row))
+        if out.tell() >= 64 * 1024:
+            yield out.getvalue().encode("utf-8")
+            out.seek(0)
+            out.truncate()
+    if out.tell():
+        yield out.getvalue().encode("utf-8")
+
+
+class _Drain(io.RawIOBase):
+    """Write-only sink whose contents are handed out and discarded batch by batch."""
+
+    def __init__(self) -> None:
+        self._chunks: list[bytes] = []
+        self._pos = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, b) -> int:
+        data = bytes(b)
+        self._chunks.append(data)
+        self._pos += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._pos
+
+    def take(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks = []
+        return data
+
+
+def _parquet(rows: Iterator[Any]) -> Iterator[bytes]:
+    pa, pq = _require_pyarrow()
+    schema = pa.schema(
+        [
+            (name, pa.int64())
+            if name in _INT_COLUMNS
+            else (name, pa.float64())
+            if name == "area_hectares"
+            else (name, pa.string())
+            for name in FLAT_COLUMNS
+        ]
+    )
+
+    sink = _Drain()
+    writer = pq.ParquetWriter(pa.PythonFile(sink, mode="w"), schema, compression="zstd")
+    batch_size = max(1, settings.EXPORT_BATCH_SIZE)
+    try:
+        batch: list[dict[str, Any]] = []
+        for row in rows:
+            batch.append(flatten_row(row))
+            if len(batch) >= batch_size:
+                # One row group per batch keeps memory flat for any export size.
+                writer.write_table(pa.Table.from_pylist(batch, schema=schema))
+                batch = []
+                chunk = sink.take()
+                if chunk:
+                    yield chunk
+        if batch:
+            writer.write_table(pa.Table.from_pylist(batch, schema=schema))
+    finally:
+        writer.close()
+    chunk = sink.take()
+    if chunk:
+        yield chunk
+
+
+def export_scans(
+    fmt: str,
+    *,
+    user_id: int | None = None,
+    start: date | None = None,
+    end: date | None = None,
+    scan_type: str | None = None,
+) -> Iterator[bytes]:
+    """Yield the matching scans encoded as ``fmt`` (``ndjson``, ``csv`` or ``parquet``)."""
+
+    rows = _iter_rows(user_id=user_id, start=start, end=end, scan_type=scan_type)
+    if fmt == "ndjson":
+        return _ndjson(rows)
+    if fmt == "csv":
+        return _csv(rows)
+    return _parquet(rows)
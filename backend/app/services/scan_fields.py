@@ -0,0 +1,83 @@
+from __future__ import annotations
+
+import json
+from collections import Counter
+from typing import Any
+
+from app.crud.rollup import scan_type_of
+
+# Label fragments that mark a detection as a disease or pest finding.
+DISEASE_KEYWORDS = (
+    "disease",
+    "blight",
+    "rust",
+    "mold",
+    "rot",
+    "wilt",
+    "pest",
+    "infect",
+)
+
+
+def _int_or_none(value: Any) -> int | None:
+    try:
+        return int(round(float(value)))
+    except (TypeError, ValueError):
+        return None
+
+
+def disease_category(detections: Any) -> str | None:
+    """Most frequent disease keyword among the detections.
+
+    ``healthy`` when there are detections but none look diseased, ``None`` when
+    there is nothing to judge.
+    """
+
+    if not isinstance(detections, list):
+        return None
+    labels = [
+        str(d.get("class_name") or d.get("class") or d.get("label") or d.get("class_id") or "").lower()
+        for d in detections
+        if isinstance(d, dict)
+    ]
+    if not labels:
+        return None
+    hits: Counter[str] = Counter()
+    for label in labels:
+        for keyword in DISEASE_KEYWORDS:
+            if keyword in label:
+                hits[keyword] += 1
+                break
+    if not hits:
+        return "healthy"
+    return hits.most_common(1)[0][0]
+
+
+def scan_columns(result: Any) -> dict[str, Any]:
+    """Pull the indexed analytics columns of a Scan out of its result (decoded, or JSON text)."""
+
+    data = result
+    if isinstance(result, str) or result is None:
+        try:
+            data = json.loads(result or "")
+        except Exception:
+            data = None
+    if not isinstance(data, dict):
+        data = {}
+
+    field_health = data.get("field_health") if isinstance(data.get("field_health"), dict) else {}
+    yield_estimate = data.get("yield_estimate") if isinstance(data.get("yield_estimate"), dict) else {}
+    drone = data.get("drone") if isinstance(data.get("drone"), dict) else {}
+    detections = data.get("detections")
+    if detections is None:
+        detections = data.get("predictions")
+
+    location = str(drone.get("location") or "").strip()[:120] or None
+
+    return {
+        "scan_type": scan_type_of(data),
+        "health_percent": _int_or_none(field_health.get("field_health_percent")),
+        "overall_yield_index": _int_or_none(yield_estimate.get("overall_yield_index")),
+        "location": location,
+        "disease_category": disease_category(detections),
+    }
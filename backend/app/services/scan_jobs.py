@@ -0,0 +1,239 @@
+from __future__ import annotations
+
+import json
+import logging
+import os
+import socket
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from app.core.config import settings
+from app.crud.scan import get_scan_by_id, update_scan_result
+from app.crud.scan_job import (
+    claim_scan_jobs,
+    get_scan_job,
+    requeue_stale_scan_jobs,
+    update_scan_job,
+)
+from app.db.session import SessionLocal
+from app.services.admission import is_degraded
+from app.services.scan_events import publish_scan_event
+from app.services.scan_pipeline import analyze_scan, scan_to_out
+from app.services.storage import get_storage
+
+logger = logging.getLogger(__name__)
+
+_lock = threading.Lock()
+_wake = threading.Event()
+_stop = threading.Event()
+_thread: threading.Thread | None = None
+_executor: ThreadPoolExecutor | None = None
+_busy = 0
+
+
+def worker_id() -> str:
+    # Computed on each call so forked workers never share their parent's id.
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def notify_scan_job_queued() -> None:
+    _wake.set()
+
+
+def _fail_job(db, *, job_id: str, user_id: int, scan_id: int | None, drone: dict, error: str) -> None:
+    update_scan_job(db, job_id=job_id, status="failed", stage="failed", error=error, claimed_by=None)
+    _mark_scan_failed(db, job_id=job_id, user_id=user_id, scan_id=scan_id, drone=drone, error=error)
+
+
+def _mark_scan_failed(db, *, job_id: str, user_id: int, scan_id: int | None, drone: dict, error: str) -> None:
+    if scan_id is not None:
+        result = {"scan_type": "dashboard", "drone": drone, "error": error}
+        update_scan_result(db, scan_id=scan_id, result=result, status="failed")
+    publish_scan_event(user_id, "scan.failed", {"scan_id": scan_id, "job_id": job_id, "error": error})
+
+
+def _finish_exhausted(job_ids: list[str]) -> None:
+    """Fail the scans of jobs claim_scan_jobs gave up on."""
+
+    db = SessionLocal()
+    try:
+        for job_id in job_ids:
+            job = get_scan_job(db, job_id=job_id)
+            if job is None:
+                continue
+            logger.warning("scan job %s failed after %s attempts", job_id, job.attempts)
+            drone = json.loads(job.payload_json or "{}").get("drone") or {}
+            _mark_scan_failed(
+                db, job_id=job_id, user_id=job.user_id, scan_id=job.scan_id, drone=drone, error=job.error or ""
+            )
+    except Exception:
+        logger.exception("failing exhausted scan jobs")
+    finally:
+        db.close()
+
+
+def process_scan_job(job_id: str) -> None:
+    me = worker_id()
+    db = SessionLocal()
+    drone: dict = {}
+    scan_id: int | None = None
+    user_id = 0
+    try:
+        job = get_scan_job(db, job_id=job_id)
+        if job is None:
+            return
+        scan_id = job.scan_id
+        user_id = job.user_id
+        payload = json.loads(job.payload_json or "{}")
+        drone = payload.get("drone") or {}
+
+        scan = get_scan_by_id(db, scan_id=job.scan_id)
+        if scan is None:
+            _fail_job(db, job_id=job_id, user_id=user_id, scan_id=None, drone=drone, error="Scan was deleted")
+            return
+
+        image_filename = scan.image_filename
+
+        def on_stage(stage: str, progress: int) -> None:
+            if not update_scan_job(db, job_id=job_id, worker_id=me, stage=stage, progress=progress):
+                raise RuntimeError("Lost the lease on this scan job")
+            publish_scan_event(
+                user_id,
+                "scan.progress",
+                {
+                    "scan_id": scan_id,
+                    "job_id": job_id,
+                    "image_filename": image_filename,
+                    "stage": stage,
+                    "progress": progress,
+                },
+            )
+
+        path = get_storage().fetch(scan.image_filename)
+        if path is None:
+            raise FileNotFoundError(f"Uploaded image {scan.image_filename} is missing from storage")
+
+        result = analyze_scan(
+            filename=scan.image_filename, path=path, drone_info=drone, on_stage=on_stage, prerender=not is_degraded()
+        )
+
+        on_stage("save", 90)
+        saved = update_scan_result(db, scan_id=scan.id, result=result, status="complete")
+        update_scan_job(
+            db,
+            job_id=job_id,
+            worker_id=me,
+            status="succeeded",
+            stage="done",
+            progress=100,
+            error=None,
+        )
+        if saved is not None:
+            summary = scan_to_out(saved, result=result).model_dump(mode="json")
+            publish_scan_event(user_id, "scan.completed", {"scan_id": saved.id, "job_id": job_id, "scan": summary})
+    except Exception as e:
+        db.rollback()
+        logger.exception("scan job %s failed", job_id)
+        job = get_scan_job(db, job_id=job_id)
+        if job is None or job.claimed_by != me:
+            return
+        if job.attempts >= settings.SCAN_JOB_MAX_ATTEMPTS:
+            _fail_job(db, job_id=job_id, user_id=user_id, scan_id=scan_id, drone=drone, error=str(e))
+        else:
+            update_scan_job(db, job_id=job_id, status="queued", claimed_by=None, error=str(e))
+            _wake.set()
+    finally:
+        db.close()
+
+
+def _run_claimed(job_id: str) -> None:
+    global _busy
+    try:
+        process_scan_job(job_id)
+    finally:
+        with _lock:
+            _busy -= 1
+        _wake.set()
+
+
+def _dispatch_loop() -> None:
+    global _busy
+    me = worker_id()
+    while not _stop.is_set():
+        with _lock:
+            free = settings.SCAN_JOB_WORKERS - _busy
+            executor = _executor
+        if free > 0 and executor is not None:
+            db = SessionLocal()
+            try:
+                claimed, exhausted = claim_scan_jobs(
+                    db,
+                    worker_id=me,
+                    limit=free,
+                    lease_seconds=settings.SCAN_JOB_LEASE_SECONDS,
+                    max_attempts=settings.SCAN_JOB_MAX_ATTEMPTS,
+                )
+            except Exception:
+                logger.exception("claiming scan jobs failed")
+                claimed, exhausted = [], []
+            finally:
+                db.close()
+            if exhausted:
+                _finish_exhausted(exhausted)
+            for job_id in claimed:
+                with _lock:
+                    _busy += 1
+                try:
+                    executor.submit(_run_claimed, job_id)
+                except RuntimeError:
+                    # Shutting down; the claimed job is picked up again once its lease expires.
+                    with _lock:
+                        _busy -= 1
+
+        _wake.wait(timeout=settings.SCAN_JOB_POLL_SECONDS)
+        _wake.clear()
+
+
+def start_scan_job_worker() -> None:
+    """Reclaim work abandoned by dead workers and start draining the job table."""
+
+    global _thread, _executor
+    if settings.SCAN_JOB_WORKERS <= 0:
+        return
+
+    db = SessionLocal()
+    try:
+        # Jobs claimed under our own id belong to a previous run of this process
+        # (e.g. a container restart keeps hostname and pid), so they cannot be live.
+        reclaimed = requeue_stale_scan_jobs(
+            db,
+            lease_seconds=settings.SCAN_JOB_LEASE_SECONDS,
+            worker_id=worker_id(),
+        )
+        if reclaimed:
+            logger.info("requeued %s abandoned scan jobs", reclaimed)
+    finally:
+        db.close()
+
+    with _lock:
+        if _thread is not None:
+            return
+        _stop.clear()
+        _executor = ThreadPoolExecutor(max_workers=settings.SCAN_JOB_WORKERS, thread_name_prefix="scan-job")
+        _thread = threading.Thread(target=_dispatch_loop, name="scan-job-dispatcher", daemon=True)
+        _thread.start()
+
+
+def stop_scan_job_worker() -> None:
+    global _thread, _executor
+    with _lock:
+        thread, executor = _thread, _executor
+        _thread = None
+        _executor = None
+    _stop.set()
+    _wake.set()
+    if thread is not None:
+        thread.join(timeout=5)
+    if executor is not None:
+        # Running jobs keep their lease; if they do not finish, another worker reclaims them.
+        executor.shutdown(wait=False, cancel_futures=True)
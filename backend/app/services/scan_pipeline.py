@@ -0,0 +1,166 @@
+from __future__ import annotations
+
+from datetime import datetime
+from typing import Any, Callable, Iterable
+
+from app.core.security import scan_image_url
+from app.core.tracing import traced
+from app.schemas.scan import ScanOut
+from app.services.ai_service import ModelNotAvailableError, predict_image
+from app.services.render_queue import enqueue_render, overlay_name
+from app.services.result_codec import dumps_json, result_json_bytes
+from app.services.scan_fields import DISEASE_KEYWORDS
+
+# Called as on_stage(stage, progress_percent) as a scan moves through the pipeline.
+StageCallback = Callable[[str, int], None]
+
+
+@traced("scan.field_health")
+def compute_field_health(result: dict) -> dict:
+    detections_raw = result.get("detections")
+    detections = [d for d in detections_raw if isinstance(d, dict)] if isinstance(detections_raw, list) else []
+
+    total = len(detections)
+    disease_count = 0
+    for d in detections:
+        label = str(d.get("class_name") or d.get("class_id") or "").lower()
+        if any(k in label for k in DISEASE_KEYWORDS):
+            disease_count += 1
+
+    if total <= 0:
+        health_percent = 100
+    else:
+        health_percent = max(0, min(100, round(100 * (1 - disease_count / total))))
+
+    if disease_count == 0:
+        recommendation = (
+            "No disease indicators were found in this scan. Maintain regular scouting and record "
+            "keeping, keep irrigation and fertilization on schedule, and avoid unnecessary "
+            "chemical applications."
+        )
+    elif health_percent >= 70:
+        recommendation = (
+            "Early or mild disease pressure detected. Mark the affected spots from the scan, scout "
+            "those rows on the ground, and consider targeted treatment only in hotspots. Monitor "
+            "these areas over the next 3–7 days."
+        )
+    elif health_percent >= 40:
+        recommendation = (
+            "Moderate disease presence detected. Prioritise treatment of the affected blocks, "
+            "following local agronomy or extension guidelines for product choice and rates. Improve "
+            "airflow in the canopy where possible and avoid prolonged leaf wetness from irrigation."
+        )
+    else:
+        recommendation = (
+            "Severe disease indicators detected in this frame. Consult an agronomist or local "
+            "extension officer as soon as possible, plan immediate treatment for the worst areas, "
+            "and review crop rotation, residue management, and variety selection for future seasons."
+        )
+
+    return {
+        "field_health_percent": health_percent,
+        "disease_count": disease_count,
+        "total_detections": total,
+        "recommendation": recommendation,
+    }
+
+
+def analyze_scan(
+    *,
+    filename: str,
+    path: str,
+    drone_info: dict[str, Any],
+    on_stage: StageCallback | None = None,
+    prerender: bool = True,
+) -> dict[str, Any]:
+    """Run inference on a stored upload and build the scan's result payload.
+
+    A missing model is reported in the result rather than raised; any other
+    inference error propagates to the caller. Without ``prerender`` the overlay
+    is left to be rendered when it is first viewed.
+    """
+
+    def stage(name: str, progress: int) -> None:
+        if on_stage is not None:
+            on_stage(name, progress)
+
+    stage("inference", 20)
+    try:
+        result: Any = predict_image(path, render=False)
+    except ModelNotAvailableError as e:
+        result = {"status": "model_not_available", "reason": str(e)}
+
+    stage("render", 70)
+    detections = result.get("detections") if isinstance(result, dict) else None
+    if isinstance(detections, list) and detections:
+        # Pre-render the overlay in the background so the first viewer does not pay for it.
+        if prerender:
+            enqueue_render(image_filename=filename, detections=[d for d in detections if isinstance(d, dict)])
+        result["annotated_image_filename"] = overlay_name(filename)
+
+    field_health = compute_field_health(result) if isinstance(result, dict) else None
+
+    if isinstance(result, dict):
+        result["drone"] = drone_info
+        if field_health is not None:
+            result["field_health"] = field_health
+        if "scan_type" not in result:
+            result["scan_type"] = "dashboard"
+
+    return result
+
+
+def scan_to_out(scan: Any, *, result: Any) -> ScanOut:
+    return ScanOut(
+        id=scan.id,
+        image_filename=scan.image_filename,
+        image_url=scan_image_url(scan),
+        original_image_url=scan_image_url(scan, variant="original"),
+        result=result,
+        status=scan.status,
+        created_at=scan.created_at,
+    )
+
+
+def _json_datetime(value: datetime) -> str:
+    # The same text pydantic writes for a datetime field.
+    text = value.isoformat()
+    return f"{text[:-6]}Z" if text.endswith("+00:00") else text
+
+
+def _splice_result(head: dict[str, Any], scan: Any, tail: dict[str, Any]) -> bytes:
+    result = result_json_bytes(scan.result_json, scan.result_data, scan.result_doc)
+    return dumps_json(head)[:-1] + b',"result":' + result + b"," + dumps_json(tail)[1:]
+
+
+def scan_out_json(scan: Any) -> bytes:
+    """``scan_to_out(scan, ...)`` as JSON, with the stored result spliced in without parsing it.
+
+    Stored results were validated when they were written, so list endpoints
+    serve them through this instead of building and re-serializing ScanOut models.
+    """
+
+    head = {
+        "id": scan.id,
+        "image_filename": scan.image_filename,
+        "image_url": scan_image_url(scan),
+        "original_image_url": scan_image_url(scan, variant="original"),
+    }
+    return _splice_result(head, scan, {"status": scan.status, "created_at": _json_datetime(scan.created_at)})
+
+
+def admin_scan_out_json(scan: Any) -> bytes:
+    """An AdminScanOut as JSON; see :func:`scan_out_json`."""
+
+    head = {
+        "id": scan.id,
+        "user_id": scan.user_id,
+        "image_filename": scan.image_filename,
+        "image_url": scan_image_url(scan),
+        "original_image_url": scan_image_url(scan, variant="original"),
+    }
+    return _splice_result(head, scan, {"created_at": _json_datetime(scan.created_at)})
+
+
+def json_array(items: Iterable[bytes]) -> bytes:
+    return b"[" + b",".join(items) + b"]"
@@ -0,0 +1,336 @@
+from __future__ import annotations
+
+import os
+import threading
+import time
+import uuid
+from functools import lru_cache
+from typing import BinaryIO, Iterator
+
+from app.core.config import settings
+
+_COPY_CHUNK_SIZE = 1024 * 1024
+
+
+class StorageError(RuntimeError):
+    pass
+
+
+def _safe_name(name: str) -> str:
+    base = os.path.basename(name or "")
+    if not base or base in (".", ".."):
+        raise StorageError(f"Invalid storage object name: {name!r}")
+    return base
+
+
+def is_scratch_name(name: str) -> bool:
+    """True for node-local scratch files: staged uploads, temp inputs, partial writes."""
+
+    return name.startswith("tmp_") or ".part-" in name
+
+
+def _copy_to_path(fileobj: BinaryIO, path: str) -> int:
+    """Stream ``fileobj`` into ``path`` via a temporary file and return the size.
+
+    The rename at the end means readers never observe a half-written object.
+    """
+
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp_path = f"{path}.part-{uuid.uuid4().hex}"
+    written = 0
+    try:
+        with open(tmp_path, "wb") as out:
+            while True:
+                chunk = fileobj.read(_COPY_CHUNK_SIZE)
+                if not chunk:
+                    break
+                out.write(chunk)
+                written += len(chunk)
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            try:
+                os.remove(tmp_path)
+            except Exception:
+                pass
+    return written
+
+
+class LocalStorage:
+    """Objects live directly in ``UPLOAD_DIR`` on the local filesystem."""
+
+    name = "local"
+
+    def __init__(self, root: str) -> None:
+        self.root = root
+
+    def path(self, name: str) -> str:
+        return os.path.join(self.root, _safe_name(name))
+
+    def save(self, name: str, fileobj: BinaryIO) -> int:
+        return _copy_to_path(fileobj, self.path(name))
+
+    def publish(self, name: str) -> None:
+        # Files written to path() are already in their final location.
+        return None
+
+    def fetch(self, name: str) -> str | None:
+        path = self.path(name)
+        return path if os.path.exists(path) else None
+
+    def exists(self, name: str) -> bool:
+        return os.path.exists(self.path(name))
+
+    def delete(self, name: str) -> None:
+        try:
+            os.remove(self.path(name))
+        except FileNotFoundError:
+            pass
+
+    def iter_objects(self) -> Iterator[tuple[str, int, float]]:
+        """Yield ``(name, size, mtime)`` for every stored object."""
+
+        if not os.path.isdir(self.root):
+            return
+        with os.scandir(self.root) as it:
+            for entry in it:
+                if not entry.is_file(follow_symlinks=False) or is_scratch_name(entry.name):
+                    continue
+                try:
+                    st = entry.stat()
+                except FileNotFoundError:
+                    continue
+                yield entry.name, st.st_size, st.st_mtime
+
+
+def _require_boto3():
+    try:
+        import boto3  # type: ignore
+        from boto3.s3.transfer import TransferConfig  # type: ignore
+        from botocore.exceptions import ClientError  # type: ignore
+    except Exception as e:  # pragma: no cover
+        raise StorageError(
+            "boto3 is not installed. Install backend/requirements-s3.txt to enable S3 storage."
+        ) from e
+    return boto3, TransferConfig, ClientError
+
+
+class S3Storage:
+    """Objects live in an S3-compatible bucket (AWS S3, MinIO, R2, ...).
+
+    ``UPLOAD_DIR`` is used as a node-local working directory and read-through
+    cache: uploads are streamed to it and then pushed to the bucket with
+    multipart transfers, and reads are served from it when the object has
+    been fetched before, so hot images are not downloaded again.
+    """
+
+    name = "s3"
+
+    def __init__(
+        self,
+        *,
+        bucket: str,
+        cache_dir: str,
+        prefix: str = "",
+        endpoint_url: str | None = None,
+        region_name: str | None = None,
+        access_key_id: str | None = None,
+        secret_access_key: str | None = None,
+        cache_max_bytes: int = 0,
+        multipart_chunk_size: int = 8 * 1024 * 1024,
+    ) -> None:
+        if not bucket:
+            raise StorageError("S3_BUCKET must be set when STORAGE_BACKEND=s3")
+
+        boto3, TransferConfig, ClientError = _require_boto3()
+        self._client_error = ClientError
+        self.bucket = bucket
+        self.prefix = prefix.strip("/")
+        self.cache_dir = cache_dir
+        self.cache_max_bytes = max(0, int(cache_max_bytes))
+        self._client = boto3.client(
+            "s3",
+            endpoint_url=endpoint_url or None,
+            region_name=region_name or None,
+            aws_access_key_id=access_key_id or None,
+            aws_secret_access_key=secret_access_key or None,
+        )
+        self._transfer = TransferConfig(
+            multipart_threshold=multipart_chunk_size,
+            multipart_chunksize=multipart_chunk_size,
+        )
+        self._cache_lock = threading.Lock()
+        self._cache_bytes: int | None = None
+
+    def _key(self, name: str) -> str:
+        base = _safe_name(name)
+        return f"{self.prefix}/{base}" if self.prefix else base
+
+    def _is_missing(self, e: Exception) -> bool:
+        if not isinstance(e, self._client_error):
+            return False
+        code = str(e.response.get("Error", {}).get("Code", ""))  # type: ignore[attr-defined]
+        return code in ("404", "NoSuchKey", "NotFound")
+
+    def path(self, name: str) -> str:
+        return os.path.join(self.cache_dir, _safe_name(name))
+
+    def save(self, name: str, fileobj: BinaryIO) -> int:
+        path = self.path(name)
+        written = _copy_to_path(fileobj, path)
+        self._upload(name, path)
+        self._account(written)
+        return written
+
+    def publish(self, name: str) -> None:
+        path = self.path(name)
+        if not os.path.exists(path):
+            raise StorageError(f"Nothing to publish at {path}")
+        self._upload(name, path)
+        self._account(os.path.getsize(path))
+
+    def _upload(self, name: str, path: str) -> None:
+        try:
+            self._client.upload_file(path, self.bucket, self._key(name), Config=self._transfer)
+        except Exception as e:
+            raise StorageError(f"S3 upload failed for {name}: {e}") from e
+
+    def fetch(self, name: str) -> str | None:
+        path = self.path(name)
+        if os.path.exists(path):
+            try:
+                # Bump atime only so LRU eviction sees the hit without changing Last-Modified.
+                os.utime(path, (time.time(), os.path.getmtime(path)))
+            except Exception:
+                pass
+            return path
+
+        os.makedirs(self.cache_dir, exist_ok=True)
+        tmp_path = f"{path}.part-{uuid.uuid4().hex}"
+        try:
+            with open(tmp_path, "wb") as out:
+                self._client.download_fileobj(self.bucket, self._key(name), out, Config=self._transfer)
+            os.replace(tmp_path, path)
+        except Exception as e:
+            if self._is_missing(e):
+                return None
+            raise StorageError(f"S3 download failed for {name}: {e}") from e
+        finally:
+            if os.path.exists(tmp_path):
+                try:
+                    os.remove(tmp_path)
+                except Exception:
+                    pass
+
+        self._account(os.path.getsize(path))
+        return path
+
+    def exists(self, name: str) -> bool:
+        if os.path.exists(self.path(name)):
+            return True
+        try:
+            self._client.head_object(Bucket=self.bucket, Key=self._key(name))
+            return True
+        except Exception as e:
+            if self._is_missing(e):
+                return False
+            raise StorageError(f"S3 lookup failed for {name}: {e}") from e
+
+    def delete(self, name: str) -> None:
+        try:
+            self._client.delete_object(Bucket=self.bucket, Key=self._key(name))
+        except Exception as e:
+            if not self._is_missing(e):
+                raise StorageError(f"S3 delete failed for {name}: {e}") from e
+        try:
+            os.remove(self.path(name))
+        except FileNotFoundError:
+            pass
+
+    def iter_objects(self) -> Iterator[tuple[str, int, float]]:
+        """Yield ``(name, size, mtime)`` for every object in the bucket prefix."""
+
+        paginator = self._client.get_paginator("list_objects_v2")
+        prefix = f"{self.prefix}/" if self.prefix else ""
+        try:
+            for page in paginator.paginate(Bucket=self.bucket, Prefix=prefix):
+                for obj in page.get("Contents", []) or []:
+                    name = str(obj["Key"])[len(prefix):]
+                    if not name or "/" in name or is_scratch_name(name):
+                        continue
+                    yield name, int(obj.get("Size", 0)), obj["LastModified"].timestamp()
+        except Exception as e:
+            raise StorageError(f"S3 listing failed: {e}") from e
+
+    def _account(self, added: int) -> None:
+        if self.cache_max_bytes <= 0:
+            return
+        with self._cache_lock:
+            if self._cache_bytes is None:
+                self._cache_bytes = self._scan_cache_size()
+            else:
+                self._cache_bytes += added
+            if self._cache_bytes > self.cache_max_bytes:
+                self._cache_bytes = self._trim_cache()
+
+    def _scan_cache_size(self) -> int:
+        total = 0
+        if not os.path.isdir(self.cache_dir):
+            return 0
+        with os.scandir(self.cache_dir) as it:
+            for entry in it:
+                if entry.is_file(follow_symlinks=False):
+                    total += entry.stat().st_size
+        return total
+
+    def _trim_cache(self) -> int:
+        # Every object in the cache is also in the bucket, so evicting the least
+        # recently used files only costs a re-download on the next miss.
+        entries = []
+        with os.scandir(self.cache_dir) as it:
+            for entry in it:
+                if not entry.is_file(follow_symlinks=False):
+                    continue
+                # Scratch files belong to in-flight requests and are never in the bucket.
+                if is_scratch_name(entry.name):
+                    continue
+                st = entry.stat()
+                entries.append((max(st.st_atime, st.st_mtime), st.st_size, entry.path))
+        entries.sort()
+
+        total = sum(size for _, size, _ in entries)
+        target = int(self.cache_max_bytes * 0.9)
+        for _, size, path in entries:
+            if total <= target:
+                break
+            try:
+                os.remove(path)
+                total -= size
+            except FileNotFoundError:
+                total -= size
+            except Exception:
+                continue
+        return total
+
+
+Storage = LocalStorage | S3Storage
+
+
+@lru_cache(maxsize=1)
+def get_storage() -> Storage:
+    backend = (settings.STORAGE_BACKEND or "local").strip().lower()
+    if backend == "local":
+        return LocalStorage(settings.UPLOAD_DIR)
+    if backend == "s3":
+        return S3Storage(
+            bucket=settings.S3_BUCKET,
+            prefix=settings.S3_PREFIX,
+            endpoint_url=settings.S3_ENDPOINT_URL,
+            region_name=settings.S3_REGION,
+            access_key_id=settings.S3_ACCESS_KEY_ID,
+            secret_access_key=settings.S3_SECRET_ACCESS_KEY,
+            cache_dir=settings.UPLOAD_DIR,
+            cache_max_bytes=settings.STORAGE_CACHE_MAX_BYTES,
+            multipart_chunk_size=settings.S3_MULTIPART_CHUNK_SIZE,
+        )
+    raise StorageError(f"Unknown STORAGE_BACKEND: {settings.STORAGE_BACKEND}")
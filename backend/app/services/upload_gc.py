@@ -0,0 +1,218 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import os
+import random
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Any
+
+from sqlalchemy import delete, update
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.crud.blob import list_blobs_by_filenames
+from app.crud.scan import count_scans_by_stem
+from app.db.session import SessionLocal
+from app.models.blob import Blob
+from app.services.storage import StorageError, get_storage, is_scratch_name
+from app.services.uploads import DERIVED_SUFFIXES
+
+logger = logging.getLogger(__name__)
+
+_metrics_lock = threading.Lock()
+_pass_lock = threading.Lock()
+_metrics: dict[str, Any] = {
+    "passes_total": 0,
+    "files_deleted_total": 0,
+    "temp_files_deleted_total": 0,
+    "bytes_reclaimed_total": 0,
+    "seconds_total": 0.0,
+    "last_pass": None,
+}
+
+
+def get_gc_metrics() -> dict[str, Any]:
+    with _metrics_lock:
+        out = dict(_metrics)
+        if isinstance(out["last_pass"], dict):
+            out["last_pass"] = dict(out["last_pass"])
+        return out
+
+
+def _split_stem(name: str) -> tuple[str, bool]:
+    for suffix in DERIVED_SUFFIXES:
+        if name.endswith(suffix):
+            return name[: -len(suffix)], True
+    return os.path.splitext(name)[0], False
+
+
+def _collect_temp_files(cutoff: float, stats: dict[str, Any]) -> None:
+    # Scratch files never leave the node, so they are swept from the local
+    # working directory whatever the storage backend is.
+    root = settings.UPLOAD_DIR
+    if not os.path.isdir(root):
+        return
+    with os.scandir(root) as it:
+        for entry in it:
+            if not entry.is_file(follow_symlinks=False) or not is_scratch_name(entry.name):
+                continue
+            try:
+                st = entry.stat()
+                if st.st_mtime >= cutoff:
+                    continue
+                os.remove(entry.path)
+            except FileNotFoundError:
+                continue
+            except Exception:
+                stats["errors"] += 1
+                continue
+            stats["temp_files_deleted"] += 1
+            stats["bytes_reclaimed"] += st.st_size
+
+
+def _reconcile_batch(
+    db: Session,
+    batch: list[tuple[str, int, float]],
+    cutoff: float,
+    stats: dict[str, Any],
+) -> None:
+    storage = get_storage()
+    cutoff_dt = datetime.fromtimestamp(cutoff, tz=timezone.utc)
+
+    stems = sorted({_split_stem(name)[0] for name, _, _ in batch})
+    refs: dict[str, int] = {}
+    # Keep each statement's OR list short enough for SQLite's expression depth limit.
+    for i in range(0, len(stems), 200):
+        refs.update(count_scans_by_stem(db, stems=stems[i : i + 200]))
+
+    originals = [name for name, _, _ in batch if not _split_stem(name)[1]]
+    blobs = {b.filename: b for b in list_blobs_by_filenames(db, filenames=originals)}
+
+    for name, size, mtime in batch:
+        stem, derived = _split_stem(name)
+        blob = None if derived else blobs.get(name)
+        last_used = blob.last_used_at if blob is not None else None
+        if last_used is not None and last_used.tzinfo is None:
+            last_used = last_used.replace(tzinfo=timezone.utc)
+        recently_used = mtime >= cutoff or (last_used is not None and last_used >= cutoff_dt)
+
+        n_refs = refs.get(stem, 0)
+        if n_refs > 0:
+            if blob is not None and blob.ref_count != n_refs and not recently_used:
+                db.execute(
+                    update(Blob)
+                    .where(Blob.id == blob.id, Blob.ref_count == blob.ref_count)
+                    .values(ref_count=n_refs)
+                    .execution_options(synchronize_session=False)
+                )
+                db.commit()
+                stats["blobs_resynced"] += 1
+            continue
+
+        if recently_used:
+            continue
+
+        if blob is not None:
+            # Only drop the row if no upload has re-acquired it since we looked.
+            res = db.execute(
+                delete(Blob).where(
+                    Blob.id == blob.id,
+                    (Blob.last_used_at.is_(None)) | (Blob.last_used_at < cutoff_dt),
+                )
+                # The loaded rows are not needed again; evaluating the predicate
+                # against them would compare naive SQLite datetimes to cutoff_dt.
+                .execution_options(synchronize_session=False)
+            )
+            db.commit()
+            if not res.rowcount:
+                continue
+            stats["blobs_removed"] += 1
+
+        try:
+            storage.delete(name)
+        except StorageError:
+            stats["errors"] += 1
+            continue
+        stats["files_deleted"] += 1
+        stats["bytes_reclaimed"] += size
+
+
+def run_gc_pass(*, grace_seconds: int | None = None, batch_size: int | None = None) -> dict[str, Any]:
+    """Delete stored files no scan references and stale scratch files.
+
+    Objects are listed from the storage backend and checked against the scans
+    table ``batch_size`` at a time. Anything younger than the grace period is
+    left alone so in-flight uploads that have not created their Scan yet are
+    never collected.
+    """
+
+    grace = settings.UPLOAD_GC_GRACE_SECONDS if grace_seconds is None else grace_seconds
+    size = max(1, settings.UPLOAD_GC_BATCH_SIZE if batch_size is None else batch_size)
+
+    stats: dict[str, Any] = {
+        "scanned": 0,
+        "files_deleted": 0,
+        "temp_files_deleted": 0,
+        "blobs_removed": 0,
+        "blobs_resynced": 0,
+        "bytes_reclaimed": 0,
+        "errors": 0,
+    }
+
+    with _pass_lock:
+        started = time.perf_counter()
+        cutoff = time.time() - max(0, grace)
+
+        _collect_temp_files(cutoff, stats)
+
+        db = SessionLocal()
+        try:
+            batch: list[tuple[str, int, float]] = []
+            for obj in get_storage().iter_objects():
+                stats["scanned"] += 1
+                batch.append(obj)
+                if len(batch) >= size:
+                    _reconcile_batch(db, batch, cutoff, stats)
+                    batch = []
+            if batch:
+                _reconcile_batch(db, batch, cutoff, stats)
+        finally:
+            db.close()
+
+        stats["duration_seconds"] = round(time.perf_counter() - started, 3)
+        stats["finished_at"] = datetime.now(timezone.utc).isoformat()
+
+    with _metrics_lock:
+        _metrics["passes_total"] += 1
+        _metrics["files_deleted_total"] += stats["files_deleted"]
+        _metrics["temp_files_deleted_total"] += stats["temp_files_deleted"]
+        _metrics["bytes_reclaimed_total"] += stats["bytes_reclaimed"]
+        _metrics["seconds_total"] += stats["duration_seconds"]
+        _metrics["last_pass"] = dict(stats)
+
+    logger.info(
+        "upload gc: scanned=%s deleted=%s temp=%s reclaimed=%sB in %.3fs",
+        stats["scanned"],
+        stats["files_deleted"],
+        stats["temp_files_deleted"],
+        stats["bytes_reclaimed"],
+        stats["duration_seconds"],
+    )
+    return stats
+
+
+async def upload_gc_loop() -> None:
+    interval = settings.UPLOAD_GC_INTERVAL_SECONDS
+    # Spread workers out so they do not all walk the directory at the same moment.
+    await asyncio.sleep(random.uniform(0.1, 1.0) * interval)
+    while True:
+        try:
+            await asyncio.to_thread(run_gc_pass)
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            logger.exception("upload gc pass failed")
+        await asyncio.sleep(interval)
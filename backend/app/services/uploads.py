@@ -0,0 +1,216 @@
+from __future__ import annotations
+
+import hashlib
+import os
+import uuid
+from dataclasses import dataclass
+
+from fastapi import UploadFile
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.core.metrics import UPLOAD_BYTES, UPLOADS
+from app.core.tracing import traced
+from app.crud.blob import acquire_blob, release_blob
+from app.db.session import SessionLocal
+from app.services.storage import StorageError, get_storage
+
+# Files rendered from an original and stored next to it as f"{stem}{suffix}".
+DERIVED_SUFFIXES = ("_poly.jpg", "_rf.jpg")
+
+_IMAGE_SIGNATURES = (
+    (b"\xff\xd8\xff", ".jpg", "image/jpeg"),
+    (b"\x89PNG\r\n\x1a\n", ".png", "image/png"),
+    (b"II*\x00", ".tif", "image/tiff"),
+    (b"MM\x00*", ".tif", "image/tiff"),
+    (b"BM", ".bmp", "image/bmp"),
+)
+
+
+class UploadRejectedError(ValueError):
+    def __init__(self, status_code: int, detail: str) -> None:
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+
+
+@dataclass(frozen=True)
+class StagedUpload:
+    path: str
+    digest: str
+    size: int
+    ext: str
+    content_type: str
+
+
+def sniff_image_type(head: bytes) -> tuple[str, str] | None:
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return ".webp", "image/webp"
+    for magic, ext, content_type in _IMAGE_SIGNATURES:
+        if head.startswith(magic):
+            return ext, content_type
+    return None
+
+
+def discard_staged(staged: StagedUpload) -> None:
+    try:
+        if os.path.exists(staged.path):
+            os.remove(staged.path)
+    except Exception:
+        pass
+
+
+def _write_chunk(out, hasher, chunk: bytes) -> None:
+    hasher.update(chunk)
+    out.write(chunk)
+
+
+@traced("upload.write")
+async def stage_upload(file: UploadFile, *, max_bytes: int | None = None) -> StagedUpload:
+    """Stream an upload into a scratch file, hashing and validating it on the way.
+
+    The body is read in UPLOAD_CHUNK_SIZE pieces, so the size limit is enforced
+    without ever holding the whole file in memory, and the SHA-256 digest is
+    ready as soon as the last chunk is written. Disk writes and hashing run in
+    the threadpool so a large upload does not stall the event loop.
+    """
+
+    limit = settings.MAX_UPLOAD_BYTES if max_bytes is None else max_bytes
+    chunk_size = max(64 * 1024, settings.UPLOAD_CHUNK_SIZE)
+    path = get_storage().path(f"tmp_upload_{uuid.uuid4().hex}")
+
+    hasher = hashlib.sha256()
+    size = 0
+    kind: tuple[str, str] | None = None
+
+    out = await run_in_threadpool(open, path, "wb")
+    try:
+        while True:
+            chunk = await file.read(chunk_size)
+            if not chunk:
+                break
+            if kind is None:
+                kind = sniff_image_type(chunk)
+                if kind is None:
+                    raise UploadRejectedError(
+                        415, "Unsupported file type. Upload a JPEG, PNG, WebP, TIFF or BMP image."
+                    )
+            size += len(chunk)
+            if limit > 0 and size > limit:
+                raise UploadRejectedError(
+                    413, f"File is too large. The maximum upload size is {limit // (1024 * 1024)} MB."
+                )
+            await run_in_threadpool(_write_chunk, out, hasher, chunk)
+        if kind is None:
+            raise UploadRejectedError(400, "Uploaded file is empty")
+        await run_in_threadpool(out.close)
+    except BaseException as e:
+        # Inline on purpose: awaiting here could be cut short when the request is cancelled.
+        out.close()
+        try:
+            os.remove(path)
+        except Exception:
+            pass
+        if isinstance(e, UploadRejectedError):
+            UPLOADS.labels(outcome=str(e.status_code)).inc()
+        raise
+
+    UPLOADS.labels(outcome="accepted").inc()
+    UPLOAD_BYTES.inc(size)
+
+    ext, content_type = kind
+    # Give the scratch file the sniffed extension so tools that guess the type
+    # from the name (mimetypes, remote inference) see the right one.
+    staged_path = f"{path}{ext}"
+    await run_in_threadpool(os.replace, path, staged_path)
+    return StagedUpload(
+        path=staged_path,
+        digest=hasher.hexdigest(),
+        size=size,
+        ext=ext,
+        content_type=content_type,
+    )
+
+
+@traced("upload.store")
+def store_upload(db: Session, staged: StagedUpload) -> str:
+    """Move a staged upload into storage and return its object name.
+
+    Objects are content addressed: if the digest is already stored, the new
+    scan just takes another reference on the existing blob and nothing is
+    written.
+    """
+
+    storage = get_storage()
+    try:
+        blob, created = acquire_blob(
+            db,
+            digest=staged.digest,
+            filename=f"{staged.digest}{staged.ext}",
+            size=staged.size,
+            content_type=staged.content_type,
+        )
+        filename = blob.filename
+        if created or not storage.exists(filename):
+            try:
+                os.replace(staged.path, storage.path(filename))
+                storage.publish(filename)
+            except StorageError:
+                release_upload(db, filename)
+                raise
+            except OSError as e:
+                release_upload(db, filename)
+                raise StorageError(f"Could not store upload {filename}: {e}") from e
+        return filename
+    finally:
+        discard_staged(staged)
+
+
+def delete_stored_files(filename: str) -> None:
+    storage = get_storage()
+    original = os.path.basename(filename)
+    stem = os.path.splitext(original)[0]
+    for name in (original, *(f"{stem}{suffix}" for suffix in DERIVED_SUFFIXES)):
+        try:
+            storage.delete(name)
+        except StorageError:
+            pass
+
+
+def release_upload(db: Session, filename: str) -> bool:
+    """Drop a scan's reference on its image.
+
+    True when that was the last reference, False while other scans still use
+    the files. Deduplicated files are then deleted by the upload GC after
+    UPLOAD_GC_GRACE_SECONDS (see release_blob); untracked uploads from before
+    deduplication belong to one scan and go at once.
+    """
+
+    remaining = release_blob(db, filename=os.path.basename(filename))
+    if remaining is None:
+        delete_stored_files(filename)
+        return True
+    return remaining <= 0
+
+
+def _in_own_session(fn, *args):
+    db = SessionLocal()
+    try:
+        return fn(db, *args)
+    finally:
+        db.close()
+
+
+async def store_upload_async(staged: StagedUpload) -> str:
+    """:func:`store_upload` for async routes.
+
+    Moving the file and publishing it to remote storage can block, so this runs
+    in the threadpool with its own short-lived session.
+    """
+
+    return await run_in_threadpool(_in_own_session, store_upload, staged)
+
+
+async def release_upload_async(filename: str) -> None:
+    await run_in_threadpool(_in_own_session, release_upload, filename)
@@ -0,0 +1,99 @@
+from __future__ import annotations
+
+import logging
+import threading
+import time
+from typing import Any, Callable, Optional
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+# The app imports only what routing needs; libraries used by a few routes (jose,
+# passlib, httpx, Pillow, ultralytics) are imported on first use. Warm-up does
+# that first use on a background thread right after startup, so the process
+# accepts connections at once while GET /ready reports 503 until it is done.
+# A failed step is logged and recorded, and does not keep the process unready:
+# the route that needs it reports the problem as it did before.
+
+_lock = threading.Lock()
+_ready = threading.Event()
+_thread: Optional[threading.Thread] = None
+_status: dict[str, Any] = {"state": "pending", "started_at": None, "duration_ms": None, "steps": {}}
+
+
+def _import_auth() -> None:
+    from app.core.security import create_access_token, pwd_context
+
+    create_access_token("0")
+    pwd_context().handler("bcrypt").get_backend()
+
+
+def _import_httpx() -> None:
+    import httpx  # noqa: F401
+
+
+def _load_model(run_inference: bool) -> Callable[[], bool]:
+    def step() -> bool:
+        from app.services.ai_service import preload_model
+
+        return preload_model(run_inference=run_inference)
+
+    return step
+
+
+def run_warmup(*, load_model: bool = True, run_inference: Optional[bool] = None) -> dict[str, Any]:
+    """Run every warm-up step in this thread and mark the process ready."""
+
+    if run_inference is None:
+        run_inference = settings.WARMUP_RUN_INFERENCE
+    steps: list[tuple[str, Callable[[], Any]]] = [("auth", _import_auth), ("httpx", _import_httpx)]
+    if load_model:
+        steps.append(("model", _load_model(run_inference)))
+
+    started = time.perf_counter()
+    with _lock:
+        _status.update(state="running", started_at=time.time())
+    for name, step in steps:
+        t0 = time.perf_counter()
+        entry: dict[str, Any] = {}
+        try:
+            result = step()
+            if result is not None:
+                entry["result"] = result
+        except Exception as e:
+            logger.warning("warm-up step %s failed", name, exc_info=True)
+            entry["error"] = f"{type(e).__name__}: {e}"
+        entry["duration_ms"] = round((time.perf_counter() - t0) * 1000, 1)
+        with _lock:
+            _status["steps"][name] = entry
+    with _lock:
+        _status.update(state="ready", duration_ms=round((time.perf_counter() - started) * 1000, 1))
+    _ready.set()
+    return get_warmup_status()
+
+
+def start_warmup() -> None:
+    """Warm up on a daemon thread; without WARMUP_ENABLED the process is ready at once."""
+
+    global _thread
+    if not settings.WARMUP_ENABLED:
+        _ready.set()
+        return
+    with _lock:
+        if _thread is not None:
+            return
+        _thread = threading.Thread(target=run_warmup, name="warmup", daemon=True)
+        # A forked worker inherits the parent's finished warm-up but not its own
+        # inference warm-up, which is not run before forking.
+        _ready.clear()
+    _thread.start()
+
+
+def is_ready() -> bool:
+    return _ready.is_set()
+
+
+def get_warmup_status() -> dict[str, Any]:
+    with _lock:
+        return {**_status, "steps": {k: dict(v) for k, v in _status["steps"].items()}, "ready": _ready.is_set()}
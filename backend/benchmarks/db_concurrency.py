@@ -0,0 +1,138 @@
+"""Concurrent read/write benchmark for the database engine profiles.
+
+Runs the same mixed workload (threads inserting scans through ``create_scan``
+while other threads page through ``list_scans_for_user``) against a plain
+engine and against the tuned profile from ``app.db.session``, and prints
+throughput, latency percentiles and "database is locked" failures.
+
+    cd backend
+    python -m benchmarks.db_concurrency --writers 8 --readers 8 --seconds 10
+
+Defaults to a throwaway SQLite file; pass ``--url`` to point it at another
+database (it creates and drops its own tables there, so never a live one).
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import statistics
+import tempfile
+import threading
+import time
+
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import sessionmaker
+
+import app.models  # noqa: F401  (registers every table on Base.metadata)
+from app.crud.scan import create_scan, list_scans_for_user
+from app.db.base import Base
+from app.db.session import create_db_engine
+from app.models.user import User
+
+RESULT = {
+    "scan_type": "field_health",
+    "status": "model_not_available",
+    "field_health": {"health_percent": 87.5, "disease_name": "Leaf Rust"},
+    "location": "North plot",
+}
+
+
+def _percentile(values: list[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(pct / 100.0 * (len(values) - 1))))]
+
+
+def run_profile(url: str, *, tuned: bool, writers: int, readers: int, seconds: float) -> dict:
+    engine = create_db_engine(url, tuned=tuned)
+    Base.metadata.drop_all(engine)
+    Base.metadata.create_all(engine)
+    Session = sessionmaker(bind=engine, autoflush=False, future=True)
+
+    with Session() as db:
+        users = [
+            User(email=f"bench{i}@example.com", username=f"bench{i}", hashed_password="x", is_active=True)
+            for i in range(max(1, writers))
+        ]
+        db.add_all(users)
+        db.commit()
+        user_ids = [u.id for u in users]
+
+    stop = time.perf_counter() + seconds
+    lock = threading.Lock()
+    stats = {"write": [], "read": [], "errors": 0}
+
+    def worker(kind: str, user_id: int) -> None:
+        latencies: list[float] = []
+        errors = 0
+        while time.perf_counter() < stop:
+            started = time.perf_counter()
+            db = Session()
+            try:
+                if kind == "write":
+                    create_scan(db, user_id=user_id, image_filename="bench.png", result=RESULT)
+                else:
+                    list_scans_for_user(db, user_id=user_id, limit=50)
+                latencies.append(time.perf_counter() - started)
+            except OperationalError:
+                db.rollback()
+                errors += 1
+            finally:
+                db.close()
+        with lock:
+            stats[kind].extend(latencies)
+            stats["errors"] += errors
+
+    threads = [
+        threading.Thread(target=worker, args=("write", user_ids[i % len(user_ids)])) for i in range(writers)
+    ] + [threading.Thread(target=worker, args=("read", user_ids[i % len(user_ids)])) for i in range(readers)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    Base.metadata.drop_all(engine)
+    engine.dispose()
+
+    def summary(latencies: list[float]) -> dict:
+        return {
+            "ops_per_s": round(len(latencies) / seconds, 1),
+            "p50_ms": round(_percentile(latencies, 50) * 1000, 2),
+            "p99_ms": round(_percentile(latencies, 99) * 1000, 2),
+            "mean_ms": round(statistics.fmean(latencies) * 1000, 2) if latencies else 0.0,
+        }
+
+    return {"write": summary(stats["write"]), "read": summary(stats["read"]), "errors": stats["errors"]}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--url", default=None, help="database URL (default: a temporary SQLite file)")
+    parser.add_argument("--writers", type=int, default=8)
+    parser.add_argument("--readers", type=int, default=8)
+    parser.add_argument("--seconds", type=float, default=10.0)
+    args = parser.parse_args()
+
+    tmpdir = None
+    url = args.url
+    if url is None:
+        tmpdir = tempfile.TemporaryDirectory()
+        url = f"sqlite:///{os.path.join(tmpdir.name, 'bench.db')}"
+
+    try:
+        for label, tuned in (("default", False), ("tuned", True)):
+            if url.startswith("sqlite") and tmpdir is not None:
+                # Fresh file per profile: WAL mode sticks to the database file once set.
+                url = f"sqlite:///{os.path.join(tmpdir.name, f'bench-{label}.db')}"
+            result = run_profile(url, tuned=tuned, writers=args.writers, readers=args.readers, seconds=args.seconds)
+            print(f"{label:8s} {json.dumps(result)}")
+    finally:
+        if tmpdir is not None:
+            tmpdir.cleanup()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,129 @@
+"""Cold-start budget: how long ``import app.main`` and app startup take.
+
+Each run is a fresh interpreter on a throwaway SQLite database. It times the
+import of the app, checks which heavy libraries that import pulled in, then
+runs the startup handlers (schema check, background workers) and times those
+too. It prints the medians and the slowest modules by cumulative import time
+from ``-X importtime``.
+
+    cd backend
+    python -m benchmarks.import_time --runs 5 --budget-ms 1200
+
+Exits non-zero if the median import is over ``--budget-ms`` or if one of the
+libraries that are meant to load lazily (see app/services/warmup.py) was
+imported by the app itself, so it can guard cold start in CI. Budgets are
+machine dependent: measure on the CI runner before picking one.
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Imported on first use or by the warm-up thread, never by ``import app.main``.
+LAZY_MODULES = ("httpx", "jose", "passlib", "cryptography", "PIL", "ultralytics", "torch", "cv2")
+
+_PROBE = """
+import json, sys, time
+t0 = time.perf_counter()
+import app.main
+t1 = time.perf_counter()
+loaded = [m for m in {lazy!r} if m in sys.modules]
+from fastapi.testclient import TestClient
+t2 = time.perf_counter()
+with TestClient(app.main.app):
+    t3 = time.perf_counter()
+print(json.dumps({{"import_ms": (t1 - t0) * 1000, "startup_ms": (t3 - t2) * 1000, "loaded": loaded}}))
+"""
+
+
+def _env(workdir: str) -> dict[str, str]:
+    env = {
+        **os.environ,
+        "DATABASE_URL": f"sqlite:///{workdir}/bench.db",
+        "UPLOAD_DIR": f"{workdir}/uploads",
+        "SCAN_JOB_WORKERS": "0",
+        "WARMUP_ENABLED": "false",
+    }
+    env.pop("PROMETHEUS_MULTIPROC_DIR", None)
+    return env
+
+
+def probe(workdir: str) -> dict:
+    out = subprocess.run(
+        [sys.executable, "-c", _PROBE.format(lazy=LAZY_MODULES)],
+        cwd=BACKEND_DIR,
+        env=_env(workdir),
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def top_imports(workdir: str, limit: int) -> list[tuple[float, str]]:
+    """``(cumulative ms, module)`` for everything ``import app.main`` imports, slowest first."""
+
+    out = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import app.main"],
+        cwd=BACKEND_DIR,
+        env=_env(workdir),
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    rows: list[tuple[float, str]] = []
+    for line in out.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = (part.strip() for part in line[len("import time:") :].split("|"))
+        if cumulative.isdigit():
+            rows.append((int(cumulative) / 1000, name))
+    return sorted(rows, reverse=True)[:limit]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--budget-ms", type=float, default=0.0, help="fail if the median import is slower (0: no budget)")
+    parser.add_argument("--top", type=int, default=15, help="slowest imports to list")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        os.makedirs(f"{workdir}/uploads")
+        # The first run also creates the schema and the bytecode caches.
+        probe(workdir)
+        runs = [probe(workdir) for _ in range(max(1, args.runs))]
+        top = top_imports(workdir, args.top)
+
+    import_ms = statistics.median(r["import_ms"] for r in runs)
+    startup_ms = statistics.median(r["startup_ms"] for r in runs)
+    loaded = sorted({m for r in runs for m in r["loaded"]})
+
+    print(f"import app.main  median {import_ms:7.1f} ms  (min {min(r['import_ms'] for r in runs):.1f}, runs {len(runs)})")
+    print(f"startup          median {startup_ms:7.1f} ms")
+    print("\nslowest imports (ms, including what they import):")
+    for ms, name in top:
+        print(f"  {ms:8.1f}  {name}")
+
+    failed = False
+    if loaded:
+        print(f"\nFAIL: imported eagerly: {', '.join(loaded)}")
+        failed = True
+    if args.budget_ms > 0:
+        verdict = "over" if import_ms > args.budget_ms else "within"
+        print(f"\n{verdict} budget: {import_ms:.1f} ms vs {args.budget_ms:.1f} ms")
+        failed = failed or import_ms > args.budget_ms
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,144 @@
+"""Per-request overhead of the CORS/compression middleware stack.
+
+Builds two apps around the same routes: one with the previous
+``@app.middleware("http")`` CORS hook (a BaseHTTPMiddleware) and one with
+the pure ASGI stack from ``app.core.middleware``. Calls them in process, with
+no server or socket, and prints the mean time per request, both for a tiny
+JSON response and for a page of scans. For the scan page it also prints the
+size on the wire per encoding.
+
+    cd backend
+    python -m benchmarks.middleware --requests 5000
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import random
+import time
+from datetime import datetime, timezone
+from types import SimpleNamespace
+
+from fastapi import FastAPI, Request
+from fastapi.responses import Response
+
+from app.core.middleware import CompressionMiddleware, CORSMiddleware
+from app.services.result_codec import result_columns
+from app.services.scan_pipeline import json_array, scan_out_json
+from benchmarks.result_codec import dashboard_result
+
+
+def _scan_page(size: int) -> bytes:
+    rng = random.Random(5)
+    scans = [
+        SimpleNamespace(
+            id=i,
+            user_id=1,
+            image_filename=f"{i:064x}.jpg",
+            status="complete",
+            created_at=datetime.now(timezone.utc),
+            **result_columns(dashboard_result(rng), dialect="sqlite"),
+        )
+        for i in range(size)
+    ]
+    return json_array(scan_out_json(s) for s in scans)
+
+
+def _routes(app: FastAPI, page: bytes) -> FastAPI:
+    @app.get("/health")
+    async def health() -> dict:
+        return {"status": "ok"}
+
+    @app.get("/scans")
+    async def scans() -> Response:
+        return Response(content=page, media_type="application/json")
+
+    return app
+
+
+def old_app(page: bytes) -> FastAPI:
+    app = FastAPI()
+
+    @app.middleware("http")
+    async def cors_middleware(request: Request, call_next):
+        if request.method == "OPTIONS":
+            response = Response(status_code=200)
+        else:
+            response = await call_next(request)
+        response.headers["Access-Control-Allow-Origin"] = request.headers.get("origin") or "*"
+        response.headers["Access-Control-Allow-Methods"] = "GET, POST, PUT, PATCH, DELETE, OPTIONS"
+        response.headers["Access-Control-Allow-Headers"] = request.headers.get("Access-Control-Request-Headers") or "*"
+        response.headers["Access-Control-Allow-Credentials"] = "false"
+        return response
+
+    return _routes(app, page)
+
+
+def new_app(page: bytes) -> FastAPI:
+    app = FastAPI()
+    app.add_middleware(CompressionMiddleware)
+    app.add_middleware(CORSMiddleware, origins=["*"])
+    return _routes(app, page)
+
+
+async def _call(app, path: str, accept_encoding: bytes) -> int:
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": "GET",
+        "scheme": "http",
+        "path": path,
+        "raw_path": path.encode(),
+        "query_string": b"",
+        "root_path": "",
+        "headers": [(b"host", b"bench"), (b"origin", b"http://app.test"), (b"accept-encoding", accept_encoding)],
+        "client": ("127.0.0.1", 1),
+        "server": ("bench", 80),
+    }
+    size = 0
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        nonlocal size
+        if message["type"] == "http.response.body":
+            size += len(message.get("body", b""))
+
+    await app(scope, receive, send)
+    return size
+
+
+async def _time(app, path: str, accept_encoding: bytes, requests: int) -> tuple[float, int]:
+    size = await _call(app, path, accept_encoding)
+    started = time.perf_counter()
+    for _ in range(requests):
+        await _call(app, path, accept_encoding)
+    return (time.perf_counter() - started) / requests * 1e6, size
+
+
+async def _main(requests: int, page_size: int) -> None:
+    page = _scan_page(page_size)
+    apps = {"BaseHTTPMiddleware": old_app(page), "pure ASGI": new_app(page)}
+    print(f"{'stack':20s} {'path':10s} {'accept':9s} {'us/req':>9s} {'bytes':>9s}")
+    for path in ("/health", "/scans"):
+        for accept in (b"identity", b"gzip", b"br"):
+            for name, app in apps.items():
+                if name == "BaseHTTPMiddleware" and accept != b"identity":
+                    continue
+                us, size = await _time(app, path, accept, requests)
+                print(f"{name:20s} {path:10s} {accept.decode():9s} {us:9.1f} {size:9d}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=5000)
+    parser.add_argument("--page", type=int, default=50)
+    args = parser.parse_args()
+    asyncio.run(_main(args.requests, args.page))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,48 @@
+"""Per-request cost of the inference rate limiter with the in-process backend.
+
+Calls ``rate_limit.check`` the way the route dependencies do (one token-bucket
+take plus one quota count) for ``--keys`` distinct users, round-robin, and
+prints the mean and tail cost per check.
+
+    cd backend
+    python -m benchmarks.rate_limit --checks 200000 --keys 1000
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import time
+
+from app.core.config import settings
+from app.services import rate_limit
+
+
+async def _run(checks: int, keys: int) -> list[float]:
+    samples = []
+    names = [f"user:{i}" for i in range(keys)]
+    for i in range(checks):
+        started = time.perf_counter_ns()
+        await rate_limit.check("scan_create", names[i % keys])
+        samples.append(time.perf_counter_ns() - started)
+    return samples
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--checks", type=int, default=200_000)
+    parser.add_argument("--keys", type=int, default=1000)
+    args = parser.parse_args()
+
+    settings.RATE_LIMIT_REDIS_URL = ""
+    settings.RATE_LIMIT_SCAN_CREATE = "1000000/second"
+    settings.INFERENCE_DAILY_QUOTA = 10**9
+    samples = sorted(asyncio.run(_run(args.checks, args.keys)))
+    mean_us = sum(samples) / len(samples) / 1000
+    p50_us = samples[len(samples) // 2] / 1000
+    p99_us = samples[int(len(samples) * 0.99)] / 1000
+    print(f"{args.checks} checks over {args.keys} keys: mean {mean_us:.2f} us, p50 {p50_us:.2f} us, p99 {p99_us:.2f} us")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,197 @@
+"""Storage size and decode time of scan results per result codec.
+
+Builds results shaped like the dashboard and Estimate Field pipelines, then
+for each codec reports the stored bytes per row and the time to encode and
+decode one, against the plain JSON text (parsed with the stdlib ``json``, as
+readers did before the codec). It then writes ``--rows`` scans per codec into a
+scratch SQLite database and reports the file size and the time to read every
+row back and decode it.
+
+    cd backend
+    python -m benchmarks.result_codec --rows 5000
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import random
+import tempfile
+import time
+import uuid
+
+from sqlalchemy import select
+from sqlalchemy.orm import sessionmaker
+
+import app.models  # noqa: F401  (registers every table on Base.metadata)
+from app.core.config import settings
+from app.db.base import Base
+from app.db.session import create_db_engine
+from app.models.scan import Scan
+from app.models.user import User
+from app.services import result_codec
+from app.services.result_codec import ResultCodecError, decode_result, result_columns
+from app.services.scan_pipeline import compute_field_health
+
+LABELS = ("healthy_leaf", "leaf_rust", "blight", "corn_ear", "weed", "pest_damage")
+
+
+def dashboard_result(rng: random.Random) -> dict:
+    detections = [
+        {
+            "class_id": rng.randrange(len(LABELS)),
+            "class_name": rng.choice(LABELS),
+            "confidence": round(rng.random(), 4),
+            "bbox": [round(rng.uniform(0, 1920), 1) for _ in range(4)],
+        }
+        for _ in range(rng.randint(10, 60))
+    ]
+    result = {"status": "ok", "detections": detections, "image_size": [1920, 1080], "scan_type": "dashboard"}
+    result["field_health"] = compute_field_health(result)
+    result["annotated_image_filename"] = f"{uuid.uuid4().hex}_poly.jpg"
+    result["drone"] = {
+        "name": "DJI Mavic 3M",
+        "flight_duration": "18 min",
+        "altitude": "40",
+        "location": f"Block {rng.randint(1, 40)}",
+        "field_size": "2.5 ha",
+        "captured_at": "2026-10-01T09:30",
+    }
+    return result
+
+
+def estimate_field_result(rng: random.Random) -> dict:
+    predictions = [
+        {
+            "x": round(rng.uniform(0, 4000), 1),
+            "y": round(rng.uniform(0, 3000), 1),
+            "width": round(rng.uniform(20, 200), 1),
+            "height": round(rng.uniform(20, 200), 1),
+            "confidence": round(rng.random(), 4),
+            "class": rng.choice(LABELS),
+            "class_id": rng.randrange(len(LABELS)),
+            "detection_id": str(uuid.uuid4()),
+        }
+        for _ in range(rng.randint(40, 200))
+    ]
+    name = uuid.uuid4().hex
+    return {
+        "source": "roboflow",
+        "model_id": "corn-ears/3",
+        "scan_type": "estimate_field",
+        "predictions": predictions,
+        "raw": {"inference_id": str(uuid.uuid4()), "time": 0.42, "image": {"width": 4000, "height": 3000}, "predictions": predictions},
+        "yield_estimate": {
+            "overall_yield_index": rng.randint(0, 100),
+            "kernel_development_score": rng.randint(0, 100),
+            "discoloration_index": rng.randint(0, 100),
+            "leaf_dryness_index": rng.randint(0, 100),
+        },
+        "field_area": {"area_hectares": round(rng.uniform(0.5, 12), 3), "altitude_m": 60},
+        "annotated_image_filename": f"{name}_rf.jpg",
+        "annotated_image_url": f"/api/estimate-field/image/{name}_rf.jpg",
+        "original_image_filename": f"{name}.jpg",
+        "original_image_url": f"/api/estimate-field/image/{name}.jpg",
+    }
+
+
+def _use_codec(codec: str) -> None:
+    settings.SCAN_RESULT_CODEC = codec
+    result_codec._resolve.cache_clear()
+
+
+def _codecs() -> list[str]:
+    available = ["json", "zlib"]
+    for codec in ("zstd", "msgpack-zstd"):
+        try:
+            _use_codec(codec)
+            result_columns({}, dialect="sqlite")
+        except ResultCodecError:
+            continue
+        available.append(codec)
+    return available
+
+
+def _per_row(results: list[dict], codec: str) -> tuple[float, float, float]:
+    _use_codec(codec)
+    started = time.perf_counter()
+    stored = [result_columns(r, dialect="sqlite") for r in results]
+    encode_us = (time.perf_counter() - started) / len(results) * 1e6
+
+    started = time.perf_counter()
+    if codec == "json":
+        # The pre-codec read path: stdlib json.loads on the text column.
+        for cols in stored:
+            json.loads(cols["result_json"])
+    else:
+        for cols in stored:
+            decode_result(cols["result_json"], cols["result_data"], cols["result_doc"])
+    decode_us = (time.perf_counter() - started) / len(results) * 1e6
+
+    size = sum(len(c["result_json"].encode("utf-8")) + len(c["result_data"] or b"") for c in stored) / len(results)
+    return size, encode_us, decode_us
+
+
+def _table(results: list[dict], codec: str, directory: str) -> tuple[int, float]:
+    _use_codec(codec)
+    path = os.path.join(directory, f"{codec}.db")
+    engine = create_db_engine(f"sqlite:///{path}")
+    Base.metadata.create_all(engine)
+    Session = sessionmaker(bind=engine, autoflush=False, future=True)
+    with Session() as db:
+        user = User(email="bench@example.com", username="bench", hashed_password="x", is_active=True)
+        db.add(user)
+        db.flush()
+        for i, result in enumerate(results):
+            db.add(Scan(user_id=user.id, image_filename=f"{i}.jpg", **result_columns(result, dialect="sqlite")))
+        db.commit()
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        conn.exec_driver_sql("PRAGMA wal_checkpoint(TRUNCATE)")
+        conn.exec_driver_sql("VACUUM")
+    size = os.path.getsize(path)
+
+    started = time.perf_counter()
+    with Session() as db:
+        rows = db.execute(select(Scan.result_json, Scan.result_data, Scan.result_doc))
+        if codec == "json":
+            for row in rows:
+                json.loads(row.result_json)
+        else:
+            for row in rows:
+                decode_result(row.result_json, row.result_data, row.result_doc)
+    elapsed = time.perf_counter() - started
+    engine.dispose()
+    return size, elapsed
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=5000)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    samples = {
+        "dashboard": [dashboard_result(rng) for _ in range(args.rows)],
+        "estimate_field": [estimate_field_result(rng) for _ in range(args.rows)],
+    }
+    codecs = _codecs()
+
+    print(f"{'sample':15s} {'codec':13s} {'bytes/row':>10s} {'encode us':>10s} {'decode us':>10s}")
+    for name, results in samples.items():
+        for codec in codecs:
+            size, encode_us, decode_us = _per_row(results, codec)
+            print(f"{name:15s} {codec:13s} {size:10.0f} {encode_us:10.1f} {decode_us:10.1f}")
+
+    print()
+    print(f"{'table (mixed)':15s} {'codec':13s} {'file MB':>10s} {'read+decode s':>14s}")
+    mixed = [r for pair in zip(samples["dashboard"], samples["estimate_field"]) for r in pair]
+    with tempfile.TemporaryDirectory() as directory:
+        for codec in codecs:
+            size, elapsed = _table(mixed, codec, directory)
+            print(f"{len(mixed):<15d} {codec:13s} {size / 1e6:10.2f} {elapsed:14.3f}")
+
+
+if __name__ == "__main__":
+    main()
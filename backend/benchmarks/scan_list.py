@@ -0,0 +1,86 @@
+"""CPU cost of serializing a page of scans for GET /scans/ and GET /admin/scans.
+
+Compares the model path (decode the stored result, build ScanOut, let
+FastAPI validate it against the response model and JSON-encode it) with the
+pass-through path the endpoints use (splice the stored result JSON into a
+directly serialized envelope), for each result codec.
+
+    cd backend
+    python -m benchmarks.scan_list --page 50 --repeat 40
+"""
+
+from __future__ import annotations
+
+import argparse
+import random
+import time
+from datetime import datetime, timezone
+from types import SimpleNamespace
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from pydantic import TypeAdapter
+
+from app.core.config import settings
+from app.schemas.scan import ScanOut
+from app.services import result_codec
+from app.services.result_codec import load_scan_result, result_columns
+from app.services.scan_pipeline import json_array, scan_out_json, scan_to_out
+from benchmarks.result_codec import dashboard_result, estimate_field_result
+
+_PAGE = TypeAdapter(list[ScanOut])
+
+
+def _page(rng: random.Random, size: int, kind: str) -> list[SimpleNamespace]:
+    make = dashboard_result if kind == "dashboard" else estimate_field_result
+    return [
+        SimpleNamespace(
+            id=i,
+            user_id=1,
+            image_filename=f"{i:064x}.jpg",
+            status="complete",
+            created_at=datetime.now(timezone.utc),
+            **result_columns(make(rng), dialect="sqlite"),
+        )
+        for i in range(size)
+    ]
+
+
+def model_path(scans: list) -> bytes:
+    out = [scan_to_out(s, result=load_scan_result(s)) for s in scans]
+    # What FastAPI does with a response_model: validate, then jsonable_encoder and render.
+    validated = _PAGE.validate_python([o.model_dump() for o in out])
+    return JSONResponse(jsonable_encoder(validated)).body
+
+
+def pass_through(scans: list) -> bytes:
+    return json_array(scan_out_json(s) for s in scans)
+
+
+def _time(fn, scans: list, repeat: int) -> float:
+    fn(scans)
+    started = time.perf_counter()
+    for _ in range(repeat):
+        fn(scans)
+    return (time.perf_counter() - started) / repeat * 1000
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--page", type=int, default=50)
+    parser.add_argument("--repeat", type=int, default=40)
+    args = parser.parse_args()
+
+    print(f"{'results':15s} {'codec':13s} {'model ms':>9s} {'pass ms':>9s} {'speedup':>8s}")
+    for kind in ("dashboard", "estimate_field"):
+        for codec in ("json", "zstd"):
+            settings.SCAN_RESULT_CODEC = codec
+            result_codec._resolve.cache_clear()
+            scans = _page(random.Random(3), args.page, kind)
+            model_ms = _time(model_path, scans, args.repeat)
+            pass_ms = _time(pass_through, scans, args.repeat)
+            print(f"{kind:15s} {codec:13s} {model_ms:9.2f} {pass_ms:9.2f} {model_ms / pass_ms:7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,199 @@
+"""Throughput of ``python -m app.serve`` against the number of workers.
+
+For each worker count, starts the pre-fork server on a throwaway SQLite
+database, signs a user up, and keeps ``--concurrency`` requests in flight for
+``--seconds``. It prints requests per second, latency percentiles, errors,
+and the memory of the whole process tree as PSS. PSS splits shared pages
+between the processes sharing them, so a preloaded model counts once, not
+once per worker.
+
+    cd backend
+    python -m benchmarks.serve --workers 1,2,4 --seconds 15 --concurrency 32
+
+By default each request lists the user's scans (``GET /api/scans/`` over
+``--scans`` stored scans). This exercises auth, the database and JSON
+encoding. With ``--image`` each request is ``POST /api/ai/predict`` with that
+file instead, which measures local inference (AI_MODEL_PATH must point at
+the weights). The load generator runs on the same machine, so leave it a core
+and read the numbers relative to each other.
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import os
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+
+from benchmarks.db_concurrency import _percentile
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _tree_pss_kb(pid: int) -> int | None:
+    """PSS of ``pid`` and its children, from /proc (Linux only)."""
+
+    try:
+        with open(f"/proc/{pid}/task/{pid}/children") as f:
+            pids = [pid, *(int(p) for p in f.read().split())]
+        total = 0
+        for p in pids:
+            with open(f"/proc/{p}/smaps_rollup") as f:
+                for line in f:
+                    if line.startswith("Pss:"):
+                        total += int(line.split()[1])
+        return total
+    except OSError:
+        return None
+
+
+def _start(workers: int, port: int, workdir: str) -> subprocess.Popen:
+    env = {
+        **os.environ,
+        "PORT": str(port),
+        "SERVE_HOST": "127.0.0.1",
+        "SERVE_WORKERS": str(workers),
+        "DATABASE_URL": f"sqlite:///{workdir}/bench.db",
+        "UPLOAD_DIR": f"{workdir}/uploads",
+        "RATE_LIMIT_ENABLED": "false",
+        "SCAN_JOB_WORKERS": "0",
+        "PASSWORD_BCRYPT_ROUNDS": "4",
+    }
+    env.pop("PROMETHEUS_MULTIPROC_DIR", None)
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "app.serve"],
+        cwd=BACKEND_DIR,
+        env=env,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    deadline = time.monotonic() + 60
+    while time.monotonic() < deadline:
+        try:
+            if httpx.get(f"http://127.0.0.1:{port}/health", timeout=1).status_code == 200:
+                return proc
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.2)
+    proc.kill()
+    raise RuntimeError("server did not come up")
+
+
+def _png() -> bytes:
+    from io import BytesIO
+
+    from PIL import Image
+
+    out = BytesIO()
+    Image.new("RGB", (64, 64), (40, 120, 40)).save(out, format="PNG")
+    return out.getvalue()
+
+
+def _prepare(base: str, scans: int) -> dict[str, str]:
+    with httpx.Client(base_url=base, timeout=60) as client:
+        client.post("/api/auth/register", json={"email": "bench@example.com", "username": "bench", "password": "password123"})
+        token = client.post("/api/auth/login", data={"username": "bench@example.com", "password": "password123"}).json()[
+            "access_token"
+        ]
+        headers = {"Authorization": f"Bearer {token}"}
+        form = {"drone_name": "d", "flight_duration": "1", "drone_altitude": "2", "location": "l", "captured_at": "now"}
+        png = _png()
+        for i in range(scans):
+            # Distinct bytes so every scan is its own upload.
+            client.post(
+                "/api/scans/",
+                headers=headers,
+                files={"file": (f"{i}.png", png + i.to_bytes(4, "big"), "image/png")},
+                data=form,
+            )
+    return headers
+
+
+async def _load(base: str, headers: dict[str, str], image: bytes | None, concurrency: int, seconds: float) -> tuple[list[float], int]:
+    latencies: list[float] = []
+    errors = 0
+    stop = time.perf_counter() + seconds
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+
+    async with httpx.AsyncClient(base_url=base, headers=headers, limits=limits, timeout=120) as client:
+
+        async def one() -> None:
+            nonlocal errors
+            while time.perf_counter() < stop:
+                started = time.perf_counter()
+                try:
+                    if image is None:
+                        r = await client.get("/api/scans/")
+                    else:
+                        r = await client.post("/api/ai/predict", files={"file": ("bench.jpg", image, "image/jpeg")})
+                    if r.status_code == 200:
+                        latencies.append(time.perf_counter() - started)
+                    else:
+                        errors += 1
+                except httpx.HTTPError:
+                    errors += 1
+
+        await asyncio.gather(*(one() for _ in range(concurrency)))
+    return latencies, errors
+
+
+def run(workers: int, *, seconds: float, concurrency: int, scans: int, image: bytes | None) -> dict:
+    port = _free_port()
+    with tempfile.TemporaryDirectory() as workdir:
+        os.makedirs(f"{workdir}/uploads")
+        proc = _start(workers, port, workdir)
+        try:
+            base = f"http://127.0.0.1:{port}"
+            headers = _prepare(base, 0 if image is not None else scans)
+            asyncio.run(_load(base, headers, image, concurrency, min(2.0, seconds)))
+            latencies, errors = asyncio.run(_load(base, headers, image, concurrency, seconds))
+            pss = _tree_pss_kb(proc.pid)
+        finally:
+            proc.send_signal(signal.SIGTERM)
+            proc.wait(timeout=60)
+    return {
+        "workers": workers,
+        "rps": len(latencies) / seconds,
+        "p50_ms": _percentile(latencies, 50) * 1000,
+        "p99_ms": _percentile(latencies, 99) * 1000,
+        "errors": errors,
+        "pss_mb": pss / 1024 if pss is not None else None,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--workers", default="1,2,4", help="comma separated worker counts")
+    parser.add_argument("--seconds", type=float, default=15.0)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--scans", type=int, default=50)
+    parser.add_argument("--image", help="benchmark POST /api/ai/predict with this image")
+    args = parser.parse_args()
+
+    image = None
+    if args.image:
+        with open(args.image, "rb") as f:
+            image = f.read()
+
+    print(f"{'workers':>7s} {'req/s':>9s} {'p50 ms':>9s} {'p99 ms':>9s} {'errors':>7s} {'PSS MB':>8s}")
+    for workers in (int(w) for w in args.workers.split(",")):
+        r = run(workers, seconds=args.seconds, concurrency=args.concurrency, scans=args.scans, image=image)
+        pss = f"{r['pss_mb']:8.1f}" if r["pss_mb"] is not None else f"{'-':>8s}"
+        print(f"{r['workers']:7d} {r['rps']:9.1f} {r['p50_ms']:9.1f} {r['p99_ms']:9.1f} {r['errors']:7d} {pss}")
+
+
+if __name__ == "__main__":
+    main()
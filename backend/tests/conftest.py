@@ -0,0 +1,103 @@
+from __future__ import annotations
+
+import os
+import tempfile
+
+# Settings are read when app.core.config is first imported, so point the app at
+# throwaway storage before any test module imports it.
+_workdir = tempfile.mkdtemp(prefix="agridronescan-tests-")
+os.environ.update(
+    {
+        "DATABASE_URL": f"sqlite:///{os.path.join(_workdir, 'app.db')}",
+        "UPLOAD_DIR": os.path.join(_workdir, "uploads"),
+        "AI_REMOTE_BASE_URL": "",
+        "ROBOFLOW_API_KEY": "",
+        "RATE_LIMIT_REDIS_URL": "",
+        "AUTH_CACHE_REDIS_URL": "",
+        "TRACING_EXPORTER": "none",
+        "WARMUP_ENABLED": "0",
+        "PASSWORD_BCRYPT_ROUNDS": "4",
+        "ADMIN_EMAILS": "admin@example.com",
+    }
+)
+
+import itertools  # noqa: E402
+
+import pytest  # noqa: E402
+from sqlalchemy.orm import sessionmaker  # noqa: E402
+
+import app.models  # noqa: E402,F401  (registers every table on Base.metadata)
+from app.db.base import Base  # noqa: E402
+from app.db.session import create_db_engine  # noqa: E402
+
+
+@pytest.fixture
+def engine(tmp_path):
+    """A file-backed SQLite engine with the current schema, one per test."""
+
+    db_engine = create_db_engine(f"sqlite:///{tmp_path / 'test.db'}")
+    Base.metadata.create_all(bind=db_engine)
+    yield db_engine
+    db_engine.dispose()
+
+
+@pytest.fixture
+def session_factory(engine):
+    return sessionmaker(autocommit=False, autoflush=False, bind=engine, future=True)
+
+
+@pytest.fixture
+def storage_dir(tmp_path, monkeypatch):
+    """An empty UPLOAD_DIR for one test, with the storage backend rebuilt on it."""
+
+    from app.core.config import settings
+    from app.services.storage import get_storage
+
+    root = tmp_path / "uploads"
+    root.mkdir()
+    monkeypatch.setattr(settings, "UPLOAD_DIR", str(root))
+    get_storage.cache_clear()
+    yield str(root)
+    get_storage.cache_clear()
+
+
+_user_numbers = itertools.count(1)
+
+
+@pytest.fixture
+def client():
+    """The app on the shared test database, started and stopped around the test."""
+
+    from fastapi.testclient import TestClient
+
+    from app.main import app
+
+    with TestClient(app, raise_server_exceptions=False) as test_client:
+        yield test_client
+
+
+@pytest.fixture
+def login(client):
+    """Register a new user and return ``(user_id, headers)``; admin=True for an admin."""
+
+    def register(*, admin: bool = False) -> tuple[int, dict[str, str]]:
+        n = next(_user_numbers)
+        email = "admin@example.com" if admin else f"user{n}@example.com"
+        username = f"admin{n}" if admin else f"user{n}"
+        client.post("/api/auth/register", json={"email": email, "username": username, "password": "password123"})
+        token = client.post("/api/auth/login", data={"username": email, "password": "password123"}).json()
+        headers = {"Authorization": f"Bearer {token['access_token']}"}
+        return client.get("/api/users/me", headers=headers).json()["id"], headers
+
+    return register
+
+
+@pytest.fixture
+def png_bytes():
+    import io
+
+    from PIL import Image
+
+    buffer = io.BytesIO()
+    Image.new("RGB", (64, 48), (40, 140, 60)).save(buffer, "PNG")
+    return buffer.getvalue()
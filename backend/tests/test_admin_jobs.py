@@ -0,0 +1,186 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import uuid
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from sqlalchemy import func, select, update
+
+from app.core.config import settings
+from app.crud.admin_job import create_admin_job, get_admin_job
+from app.crud.blob import get_blob_by_filename
+from app.crud.rollup import USERS_ACTIVE, USERS_TOTAL, get_counters, scan_counter_name
+from app.crud.scan import create_scan
+from app.crud.user import create_user, set_user_active
+from app.models.admin_job import AdminJob
+from app.models.scan import Scan
+from app.models.user import User
+from app.services import admin_jobs
+from app.services.admin_jobs import process_admin_job
+from app.services.uploads import StagedUpload, store_upload
+
+
+class _Crash(BaseException):
+    """Stands in for the worker process dying mid-job."""
+
+
+@pytest.fixture(autouse=True)
+def jobs_db(session_factory, storage_dir, monkeypatch):
+    monkeypatch.setattr(admin_jobs, "SessionLocal", session_factory)
+    monkeypatch.setattr(admin_jobs, "worker_id", lambda: "w1")
+
+
+def _user(session_factory, *, active: bool = True) -> int:
+    with session_factory() as db:
+        n = uuid.uuid4().hex[:8]
+        user_id = create_user(db, email=f"{n}@example.com", username=n, password="password123").id
+        if not active:
+            set_user_active(db, user_id=user_id, is_active=False)
+        return user_id
+
+
+def _scan(session_factory, storage_dir: str, user_id: int, content: bytes) -> tuple[int, str]:
+    path = os.path.join(storage_dir, f"tmp_upload_{uuid.uuid4().hex}.jpg")
+    with open(path, "wb") as out:
+        out.write(content)
+    staged = StagedUpload(
+        path=path, digest=hashlib.sha256(content).hexdigest(), size=len(content), ext=".jpg", content_type="image/jpeg"
+    )
+    with session_factory() as db:
+        filename = store_upload(db, staged)
+        return create_scan(db, user_id=user_id, image_filename=filename, result={"scan_type": "dashboard"}).id, filename
+
+
+def _job(session_factory, kind: str, created_by: int, **params) -> str:
+    with session_factory() as db:
+        return create_admin_job(db, kind=kind, params_json=json.dumps(params), created_by=created_by).id
+
+
+def _state(session_factory, job_id: str) -> AdminJob:
+    with session_factory() as db:
+        job = get_admin_job(db, job_id=job_id)
+        db.expunge(job)
+        return job
+
+
+def _count(session_factory, model, *conditions) -> int:
+    with session_factory() as db:
+        return int(db.execute(select(func.count()).select_from(model).where(*conditions)).scalar())
+
+
+def test_delete_users_never_matches_the_admin_who_started_it(session_factory):
+    admin = _user(session_factory)
+    others = [_user(session_factory), _user(session_factory, active=False)]
+
+    job_id = _job(session_factory, "delete_users", admin, filter={})
+    process_admin_job(job_id)
+    job = _state(session_factory, job_id)
+    assert (job.status, job.total, job.processed) == ("succeeded", 2, 2)
+    assert _count(session_factory, User, User.id.in_(others)) == 0
+    assert _count(session_factory, User, User.id == admin) == 1
+
+    # Even when the admin is named explicitly.
+    job_id = _job(session_factory, "delete_users", admin, ids=[admin])
+    process_admin_job(job_id)
+    assert _state(session_factory, job_id).processed == 0
+    assert _count(session_factory, User, User.id == admin) == 1
+
+
+def test_shared_uploads_survive_a_bulk_delete(session_factory, storage_dir):
+    admin, owner, keeper = _user(session_factory), _user(session_factory), _user(session_factory)
+    _, shared = _scan(session_factory, storage_dir, owner, b"shared")
+    _scan(session_factory, storage_dir, keeper, b"shared")
+    _, own = _scan(session_factory, storage_dir, owner, b"own")
+
+    job_id = _job(session_factory, "delete_scans", admin, filter={"user_id": owner})
+    process_admin_job(job_id)
+    job = _state(session_factory, job_id)
+    assert (job.status, job.processed, job.files_released) == ("succeeded", 2, 1)
+    assert _count(session_factory, Scan, Scan.user_id == keeper) == 1
+    with session_factory() as db:
+        assert get_blob_by_filename(db, filename=shared).ref_count == 1
+        # Released, and left for the upload GC.
+        assert get_blob_by_filename(db, filename=own).ref_count == 0
+    assert os.path.exists(os.path.join(storage_dir, shared))
+
+
+def test_resumed_job_continues_from_its_progress(session_factory, storage_dir, monkeypatch):
+    monkeypatch.setattr(settings, "ADMIN_BULK_CHUNK_SIZE", 2)
+    admin, owner = _user(session_factory), _user(session_factory)
+    for i in range(5):
+        _scan(session_factory, storage_dir, owner, f"scan-{i}".encode())
+    job_id = _job(session_factory, "delete_scans", admin, filter={"user_id": owner})
+
+    delete_batch = admin_jobs._delete_scan_batch
+    batches = []
+
+    def crash_on_second_batch(db, scan_ids):
+        batches.append(scan_ids)
+        if len(batches) == 2:
+            raise _Crash()
+        return delete_batch(db, scan_ids)
+
+    monkeypatch.setattr(admin_jobs, "_delete_scan_batch", crash_on_second_batch)
+    with pytest.raises(_Crash):
+        process_admin_job(job_id)
+    job = _state(session_factory, job_id)
+    assert (job.status, job.total, job.processed, job.files_released) == ("running", 5, 2, 2)
+
+    # Another worker takes over once the lease expires.
+    monkeypatch.setattr(admin_jobs, "_delete_scan_batch", delete_batch)
+    monkeypatch.setattr(admin_jobs, "worker_id", lambda: "w2")
+    process_admin_job(job_id)
+    assert _state(session_factory, job_id).status == "running"
+    with session_factory() as db:
+        stale = datetime.now(timezone.utc) - timedelta(seconds=settings.ADMIN_JOB_LEASE_SECONDS + 1)
+        db.execute(update(AdminJob).where(AdminJob.id == job_id).values(heartbeat_at=stale))
+        db.commit()
+    process_admin_job(job_id)
+
+    job = _state(session_factory, job_id)
+    assert (job.status, job.claimed_by, job.total, job.processed, job.files_released) == ("succeeded", "w2", 5, 5, 5)
+    assert _count(session_factory, Scan, Scan.user_id == owner) == 0
+
+
+def test_rollup_counters_match_after_bulk_deletes(session_factory, storage_dir):
+    admin = _user(session_factory)
+    users = [_user(session_factory), _user(session_factory, active=False), _user(session_factory)]
+    scan_ids = [
+        _scan(session_factory, storage_dir, user_id, f"rollup-{i}".encode())[0] for i, user_id in enumerate(users * 2)
+    ]
+
+    process_admin_job(_job(session_factory, "delete_scans", admin, ids=scan_ids[:3]))
+    process_admin_job(_job(session_factory, "delete_users", admin, filter={"is_active": False}))
+
+    with session_factory() as db:
+        counters = get_counters(db)
+    assert counters[USERS_TOTAL] == _count(session_factory, User) == 3
+    assert counters[USERS_ACTIVE] == _count(session_factory, User, User.is_active.is_(True)) == 3
+    assert counters[scan_counter_name("dashboard")] == _count(session_factory, Scan) == 2
+
+
+def test_lost_lease_stops_the_job(session_factory, storage_dir, monkeypatch):
+    monkeypatch.setattr(settings, "ADMIN_BULK_CHUNK_SIZE", 1)
+    admin, owner = _user(session_factory), _user(session_factory)
+    for i in range(3):
+        _scan(session_factory, storage_dir, owner, f"lease-{i}".encode())
+    job_id = _job(session_factory, "delete_scans", admin, filter={"user_id": owner})
+
+    delete_batch = admin_jobs._delete_scan_batch
+
+    def steal_lease(db, scan_ids):
+        result = delete_batch(db, scan_ids)
+        with session_factory() as other:
+            other.execute(update(AdminJob).where(AdminJob.id == job_id).values(claimed_by="w2"))
+            other.commit()
+        return result
+
+    monkeypatch.setattr(admin_jobs, "_delete_scan_batch", steal_lease)
+    process_admin_job(job_id)
+
+    job = _state(session_factory, job_id)
+    assert (job.status, job.claimed_by, job.processed) == ("running", "w2", 0)
+    assert _count(session_factory, Scan, Scan.user_id == owner) == 2
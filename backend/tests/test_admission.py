@@ -0,0 +1,222 @@
+from __future__ import annotations
+
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+
+from app.api import deps
+from app.core.config import settings
+from app.services import admission
+
+
+@pytest.fixture
+def limiter(monkeypatch):
+    """A fresh limiter with two slots and room for one waiter."""
+
+    monkeypatch.setattr(settings, "ADMISSION_ENABLED", True)
+    monkeypatch.setattr(settings, "ADMISSION_MAX_CONCURRENCY", 2)
+    monkeypatch.setattr(settings, "ADMISSION_MIN_CONCURRENCY", 1)
+    monkeypatch.setattr(settings, "ADMISSION_MAX_QUEUE", 1)
+    monkeypatch.setattr(settings, "ADMISSION_QUEUE_TIMEOUT_SECONDS", 0.2)
+    monkeypatch.setattr(settings, "ADMISSION_TARGET_LATENCY_SECONDS", 5.0)
+    monkeypatch.setattr(settings, "ADMISSION_DEGRADED_HOLD_SECONDS", 10.0)
+    fresh = admission._Limiter()
+    monkeypatch.setattr(admission, "_limiter", fresh)
+    return fresh
+
+
+async def _hold(release: asyncio.Event) -> None:
+    async with admission.admit():
+        await release.wait()
+
+
+async def _fill(release: asyncio.Event, count: int) -> list[asyncio.Task]:
+    tasks = [asyncio.create_task(_hold(release)) for _ in range(count)]
+    await asyncio.sleep(0)
+    return tasks
+
+
+def test_admits_up_to_capacity(limiter):
+    async def run():
+        async with admission.admit() as first, admission.admit() as second:
+            assert limiter.in_flight == 2
+            return first, second
+
+    first, second = asyncio.run(run())
+    assert not first.degraded and not second.degraded
+    assert limiter.in_flight == 0
+    assert limiter.counts["admitted"] == 2
+
+
+def test_waiting_calls_mark_inference_degraded(limiter):
+    async def run():
+        release = asyncio.Event()
+        holders = await _fill(release, 3)
+        assert limiter.snapshot()["queued"] == 1
+        assert admission.is_degraded()
+        release.set()
+        await asyncio.gather(*holders)
+
+    asyncio.run(run())
+    assert limiter.in_flight == 0
+    assert limiter.snapshot()["queued"] == 0
+
+
+def test_queued_call_is_granted_on_release(limiter):
+    async def run():
+        release = asyncio.Event()
+        holders = await _fill(release, 2)
+
+        async def queued():
+            async with admission.admit() as ticket:
+                return ticket
+
+        waiter = asyncio.create_task(queued())
+        await asyncio.sleep(0)
+        assert not waiter.done()
+        release.set()
+        ticket = await waiter
+        await asyncio.gather(*holders)
+        return ticket
+
+    ticket = asyncio.run(run())
+    assert ticket.waited >= 0
+    assert limiter.counts["queued"] == 1
+    assert limiter.in_flight == 0
+
+
+def test_sheds_when_the_queue_is_full(limiter):
+    async def run():
+        release = asyncio.Event()
+        holders = await _fill(release, 3)
+        with pytest.raises(admission.Overloaded) as excinfo:
+            async with admission.admit():
+                pass
+        release.set()
+        await asyncio.gather(*holders)
+        return excinfo.value
+
+    error = asyncio.run(run())
+    assert error.reason == "queue_full"
+    assert int(admission.retry_after_header(error)) >= 1
+    assert limiter.counts["queue_full"] == 1
+    assert limiter.in_flight == 0
+    # Optional work stays off for a while after shedding.
+    assert admission.is_degraded()
+
+
+def test_waiter_that_times_out_is_shed_and_dequeued(limiter):
+    async def run():
+        release = asyncio.Event()
+        holders = await _fill(release, 2)
+        with pytest.raises(admission.Overloaded) as excinfo:
+            async with admission.admit():
+                pass
+        assert limiter.in_flight == 2
+        release.set()
+        await asyncio.gather(*holders)
+        return excinfo.value
+
+    error = asyncio.run(run())
+    assert error.reason == "queue_timeout"
+    assert limiter.snapshot()["queued"] == 0
+    assert limiter.in_flight == 0
+
+
+def test_cancelled_waiter_gives_up_its_place(limiter):
+    async def run():
+        release = asyncio.Event()
+        holders = await _fill(release, 2)
+        waiter = asyncio.create_task(_hold(release))
+        await asyncio.sleep(0)
+        waiter.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiter
+        assert limiter.snapshot()["queued"] == 0
+        release.set()
+        await asyncio.gather(*holders)
+        async with admission.admit() as ticket:
+            return ticket
+
+    ticket = asyncio.run(run())
+    assert ticket.waited == 0.0
+    assert limiter.in_flight == 0
+
+
+def test_concurrent_calls_never_exceed_the_limit(limiter, monkeypatch):
+    monkeypatch.setattr(settings, "ADMISSION_MAX_QUEUE", 50)
+    monkeypatch.setattr(settings, "ADMISSION_QUEUE_TIMEOUT_SECONDS", 5.0)
+    peak = 0
+
+    async def call():
+        nonlocal peak
+        async with admission.admit():
+            peak = max(peak, limiter.in_flight)
+            await asyncio.sleep(0.005)
+
+    async def run():
+        await asyncio.gather(*(call() for _ in range(30)))
+
+    asyncio.run(run())
+    assert peak == 2
+    assert limiter.in_flight == 0
+    assert sum(limiter.counts[k] for k in ("admitted", "degraded")) == 30
+
+
+def test_slow_calls_cut_the_limit_at_most_once_per_period(limiter):
+    limiter._adapt(10.0, saturated=False, now=100.0)
+    assert limiter.limit == pytest.approx(1.8)
+    assert limiter.capacity == 1
+    limiter._adapt(10.0, saturated=False, now=101.0)
+    assert limiter.limit == pytest.approx(1.8)
+    for step in range(10):
+        limiter._adapt(10.0, saturated=False, now=110.0 + step * 5)
+    assert limiter.limit == 1.0
+
+
+def test_fast_saturated_calls_raise_the_limit_up_to_the_maximum(limiter):
+    limiter.limit = 1.0
+    limiter._adapt(0.1, saturated=False, now=1.0)
+    assert limiter.limit == 1.0
+    limiter._adapt(0.1, saturated=True, now=2.0)
+    assert limiter.limit == 2.0
+    limiter._adapt(0.1, saturated=True, now=3.0)
+    assert limiter.limit == 2.0
+
+
+def test_disabled_admits_everything(limiter, monkeypatch):
+    monkeypatch.setattr(settings, "ADMISSION_ENABLED", False)
+
+    async def run():
+        async with admission.admit() as a, admission.admit() as b, admission.admit() as c:
+            return [a, b, c]
+
+    assert not any(t.degraded for t in asyncio.run(run()))
+    assert limiter.in_flight == 0
+    assert not admission.is_degraded()
+
+
+def test_limiter_is_built_on_first_use(monkeypatch):
+    monkeypatch.setattr(admission, "_limiter", None)
+    metrics = admission.get_admission_metrics()
+    assert admission._limiter is not None
+    assert metrics["capacity"] == max(1, settings.ADMISSION_MAX_CONCURRENCY)
+
+
+def test_inference_slot_maps_overload_to_503(limiter, monkeypatch):
+    monkeypatch.setattr(settings, "ADMISSION_MAX_QUEUE", 0)
+
+    async def run():
+        release = asyncio.Event()
+        holders = await _fill(release, 2)
+        with pytest.raises(HTTPException) as excinfo:
+            async with deps.inference_slot():
+                pass
+        release.set()
+        await asyncio.gather(*holders)
+        return excinfo.value
+
+    error = asyncio.run(run())
+    assert error.status_code == 503
+    assert int(error.headers["Retry-After"]) >= 1
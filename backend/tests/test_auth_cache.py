@@ -0,0 +1,186 @@
+from __future__ import annotations
+
+import asyncio
+import threading
+import time
+
+import pytest
+
+from app.core.config import settings
+from app.services import auth_cache
+from app.services.auth_cache import Principal
+
+
+@pytest.fixture(autouse=True)
+def cache(monkeypatch):
+    monkeypatch.setattr(settings, "AUTH_CACHE_TTL_SECONDS", 30.0)
+    monkeypatch.setattr(settings, "AUTH_CACHE_MAX_ENTRIES", 100)
+    monkeypatch.setattr(settings, "AUTH_CACHE_REDIS_URL", "")
+    auth_cache._evict(None)
+
+
+class Loader:
+    """Stands in for the user query and counts how often it runs."""
+
+    def __init__(self, users=None):
+        self.users = users if users is not None else {1: _principal(1), 2: _principal(2), 3: _principal(3)}
+        self.calls = 0
+
+    def __call__(self, user_id):
+        self.calls += 1
+        return self.users.get(user_id)
+
+
+def _principal(user_id: int, *, active: bool = True) -> Principal:
+    return Principal(id=user_id, email=f"user{user_id}@example.com", is_active=active, is_admin=False)
+
+
+def test_second_lookup_is_served_from_cache():
+    load = Loader()
+    assert auth_cache.get_principal(1, load) == _principal(1)
+    assert auth_cache.get_principal(1, load) == _principal(1)
+    assert load.calls == 1
+
+
+def test_missing_users_are_cached_too():
+    load = Loader()
+    assert auth_cache.get_principal(99, load) is None
+    assert auth_cache.get_principal(99, load) is None
+    assert load.calls == 1
+
+
+def test_invalidation_drops_only_the_named_users():
+    load = Loader()
+    auth_cache.get_principal(1, load)
+    auth_cache.get_principal(2, load)
+    load.users[1] = _principal(1, active=False)
+    auth_cache.invalidate_users([1])
+    assert auth_cache.get_principal(1, load).is_active is False
+    auth_cache.get_principal(2, load)
+    assert load.calls == 3
+
+
+def test_invalidating_everyone_clears_the_cache():
+    load = Loader()
+    auth_cache.get_principal(1, load)
+    auth_cache.get_principal(2, load)
+    auth_cache.invalidate_users()
+    auth_cache.get_principal(1, load)
+    auth_cache.get_principal(2, load)
+    assert load.calls == 4
+
+
+def test_load_that_races_an_invalidation_is_not_cached():
+    users = {1: _principal(1)}
+
+    def load(user_id):
+        # The row is read, then deactivated and invalidated before we store it.
+        stale = users[user_id]
+        users[user_id] = _principal(user_id, active=False)
+        auth_cache.invalidate_users([user_id])
+        return stale
+
+    assert auth_cache.get_principal(1, load).is_active is True
+    assert auth_cache.get_principal(1, Loader(users)).is_active is False
+
+
+def test_invalidation_from_another_thread_during_a_load():
+    loading = threading.Event()
+    invalidated = threading.Event()
+
+    def slow_load(user_id):
+        loading.set()
+        invalidated.wait(5)
+        return _principal(user_id)
+
+    def invalidate():
+        loading.wait(5)
+        auth_cache.invalidate_users([1])
+        invalidated.set()
+
+    worker = threading.Thread(target=invalidate)
+    worker.start()
+    auth_cache.get_principal(1, slow_load)
+    worker.join()
+    load = Loader()
+    auth_cache.get_principal(1, load)
+    assert load.calls == 1
+
+
+def test_entries_expire(monkeypatch):
+    monkeypatch.setattr(settings, "AUTH_CACHE_TTL_SECONDS", 0.05)
+    load = Loader()
+    auth_cache.get_principal(1, load)
+    time.sleep(0.1)
+    auth_cache.get_principal(1, load)
+    assert load.calls == 2
+
+
+def test_least_recently_used_entry_is_evicted(monkeypatch):
+    monkeypatch.setattr(settings, "AUTH_CACHE_MAX_ENTRIES", 2)
+    load = Loader()
+    auth_cache.get_principal(1, load)
+    auth_cache.get_principal(2, load)
+    auth_cache.get_principal(1, load)
+    auth_cache.get_principal(3, load)
+    assert load.calls == 3
+    auth_cache.get_principal(1, load)
+    assert load.calls == 3
+    auth_cache.get_principal(2, load)
+    assert load.calls == 4
+
+
+def test_disabled_cache_always_loads(monkeypatch):
+    monkeypatch.setattr(settings, "AUTH_CACHE_TTL_SECONDS", 0)
+    load = Loader()
+    for _ in range(3):
+        auth_cache.get_principal(1, load)
+    assert load.calls == 3
+
+
+def test_async_lookup_shares_the_cache():
+    load = Loader()
+
+    async def async_load(user_id):
+        return load(user_id)
+
+    async def run():
+        return [await auth_cache.get_principal_async(1, async_load) for _ in range(3)]
+
+    assert asyncio.run(run()) == [_principal(1)] * 3
+    assert auth_cache.get_principal(1, load) == _principal(1)
+    assert load.calls == 1
+
+
+def test_broadcast_invalidations_from_other_workers_apply_here():
+    load = Loader()
+    auth_cache.get_principal(1, load)
+    auth_cache.get_principal(2, load)
+    auth_cache._apply_remote({"type": "message", "data": b"1"})
+    auth_cache.get_principal(1, load)
+    auth_cache.get_principal(2, load)
+    assert load.calls == 3
+    auth_cache._apply_remote({"type": "message", "data": "*"})
+    auth_cache.get_principal(2, load)
+    assert load.calls == 4
+
+
+def test_deactivating_a_user_is_seen_on_the_next_request(session_factory):
+    from app.crud import user as crud_user
+
+    with session_factory() as db:
+        user_id = crud_user._insert_user(
+            db, email="grower@example.com", username="grower", hashed_password="x", full_name=None
+        ).id
+
+    def load(uid):
+        with session_factory() as db:
+            return auth_cache.principal_of(crud_user.get_user_by_id(db, uid))
+
+    assert auth_cache.get_principal(user_id, load).is_active is True
+    with session_factory() as db:
+        crud_user.set_user_active(db, user_id=user_id, is_active=False)
+    assert auth_cache.get_principal(user_id, load).is_active is False
+    with session_factory() as db:
+        crud_user.delete_user(db, user_id=user_id)
+    assert auth_cache.get_principal(user_id, load) is None
@@ -0,0 +1,143 @@
+from __future__ import annotations
+
+import json
+import os
+import time
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.core import security
+from app.core.config import settings
+from app.core.middleware import CORSMiddleware
+from app.core.security import create_image_token, verify_image_token
+from app.crud.scan import create_scan, delete_scan
+from app.db.session import SessionLocal
+
+TTL = max(60, settings.IMAGE_URL_TTL_SECONDS)
+
+
+def _token(**overrides) -> str:
+    return create_image_token(**{"scan_id": 1, "user_id": 7, "filename": "a.jpg", **overrides})
+
+
+def _signed(payload: dict) -> str:
+    body = security._b64url_encode(json.dumps(payload).encode("utf-8"))
+    return f"{body}.{security._image_signature(body)}"
+
+
+def test_token_carries_its_claims():
+    claims = verify_image_token(_token(variant="original", now=1000), now=1000)
+    assert {k: claims[k] for k in ("scan_id", "user_id", "variant", "filename")} == {
+        "scan_id": 1,
+        "user_id": 7,
+        "variant": "original",
+        "filename": "a.jpg",
+    }
+
+
+def test_urls_are_identical_within_an_expiry_window():
+    start = 100 * TTL
+    assert _token(now=start) == _token(now=start + TTL - 1)
+    assert _token(now=start) != _token(now=start + TTL)
+    # Rounding up never leaves less than a full TTL of validity.
+    for now in (start, start + TTL - 1):
+        assert now + TTL < verify_image_token(_token(now=now), now=now)["expires_at"] <= now + 2 * TTL
+
+
+def test_token_stops_working_at_its_expiry():
+    token = _token(now=1000)
+    expires_at = verify_image_token(token, now=1000)["expires_at"]
+    assert verify_image_token(token, now=expires_at - 1) is not None
+    assert verify_image_token(token, now=expires_at) is None
+
+
+@pytest.mark.parametrize(
+    "make",
+    [
+        # Scan 2's claims under scan 1's signature.
+        lambda: _token(scan_id=2).split(".")[0] + "." + _token().split(".")[1],
+        lambda: _token()[:-1] + ("B" if _token().endswith("A") else "A"),
+        lambda: _token().split(".")[0],
+        lambda: "",
+    ],
+    ids=["swapped-body", "bad-signature", "unsigned", "empty"],
+)
+def test_tampered_tokens_are_rejected(make):
+    assert verify_image_token(make()) is None
+
+
+def test_unknown_variants_are_rejected():
+    with pytest.raises(ValueError):
+        _token(variant="thumbnail")
+    forged = _signed({"s": 1, "u": 7, "v": "thumbnail", "f": "a.jpg", "e": int(time.time()) + TTL})
+    assert verify_image_token(forged) is None
+
+
+def _scan_with_file(user_id: int, storage_dir: str, name: str) -> int:
+    with open(os.path.join(storage_dir, name), "wb") as out:
+        out.write(b"jpeg bytes")
+    with SessionLocal() as db:
+        return create_scan(db, user_id=user_id, image_filename=name, result={}).id
+
+
+def test_media_serves_a_signed_original_with_cache_headers(client, login, storage_dir):
+    user_id, _ = login()
+    scan_id = _scan_with_file(user_id, storage_dir, "media-a.jpg")
+    token = _token(scan_id=scan_id, user_id=user_id, filename="media-a.jpg", variant="original")
+
+    response = client.get(f"/api/scans/media/{token}", headers={"Origin": "https://fields.example"})
+    assert response.status_code == 200 and response.content == b"jpeg bytes"
+    cache_control = response.headers["cache-control"]
+    assert cache_control.startswith("public, max-age=") and cache_control.endswith(", immutable")
+    assert 0 < int(cache_control.split("max-age=")[1].split(",")[0]) <= 2 * TTL
+    # Publicly cacheable, so the CORS headers must not depend on the caller's Origin.
+    assert response.headers["access-control-allow-origin"] == "*"
+
+
+@pytest.mark.parametrize("variant", ["image", "original"])
+def test_media_for_a_deleted_scan_is_not_found(client, login, storage_dir, variant):
+    user_id, _ = login()
+    scan_id = _scan_with_file(user_id, storage_dir, f"media-{variant}.jpg")
+    token = _token(scan_id=scan_id, user_id=user_id, filename=f"media-{variant}.jpg", variant=variant)
+    with SessionLocal() as db:
+        delete_scan(db, scan_id=scan_id)
+    os.remove(os.path.join(storage_dir, f"media-{variant}.jpg"))
+
+    assert client.get(f"/api/scans/media/{token}").status_code == 404
+
+
+def test_media_rejects_bad_and_expired_tokens(client, login, storage_dir):
+    user_id, _ = login()
+    scan_id = _scan_with_file(user_id, storage_dir, "media-b.jpg")
+    claims = {"scan_id": scan_id, "user_id": user_id, "filename": "media-b.jpg", "variant": "original"}
+    expired = _token(**claims, now=time.time() - 3 * TTL)
+    tampered = _token(**{**claims, "filename": "other.jpg"}).split(".")[0] + "." + _token(**claims).split(".")[1]
+
+    assert client.get(f"/api/scans/media/{_token(**claims)}").status_code == 200
+    assert client.get(f"/api/scans/media/{expired}").status_code == 404
+    assert client.get(f"/api/scans/media/{tampered}").status_code == 404
+
+
+async def _ok(scope, receive, send):
+    await send({"type": "http.response.start", "status": 200, "headers": []})
+    await send({"type": "http.response.body", "body": b"ok"})
+
+
+def test_cors_echoes_listed_origins_and_varies_on_them():
+    client = TestClient(CORSMiddleware(_ok, origins=["https://fields.example"]))
+    allowed = client.get("/", headers={"Origin": "https://fields.example"})
+    assert allowed.headers["access-control-allow-origin"] == "https://fields.example"
+    assert allowed.headers["vary"] == "Origin"
+    other = client.get("/", headers={"Origin": "https://elsewhere.example"})
+    assert "access-control-allow-origin" not in other.headers and other.headers["vary"] == "Origin"
+
+
+def test_cors_allow_all_sends_a_literal_star():
+    client = TestClient(CORSMiddleware(_ok, origins=["*"]))
+    for origin in ("https://a.example", "https://b.example", None):
+        response = client.get("/", headers={"Origin": origin} if origin else {})
+        assert response.headers["access-control-allow-origin"] == "*"
+        assert "vary" not in response.headers
+    preflight = client.options("/", headers={"Origin": "https://a.example", "Access-Control-Request-Method": "POST"})
+    assert preflight.headers["access-control-allow-origin"] == "*"
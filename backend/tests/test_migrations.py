@@ -0,0 +1,162 @@
+from __future__ import annotations
+
+import json
+
+import pytest
+from sqlalchemy import inspect, select, text
+
+from app.db.migrations import SCHEMA_VERSION, get_schema_version, schema_is_current, upgrade_schema
+from app.db.session import create_db_engine
+from app.models.rollup import ScanDailyStat, StatCounter
+from app.models.scan import Scan
+from app.services.result_codec import load_scan_result
+
+# The tables as the first release created them, before schema_version existed.
+BASELINE_DDL = [
+    """CREATE TABLE users (
+        id INTEGER NOT NULL PRIMARY KEY,
+        email VARCHAR(320) NOT NULL,
+        username VARCHAR(50) NOT NULL,
+        full_name VARCHAR(120),
+        hashed_password VARCHAR(255) NOT NULL,
+        is_active BOOLEAN NOT NULL,
+        created_at DATETIME NOT NULL
+    )""",
+    "CREATE UNIQUE INDEX ix_users_email ON users (email)",
+    "CREATE UNIQUE INDEX ix_users_username ON users (username)",
+    """CREATE TABLE scans (
+        id INTEGER NOT NULL PRIMARY KEY,
+        user_id INTEGER NOT NULL REFERENCES users (id),
+        image_filename VARCHAR(255) NOT NULL,
+        result_json TEXT NOT NULL,
+        created_at DATETIME NOT NULL
+    )""",
+    "CREATE INDEX ix_scans_user_id ON scans (user_id)",
+    """CREATE TABLE contact_messages (
+        id INTEGER NOT NULL PRIMARY KEY,
+        name VARCHAR(120) NOT NULL,
+        email VARCHAR(320) NOT NULL,
+        subject VARCHAR(200) NOT NULL,
+        message VARCHAR(2000) NOT NULL,
+        created_at DATETIME NOT NULL
+    )""",
+]
+
+# What version 1 added on top: content-addressed blobs and the version table.
+V1_DDL = [
+    """CREATE TABLE blobs (
+        id INTEGER NOT NULL PRIMARY KEY,
+        digest VARCHAR(64) NOT NULL,
+        filename VARCHAR(255) NOT NULL,
+        size BIGINT NOT NULL,
+        content_type VARCHAR(100) NOT NULL,
+        ref_count INTEGER NOT NULL,
+        created_at DATETIME NOT NULL,
+        last_used_at DATETIME
+    )""",
+    "CREATE INDEX ix_scans_image_filename ON scans (image_filename)",
+    "CREATE TABLE schema_version (version INTEGER NOT NULL PRIMARY KEY)",
+    "INSERT INTO schema_version (version) VALUES (1)",
+]
+
+DASHBOARD = {
+    "scan_type": "dashboard",
+    "detections": [{"class_name": "leaf_rust", "confidence": 0.8}],
+    "field_health": {"field_health_percent": 72.4},
+    "drone": {"location": "River plot"},
+}
+
+
+@pytest.fixture
+def legacy_engine(tmp_path):
+    """Builds the database as release ``version`` of the schema left it, with two scans."""
+
+    engines = []
+
+    def build(version: int):
+        engine = create_db_engine(f"sqlite:///{tmp_path / 'legacy.db'}")
+        with engine.begin() as conn:
+            for ddl in BASELINE_DDL + (V1_DDL if version >= 1 else []):
+                conn.execute(text(ddl))
+            conn.execute(
+                text(
+                    "INSERT INTO users VALUES (1, 'grower@example.com', 'grower', NULL, 'x', 1, '2024-03-01 08:00:00')"
+                )
+            )
+            rows = [
+                (1, "a.jpg", json.dumps(DASHBOARD), "2024-03-01 09:30:00"),
+                (2, "b.jpg", "{not json", "2024-03-02 23:59:59"),
+            ]
+            for scan_id, filename, result, created_at in rows:
+                conn.execute(
+                    text("INSERT INTO scans VALUES (:id, 1, :f, :r, :c)"),
+                    {"id": scan_id, "f": filename, "r": result, "c": created_at},
+                )
+        engines.append(engine)
+        return engine
+
+    yield build
+    for engine in engines:
+        engine.dispose()
+
+
+@pytest.mark.parametrize("version", [0, 1])
+def test_upgrades_an_old_database_to_the_current_schema(legacy_engine, version):
+    engine = legacy_engine(version)
+    upgrade_schema(engine)
+
+    with engine.connect() as conn:
+        assert get_schema_version(conn) == SCHEMA_VERSION
+        assert schema_is_current(conn)
+        columns = {c["name"] for c in inspect(conn).get_columns("scans")}
+        assert {"status", "scan_type", "location", "created_date", "result_data", "result_doc"} <= columns
+        indexes = {i["name"] for i in inspect(conn).get_indexes("scans")}
+        assert {"ix_scans_image_filename", "ix_scans_created_date_scan_type"} <= indexes
+        assert "last_used_at" in {c["name"] for c in inspect(conn).get_columns("blobs")}
+
+        first, second = conn.execute(select(Scan).order_by(Scan.id)).all()
+        assert (first.status, first.scan_type, first.health_percent) == ("complete", "dashboard", 72)
+        assert (first.location, first.disease_category, str(first.created_date)) == ("River plot", "rust", "2024-03-01")
+        assert (second.scan_type, str(second.created_date)) == ("other", "2024-03-02")
+        # Old rows stay as text and still decode.
+        assert first.result_data is None and load_scan_result(first) == DASHBOARD
+        assert load_scan_result(second) == {"raw": "{not json"}
+
+        stats = {(str(r.day), r.scan_type): r.count for r in conn.execute(select(ScanDailyStat)).all()}
+        assert stats == {("2024-03-01", "dashboard"): 1, ("2024-03-02", "other"): 1}
+        counters = dict(conn.execute(select(StatCounter.name, StatCounter.value)).all())
+        assert counters["scans:dashboard"] == 1 and counters["scans:other"] == 1
+
+
+def test_upgrading_twice_changes_nothing(legacy_engine):
+    engine = legacy_engine(0)
+    upgrade_schema(engine)
+    with engine.connect() as conn:
+        before = conn.execute(select(Scan.id, Scan.scan_type, Scan.created_date)).all()
+        counters = conn.execute(select(StatCounter.name, StatCounter.value)).all()
+    upgrade_schema(engine)
+    with engine.connect() as conn:
+        assert conn.execute(select(Scan.id, Scan.scan_type, Scan.created_date)).all() == before
+        assert conn.execute(select(StatCounter.name, StatCounter.value)).all() == counters
+        assert conn.execute(text("SELECT COUNT(*) FROM schema_version")).scalar() == 1
+
+
+def test_fresh_database_is_stamped_current(engine):
+    with engine.connect() as conn:
+        # create_all() alone builds the tables but records no version.
+        assert not schema_is_current(conn)
+    upgrade_schema(engine)
+    with engine.connect() as conn:
+        assert schema_is_current(conn)
+        assert get_schema_version(conn) == SCHEMA_VERSION
+
+
+def test_missing_table_is_not_current(engine):
+    upgrade_schema(engine)
+    with engine.begin() as conn:
+        conn.execute(text("DROP TABLE scan_jobs"))
+        assert not schema_is_current(conn)
+    upgrade_schema(engine)
+    with engine.connect() as conn:
+        assert "scan_jobs" in inspect(conn).get_table_names()
+        assert schema_is_current(conn)
@@ -0,0 +1,211 @@
+from __future__ import annotations
+
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+from starlette.requests import Request
+
+from app.api import deps
+from app.core.config import settings
+from app.services import admission, rate_limit
+from app.services.auth_cache import Principal
+from app.services.rate_limit import MemoryBackend, Policy, RateLimitError, parse_rate
+
+
+@pytest.fixture
+def backend(monkeypatch):
+    """Rate limiting on, with a fresh in-memory backend and counters."""
+
+    fresh = MemoryBackend()
+    monkeypatch.setattr(settings, "RATE_LIMIT_ENABLED", True)
+    monkeypatch.setattr(settings, "RATE_LIMIT_REDIS_URL", "")
+    monkeypatch.setattr(settings, "RATE_LIMIT_SCAN_CREATE", "3/minute")
+    monkeypatch.setattr(settings, "INFERENCE_DAILY_QUOTA", 2)
+    monkeypatch.setattr(rate_limit, "_backend", fresh)
+    monkeypatch.setattr(rate_limit, "_metrics", {})
+    return fresh
+
+
+@pytest.mark.parametrize(
+    "spec, limit, period",
+    [("30/minute", 30, 60.0), ("5/10s", 5, 10.0), ("1000/day", 1000, 86400.0), (" 2 / hours ", 2, 3600.0)],
+)
+def test_parse_rate(spec, limit, period):
+    policy = parse_rate("x", spec)
+    assert (policy.limit, policy.period) == (limit, period)
+
+
+@pytest.mark.parametrize("spec", ["", "0", "off", "0/minute"])
+def test_parse_rate_unlimited(spec):
+    assert parse_rate("x", spec) is None
+
+
+@pytest.mark.parametrize("spec", ["lots", "5/fortnight", "-1/minute"])
+def test_parse_rate_rejects_garbage(spec):
+    with pytest.raises(RateLimitError):
+        parse_rate("x", spec)
+
+
+def test_bucket_empties_and_refills():
+    backend = MemoryBackend()
+    policy = Policy("x", limit=2, period=10.0)
+
+    async def run():
+        taken = [await backend.take("k", policy, 0.0) for _ in range(3)]
+        return taken, await backend.take("k", policy, 5.0), await backend.take("other", policy, 5.0)
+
+    taken, refilled, other = asyncio.run(run())
+    assert taken[:2] == [0.0, 0.0]
+    # One token every 5 seconds.
+    assert taken[2] == pytest.approx(5.0)
+    assert refilled == 0.0
+    assert other == 0.0
+
+
+def test_daily_counter_resets_at_utc_midnight():
+    backend = MemoryBackend()
+
+    async def run():
+        day = 86400.0
+        return [await backend.count("k", day + 1), await backend.count("k", day + 2), await backend.count("k", 2 * day)]
+
+    assert asyncio.run(run()) == [1, 2, 1]
+
+
+def test_full_map_drops_refilled_buckets_first():
+    backend = MemoryBackend(max_keys=1000)
+    policy = Policy("x", limit=5, period=60.0)
+
+    async def run():
+        for i in range(1000):
+            await backend.take(f"k{i}", policy, 0.0)
+        # An hour later every bucket is full again and can go.
+        await backend.take("late", policy, 3600.0)
+
+    asyncio.run(run())
+    assert list(backend._buckets) == ["late"]
+
+
+def test_full_map_evicts_least_recently_used():
+    backend = MemoryBackend(max_keys=1000)
+    policy = Policy("x", limit=5, period=60.0)
+
+    async def run():
+        for i in range(1000):
+            await backend.take(f"k{i}", policy, 0.0)
+        await backend.take("k0", policy, 0.0)
+        for i in range(1000, 1100):
+            await backend.take(f"k{i}", policy, 0.0)
+
+    asyncio.run(run())
+    assert len(backend._buckets) == 1000
+    assert "k0" in backend._buckets
+    assert "k1" not in backend._buckets
+    assert "k1099" in backend._buckets
+
+
+def test_check_limits_per_key_without_charging_quota(backend):
+    async def run():
+        first = [await rate_limit.check("scan_create", "user:1") for _ in range(4)]
+        other = await rate_limit.check("scan_create", "user:2")
+        return first, other
+
+    first, other = asyncio.run(run())
+    assert [d.allowed for d in first] == [True, True, True, False]
+    assert first[-1].reason == "rate" and first[-1].retry_after > 0
+    assert other.allowed
+    assert backend._counts == {}
+    assert rate_limit.get_rate_limit_metrics()["counts"]["scan_create"]["limited"] == 1
+
+
+def test_concurrent_checks_let_exactly_the_limit_through(backend):
+    async def run():
+        return await asyncio.gather(*(rate_limit.check("scan_create", "user:1") for _ in range(20)))
+
+    assert sum(d.allowed for d in asyncio.run(run())) == 3
+
+
+def test_quota_is_charged_separately_and_runs_out(backend):
+    async def run():
+        return [await rate_limit.charge_quota("user:1") for _ in range(3)]
+
+    decisions = asyncio.run(run())
+    assert [d.allowed for d in decisions] == [True, True, False]
+    assert decisions[-1].reason == "quota"
+    assert 1 <= decisions[-1].retry_after <= 86400
+    assert rate_limit.get_rate_limit_metrics()["counts"]["quota"]["quota_exceeded"] == 1
+
+
+def test_disabled_limits_nothing(backend, monkeypatch):
+    monkeypatch.setattr(settings, "RATE_LIMIT_ENABLED", False)
+
+    async def run():
+        checks = [await rate_limit.check("scan_create", "user:1") for _ in range(10)]
+        quotas = [await rate_limit.charge_quota("user:1") for _ in range(10)]
+        return checks + quotas
+
+    assert all(d.allowed for d in asyncio.run(run()))
+    assert backend._buckets == {} and backend._counts == {}
+
+
+def test_backend_failure_lets_requests_through(backend, monkeypatch):
+    async def broken(*args, **kwargs):
+        raise ConnectionError("redis went away")
+
+    monkeypatch.setattr(backend, "take", broken)
+    monkeypatch.setattr(backend, "count", broken)
+
+    async def run():
+        return await rate_limit.check("scan_create", "user:1"), await rate_limit.charge_quota("user:1")
+
+    assert all(d.allowed for d in asyncio.run(run()))
+    counts = rate_limit.get_rate_limit_metrics()["counts"]
+    assert counts["scan_create"]["errors"] == 1
+    assert counts["quota"]["errors"] == 1
+
+
+def test_client_address_limit_never_charges_quota(backend, monkeypatch):
+    monkeypatch.setattr(settings, "RATE_LIMIT_AI_PREDICT", "2/minute")
+    dependency = deps.limit_client_inference("ai_predict")
+    request = Request({"type": "http", "client": ("203.0.113.7", 5000), "headers": []})
+
+    async def run():
+        await dependency(request)
+        await dependency(request)
+        with pytest.raises(HTTPException) as excinfo:
+            await dependency(request)
+        return excinfo.value
+
+    assert asyncio.run(run()).status_code == 429
+    assert backend._counts == {}
+
+
+def test_quota_is_charged_only_once_admitted(backend, monkeypatch):
+    monkeypatch.setattr(settings, "ADMISSION_ENABLED", True)
+    monkeypatch.setattr(settings, "ADMISSION_MAX_CONCURRENCY", 1)
+    monkeypatch.setattr(settings, "ADMISSION_MAX_QUEUE", 0)
+    monkeypatch.setattr(admission, "_limiter", admission._Limiter())
+    user = Principal(id=1, email="u@example.com", is_active=True, is_admin=False)
+
+    async def run():
+        async with deps.inference_slot():
+            # Shed while the only slot is busy: no quota used.
+            with pytest.raises(HTTPException) as shed:
+                async with deps.inference_slot(user):
+                    pass
+            assert shed.value.status_code == 503
+            assert backend._counts == {}
+        async with deps.inference_slot(user):
+            pass
+        async with deps.inference_slot(user):
+            pass
+        with pytest.raises(HTTPException) as exhausted:
+            async with deps.inference_slot(user):
+                pass
+        return exhausted.value
+
+    error = asyncio.run(run())
+    assert error.status_code == 429
+    assert backend._counts == {"user:1": 3}
+    assert admission._limiter.in_flight == 0
@@ -0,0 +1,153 @@
+from __future__ import annotations
+
+import json
+from types import SimpleNamespace
+
+import pytest
+
+from app.core.config import settings
+from app.services import result_codec
+from app.services.result_codec import (
+    ResultCodecError,
+    decode_envelope,
+    decode_result,
+    encode_envelope,
+    load_scan_result,
+    result_columns,
+    result_json_bytes,
+)
+
+RESULT = {
+    "scan_type": "dashboard",
+    "detections": [{"class_name": "leaf_blight", "confidence": 0.91, "polygon": [[1, 2], [3, 4], [5, 6]]}],
+    "field_health": {"field_health_percent": 87.5},
+    "drone": {"name": "Mavic", "location": "North field é"},
+    "big": 2**70,
+}
+
+
+def _row(result_json="", result_data=None, result_doc=None):
+    return SimpleNamespace(result_json=result_json, result_data=result_data, result_doc=result_doc)
+
+
+@pytest.fixture
+def codec(monkeypatch):
+    def use(name: str) -> None:
+        monkeypatch.setattr(settings, "SCAN_RESULT_CODEC", name)
+
+    return use
+
+
+@pytest.mark.parametrize("name", ["zlib", "zstd", "msgpack-zstd"])
+def test_envelope_round_trip(name):
+    if name != "zlib":
+        pytest.importorskip("zstandard")
+    if name == "msgpack-zstd":
+        pytest.importorskip("msgpack")
+    small = {k: v for k, v in RESULT.items() if k != "big"}
+    blob = encode_envelope(small, name)
+    assert blob[:2] == bytes([1, result_codec._CODEC_IDS[name]])
+    assert decode_envelope(blob) == small
+
+
+def test_values_msgpack_cannot_hold_fall_back_to_zstd_json():
+    pytest.importorskip("zstandard")
+    pytest.importorskip("msgpack")
+    blob = encode_envelope(RESULT, "msgpack-zstd")
+    assert blob[1] == result_codec._CODEC_IDS["zstd"]
+    assert decode_envelope(blob) == RESULT
+
+
+@pytest.mark.parametrize(
+    "dialect, setting, column",
+    [
+        ("sqlite", "auto", "result_data"),
+        ("sqlite", "json", "result_json"),
+        ("sqlite", "jsonb", "result_data"),
+        ("postgresql", "auto", "result_doc"),
+        ("postgresql", "zlib", "result_data"),
+    ],
+)
+def test_result_columns_round_trip(codec, dialect, setting, column):
+    codec(setting)
+    columns = result_columns(RESULT, dialect=dialect)
+    assert [k for k, v in columns.items() if v not in (None, "")] == [column]
+    assert decode_result(**columns) == RESULT
+    assert json.loads(result_json_bytes(**columns)) == RESULT
+
+
+def test_auto_never_picks_an_optional_package(codec):
+    codec("auto")
+    assert result_codec.resolve_codec("sqlite") == "zlib"
+    assert result_codec.resolve_codec("mysql") == "zlib"
+
+
+def test_unknown_codec_is_rejected_at_startup(codec):
+    codec("brotli")
+    with pytest.raises(ResultCodecError):
+        result_codec.check_result_codec_settings("sqlite")
+
+
+def test_json_envelope_is_passed_through_without_reencoding():
+    blob = encode_envelope(RESULT, "zlib")
+    raw = result_json_bytes("", blob, None)
+    assert raw == result_codec.dumps_json(RESULT)
+
+
+@pytest.mark.parametrize(
+    "blob",
+    [b"\x01", b"\x09\x01payload", b"\x01\x01not zlib at all", b"\x01\x07whatever"],
+    ids=["truncated", "future-version", "corrupt", "unknown-codec"],
+)
+def test_unreadable_envelope_degrades_to_an_error_row(blob):
+    data = json.loads(result_json_bytes("", blob, None))
+    assert set(data) == {"raw", "error"}
+    assert data["raw"] is None and data["error"]
+    assert load_scan_result(_row(result_data=blob)) == data
+    with pytest.raises(ResultCodecError):
+        decode_envelope(blob)
+
+
+def test_legacy_json_text_is_passed_through_as_stored():
+    text = '{"scan_type": "other",  "note": "spacing kept"}'
+    assert result_json_bytes(text, None, None) == text.encode("utf-8")
+    assert load_scan_result(_row(text)) == {"scan_type": "other", "note": "spacing kept"}
+
+
+@pytest.mark.parametrize("text", ["{not json", '{"a": 1} trailing', "", "plain words"])
+def test_legacy_text_that_is_not_json_is_wrapped(text):
+    assert json.loads(result_json_bytes(text, None, None)) == {"raw": text}
+    assert load_scan_result(_row(text)) == {"raw": text}
+
+
+def test_legacy_json_that_is_not_an_object_is_wrapped():
+    assert json.loads(result_json_bytes("[1, 2]", None, None)) == {"raw": "[1, 2]"}
+
+
+def test_a_bad_row_does_not_break_a_list_response():
+    from app.services.scan_pipeline import json_array
+
+    rows = [
+        result_json_bytes("", encode_envelope(RESULT, "zlib"), None),
+        result_json_bytes("{not json", None, None),
+        result_json_bytes("", b"\x01\x01garbage", None),
+        result_json_bytes("", None, {"scan_type": "estimate_field"}),
+    ]
+    decoded = json.loads(json_array(rows))
+    assert decoded[0] == RESULT
+    assert decoded[1] == {"raw": "{not json"}
+    assert decoded[2]["raw"] is None
+    assert decoded[3] == {"scan_type": "estimate_field"}
+
+
+def test_stored_scan_round_trip(session_factory, codec):
+    from app.crud.scan import create_scan, get_scan_by_id
+
+    codec("auto")
+    with session_factory() as db:
+        scan_id = create_scan(db, user_id=1, image_filename="a.jpg", result=RESULT).id
+    with session_factory() as db:
+        scan = get_scan_by_id(db, scan_id=scan_id)
+        assert scan.result_json == "" and scan.result_data is not None
+        assert load_scan_result(scan) == RESULT
+        assert scan.location == "North field é"
@@ -0,0 +1,187 @@
+from __future__ import annotations
+
+import hashlib
+import threading
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from sqlalchemy import select, update
+
+from app.crud.scan_job import (
+    claim_scan_jobs,
+    create_scan_job,
+    get_scan_job,
+    requeue_stale_scan_jobs,
+    update_scan_job,
+)
+from app.models.scan_job import ScanJob
+
+LEASE = 60
+
+
+def _queue(session_factory, count: int) -> list[str]:
+    with session_factory() as db:
+        return [create_scan_job(db, scan_id=i + 1, user_id=1, payload_json="{}").id for i in range(count)]
+
+
+def _claim(session_factory, worker: str, limit: int = 10, max_attempts: int = 0):
+    with session_factory() as db:
+        return claim_scan_jobs(db, worker_id=worker, limit=limit, lease_seconds=LEASE, max_attempts=max_attempts)
+
+
+def _expire_lease(session_factory, job_id: str) -> None:
+    with session_factory() as db:
+        db.execute(
+            update(ScanJob)
+            .where(ScanJob.id == job_id)
+            .values(heartbeat_at=datetime.now(timezone.utc) - timedelta(seconds=LEASE * 2))
+        )
+        db.commit()
+
+
+def _job(session_factory, job_id: str) -> ScanJob:
+    with session_factory() as db:
+        job = get_scan_job(db, job_id=job_id)
+        db.expunge(job)
+        return job
+
+
+def test_claims_oldest_jobs_up_to_the_limit(session_factory):
+    ids = _queue(session_factory, 3)
+    claimed, exhausted = _claim(session_factory, "w1", limit=2)
+    assert claimed == ids[:2] and exhausted == []
+    job = _job(session_factory, ids[0])
+    assert (job.status, job.claimed_by, job.attempts) == ("running", "w1", 1)
+    assert _claim(session_factory, "w2")[0] == ids[2:]
+    assert _claim(session_factory, "w3") == ([], [])
+
+
+def test_live_lease_is_not_taken_over(session_factory):
+    (job_id,) = _queue(session_factory, 1)
+    _claim(session_factory, "w1")
+    with session_factory() as db:
+        assert update_scan_job(db, job_id=job_id, worker_id="w1", progress=50)
+    assert _claim(session_factory, "w2") == ([], [])
+
+
+def test_expired_lease_is_reclaimed_and_the_old_worker_loses_it(session_factory):
+    (job_id,) = _queue(session_factory, 1)
+    _claim(session_factory, "w1")
+    _expire_lease(session_factory, job_id)
+    assert _claim(session_factory, "w2")[0] == [job_id]
+    with session_factory() as db:
+        assert not update_scan_job(db, job_id=job_id, worker_id="w1", status="succeeded")
+        assert update_scan_job(db, job_id=job_id, worker_id="w2", status="succeeded")
+    job = _job(session_factory, job_id)
+    assert (job.status, job.claimed_by, job.attempts) == ("succeeded", "w2", 2)
+
+
+def test_job_out_of_attempts_is_failed_instead_of_leased(session_factory):
+    first, second = _queue(session_factory, 2)
+    _claim(session_factory, "w1", limit=1, max_attempts=2)
+    for worker in ("w2", "w3"):
+        _expire_lease(session_factory, first)
+        claimed, exhausted = _claim(session_factory, worker, limit=1, max_attempts=2)
+    assert exhausted == [first]
+    # The slot the exhausted job would have taken goes to the next job.
+    assert claimed == [second]
+    job = _job(session_factory, first)
+    assert (job.status, job.stage, job.claimed_by, job.attempts) == ("failed", "failed", None, 2)
+    assert "2 attempts" in job.error
+    _expire_lease(session_factory, first)
+    assert _claim(session_factory, "w4", max_attempts=2) == ([], [])
+
+
+def test_requeue_returns_a_stopping_workers_jobs(session_factory):
+    ids = _queue(session_factory, 2)
+    _claim(session_factory, "w1", limit=1)
+    _claim(session_factory, "w2", limit=1)
+    with session_factory() as db:
+        assert requeue_stale_scan_jobs(db, lease_seconds=LEASE, worker_id="w1") == 1
+    assert _job(session_factory, ids[0]).status == "queued"
+    assert _job(session_factory, ids[1]).status == "running"
+    assert _claim(session_factory, "w3")[0] == [ids[0]]
+
+
+def test_concurrent_workers_never_claim_the_same_job(session_factory):
+    ids = _queue(session_factory, 40)
+    results: dict[str, list[str]] = {}
+    start = threading.Barrier(4)
+
+    def worker(name: str) -> None:
+        start.wait()
+        claimed: list[str] = []
+        while True:
+            batch = _claim(session_factory, name, limit=3)[0]
+            if not batch:
+                break
+            claimed.extend(batch)
+        results[name] = claimed
+
+    threads = [threading.Thread(target=worker, args=(f"w{i}",)) for i in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    claimed = [job_id for batch in results.values() for job_id in batch]
+    assert sorted(claimed) == sorted(ids)
+    assert len(set(claimed)) == len(claimed)
+
+
+def _failing_add_scan_job(*args, **kwargs):
+    raise RuntimeError("job insert failed")
+
+
+def _blob_refs(digest: str) -> int:
+    from app.crud.blob import get_blob_by_digest
+    from app.db.session import SessionLocal
+
+    with SessionLocal() as db:
+        blob = get_blob_by_digest(db, digest=digest)
+        return 0 if blob is None else blob.ref_count
+
+
+def test_queued_scan_and_job_are_committed_together(session_factory, monkeypatch):
+    from app.crud import scan as crud_scan
+    from app.crud.rollup import get_counters
+    from app.models.scan import Scan
+
+    with session_factory() as db:
+        scan, job = crud_scan.create_queued_scan(
+            db, user_id=1, image_filename="a.jpg", result={"scan_type": "dashboard"}, payload_json="{}"
+        )
+        assert (scan.status, job.scan_id, job.status) == ("pending", scan.id, "queued")
+
+    monkeypatch.setattr(crud_scan, "add_scan_job", _failing_add_scan_job)
+    with session_factory() as db:
+        with pytest.raises(RuntimeError):
+            crud_scan.create_queued_scan(
+                db, user_id=1, image_filename="b.jpg", result={"scan_type": "dashboard"}, payload_json="{}"
+            )
+        db.rollback()
+        assert db.execute(select(Scan.image_filename)).scalars().all() == ["a.jpg"]
+        assert get_counters(db)["scans:dashboard"] == 1
+
+
+def test_failed_async_submission_leaves_no_pending_scan(client, login, monkeypatch, png_bytes):
+    from app.crud import scan as crud_scan
+    from app.db.session import SessionLocal
+    from app.models.scan import Scan
+
+    user_id, headers = login()
+    digest = hashlib.sha256(png_bytes).hexdigest()
+    refs_before = _blob_refs(digest)
+    monkeypatch.setattr(crud_scan, "add_scan_job", _failing_add_scan_job)
+    response = client.post(
+        "/api/scans/?async=1",
+        headers=headers,
+        files={"file": ("field.png", png_bytes, "image/png")},
+        data={"drone_name": "d", "flight_duration": "1", "drone_altitude": "10", "location": "l", "captured_at": "x"},
+    )
+    assert response.status_code == 500
+    with SessionLocal() as db:
+        assert db.execute(select(Scan).where(Scan.user_id == user_id)).first() is None
+    assert client.get("/api/scans/", headers=headers).json() == []
+    # The image reference is handed back; the upload GC removes the file later.
+    assert _blob_refs(digest) == refs_before
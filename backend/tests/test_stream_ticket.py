@@ -0,0 +1,42 @@
+from __future__ import annotations
+
+import pytest
+from fastapi import HTTPException
+
+from app.api import deps
+from app.core.config import settings
+from app.core.security import create_access_token, create_image_token, create_stream_ticket, verify_stream_ticket
+
+
+def test_ticket_names_its_user_until_it_expires():
+    ticket = create_stream_ticket(user_id=7, now=1000)
+    assert verify_stream_ticket(ticket, now=1000) == 7
+    assert verify_stream_ticket(ticket, now=1000 + settings.STREAM_TICKET_TTL_SECONDS - 1) == 7
+    assert verify_stream_ticket(ticket, now=1000 + settings.STREAM_TICKET_TTL_SECONDS) is None
+
+
+def test_ticket_is_url_safe():
+    ticket = create_stream_ticket(user_id=123456)
+    assert all(c.isalnum() or c in "-_." for c in ticket)
+
+
+@pytest.mark.parametrize(
+    "make",
+    [
+        lambda: create_access_token("7"),
+        lambda: create_image_token(scan_id=1, user_id=7, filename="a.jpg"),
+        # Another user's claims under this ticket's signature.
+        lambda: create_stream_ticket(user_id=8).split(".")[0] + "." + create_stream_ticket(user_id=7).split(".")[1],
+        lambda: "",
+        lambda: "no-signature",
+    ],
+    ids=["jwt", "image-token", "tampered", "empty", "unsigned"],
+)
+def test_other_credentials_are_not_tickets(make):
+    assert verify_stream_ticket(make()) is None
+
+
+def test_ticket_is_not_a_bearer_token():
+    with pytest.raises(HTTPException) as excinfo:
+        deps._user_id_from_token(create_stream_ticket(user_id=7))
+    assert excinfo.value.status_code == 401
@@ -0,0 +1,143 @@
+from __future__ import annotations
+
+import asyncio
+import json
+
+import pytest
+
+from app.core import tracing
+from app.core.config import settings
+from app.core.tracing import FileSpanExporter, TracingError, parse_traceparent
+
+TRACE_ID = "4bf92f3577b34da6a3ce929d0e0e4736"
+PARENT_ID = "00f067aa0ba902b7"
+
+
+@pytest.fixture
+def exported(tmp_path, monkeypatch):
+    """Tracing on, exporting to a JSON lines file; call the result to flush and read it."""
+
+    path = tmp_path / "spans.jsonl"
+    monkeypatch.setattr(settings, "TRACING_EXPORT_INTERVAL_SECONDS", 0.05)
+    monkeypatch.setattr(tracing, "_enabled", True)
+    processor = tracing._BatchProcessor(FileSpanExporter(str(path)))
+    monkeypatch.setattr(tracing, "_processor", processor)
+
+    def read() -> list[dict]:
+        tracing.flush_spans()
+        if not path.exists():
+            return []
+        return [json.loads(line) for line in path.read_text(encoding="utf-8").splitlines()]
+
+    yield read
+    processor.shutdown()
+
+
+@pytest.mark.parametrize(
+    "header, expected",
+    [
+        (f"00-{TRACE_ID}-{PARENT_ID}-01", (TRACE_ID, PARENT_ID, True)),
+        (f"00-{TRACE_ID}-{PARENT_ID}-00", (TRACE_ID, PARENT_ID, False)),
+        (f"01-{TRACE_ID}-{PARENT_ID}-01-future", (TRACE_ID, PARENT_ID, True)),
+    ],
+)
+def test_parse_traceparent(header, expected):
+    assert parse_traceparent(header) == expected
+
+
+@pytest.mark.parametrize(
+    "header",
+    [
+        None,
+        "",
+        "garbage",
+        f"00-{TRACE_ID.upper()}-{PARENT_ID}-01",
+        f"00-{'0' * 32}-{PARENT_ID}-01",
+        f"00-{TRACE_ID}-{'0' * 16}-01",
+        f"ff-{TRACE_ID}-{PARENT_ID}-01",
+        f"00-{TRACE_ID}-{PARENT_ID}-01-extra",
+    ],
+)
+def test_invalid_traceparent_starts_a_new_trace(header):
+    assert parse_traceparent(header) is None
+
+
+def test_file_exporter_writes_one_json_object_per_span(exported):
+    with tracing.span("request", kind="server", parent=f"00-{TRACE_ID}-{PARENT_ID}-01") as outer:
+        outer.set_attribute("http.route", "/api/scans/")
+        assert tracing.inject()["traceparent"] == outer.traceparent
+        with pytest.raises(ValueError):
+            with tracing.span("inference"):
+                raise ValueError("model exploded")
+
+    spans = {s["name"]: s for s in exported()}
+    request, inference = spans["request"], spans["inference"]
+    assert request["trace_id"] == inference["trace_id"] == TRACE_ID
+    assert request["parent_span_id"] == PARENT_ID
+    assert inference["parent_span_id"] == request["span_id"]
+    assert request["kind"] == "server" and request["attributes"] == {"http.route": "/api/scans/"}
+    assert (inference["status"], inference["error"]) == ("error", "ValueError: model exploded")
+    assert request["end_time_unix_nano"] >= inference["end_time_unix_nano"]
+    assert request["service"] == settings.TRACING_SERVICE_NAME
+
+
+def test_unsampled_traces_are_not_exported(exported, monkeypatch):
+    monkeypatch.setattr(settings, "TRACING_SAMPLE_RATE", 0.0)
+    with tracing.span("dropped"):
+        pass
+    with tracing.span("unsampled caller", parent=f"00-{TRACE_ID}-{PARENT_ID}-00"):
+        pass
+    # A caller that sampled the trace is always followed.
+    with tracing.span("kept", parent=f"00-{TRACE_ID}-{PARENT_ID}-01"):
+        pass
+    assert [s["name"] for s in exported()] == ["kept"]
+
+
+def test_traced_decorator_wraps_sync_and_async_functions(exported):
+    @tracing.traced("sync.work")
+    def work():
+        return tracing.current_span().name
+
+    @tracing.traced("async.work")
+    async def async_work():
+        return tracing.current_span().name
+
+    assert work() == "sync.work"
+    assert asyncio.run(async_work()) == "async.work"
+    assert sorted(s["name"] for s in exported()) == ["async.work", "sync.work"]
+
+
+def test_failing_exporter_is_counted_not_raised(monkeypatch):
+    class Broken:
+        def export(self, spans):
+            raise OSError("collector is down")
+
+        def shutdown(self):
+            pass
+
+    monkeypatch.setattr(settings, "TRACING_EXPORT_INTERVAL_SECONDS", 0.05)
+    monkeypatch.setattr(tracing, "_enabled", True)
+    processor = tracing._BatchProcessor(Broken())
+    monkeypatch.setattr(tracing, "_processor", processor)
+    try:
+        with tracing.span("lost"):
+            pass
+        tracing.flush_spans()
+        assert (processor.exported, processor.failed) == (0, 1)
+    finally:
+        processor.shutdown()
+
+
+def test_disabled_tracing_yields_no_span(monkeypatch):
+    monkeypatch.setattr(tracing, "_enabled", False)
+    with tracing.span("anything") as s:
+        assert s is None
+    assert "traceparent" not in tracing.inject()
+
+
+def test_unknown_exporter_is_rejected():
+    with pytest.raises(TracingError):
+        tracing._load_exporter("carrier-pigeon")
+    with pytest.raises(TracingError):
+        tracing._load_exporter("no.such.module:factory")
+    assert tracing._load_exporter("none") is None
@@ -0,0 +1,129 @@
+from __future__ import annotations
+
+import os
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from app.crud.blob import get_blob_by_filename
+from app.crud.scan import create_scan
+from app.crud.user import create_user
+from app.models.blob import Blob
+from app.services import upload_gc
+from app.services.upload_gc import run_gc_pass
+
+GRACE = 3600
+
+
+@pytest.fixture(autouse=True)
+def gc_db(session_factory, storage_dir, monkeypatch):
+    monkeypatch.setattr(upload_gc, "SessionLocal", session_factory)
+
+
+def _file(storage_dir: str, name: str, *, age: float = 2 * GRACE) -> str:
+    path = os.path.join(storage_dir, name)
+    with open(path, "wb") as out:
+        out.write(b"x" * 10)
+    mtime = time.time() - age
+    os.utime(path, (mtime, mtime))
+    return path
+
+
+def _blob(session_factory, filename: str, *, ref_count: int, last_used_age: float = 2 * GRACE) -> None:
+    with session_factory() as db:
+        db.add(
+            Blob(
+                digest=uuid.uuid4().hex,
+                filename=filename,
+                size=10,
+                content_type="image/jpeg",
+                ref_count=ref_count,
+                last_used_at=datetime.now(timezone.utc) - timedelta(seconds=last_used_age),
+            )
+        )
+        db.commit()
+
+
+def _scan(session_factory, filename: str) -> None:
+    with session_factory() as db:
+        n = uuid.uuid4().hex[:8]
+        user = create_user(db, email=f"{n}@example.com", username=n, password="password123")
+        create_scan(db, user_id=user.id, image_filename=filename, result={})
+
+
+def _ref_count(session_factory, filename: str) -> int | None:
+    with session_factory() as db:
+        blob = get_blob_by_filename(db, filename=filename)
+        return None if blob is None else blob.ref_count
+
+
+def test_referenced_original_and_its_overlay_survive(session_factory, storage_dir):
+    original = _file(storage_dir, "aaaa.jpg")
+    overlay = _file(storage_dir, "aaaa_poly.jpg")
+    _blob(session_factory, "aaaa.jpg", ref_count=1)
+    _scan(session_factory, "aaaa.jpg")
+
+    stats = run_gc_pass(grace_seconds=GRACE)
+    assert (stats["scanned"], stats["files_deleted"], stats["blobs_removed"]) == (2, 0, 0)
+    assert os.path.exists(original) and os.path.exists(overlay)
+
+
+@pytest.mark.parametrize("batch_size", [1, 500])
+def test_unreferenced_files_past_grace_go_with_their_blob(session_factory, storage_dir, batch_size):
+    _file(storage_dir, "bbbb.jpg")
+    _file(storage_dir, "bbbb_rf.jpg")
+    _blob(session_factory, "bbbb.jpg", ref_count=0)
+    _file(storage_dir, "untracked.png")
+
+    stats = run_gc_pass(grace_seconds=GRACE, batch_size=batch_size)
+    assert (stats["files_deleted"], stats["blobs_removed"], stats["bytes_reclaimed"]) == (3, 1, 30)
+    assert os.listdir(storage_dir) == []
+    assert _ref_count(session_factory, "bbbb.jpg") is None
+
+
+def test_recently_used_blobs_and_new_files_survive(session_factory, storage_dir):
+    # An old file whose blob was just acquired by an upload that has no Scan yet.
+    in_use = _file(storage_dir, "cccc.jpg")
+    _blob(session_factory, "cccc.jpg", ref_count=1, last_used_age=60)
+    # A file written inside the grace period, with or without a blob row.
+    fresh = _file(storage_dir, "dddd.jpg", age=60)
+    _blob(session_factory, "dddd.jpg", ref_count=0)
+    fresh_overlay = _file(storage_dir, "eeee_poly.jpg", age=60)
+
+    stats = run_gc_pass(grace_seconds=GRACE)
+    assert (stats["files_deleted"], stats["blobs_removed"]) == (0, 0)
+    assert all(os.path.exists(p) for p in (in_use, fresh, fresh_overlay))
+    assert _ref_count(session_factory, "dddd.jpg") == 0
+
+
+def test_stale_scratch_files_are_swept(storage_dir):
+    stale = [_file(storage_dir, "tmp_upload_1234.png"), _file(storage_dir, "ffff.jpg.part-abc")]
+    live = [_file(storage_dir, "tmp_upload_5678", age=60), _file(storage_dir, "gggg.jpg.part-def", age=60)]
+
+    stats = run_gc_pass(grace_seconds=GRACE)
+    assert stats["temp_files_deleted"] == 2
+    assert not any(os.path.exists(p) for p in stale)
+    assert all(os.path.exists(p) for p in live)
+
+
+def test_drifted_ref_count_is_resynced(session_factory, storage_dir):
+    _file(storage_dir, "hhhh.jpg")
+    _blob(session_factory, "hhhh.jpg", ref_count=5)
+    _scan(session_factory, "hhhh.jpg")
+    _scan(session_factory, "hhhh.jpg")
+
+    stats = run_gc_pass(grace_seconds=GRACE)
+    assert (stats["blobs_resynced"], stats["files_deleted"]) == (1, 0)
+    assert _ref_count(session_factory, "hhhh.jpg") == 2
+
+
+def test_recently_used_blob_is_not_resynced(session_factory, storage_dir):
+    # An upload may have taken its reference and not created its Scan yet.
+    _file(storage_dir, "iiii.jpg")
+    _blob(session_factory, "iiii.jpg", ref_count=2, last_used_age=60)
+    _scan(session_factory, "iiii.jpg")
+
+    assert run_gc_pass(grace_seconds=GRACE)["blobs_resynced"] == 0
+    assert _ref_count(session_factory, "iiii.jpg") == 2
@@ -0,0 +1,175 @@
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import io
+import os
+import threading
+import uuid
+
+import pytest
+from fastapi import UploadFile
+
+from app.crud.blob import get_blob_by_digest
+from app.crud.scan import create_scan, delete_scan, get_scan_by_id
+from app.crud.user import create_user
+from app.services import upload_gc, uploads
+from app.services.upload_gc import run_gc_pass
+from app.services.uploads import StagedUpload, UploadRejectedError, release_upload, stage_upload, store_upload
+
+
+@pytest.fixture
+def gc_db(session_factory, monkeypatch):
+    monkeypatch.setattr(upload_gc, "SessionLocal", session_factory)
+    return session_factory
+
+
+def _stage(storage_dir: str, content: bytes) -> StagedUpload:
+    path = os.path.join(storage_dir, f"tmp_upload_{uuid.uuid4().hex}.png")
+    with open(path, "wb") as out:
+        out.write(content)
+    return StagedUpload(
+        path=path,
+        digest=hashlib.sha256(content).hexdigest(),
+        size=len(content),
+        ext=".png",
+        content_type="image/png",
+    )
+
+
+def _store(session_factory, storage_dir: str, content: bytes) -> str:
+    with session_factory() as db:
+        return store_upload(db, _stage(storage_dir, content))
+
+
+def _user(session_factory) -> int:
+    with session_factory() as db:
+        n = uuid.uuid4().hex[:8]
+        return create_user(db, email=f"{n}@example.com", username=n, password="password123").id
+
+
+def _scan(session_factory, storage_dir: str, user_id: int, content: bytes) -> tuple[int, str]:
+    filename = _store(session_factory, storage_dir, content)
+    with session_factory() as db:
+        return create_scan(db, user_id=user_id, image_filename=filename, result={}).id, filename
+
+
+def _delete(session_factory, scan_id: int) -> bool:
+    """Delete a scan the way the admin route does; True when its image lost its last reference."""
+
+    with session_factory() as db:
+        filename = get_scan_by_id(db, scan_id=scan_id).image_filename
+        assert delete_scan(db, scan_id=scan_id)
+        return release_upload(db, filename)
+
+
+def _ref_count(session_factory, content: bytes) -> int | None:
+    with session_factory() as db:
+        blob = get_blob_by_digest(db, digest=hashlib.sha256(content).hexdigest())
+        return None if blob is None else blob.ref_count
+
+
+def test_same_content_is_stored_once(session_factory, storage_dir):
+    first = _store(session_factory, storage_dir, b"image-a")
+    second = _store(session_factory, storage_dir, b"image-a")
+    assert first == second == f"{hashlib.sha256(b'image-a').hexdigest()}.png"
+    assert _ref_count(session_factory, b"image-a") == 2
+    assert sorted(os.listdir(storage_dir)) == [first]
+
+
+def test_deleting_one_of_two_scans_keeps_the_shared_file(session_factory, storage_dir, gc_db):
+    user_id = _user(session_factory)
+    first, filename = _scan(session_factory, storage_dir, user_id, b"image-b")
+    _scan(session_factory, storage_dir, user_id, b"image-b")
+
+    assert not _delete(session_factory, first)
+    assert _ref_count(session_factory, b"image-b") == 1
+    assert run_gc_pass(grace_seconds=0)["files_deleted"] == 0
+    assert os.path.exists(os.path.join(storage_dir, filename))
+
+
+def test_deleting_the_last_scan_leaves_the_files_to_the_gc(session_factory, storage_dir, gc_db):
+    user_id = _user(session_factory)
+    first, filename = _scan(session_factory, storage_dir, user_id, b"image-c")
+    second, _ = _scan(session_factory, storage_dir, user_id, b"image-c")
+    with open(os.path.join(storage_dir, f"{os.path.splitext(filename)[0]}_poly.jpg"), "wb") as out:
+        out.write(b"overlay")
+
+    _delete(session_factory, first)
+    assert _delete(session_factory, second)
+    assert _ref_count(session_factory, b"image-c") == 0
+    assert os.path.exists(os.path.join(storage_dir, filename))
+    # Released just now, so still inside the grace period.
+    assert run_gc_pass(grace_seconds=3600)["files_deleted"] == 0
+
+    stats = run_gc_pass(grace_seconds=0)
+    assert (stats["files_deleted"], stats["blobs_removed"]) == (2, 1)
+    assert os.listdir(storage_dir) == []
+    assert _ref_count(session_factory, b"image-c") is None
+
+
+def test_upload_revives_a_released_blob(session_factory, storage_dir):
+    user_id = _user(session_factory)
+    scan_id, filename = _scan(session_factory, storage_dir, user_id, b"image-d")
+    _delete(session_factory, scan_id)
+
+    assert _scan(session_factory, storage_dir, user_id, b"image-d")[1] == filename
+    assert _ref_count(session_factory, b"image-d") == 1
+    assert os.path.exists(os.path.join(storage_dir, filename))
+
+
+def test_revived_blob_rewrites_a_missing_file(session_factory, storage_dir):
+    filename = _store(session_factory, storage_dir, b"image-e")
+    with session_factory() as db:
+        release_upload(db, filename)
+    os.remove(os.path.join(storage_dir, filename))
+
+    _store(session_factory, storage_dir, b"image-e")
+    with open(os.path.join(storage_dir, filename), "rb") as f:
+        assert f.read() == b"image-e"
+
+
+def test_untracked_upload_is_deleted_on_release(session_factory, storage_dir):
+    legacy = os.path.join(storage_dir, "legacy.jpg")
+    with open(legacy, "wb") as out:
+        out.write(b"old")
+    with session_factory() as db:
+        assert release_upload(db, "legacy.jpg")
+    assert not os.path.exists(legacy)
+
+
+def _stage_bytes(content: bytes, **kwargs) -> StagedUpload:
+    return asyncio.run(stage_upload(UploadFile(io.BytesIO(content), filename="field.png"), **kwargs))
+
+
+def test_stage_upload_hashes_and_types_the_body(storage_dir, png_bytes):
+    staged = _stage_bytes(png_bytes)
+    assert (staged.digest, staged.size) == (hashlib.sha256(png_bytes).hexdigest(), len(png_bytes))
+    assert (staged.ext, staged.content_type) == (".png", "image/png")
+    with open(staged.path, "rb") as f:
+        assert f.read() == png_bytes
+
+
+@pytest.mark.parametrize(
+    ("content", "max_bytes", "status"),
+    [(b"", None, 400), (b"not an image", None, 415), (b"\x89PNG\r\n\x1a\n" + b"0" * 100, 50, 413)],
+)
+def test_rejected_upload_leaves_no_scratch_file(storage_dir, content, max_bytes, status):
+    with pytest.raises(UploadRejectedError) as exc:
+        _stage_bytes(content, max_bytes=max_bytes)
+    assert exc.value.status_code == status
+    assert os.listdir(storage_dir) == []
+
+
+def test_stage_upload_writes_off_the_event_loop(storage_dir, png_bytes, monkeypatch):
+    loop_thread = threading.get_ident()
+    writers = []
+    write_chunk = uploads._write_chunk
+
+    def record(*args):
+        writers.append(threading.get_ident())
+        write_chunk(*args)
+
+    monkeypatch.setattr(uploads, "_write_chunk", record)
+    _stage_bytes(png_bytes)
+    assert writers and loop_thread not in writers
@@ -117,7 +117,7 @@ export default function DashboardPage() {
           let imageUrl: string | null = null;
 
           // Prefer original image without polygons when backend supports it.
-          const originalPath = s.image_url.replace(/\/image$/, "/original-image");
+          const originalPath = s.original_image_url ?? s.image_url.replace(/\/image$/, "/original-image");
           try {
             const resOriginal = await fetch(`${API_BASE_URL}${originalPath}`, {
               headers: {
@@ -31,6 +31,7 @@ export type Scan = {
   id: number;
   image_filename: string;
   image_url: string;
+  original_image_url?: string | null;
   result: any;
   created_at: string;
 };
@@ -54,6 +55,7 @@ export type AdminScan = {
   user_id: number;
   image_filename: string;
   image_url: string;
+  original_image_url?: string | null;
   result: any;
   created_at: string;
 };